@@ -0,0 +1,79 @@
+"""
+Encode/decode throughput, latency and allocations for every algorithm and message type.
+
+Usage:
+
+    python -m benchmarks [--sizes 64,1K,64K,1M,64M] [--filter REGEX] [--min-time SEC]
+                         [--save baseline.json] [--compare baseline.json] [--threshold 0.1]
+
+Each result is keyed by ``<message type>/<alg>/<payload size>/<encode|decode>``
+(e.g., ``Sign1/ES256/1K/decode``). With ``--compare``, the results are compared
+with a baseline written by ``--save`` and the process exits with status 1 if a
+regression is found.
+"""
+
+import argparse
+import re
+import sys
+from typing import Dict
+
+from .runner import Result, compare, format_size, load, measure, parse_size, save
+from .scenarios import all_scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="64,1K,64K,1M,64M", help="payload sizes (default: 64,1K,64K,1M,64M)")
+    parser.add_argument("--filter", default="", help="a regular expression to select scenarios by name")
+    parser.add_argument("--signers", default="1,2,4", help="the numbers of signers of COSE_Sign (default: 1,2,4)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    parser.add_argument("--max-iters", type=int, default=10000, help="the maximum iterations per measurement")
+    parser.add_argument("--quick", action="store_true", help="a smoke run with 64 B and 1 KiB payloads")
+    parser.add_argument("--list", action="store_true", help="list the scenarios and exit")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the tolerance of the comparison (default: 0.1)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.min_time = "64,1K", 0.05
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    pattern = re.compile(args.filter)
+    scenarios = [s for s in all_scenarios([int(n) for n in args.signers.split(",")]) if pattern.search(s.name)]
+    if args.list:
+        for s in scenarios:
+            print(s.name)
+        return
+
+    results: Dict[str, Result] = {}
+    print(f"{'scenario':<48}{'size':>6}{'op':>8}{'ops/s':>12}{'p50 us':>12}{'p99 us':>12}{'alloc B':>12}")
+    for s in scenarios:
+        for size in sizes:
+            try:
+                encode, decode = s.setup(b"x" * size)
+            except (NotImplementedError, ValueError) as err:
+                print(f"{s.name:<48}{format_size(size):>6}    skipped: {err}")
+                break
+            for op, fn in [("encode", encode), ("decode", decode)]:
+                r = measure(fn, args.min_time, max_iters=args.max_iters)
+                results[f"{s.name}/{format_size(size)}/{op}"] = r
+                print(
+                    f"{s.name:<48}{format_size(size):>6}{op:>8}"
+                    f"{r.ops_per_sec:>12.1f}{r.p50_us:>12.1f}{r.p99_us:>12.1f}{r.alloc_bytes:>12}"
+                )
+
+    if args.save:
+        save(args.save, results)
+        print(f"\nSaved {len(results)} results to {args.save}")
+    if args.compare:
+        regressions = compare(results, load(args.compare), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for r in regressions:
+                print(f"  REGRESSION {r}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
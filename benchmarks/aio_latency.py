@@ -0,0 +1,89 @@
+"""
+Event-loop latency while CWTs are decoded inline with CWT.decode() or with AsyncCWT.
+
+Usage:
+
+    python -m benchmarks.aio_latency [--algs PS256,ES256] [--tokens N] [--concurrency N]
+
+A ticker task sleeps for 1 ms repeatedly and records how late it wakes up,
+which is the latency any other request on the same event loop would see.
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Tuple
+
+from cwt import CWT
+from cwt.aio import AsyncCWT
+
+from .keys import key_pair
+
+TICK = 0.001
+
+
+async def _ticker(lags: List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def _measure(
+    decode: Callable[[bytes], Awaitable[Any]], tokens: List[bytes], concurrency: int
+) -> Tuple[float, List[float]]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.ensure_future(_ticker(lags, stop))
+    queue = list(tokens)
+
+    async def worker():
+        while queue:
+            await decode(queue.pop())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return len(tokens) / elapsed, sorted(lags) or [0.0]
+
+
+def _pct(samples: List[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+
+def _run(ctx: CWT, alg: str, n_tokens: int, concurrency: int, workers: int):
+    priv, pub = key_pair(alg)
+    tokens = [ctx.encode({"iss": "coaps://as.example", "cti": str(i)}, priv) for i in range(n_tokens)]
+
+    async def inline(token: bytes) -> Any:
+        res = ctx.decode(token, pub)
+        # Yield to the event loop between tokens as a request handler would.
+        await asyncio.sleep(0)
+        return res
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        actx = AsyncCWT.new(ctx, executor=executor, max_concurrency=workers)
+        for mode, decode in [("inline", inline), ("aio", lambda t: actx.decode(t, pub))]:
+            rate, lags = asyncio.run(_measure(decode, tokens, concurrency))
+            print(f"{alg:<8}{mode:<10}{rate:>12.1f}{_pct(lags, 50):>12.2f}{_pct(lags, 99):>12.2f}{lags[-1] * 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--algs", default="PS256,ES256,EdDSA")
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="threads of the executor of AsyncCWT")
+    args = parser.parse_args()
+
+    ctx = CWT.new()
+    print(f"{'alg':<8}{'mode':<10}{'tokens/s':>12}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for alg in args.algs.split(","):
+        _run(ctx, alg, args.tokens, args.concurrency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Memory usage of a large set of public keys as EC2Key/OKPKey objects and as CompactPublicKey objects.
+
+Usage:
+
+    python -m benchmarks.compact_keys [--keys 1000000] [--full-keys 100000] [--distinct 1000]
+
+The key sets are built from ``--distinct`` generated key pairs with unique kids
+and copied coordinates. The full keys are measured with ``--full-keys`` keys
+and scaled to ``--keys`` since they need several GB for 1M keys. The
+verification latency with a cold and a warm cache of materialized keys is
+also shown.
+
+The memory is measured as the growth of the resident set size on Linux, and
+with tracemalloc (which does not see the memory allocated by OpenSSL) elsewhere.
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from cwt import COSE, CompactKeyCache, CompactPublicKey, COSEKey
+
+from .keys import key_pair
+
+
+def _params(n_keys: int, alg: str, crv: str, distinct: int) -> List[Dict[int, Any]]:
+    bases = [key_pair(alg, crv)[1].to_dict() for _ in range(distinct)]
+    res = []
+    for i in range(n_keys):
+        params = {k: bytes(bytearray(v)) if isinstance(v, bytes) else v for k, v in bases[i % distinct].items()}
+        params[2] = f"device-{i:08d}".encode()
+        res.append(params)
+    return res
+
+
+def _rss() -> int:
+    # The keys of pyca/cryptography are allocated by OpenSSL, which tracemalloc does not see.
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _measure(params: List[Dict[int, Any]], build: Callable[[Dict[int, Any]], Any]) -> float:
+    gc.collect()
+    if os.path.exists("/proc/self/statm"):
+        start = _rss()
+        keys = [build(p) for p in params]
+        used = _rss() - start
+    else:
+        tracemalloc.start()
+        keys = [build(p) for p in params]
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    del keys
+    return used / len(params)
+
+
+def _verify_latency_us(alg: str, cold: bool, n: int = 1000) -> float:
+    priv, pub = key_pair(alg, kid="device-0")
+    cache = CompactKeyCache()
+    key = CompactPublicKey.from_key(pub, cache)
+    ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+    encoded = ctx.encode_and_sign(b"x" * 64, priv)
+    elapsed = 0
+    for _ in range(n):
+        if cold:
+            cache.clear()
+        start = time.perf_counter_ns()
+        ctx.decode(encoded, [key])
+        elapsed += time.perf_counter_ns() - start
+    return elapsed / n / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--full-keys", type=int, default=100_000, help="the number of full keys actually built")
+    parser.add_argument("--distinct", type=int, default=1000, help="the number of generated key pairs")
+    args = parser.parse_args()
+
+    print(f"{'alg':<8}{'crv':<10}{'full B/key':>12}{'compact B/key':>15}{'full MB':>10}{'compact MB':>12}")
+    for alg, crv in [("ES256", "P-256"), ("EdDSA", "Ed25519"), ("PS256", "RSA")]:
+        distinct = args.distinct if alg != "PS256" else 1
+        full = _measure(_params(min(args.full_keys, args.keys), alg, crv, distinct), COSEKey.new)
+        compact = _measure(_params(args.keys, alg, crv, distinct), CompactPublicKey.new)
+        print(
+            f"{alg:<8}{crv:<10}{full:>12.0f}{compact:>15.0f}"
+            f"{full * args.keys / 2**20:>10.0f}{compact * args.keys / 2**20:>12.0f}"
+        )
+
+    print()
+    print(f"{'alg':<8}{'cache':<8}{'decode us':>10}")
+    for alg in ["ES256", "EdDSA", "PS256"]:
+        for cold in [True, False]:
+            latency = _verify_latency_us(alg, cold)
+            print(f"{alg:<8}{'cold' if cold else 'warm':<8}{latency:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cost of decoding CWTs in one pass compared with decoding each layer with cbor2.
+
+Usage:
+
+    python -m benchmarks.cwt_decode [--sizes 200,20K,1M] [--min-time SEC]
+
+``layers`` decodes the token in the way ``CWT.decode`` used to do: the token,
+the COSE message and the claims are decoded by separate ``cbor2.loads`` calls
+on copies of the data. ``decode`` is ``CWT.decode`` today, which splits a
+message of 64 KiB or more in one pass and verifies and decodes its payload as
+a slice of the token. The size is the one of the whole token, which is scaled
+by the ``7`` (cti) claim.
+"""
+
+import argparse
+
+from cbor2 import CBORTag, loads
+
+from cwt import CWT, COSEKey
+
+from .keys import key_pair
+from .runner import format_size, measure, parse_size
+
+
+def _layers(ctx, data, key):
+    cwt = loads(data)
+    if isinstance(cwt, CBORTag) and cwt.tag == CWT.CBOR_TAG:
+        cwt = cwt.value
+    payload = ctx._cose.decode(cwt, key)
+    return ctx._verify(loads(payload))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="200,20K,1M", help="the sizes of the tokens (default: 200,20K,1M)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    args = parser.parse_args()
+
+    ctx = CWT.new()
+    mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+    private_key, public_key = key_pair("EdDSA", "Ed25519")
+    print(f"{'scenario':<40}{'ops/s':>12}{'p50 us':>10}{'alloc B':>12}")
+    for size in [parse_size(s) for s in args.sizes.split(",")]:
+        claims = {1: "coaps://as.example", 2: "dajiaji", 7: b""}
+        overhead = len(ctx.encode_and_mac(claims, mac_key, tagged=True))
+        claims[7] = b"x" * max(size - overhead - 8, 0)
+        tokens = [
+            ("Sign1/Ed25519", ctx.encode_and_sign(claims, private_key, tagged=True), public_key),
+            ("MAC0/HS256", ctx.encode_and_mac(claims, mac_key, tagged=True), mac_key),
+        ]
+        for name, token, key in tokens:
+            cases = [
+                ("layers", lambda token=token, key=key: _layers(ctx, token, key)),
+                ("decode", lambda token=token, key=key: ctx.decode(token, key)),
+            ]
+            for method, fn in cases:
+                res = measure(fn, min_time=args.min_time)
+                label = f"{name}/{format_size(size)}/{method}"
+                print(f"{label:<40}{res.ops_per_sec:>12.0f}{res.p50_us:>10.2f}{res.alloc_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Cost of encoding CWTs in one pass compared with encoding trees of CBORTag objects.
+
+Usage:
+
+    python -m benchmarks.cwt_encode [--sizes 64,1K,64K] [--min-time SEC]
+
+``tree`` builds the token in the way ``CWT.encode_and_sign`` and
+``CWT.encode_and_mac`` used to do: the COSE message is returned as a
+``CBORTag`` object and encoded again (optionally wrapped by tag(61)).
+``encode_and_*`` is the same function today, and ``encode_into`` is
+``CWT.encode_into`` which writes the token into a ``bytearray`` reused for all
+the tokens. The size is the one of the
+``7`` (cti) claim which is added to small claims to scale the token.
+"""
+
+import argparse
+
+from cbor2 import CBORTag, dumps
+
+from cwt import CWT, COSEKey
+
+from .keys import key_pair
+from .runner import format_size, measure, parse_size
+
+
+def _tree(ctx, claims, key, usage):
+    b_claims = ctx._serialize(claims)
+    if usage == "sign":
+        res = ctx._cose.encode_and_sign(b_claims, key, {}, {}, out="cbor2/CBORTag")
+    else:
+        res = ctx._cose.encode_and_mac(b_claims, key, {}, {}, out="cbor2/CBORTag")
+    return dumps(CBORTag(61, res))
+
+
+def _encode(ctx, claims, key, usage):
+    if usage == "sign":
+        return ctx.encode_and_sign(claims, key, tagged=True)
+    return ctx.encode_and_mac(claims, key, tagged=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="64,1K,64K", help="the sizes of the cti claim (default: 64,1K,64K)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    args = parser.parse_args()
+
+    ctx = CWT.new()
+    mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+    keys = [("Sign1/Ed25519", "sign", key_pair("EdDSA", "Ed25519")[0]), ("MAC0/HS256", "mac", mac_key)]
+    buf = bytearray()
+    print(f"{'scenario':<40}{'ops/s':>12}{'p50 us':>10}{'alloc B':>12}")
+    for size in [parse_size(s) for s in args.sizes.split(",")]:
+        claims = {1: "coaps://as.example", 2: "dajiaji", 4: 9999999999, 5: 1000000000, 6: 1000000000, 7: b"x" * size}
+        for name, usage, key in keys:
+            cases = [
+                ("tree", lambda claims=claims, key=key, usage=usage: _tree(ctx, claims, key, usage)),
+                ("encode_and_*", lambda claims=claims, key=key, usage=usage: _encode(ctx, claims, key, usage)),
+                ("encode_into", lambda claims=claims, key=key: ctx.encode_into(buf, claims, key, tagged=True)),
+            ]
+            for method, fn in cases:
+                res = measure(fn, min_time=args.min_time)
+                label = f"{name}/{format_size(size)}/{method}"
+                print(f"{label:<40}{res.ops_per_sec:>12.0f}{res.p50_us:>10.2f}{res.alloc_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
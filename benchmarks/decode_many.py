@@ -0,0 +1,56 @@
+"""
+Throughput of CWT.decode_many() across the number of worker threads.
+
+Usage:
+
+    python -m benchmarks.decode_many [--tokens N] [--workers 1,2,4,8,16]
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+from cwt import CWT
+
+from .keys import key_pair
+
+
+def run(algs: List[str], n_tokens: int, workers: List[int], chunk_size: int) -> List[Tuple[str, int, float]]:
+    ctx = CWT.new()
+    results = []
+    for alg in algs:
+        priv, pub = key_pair(alg)
+        tokens = [ctx.encode({"iss": "coaps://as.example", "cti": str(i)}, priv) for i in range(n_tokens)]
+        for w in workers:
+            start = time.perf_counter()
+            res = ctx.decode_many(tokens, pub, workers=w, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            if any(isinstance(r, Exception) for r in res):
+                raise RuntimeError(f"Failed to decode tokens with {alg}.")
+            results.append((alg, w, n_tokens / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--algs", default="ES256,EdDSA,PS256")
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4,8,16")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    args = parser.parse_args()
+
+    results = run(
+        args.algs.split(","),
+        args.tokens,
+        [int(w) for w in args.workers.split(",")],
+        args.chunk_size,
+    )
+    print(f"{'alg':<8}{'workers':>8}{'tokens/s':>12}{'speedup':>9}")
+    base: Dict[str, float] = {}
+    for alg, w, ops in results:
+        base.setdefault(alg, ops)
+        print(f"{alg:<8}{w:>8}{ops:>12.0f}{ops / base[alg]:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
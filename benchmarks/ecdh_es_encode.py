@@ -0,0 +1,80 @@
+"""
+Encoding latency of COSE_Encrypt with ECDH-ES recipients with and without EphemeralKeyPool.
+
+Usage:
+
+    python -m benchmarks.ecdh_es_encode [--recipients N] [--burst N] [--bursts N] [--idle SEC]
+
+Messages are encoded in bursts separated by idle time, during which the pool
+is refilled by its background thread.
+"""
+
+import argparse
+import time
+from typing import List, Optional
+
+from cwt import COSE, COSEKey, EphemeralKeyPool, Recipient
+
+from .keys import key_pair
+from .runner import _percentile
+
+CASES = [
+    ("ECDH-ES+A128KW", "P-256"),
+    ("ECDH-ES+A256KW", "P-521"),
+    ("ECDH-ES+HKDF-256", "P-256"),
+    ("ECDH-ES+HKDF-256", "X25519"),
+]
+
+
+def run(
+    alg: str, crv: str, n_recipients: int, burst: int, bursts: int, idle: float, pool: Optional[EphemeralKeyPool]
+) -> List[int]:
+    ctx = COSE.new(alg_auto_inclusion=True)
+    # Direct key agreement allows only one recipient.
+    cek = COSEKey.from_symmetric_key(alg="A128GCM") if alg.endswith("KW") else None
+    recipients = []
+    for i in range(n_recipients if cek else 1):
+        _, pub = key_pair(alg, crv, kid=str(i))
+        recipients.append(
+            Recipient.new(
+                unprotected={"alg": alg},
+                recipient_key=pub,
+                context={"alg": "A128GCM"},
+                ephemeral_key_pool=pool,
+            )
+        )
+    samples: List[int] = []
+    for _ in range(bursts):
+        time.sleep(idle)
+        for _ in range(burst):
+            start = time.perf_counter_ns()
+            ctx.encode_and_encrypt(b"x" * 64, cek, recipients=recipients)
+            samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=4, help="the number of key wrap recipients")
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--idle", type=float, default=0.05, help="seconds between bursts")
+    parser.add_argument("--pool-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'alg':<18}{'crv':<8}{'pool':<6}{'p50 us':>10}{'p99 us':>10}")
+    for alg, crv in CASES:
+        for use_pool in [False, True]:
+            if not use_pool:
+                samples = run(alg, crv, args.recipients, args.burst, args.bursts, args.idle, None)
+            else:
+                with EphemeralKeyPool(crvs=[crv], size=args.pool_size, low_watermark=args.pool_size // 2) as pool:
+                    samples = run(alg, crv, args.recipients, args.burst, args.bursts, args.idle, pool)
+            p50 = _percentile(samples, 50)
+            p99 = _percentile(samples, 99)
+            print(f"{alg:<18}{crv:<8}{'yes' if use_pool else 'no':<6}{p50:>10.1f}{p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Decoding latency of HPKE Encrypt0 and Encrypt messages for every HPKE algorithm.
+
+Usage:
+
+    python -m benchmarks.hpke_decode [--size 64] [--min-time SEC]
+
+The payload is small by default so that the overhead around the KEM and AEAD
+operations (e.g., building the cipher suite and converting the keys) is visible.
+"""
+
+import argparse
+
+from cwt.const import COSE_ALGORITHMS_HPKE
+
+from .runner import format_size, measure, parse_size
+from .scenarios import _encrypt, _encrypt0_hpke
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="64", help="payload size (default: 64)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    payload = b"x" * size
+    print(f"{'scenario':<60}{'ops/s':>10}{'p50 us':>10}{'p99 us':>10}")
+    for alg in COSE_ALGORITHMS_HPKE:
+        for scenario in [_encrypt0_hpke(alg), _encrypt(alg)]:
+            _, decode = scenario.setup(payload)
+            res = measure(decode, min_time=args.min_time)
+            name = f"{scenario.name}/{format_size(size)}/decode"
+            print(f"{name:<60}{res.ops_per_sec:>10.0f}{res.p50_us:>10.1f}{res.p99_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Import time of ``import cwt`` measured with ``python -X importtime``.
+
+Usage:
+
+    python -m benchmarks.import_time [--runs N] [--budget-file PATH] [--update]
+
+The median cumulative import time of the ``cwt`` package is compared with the
+budget tracked in ``benchmarks/import_time_budget.json``. It exits with status 1
+if the budget is exceeded or one of the lazily-loaded dependencies is imported.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+# The modules which should be loaded only when x5c validation, ca_certs, HPKE, a
+# KeyRegistry, a ReplayGuard, a thread pool or a detached payload stream is used.
+LAZY_MODULES = [
+    "asn1crypto",
+    "certvalidator",
+    "oscrypto",
+    "pyhpke",
+    "cryptography.x509",
+    "concurrent.futures",
+    "sqlite3",
+    "tempfile",
+    "cwt.aio",
+    "cwt.key_registry",
+    "cwt.parallel",
+    "cwt.replay_guard",
+]
+
+DEFAULT_BUDGET_FILE = os.path.join(os.path.dirname(__file__), "import_time_budget.json")
+
+_SCRIPT = "import sys, cwt; print(','.join(m for m in sys.argv[1:] if m in sys.modules))"
+
+
+def measure() -> Tuple[int, List[str]]:
+    """
+    Imports cwt in a fresh interpreter and returns the cumulative import time
+    in microseconds and the lazy modules which have been loaded.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT, *LAZY_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    us = -1
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        cols = line.split("|")
+        if len(cols) == 3 and cols[2].strip() == "cwt":
+            us = int(cols[1])
+    if us < 0:
+        raise RuntimeError("Failed to parse the output of -X importtime.")
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return us, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-file", default=DEFAULT_BUDGET_FILE)
+    parser.add_argument("--update", action="store_true", help="write the measured median as the new budget")
+    args = parser.parse_args()
+
+    samples = []
+    loaded: List[str] = []
+    for _ in range(args.runs):
+        us, loaded = measure()
+        samples.append(us)
+    median = statistics.median(samples)
+    print(f"import cwt: median {median / 1000:.1f} ms, min {min(samples) / 1000:.1f} ms ({args.runs} runs)")
+
+    if args.update:
+        with open(args.budget_file, "w") as f:
+            json.dump({"import_cwt_ms": round(median / 1000 * 1.5, 1)}, f, indent=2)
+            f.write("\n")
+        print(f"budget updated: {args.budget_file}")
+        return
+
+    failed = False
+    if loaded:
+        print(f"NG: lazily-loaded modules are imported: {', '.join(loaded)}")
+        failed = True
+    with open(args.budget_file) as f:
+        budget = json.load(f)["import_cwt_ms"]
+    if median / 1000 > budget:
+        print(f"NG: exceeds the budget of {budget} ms")
+        failed = True
+    else:
+        print(f"OK: within the budget of {budget} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
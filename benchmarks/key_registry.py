@@ -0,0 +1,90 @@
+"""
+Key lookup cost of CWT.decode with a KeyRegistry (SQLite) compared with an in-memory KeyRing.
+
+Usage:
+
+    python -m benchmarks.key_registry [--keys 100000] [--tokens 2000] [--distinct 16] [--db PATH]
+
+The registry is filled with ``--keys`` ES256 public keys with unique kids,
+built from ``--distinct`` generated key pairs. Tokens for random kids are then
+decoded with a cold cache (every lookup reads the database) and a warm cache.
+The time of ``find()`` alone is shown as well since the signature verification
+dominates the decoding.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+
+from cwt import CWT, COSEKey, KeyRegistry, KeyRing
+
+from .keys import key_pair
+from .runner import _percentile
+
+
+def _samples(fn: Callable[[bytes], object], kids: List[bytes]) -> List[int]:
+    res = []
+    for kid in kids:
+        start = time.perf_counter_ns()
+        fn(kid)
+        res.append(time.perf_counter_ns() - start)
+    res.sort()
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=2000, help="the number of decoded tokens")
+    parser.add_argument("--distinct", type=int, default=16, help="the number of generated key pairs")
+    parser.add_argument("--db", default="", help="the database file (default: a temporary file)")
+    parser.add_argument("--mmap-size", type=int, default=256 * 1024 * 1024)
+    args = parser.parse_args()
+
+    pairs = [key_pair("ES256", kid=str(i)) for i in range(args.distinct)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "keys.db")
+        start = time.perf_counter()
+        with KeyRegistry(path) as registry:
+            chunk = 10000
+            for i in range(0, args.keys, chunk):
+                registry.update(
+                    add=[
+                        COSEKey.new({**pairs[j % args.distinct][1].to_dict(), 2: f"device-{j:08d}".encode()})
+                        for j in range(i, min(i + chunk, args.keys))
+                    ]
+                )
+        print(f"import: {args.keys} keys in {time.perf_counter() - start:.1f} s, {os.path.getsize(path) / 2**20:.1f} MB")
+
+        ctx = CWT.new()
+        kids = [random.randrange(args.keys) for _ in range(args.tokens)]
+        tokens = {}
+        for j in kids:
+            priv = COSEKey.new({**pairs[j % args.distinct][0].to_dict(), 2: f"device-{j:08d}".encode()})
+            tokens[priv.kid] = ctx.encode({"iss": "coaps://as.example"}, priv)
+        b_kids = [f"device-{j:08d}".encode() for j in kids]
+
+        ring = KeyRing(
+            [COSEKey.new({**pairs[j % args.distinct][1].to_dict(), 2: f"device-{j:08d}".encode()}) for j in set(kids)]
+        )
+        print(f"{'keys':<24}{'find p50 us':>12}{'find p99 us':>12}{'decode p50 us':>15}")
+        cases = [
+            ("KeyRing", ring, 1),
+            ("KeyRegistry cold", KeyRegistry(path, read_only=True, mmap_size=args.mmap_size, cache_size=1), 1),
+            ("KeyRegistry warm", KeyRegistry(path, read_only=True, mmap_size=args.mmap_size, cache_size=args.tokens), 2),
+        ]
+        for name, keys, passes in cases:
+            for _ in range(passes):
+                # The first pass of the warm case fills the cache.
+                find = _samples(lambda kid, keys=keys: keys.find(kid, 2, -7), b_kids)
+            decode = _samples(lambda kid, keys=keys: ctx.decode(tokens[kid], keys), b_kids)
+            print(f"{name:<24}{_percentile(find, 50):>12.1f}{_percentile(find, 99):>12.1f}{_percentile(decode, 50):>15.1f}")
+            if isinstance(keys, KeyRegistry):
+                keys.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Key generation helpers for the benchmarks.
+"""
+
+from typing import Any, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import (
+    ec,
+    ed448,
+    ed25519,
+    rsa,
+    x448,
+    x25519,
+)
+
+from cwt import COSEKey
+
+_CURVES = {
+    "P-256": ec.SECP256R1(),
+    "P-384": ec.SECP384R1(),
+    "P-521": ec.SECP521R1(),
+    "secp256k1": ec.SECP256K1(),
+}
+
+_SIG_CURVES = {
+    "ES256": "P-256",
+    "ES384": "P-384",
+    "ES512": "P-521",
+    "ES256K": "secp256k1",
+}
+
+# The curve (or key type) of the recipient key of each HPKE algorithm.
+HPKE_CURVES = {
+    "HPKE-Base-P256-SHA256-AES128GCM": "P-256",
+    "HPKE-Base-P256-SHA256-ChaCha20Poly1305": "P-256",
+    "HPKE-Base-P384-SHA384-AES256GCM": "P-384",
+    "HPKE-Base-P384-SHA384-ChaCha20Poly1305": "P-384",
+    "HPKE-Base-P521-SHA512-AES256GCM": "P-521",
+    "HPKE-Base-P521-SHA512-ChaCha20Poly1305": "P-521",
+    "HPKE-Base-X25519-SHA256-AES128GCM": "X25519",
+    "HPKE-Base-X25519-SHA256-ChaCha20Poly1305": "X25519",
+    "HPKE-Base-X448-SHA512-AES256GCM": "X448",
+    "HPKE-Base-X448-SHA512-ChaCha20Poly1305": "X448",
+}
+
+_RSA_KEY = None
+
+
+def _to_pem(k: Any) -> Tuple[bytes, bytes]:
+    priv = k.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    pub = k.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return priv, pub
+
+
+def generate_private_key(crv: str) -> Any:
+    """
+    Generates a pyca/cryptography private key on the curve (or of the key type).
+    """
+    global _RSA_KEY
+    if crv in _CURVES:
+        return ec.generate_private_key(_CURVES[crv])
+    if crv == "Ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    if crv == "Ed448":
+        return ed448.Ed448PrivateKey.generate()
+    if crv == "X25519":
+        return x25519.X25519PrivateKey.generate()
+    if crv == "X448":
+        return x448.X448PrivateKey.generate()
+    if crv == "RSA":
+        # RSA key generation is slow; one 2048-bit key is shared by the RSA algorithms.
+        if _RSA_KEY is None:
+            _RSA_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return _RSA_KEY
+    raise ValueError(f"Unsupported crv: {crv}.")
+
+
+def key_pair(alg: str, crv: str = "", kid: str = "01") -> Tuple[Any, Any]:
+    """
+    Generates a pair of COSE private and public keys for the alg.
+
+    For signature algorithms, ``crv`` is derived from the alg (``Ed25519`` for EdDSA by
+    default). For key agreement algorithms, it should be specified.
+    """
+    if not crv:
+        if alg in _SIG_CURVES:
+            crv = _SIG_CURVES[alg]
+        elif alg == "EdDSA":
+            crv = "Ed25519"
+        elif alg in HPKE_CURVES:
+            crv = HPKE_CURVES[alg]
+        elif alg[0:2] in ["RS", "PS"]:
+            crv = "RSA"
+        else:
+            raise ValueError(f"crv should be specified for {alg}.")
+    priv, pub = _to_pem(generate_private_key(crv))
+    # HPKE recipient keys are used without alg.
+    key_alg = "" if alg in HPKE_CURVES else alg
+    return (
+        COSEKey.from_pem(priv, alg=key_alg, kid=kid),
+        COSEKey.from_pem(pub, alg=key_alg, kid=kid),
+    )
@@ -0,0 +1,72 @@
+"""
+Cost of decoding COSE messages without kid with a list of keys compared with an adaptive KeyRing.
+
+Usage:
+
+    python -m benchmarks.kidless_decode [--keys 20] [--tokens 2000] [--hot 2]
+
+``--keys`` keys of a partner (half HS256 keys and half ES256 public keys
+which have no ``alg``) are tried for Mac0 and Sign1 messages which carry no
+``kid``. Most of the messages (90%) are created with ``--hot`` keys and the
+rest with any key, which is the case where a partner uses a few keys at a
+time. ``attempts`` is the average number of keys tried per decode.
+"""
+
+import argparse
+import random
+import time
+
+from cwt import COSE, COSEKey, KeyRing
+
+from .keys import key_pair
+from .runner import _percentile
+
+
+def _without(key, labels):
+    return COSEKey.new({k: v for k, v in key.to_dict().items() if k not in labels})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=20, help="the number of keys of the partner")
+    parser.add_argument("--tokens", type=int, default=2000, help="the number of decoded tokens")
+    parser.add_argument("--hot", type=int, default=2, help="the number of keys used for 90%% of the tokens")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    ctx = COSE.new(alg_auto_inclusion=True)
+    mac_keys = [COSEKey.from_symmetric_key(alg="HS256") for _ in range(args.keys // 2)]
+    pairs = []
+    for _ in range(args.keys - len(mac_keys)):
+        priv, pub = key_pair("ES256")
+        pairs.append((_without(priv, [2]), _without(pub, [2, 3])))
+    keys = [*mac_keys, *[pub for _, pub in pairs]]
+    rnd.shuffle(keys)
+
+    messages = []
+    for usage, signing_keys in [("mac", mac_keys), ("sign", [priv for priv, _ in pairs])]:
+        hot = signing_keys[-args.hot :]
+        for _ in range(args.tokens // 2):
+            k = rnd.choice(hot) if rnd.random() < 0.9 else rnd.choice(signing_keys)
+            if usage == "mac":
+                messages.append(ctx.encode_and_mac(b"Hello world!", k))
+            else:
+                messages.append(ctx.encode_and_sign(b"Hello world!", k))
+    rnd.shuffle(messages)
+
+    print(f"{'keys':<24}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}{'attempts':>10}")
+    cases = [("list", keys), ("KeyRing", KeyRing(keys)), ("KeyRing(adaptive)", KeyRing(keys, adaptive=True))]
+    for name, ks in cases:
+        samples = []
+        for m in messages:
+            start = time.perf_counter_ns()
+            ctx.decode(m, ks)
+            samples.append(time.perf_counter_ns() - start)
+        samples.sort()
+        attempts = f"{ks.attempts / ks.decodes:.2f}" if isinstance(ks, KeyRing) and ks.adaptive else "-"
+        mean = sum(samples) / len(samples) / 1000
+        print(f"{name:<24}{_percentile(samples, 50):>10.1f}{_percentile(samples, 99):>10.1f}{mean:>10.1f}{attempts:>10}")
+
+
+if __name__ == "__main__":
+    main()
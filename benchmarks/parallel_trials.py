@@ -0,0 +1,43 @@
+"""
+Worst-case decode latency with several candidate keys tried one by one or in parallel.
+
+Usage:
+
+    python -m benchmarks.parallel_trials [--candidates 8] [--workers 1,2,4] [--min-time SEC]
+
+The candidate keys share a ``kid`` as in a key rotation window, and the key
+which succeeds is the last one, so that every other key fails first. Each row
+decodes the message with ``COSE.new(trial_workers=N)``. Since
+``pyca/cryptography`` releases the GIL during signature verification, the
+latency with ``N`` workers shrinks only with as many CPU cores.
+"""
+
+import argparse
+
+from cwt import COSE
+
+from .keys import key_pair
+from .runner import measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=8, help="the number of candidate keys")
+    parser.add_argument("--workers", default="1,2,4", help="the numbers of trial workers (default: 1,2,4)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<40}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}")
+    for alg, crv in [("PS256", ""), ("ES256", ""), ("EdDSA", "Ed25519")]:
+        pairs = [key_pair(alg, crv, kid="01") for _ in range(args.candidates)]
+        public_keys = [pub for _, pub in pairs]
+        encoded = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True).encode_and_sign(b"x" * 1024, pairs[-1][0])
+        for workers in [int(w) for w in args.workers.split(",")]:
+            ctx = COSE.new(trial_workers=workers)
+            res = measure(lambda ctx=ctx, e=encoded, ks=public_keys: ctx.decode(e, ks), min_time=args.min_time)
+            label = f"{alg}/{args.candidates} keys/workers={workers}"
+            print(f"{label:<40}{res.ops_per_sec:>12.0f}{res.p50_us:>10.2f}{res.p99_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cost of reading the headers of a COSE message with COSE.peek compared with a full CBOR decoding.
+
+Usage:
+
+    python -m benchmarks.peek [--size 1M] [--min-time SEC]
+
+``cbor2.loads`` is what routing by ``kid`` or ``alg`` costs without
+COSE.peek: the whole message, including the payload, is decoded and copied.
+``COSEMessage.loads`` parses the recipients and the signers as well.
+"""
+
+import argparse
+
+import cbor2
+
+from cwt import COSE, COSEKey, COSEMessage, Recipient, Signer
+
+from .keys import key_pair
+from .runner import format_size, measure, parse_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="1M", help="payload size (default: 1M)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum duration in seconds per measurement")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    payload = b"x" * size
+    ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+    priv, _ = key_pair("ES256")
+    enc_key = COSEKey.generate_symmetric_key(alg="A128GCM", kid="02")
+    messages = [
+        ("Sign1", ctx.encode_and_sign(payload, priv)),
+        ("Encrypt0", ctx.encode_and_encrypt(payload, enc_key)),
+        (
+            "Encrypt",
+            ctx.encode_and_encrypt(
+                payload,
+                COSEKey.generate_symmetric_key(alg="A128GCM"),
+                recipients=[Recipient.new(unprotected={"alg": "direct", "kid": "03"})],
+            ),
+        ),
+        (
+            "Sign",
+            ctx.encode_and_sign(
+                payload,
+                signers=[Signer.new(cose_key=priv, protected={"alg": "ES256"}, unprotected={"kid": "01"})],
+            ),
+        ),
+    ]
+    print(f"{'scenario':<40}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'alloc':>10}")
+    for name, encoded in messages:
+        cases = [
+            ("COSE.peek", lambda encoded=encoded: ctx.peek(encoded, nested=True)),
+            ("cbor2.loads", lambda encoded=encoded: cbor2.loads(encoded)),
+            ("COSEMessage.loads", lambda encoded=encoded: COSEMessage.loads(encoded)),
+        ]
+        for method, fn in cases:
+            res = measure(fn, min_time=args.min_time)
+            label = f"{name}/{format_size(size)}/{method}"
+            print(f"{label:<40}{res.ops_per_sec:>12.0f}{res.p50_us:>10.1f}{res.p99_us:>10.1f}{res.alloc_bytes:>10}")
+
+
+if __name__ == "__main__":
+    main()
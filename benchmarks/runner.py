@@ -0,0 +1,138 @@
+"""
+Measurement, JSON baselines and regression detection for the benchmarks.
+"""
+
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import cwt
+
+
+class Result(NamedTuple):
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    alloc_bytes: int
+    iterations: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ops_per_sec": round(self.ops_per_sec, 2),
+            "p50_us": round(self.p50_us, 2),
+            "p99_us": round(self.p99_us, 2),
+            "alloc_bytes": self.alloc_bytes,
+            "iterations": self.iterations,
+        }
+
+
+def parse_size(v: str) -> int:
+    """
+    Parses a payload size such as ``64``, ``1K`` or ``64M``.
+    """
+    units = {"K": 1024, "M": 1024 * 1024}
+    v = v.strip().upper().rstrip("B")
+    if v and v[-1] in units:
+        return int(v[:-1]) * units[v[-1]]
+    return int(v)
+
+
+def format_size(n: int) -> str:
+    for unit, size in [("M", 1024 * 1024), ("K", 1024)]:
+        if n >= size and n % size == 0:
+            return f"{n // size}{unit}"
+    return str(n)
+
+
+def _percentile(samples: List[int], p: float) -> float:
+    i = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[i] / 1000
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.2, min_iters: int = 3, max_iters: int = 10000) -> Result:
+    """
+    Calls ``fn`` repeatedly for at least ``min_time`` seconds and ``min_iters``
+    times (at most ``max_iters`` times), then calls it once more under
+    tracemalloc to measure the peak of the memory allocated by a call.
+    """
+    fn()  # warm-up
+    samples: List[int] = []
+    total = 0
+    while len(samples) < max_iters and (total < min_time * 1e9 or len(samples) < min_iters):
+        start = time.perf_counter_ns()
+        fn()
+        elapsed = time.perf_counter_ns() - start
+        samples.append(elapsed)
+        total += elapsed
+    samples.sort()
+
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        ops_per_sec=len(samples) / (total / 1e9),
+        p50_us=_percentile(samples, 50),
+        p99_us=_percentile(samples, 99),
+        alloc_bytes=peak - base,
+        iterations=len(samples),
+    )
+
+
+def save(path: str, results: Dict[str, Result]):
+    """
+    Writes the results with the environment information as a JSON baseline.
+    """
+    data = {
+        "meta": {
+            "cwt": cwt.__version__,
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": {k: v.to_dict() for k, v in results.items()},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return
+
+
+def load(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the results of a JSON baseline.
+    """
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    Returns the descriptions of the regressions: a throughput which is lower,
+    or an allocation which is larger, than the baseline by more than ``threshold``
+    (e.g., ``0.1`` for 10%). The entries which are not in the baseline are ignored.
+    """
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        if r.ops_per_sec < b["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: ops/s {b['ops_per_sec']:.1f} -> {r.ops_per_sec:.1f} ({r.ops_per_sec / b['ops_per_sec'] - 1:+.1%})"
+            )
+        # Small allocations fluctuate with interpreter internals, so a slack of 1 KiB is allowed.
+        if r.alloc_bytes > b["alloc_bytes"] * (1 + threshold) + 1024:
+            regressions.append(f"{name}: alloc {b['alloc_bytes']} B -> {r.alloc_bytes} B")
+    return regressions
@@ -0,0 +1,232 @@
+"""
+Benchmark scenarios: one per message type and algorithm.
+
+Each scenario is set up with a payload and returns a pair of callables: one
+encodes the payload and the other decodes a message encoded in advance.
+"""
+
+import functools
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+from cwt import COSE, COSEKey, COSEMessage, Recipient, Signer
+from cwt.const import (
+    COSE_ALGORITHMS_CEK_AEAD,
+    COSE_ALGORITHMS_CEK_NON_AEAD,
+    COSE_ALGORITHMS_HPKE,
+)
+
+from .keys import key_pair
+
+Operation = Callable[[], Any]
+
+
+class Scenario(NamedTuple):
+    name: str
+    setup: Callable[[bytes], Tuple[Operation, Operation]]
+
+
+# Aliases (e.g., "HS256" for "HMAC 256/256") are measured once. The algorithms
+# which are not implemented (e.g., AES-MAC) are reported as skipped.
+MAC_ALGS = [
+    "HMAC 256/64",
+    "HMAC 256/256",
+    "HMAC 384/384",
+    "HMAC 512/512",
+    "AES-MAC128/64",
+    "AES-MAC256/64",
+    "AES-MAC128/128",
+    "AES-MAC256/128",
+]
+SIGNATURE_ALGS = ["EdDSA", "Ed448", "ES256", "ES384", "ES512", "ES256K", "PS256", "PS384", "PS512", "RS256", "RS384", "RS512"]
+KEY_WRAP_ALGS = ["A128KW", "A192KW", "A256KW"]
+ECDH_DIRECT_ALGS = ["ECDH-ES+HKDF-256", "ECDH-ES+HKDF-512", "ECDH-SS+HKDF-256", "ECDH-SS+HKDF-512"]
+ECDH_KEY_WRAP_ALGS = [
+    "ECDH-ES+A128KW",
+    "ECDH-ES+A192KW",
+    "ECDH-ES+A256KW",
+    "ECDH-SS+A128KW",
+    "ECDH-SS+A192KW",
+    "ECDH-SS+A256KW",
+]
+COUNTERSIGNATURE_ALGS = ["EdDSA", "ES256"]
+
+
+@functools.lru_cache(maxsize=None)
+def _key_pair(alg: str, crv: str = "") -> Tuple[Any, Any]:
+    if alg == "Ed448":
+        return key_pair("EdDSA", "Ed448")
+    return key_pair(alg, crv)
+
+
+def _check(expected: bytes, decode: Operation) -> Operation:
+    if decode() != expected:
+        raise RuntimeError("The decoded payload does not match.")
+    return decode
+
+
+def _encrypt0(alg: str) -> Scenario:
+    non_aead = alg in COSE_ALGORITHMS_CEK_NON_AEAD
+
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        key = COSEKey.from_symmetric_key(alg=alg, kid="01")
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        encoded = ctx.encode_and_encrypt(payload, key, enable_non_aead=non_aead)
+        return (
+            lambda: ctx.encode_and_encrypt(payload, key, enable_non_aead=non_aead),
+            _check(payload, lambda: ctx.decode(encoded, key, enable_non_aead=non_aead)),
+        )
+
+    return Scenario(f"Encrypt0/{alg}", setup)
+
+
+def _encrypt0_hpke(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        rsk, rpk = _key_pair(alg)
+        ctx = COSE.new()
+        p, u = {1: COSE_ALGORITHMS_HPKE[alg]}, {4: b"01"}
+        encoded = ctx.encode_and_encrypt(payload, rpk, protected=p, unprotected=u)
+        return (
+            lambda: ctx.encode_and_encrypt(payload, rpk, protected=p, unprotected=u),
+            _check(payload, lambda: ctx.decode(encoded, rsk)),
+        )
+
+    return Scenario(f"Encrypt0/{alg}", setup)
+
+
+def _encrypt(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        ctx = COSE.new(alg_auto_inclusion=True)
+        context = {"alg": "A128GCM"}
+        cek = None
+        if alg == "direct":
+            cek = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+            decode_key = cek
+            rec = Recipient.new(unprotected={"alg": alg, "kid": "01"})
+        elif alg.startswith("direct+HKDF"):
+            cek = decode_key = COSEKey.from_symmetric_key(kid="01")
+            rec = Recipient.new(unprotected={"alg": alg, "salt": "aabbccddeeffgghh"}, context=context)
+        elif alg in KEY_WRAP_ALGS:
+            cek = COSEKey.from_symmetric_key(alg="A128GCM")
+            decode_key = COSEKey.from_symmetric_key(alg=alg, kid="01")
+            rec = Recipient.new(unprotected={"alg": alg, "kid": "01"}, sender_key=decode_key)
+        elif alg in COSE_ALGORITHMS_HPKE:
+            cek = COSEKey.from_symmetric_key(alg="A128GCM")
+            decode_key, rpk = _key_pair(alg)
+            rec = Recipient.new(protected={"alg": alg}, unprotected={"kid": "01"}, recipient_key=rpk)
+        else:  # ECDH
+            decode_key, rpk = _key_pair(alg, "P-256")
+            sender_key = _key_pair(alg, "P-256")[0] if "-SS+" in alg else None
+            if alg in ECDH_KEY_WRAP_ALGS:
+                cek = COSEKey.from_symmetric_key(alg="A128GCM")
+
+            def recipient():
+                # ECDH-ES recipients generate an ephemeral key on each encoding.
+                return Recipient.new(unprotected={"alg": alg}, sender_key=sender_key, recipient_key=rpk, context=context)
+
+            encoded = ctx.encode_and_encrypt(payload, cek, recipients=[recipient()])
+            return (
+                lambda: ctx.encode_and_encrypt(payload, cek, recipients=[recipient()]),
+                _check(payload, lambda: ctx.decode(encoded, decode_key, context=context)),
+            )
+
+        encoded = ctx.encode_and_encrypt(payload, cek, recipients=[rec])
+        return (
+            lambda: ctx.encode_and_encrypt(payload, cek, recipients=[rec]),
+            _check(payload, lambda: ctx.decode(encoded, decode_key, context=context)),
+        )
+
+    return Scenario(f"Encrypt/{alg}", setup)
+
+
+def _mac0(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        key = COSEKey.from_symmetric_key(alg=alg, kid="01")
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        encoded = ctx.encode_and_mac(payload, key)
+        return (
+            lambda: ctx.encode_and_mac(payload, key),
+            _check(payload, lambda: ctx.decode(encoded, key)),
+        )
+
+    return Scenario(f"MAC0/{alg}", setup)
+
+
+def _mac(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        ctx = COSE.new(alg_auto_inclusion=True)
+        if alg == "direct":
+            key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+            rec = Recipient.new(unprotected={"alg": alg, "kid": "01"})
+            context = None
+        else:
+            key = COSEKey.from_symmetric_key(kid="01")
+            rec = Recipient.new(unprotected={"alg": alg, "salt": "aabbccddeeffgghh"}, context={"alg": "HS256"})
+            context = {"alg": "HS256"}
+        encoded = ctx.encode_and_mac(payload, key, recipients=[rec])
+        return (
+            lambda: ctx.encode_and_mac(payload, key, recipients=[rec]),
+            _check(payload, lambda: ctx.decode(encoded, key, context=context)),
+        )
+
+    return Scenario(f"MAC/{alg}", setup)
+
+
+def _sign1(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        priv, pub = _key_pair(alg)
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        encoded = ctx.encode_and_sign(payload, priv)
+        return (
+            lambda: ctx.encode_and_sign(payload, priv),
+            _check(payload, lambda: ctx.decode(encoded, pub)),
+        )
+
+    return Scenario(f"Sign1/{alg}", setup)
+
+
+def _sign(alg: str, n: int) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        priv, pub = _key_pair(alg)
+        ctx = COSE.new()
+        signers = [Signer.new(cose_key=priv, protected={"alg": alg}, unprotected={"kid": "01"}) for _ in range(n)]
+        encoded = ctx.encode_and_sign(payload, signers=signers)
+        return (
+            lambda: ctx.encode_and_sign(payload, signers=signers),
+            _check(payload, lambda: ctx.decode(encoded, pub)),
+        )
+
+    return Scenario(f"Sign/{alg}x{n}", setup)
+
+
+def _countersign(alg: str) -> Scenario:
+    def setup(payload: bytes) -> Tuple[Operation, Operation]:
+        priv, pub = _key_pair("ES256")
+        c_priv, c_pub = _key_pair(alg)
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        encoded = ctx.encode_and_sign(payload, priv)
+        notary = Signer.new(cose_key=c_priv, protected={"alg": alg}, unprotected={"kid": "01"})
+        countersigned = COSEMessage.loads(encoded).countersign(notary).dumps()
+        return (
+            lambda: COSEMessage.loads(encoded).countersign(notary).dumps(),
+            lambda: COSEMessage.loads(countersigned).counterverify(c_pub),
+        )
+
+    return Scenario(f"CounterSignature/{alg}", setup)
+
+
+def all_scenarios(signers: List[int] = [1, 2, 4]) -> List[Scenario]:
+    """
+    Returns the scenarios covering all of the algorithms in ``cwt.const`` and all of
+    the message types.
+    """
+    res: List[Scenario] = []
+    res += [_encrypt0(alg) for alg in [*COSE_ALGORITHMS_CEK_AEAD, *COSE_ALGORITHMS_CEK_NON_AEAD]]
+    res += [_encrypt0_hpke(alg) for alg in COSE_ALGORITHMS_HPKE]
+    res += [_encrypt(alg) for alg in ["direct", "direct+HKDF-SHA-256", "direct+HKDF-SHA-512", *KEY_WRAP_ALGS]]
+    res += [_encrypt(alg) for alg in [*ECDH_DIRECT_ALGS, *ECDH_KEY_WRAP_ALGS, *COSE_ALGORITHMS_HPKE]]
+    res += [_mac0(alg) for alg in MAC_ALGS]
+    res += [_mac(alg) for alg in ["direct", "direct+HKDF-SHA-256", "direct+HKDF-SHA-512"]]
+    res += [_sign1(alg) for alg in SIGNATURE_ALGS]
+    res += [_sign("ES256", n) for n in signers]
+    res += [_countersign(alg) for alg in COUNTERSIGNATURE_ALGS]
+    return res
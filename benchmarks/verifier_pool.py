@@ -0,0 +1,54 @@
+"""
+Throughput of cwt.parallel.VerifierPool across the number of worker processes.
+
+Usage:
+
+    python -m benchmarks.verifier_pool [--tokens N] [--processes 1,2,4,8]
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+from cwt import CWT
+from cwt.parallel import VerifierPool
+
+from .keys import key_pair
+
+
+def run(algs: List[str], n_tokens: int, processes: List[int]) -> List[Tuple[str, int, float]]:
+    ctx = CWT.new()
+    results = []
+    for alg in algs:
+        priv, pub = key_pair(alg)
+        tokens = [ctx.encode({"iss": "coaps://as.example", "cti": str(i)}, priv) for i in range(n_tokens)]
+        for p in processes:
+            with VerifierPool([pub], processes=p) as pool:
+                # Warms up the workers.
+                pool.decode(tokens[:p])
+                start = time.perf_counter()
+                res = pool.decode(tokens)
+                elapsed = time.perf_counter() - start
+            if any(isinstance(r, Exception) for r in res):
+                raise RuntimeError(f"Failed to decode tokens with {alg}.")
+            results.append((alg, p, n_tokens / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--algs", default="ES256,EdDSA,PS256")
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--processes", default="1,2,4,8")
+    args = parser.parse_args()
+
+    results = run(args.algs.split(","), args.tokens, [int(p) for p in args.processes.split(",")])
+    print(f"{'alg':<8}{'processes':>10}{'tokens/s':>12}{'speedup':>9}")
+    base: Dict[str, float] = {}
+    for alg, p, ops in results:
+        base.setdefault(alg, ops)
+        print(f"{alg:<8}{p:>10}{ops:>12.0f}{ops / base[alg]:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
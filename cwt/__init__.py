@@ -1,7 +1,14 @@
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+from .cert_validator import CertValidator
 from .claims import Claims
+from .clock import CoarseClock
+from .compact_key import CompactKeyCache, CompactPublicKey
 from .cose import COSE
 from .cose_key import COSEKey
 from .cose_message import COSEMessage
+from .cose_peek import PeekedHeaders
 from .cwt import (
     CWT,
     decode,
@@ -11,6 +18,7 @@ from .cwt import (
     encode_and_sign,
     set_private_claim_names,
 )
+from .encoder import COSEEncoder, CWTEncoder
 from .encrypted_cose_key import EncryptedCOSEKey
 from .enums import (
     COSEAlgs,
@@ -22,10 +30,33 @@ from .enums import (
     COSETypes,
     CWTClaims,
 )
+from .ephemeral_key_pool import EphemeralKeyPool
 from .exceptions import CWTError, DecodeError, EncodeError, VerifyError
 from .helpers.hcert import load_pem_hcert_dsc
+from .key_ring import KeyRing
 from .recipient import Recipient
 from .signer import Signer
+from .token_cache import TokenCache
+from .tracer import Histogram, HistogramTracer, Span, Tracer
+from .trust_store import TrustStore
+
+if TYPE_CHECKING:
+    from .key_registry import KeyRegistry
+    from .replay_guard import (
+        BloomReplayGuard,
+        MemoryReplayGuard,
+        ReplayGuard,
+        SQLiteReplayGuard,
+    )
+
+# The attributes whose modules are imported on first access to keep ``import cwt`` fast.
+_LAZY_ATTRS = {
+    "KeyRegistry": "key_registry",
+    "ReplayGuard": "replay_guard",
+    "MemoryReplayGuard": "replay_guard",
+    "BloomReplayGuard": "replay_guard",
+    "SQLiteReplayGuard": "replay_guard",
+}
 
 __version__ = "2.8.0"
 __title__ = "cwt"
@@ -44,6 +75,7 @@ __all__ = [
     "encode_and_encrypt",
     "decode",
     "set_private_claim_names",
+    "CertValidator",
     "COSE",
     "COSEAlgs",
     "COSEHeaders",
@@ -53,18 +85,49 @@ __all__ = [
     "COSEKeyTypes",
     "COSETypes",
     "COSEKey",
+    "CompactKeyCache",
+    "CompactPublicKey",
     "COSEMessage",
+    "COSEEncoder",
     "COSESignature",
     "CWT",
     "CWTClaims",
+    "CWTEncoder",
     "EncryptedCOSEKey",
+    "EphemeralKeyPool",
     "HPKECipherSuite",
+    "KeyRegistry",
+    "KeyRing",
     "Claims",
+    "CoarseClock",
+    "PeekedHeaders",
     "Recipient",
+    "ReplayGuard",
+    "MemoryReplayGuard",
+    "BloomReplayGuard",
+    "SQLiteReplayGuard",
     "Signer",
+    "TokenCache",
+    "TrustStore",
+    "Tracer",
+    "HistogramTracer",
+    "Histogram",
+    "Span",
     "load_pem_hcert_dsc",
     "CWTError",
     "EncodeError",
     "DecodeError",
     "VerifyError",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{_LAZY_ATTRS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_LAZY_ATTRS])
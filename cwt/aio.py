@@ -0,0 +1,488 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from cbor2 import CBORTag, loads
+
+from .cose import COSE
+from .cose_key_interface import COSEKeyInterface
+from .cwt import CWT, next_step
+from .key_ring import KeyRing
+
+ResolvedKeys = Union[None, COSEKeyInterface, List[COSEKeyInterface]]
+KeyResolver = Callable[[bytes, int], Awaitable[ResolvedKeys]]
+Keys = Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]
+
+RESOLVER_CACHE_TTL = 300  # 5 min
+RESOLVER_CACHE_SIZE = 1024
+
+
+class CachingResolver:
+    """
+    A key resolver which caches the keys returned by another resolver for
+    ``ttl`` seconds in an LRU of ``max_entries`` entries. Concurrent lookups
+    of the same ``kid`` and ``alg`` are coalesced into one call of the
+    underlying resolver. Empty results and errors are not cached. If the
+    caller which calls the underlying resolver is cancelled, the other callers
+    waiting for it look the keys up again.
+
+    Examples:
+
+        >>> from cwt.aio import AsyncCWT, CachingResolver
+        >>> async def resolve(kid: bytes, alg: int):
+        ...     return COSEKey.from_jwk(await fetch_jwk(kid))
+        >>> ctx = AsyncCWT.new(resolver=CachingResolver(resolve, ttl=600))
+        >>> claims = await ctx.decode(token)
+    """
+
+    def __init__(self, resolve: KeyResolver, ttl: int = RESOLVER_CACHE_TTL, max_entries: int = RESOLVER_CACHE_SIZE):
+        """
+        Constructor.
+
+        Args:
+            resolve (KeyResolver): An async function which takes ``kid`` and ``alg``
+                and returns a COSE key, a list of the keys or ``None``.
+            ttl (int): The lifetime in seconds of a cached entry (default value: ``300``).
+            max_entries (int): The maximum number of cached entries (default value: ``1024``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not callable(resolve):
+            raise ValueError("resolve should be callable.")
+        if not isinstance(ttl, int) or ttl <= 0:
+            raise ValueError("ttl should be positive int.")
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries should be positive int.")
+        self._resolve = resolve
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._pending: Dict[Tuple[bytes, int], asyncio.Future] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of lookups answered from the cache.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of lookups which called the underlying resolver.
+        """
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Removes all of the cached entries.
+        """
+        self._entries.clear()
+        return
+
+    def invalidate(self, kid: bytes):
+        """
+        Removes the cached entries of the ``kid``.
+
+        Args:
+            kid (bytes): A key identifier.
+        """
+        for k in [k for k in self._entries if k[0] == kid]:
+            del self._entries[k]
+        return
+
+    async def __call__(self, kid: bytes, alg: int) -> List[COSEKeyInterface]:
+        k = (kid, alg)
+        entry = self._entries.get(k)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(k)
+                self._hits += 1
+                return entry[1]
+            del self._entries[k]
+
+        pending = self._pending.get(k)
+        if pending is not None:
+            self._hits += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The caller which looked the keys up has been cancelled, so they are looked up again.
+            return await self(kid, alg)
+
+        self._misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[k] = fut
+        try:
+            keys = _to_list(await self._resolve(kid, alg))
+        except Exception as err:
+            fut.set_exception(err)
+            # Mark the exception as retrieved when no one else is waiting for it.
+            fut.exception()
+            raise
+        except BaseException:
+            # e.g., asyncio.CancelledError. The waiters are woken up to look the keys up again.
+            fut.cancel()
+            raise
+        finally:
+            del self._pending[k]
+        fut.set_result(keys)
+        if keys:
+            self._entries[k] = (time.monotonic() + self._ttl, keys)
+            if len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return keys
+
+
+class _AsyncRunner:
+    def __init__(self, executor: Optional[Executor], max_concurrency: int, resolver: Optional[KeyResolver]):
+        if executor is not None and not isinstance(executor, Executor):
+            raise ValueError("executor should be concurrent.futures.Executor.")
+        if not isinstance(max_concurrency, int) or max_concurrency < 0:
+            raise ValueError("max_concurrency should be non-negative int.")
+        if resolver is not None and not callable(resolver):
+            raise ValueError("resolver should be callable.")
+        self._executor = executor
+        self._max_concurrency = max_concurrency
+        self._resolver = resolver
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def max_concurrency(self) -> int:
+        """
+        The maximum number of operations running on the executor at a time.
+        ``0`` means unlimited.
+        """
+        return self._max_concurrency
+
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if self._max_concurrency == 0:
+            return await loop.run_in_executor(self._executor, call)
+        # A semaphore is bound to the event loop where it is used first.
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, call)
+
+    async def _resolve(self, msg: Any) -> List[COSEKeyInterface]:
+        if self._resolver is None:
+            raise ValueError("keys should be set if resolver is not specified.")
+        hints = list(dict.fromkeys(_key_hints(msg)))
+        resolved = await asyncio.gather(*[self._resolver(kid, alg) for kid, alg in hints])
+        keys: List[COSEKeyInterface] = []
+        seen = set()
+        for r in resolved:
+            for k in _to_list(r):
+                if id(k) not in seen:
+                    seen.add(id(k))
+                    keys.append(k)
+        return keys
+
+
+class AsyncCOSE(_AsyncRunner):
+    """
+    An asyncio front-end of :class:`COSE <cwt.COSE>`. The methods have the same
+    arguments as the ones of COSE and run it on the executor.
+
+    Examples:
+
+        >>> from cwt.aio import AsyncCOSE
+        >>> ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True), max_concurrency=32)
+        >>> encoded = await ctx.encode_and_sign(b"Hello world!", private_key)
+        >>> payload = await ctx.decode(encoded, public_key)
+    """
+
+    def __init__(
+        self,
+        cose: Optional[COSE] = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 0,
+        resolver: Optional[KeyResolver] = None,
+    ):
+        super().__init__(executor, max_concurrency, resolver)
+        if cose is None:
+            cose = COSE()
+        if not isinstance(cose, COSE):
+            raise ValueError("cose should be COSE.")
+        self._cose = cose
+
+    @classmethod
+    def new(
+        cls,
+        cose: Optional[COSE] = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 0,
+        resolver: Optional[KeyResolver] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            cose (Optional[COSE]): The COSE object which does the work. If it is
+                not specified, ``COSE()`` with the default settings is used.
+            executor (Optional[Executor]): The executor on which the cryptographic
+                operations run. If it is not specified, the default executor of the
+                event loop is used.
+            max_concurrency (int): The maximum number of operations running on the
+                executor at a time (default value: ``0``). The callers beyond it wait
+                for a slot, which applies backpressure. If ``0`` is specified, it is
+                not limited.
+            resolver (Optional[KeyResolver]): An async function which takes ``kid``
+                (``b""`` if the message has no ``kid``) and ``alg``, and returns a
+                COSE key, a list of the keys or ``None``. It is used to look up the
+                keys when ``keys`` is not given to ``decode``. See
+                :class:`CachingResolver <cwt.aio.CachingResolver>`.
+        """
+        return cls(cose, executor, max_concurrency, resolver)
+
+    @property
+    def cose(self) -> COSE:
+        """
+        The underlying COSE object.
+        """
+        return self._cose
+
+    async def encode(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Same as :func:`COSE.encode <cwt.COSE.encode>`.
+        """
+        return await self._run(self._cose.encode, *args, **kwargs)
+
+    async def encode_and_encrypt(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Same as :func:`COSE.encode_and_encrypt <cwt.COSE.encode_and_encrypt>`.
+        """
+        return await self._run(self._cose.encode_and_encrypt, *args, **kwargs)
+
+    async def encode_and_mac(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Same as :func:`COSE.encode_and_mac <cwt.COSE.encode_and_mac>`.
+        """
+        return await self._run(self._cose.encode_and_mac, *args, **kwargs)
+
+    async def encode_and_sign(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Same as :func:`COSE.encode_and_sign <cwt.COSE.encode_and_sign>`.
+        """
+        return await self._run(self._cose.encode_and_sign, *args, **kwargs)
+
+    async def decode(
+        self,
+        data: Union[bytes, CBORTag],
+        keys: Optional[Keys] = None,
+        context: Optional[Union[Dict[str, Any], List[Any]]] = None,
+        external_aad: bytes = b"",
+        detached_payload: Optional[Any] = None,
+        enable_non_aead: bool = False,
+    ) -> bytes:
+        """
+        Same as :func:`COSE.decode <cwt.COSE.decode>` except that the keys are looked
+        up with the resolver if ``keys`` is not specified.
+        """
+        _, _, res = await self.decode_with_headers(data, keys, context, external_aad, detached_payload, enable_non_aead)
+        return res
+
+    async def decode_with_headers(
+        self,
+        data: Union[bytes, CBORTag],
+        keys: Optional[Keys] = None,
+        context: Optional[Union[Dict[str, Any], List[Any]]] = None,
+        external_aad: bytes = b"",
+        detached_payload: Optional[Any] = None,
+        enable_non_aead: bool = False,
+    ) -> Tuple[Dict[int, Any], Dict[int, Any], bytes]:
+        """
+        Same as :func:`COSE.decode_with_headers <cwt.COSE.decode_with_headers>` except
+        that the keys are looked up with the resolver if ``keys`` is not specified.
+        """
+        if keys is None:
+            # The message is parsed on the executor since a large one would block the event loop.
+            msg = await self._run(self._cose._loads, data) if isinstance(data, bytes) else data
+            if not isinstance(msg, CBORTag):
+                raise ValueError("Invalid COSE format.")
+            data = msg
+            keys = await self._resolve(data)
+        return await self._run(
+            self._cose.decode_with_headers, data, keys, context, external_aad, detached_payload, enable_non_aead
+        )
+
+
+class AsyncCWT(_AsyncRunner):
+    """
+    An asyncio front-end of :class:`CWT <cwt.CWT>`. The methods have the same
+    arguments as the ones of CWT and run it on the executor.
+
+    Examples:
+
+        >>> from cwt.aio import AsyncCWT
+        >>> ctx = AsyncCWT.new(max_concurrency=64, resolver=CachingResolver(resolve))
+        >>> token = await ctx.encode({"iss": "coaps://as.example"}, private_key)
+        >>> claims = await ctx.decode(token)
+    """
+
+    def __init__(
+        self,
+        cwt: Optional[CWT] = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 0,
+        resolver: Optional[KeyResolver] = None,
+    ):
+        super().__init__(executor, max_concurrency, resolver)
+        if cwt is None:
+            cwt = CWT()
+        if not isinstance(cwt, CWT):
+            raise ValueError("cwt should be CWT.")
+        self._cwt = cwt
+
+    @classmethod
+    def new(
+        cls,
+        cwt: Optional[CWT] = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 0,
+        resolver: Optional[KeyResolver] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            cwt (Optional[CWT]): The CWT object which does the work. If it is not
+                specified, ``CWT()`` with the default settings is used.
+            executor (Optional[Executor]): The executor on which the cryptographic
+                operations run. If it is not specified, the default executor of the
+                event loop is used.
+            max_concurrency (int): The maximum number of operations running on the
+                executor at a time (default value: ``0``). If ``0`` is specified, it
+                is not limited.
+            resolver (Optional[KeyResolver]): An async function which takes ``kid``
+                and ``alg``, and returns a COSE key, a list of the keys or ``None``.
+                It is called for each layer of a nested CWT when ``keys`` is not
+                given to ``decode``.
+        """
+        return cls(cwt, executor, max_concurrency, resolver)
+
+    @property
+    def cwt(self) -> CWT:
+        """
+        The underlying CWT object.
+        """
+        return self._cwt
+
+    async def encode(self, *args: Any, **kwargs: Any) -> bytes:
+        """
+        Same as :func:`CWT.encode <cwt.CWT.encode>`.
+        """
+        return await self._run(self._cwt.encode, *args, **kwargs)
+
+    async def encode_and_mac(self, *args: Any, **kwargs: Any) -> bytes:
+        """
+        Same as :func:`CWT.encode_and_mac <cwt.CWT.encode_and_mac>`.
+        """
+        return await self._run(self._cwt.encode_and_mac, *args, **kwargs)
+
+    async def encode_and_sign(self, *args: Any, **kwargs: Any) -> bytes:
+        """
+        Same as :func:`CWT.encode_and_sign <cwt.CWT.encode_and_sign>`.
+        """
+        return await self._run(self._cwt.encode_and_sign, *args, **kwargs)
+
+    async def encode_and_encrypt(self, *args: Any, **kwargs: Any) -> bytes:
+        """
+        Same as :func:`CWT.encode_and_encrypt <cwt.CWT.encode_and_encrypt>`.
+        """
+        return await self._run(self._cwt.encode_and_encrypt, *args, **kwargs)
+
+    async def decode(
+        self,
+        data: bytes,
+        keys: Optional[Keys] = None,
+        no_verify: bool = False,
+        now: Optional[int] = None,
+    ) -> Union[Dict[int, Any], bytes]:
+        """
+        Same as :func:`CWT.decode <cwt.CWT.decode>` except that the keys are looked
+        up with the resolver for each layer if ``keys`` is not specified. Each layer
+        is parsed and verified on the executor, and the resolver is awaited on the
+        event loop between them, so that no worker thread waits for the resolver.
+        The keys resolved for the outermost layer are used as the key set of the
+        token cache of the CWT.
+        """
+        if keys is not None:
+            return await self._run(self._cwt.decode, data, keys, no_verify, now)
+        if self._resolver is None:
+            raise ValueError("keys should be set if resolver is not specified.")
+
+        tracer = self._cwt.cose.tracer
+        with tracer.span("cwt.decode") as span:
+            steps = self._cwt._decode_steps(span, data, [], no_verify, now, True)
+            done, res = await self._run(next_step, steps)
+            while not done:
+                with tracer.span("cwt.key_resolve"):
+                    keys = await self._resolve(res)
+                done, res = await self._run(next_step, steps, keys)
+            return res
+
+
+def _to_list(keys: ResolvedKeys) -> List[COSEKeyInterface]:
+    if keys is None:
+        return []
+    if isinstance(keys, COSEKeyInterface):
+        return [keys]
+    return list(keys)
+
+
+def _headers(protected: Any, unprotected: Any) -> Tuple[Dict[int, Any], Dict[int, Any]]:
+    p: Any = {}
+    if isinstance(protected, bytes) and protected:
+        try:
+            p = loads(protected)
+        except Exception:
+            p = {}
+    return (p if isinstance(p, dict) else {}), (unprotected if isinstance(unprotected, dict) else {})
+
+
+def _kid(p: Dict[int, Any], u: Dict[int, Any]) -> bytes:
+    kid = p.get(4, u.get(4, b""))
+    return kid if isinstance(kid, bytes) else b""
+
+
+def _alg(p: Dict[int, Any], u: Dict[int, Any], default: int) -> int:
+    alg = p.get(1, u.get(1, default))
+    return alg if isinstance(alg, int) else default
+
+
+def _key_hints(msg: Any) -> List[Tuple[bytes, int]]:
+    """
+    Returns the pairs of ``kid`` and ``alg`` of the keys needed to decode the message:
+    the ones of the message for Encrypt0, MAC0 and Signature1, and the ones of the
+    recipients or the signatures for Encrypt, MAC and Signature.
+    """
+    if not isinstance(msg, CBORTag) or not isinstance(msg.value, list) or len(msg.value) < 3:
+        return []
+    p, u = _headers(msg.value[0], msg.value[1])
+    alg = _alg(p, u, 0)
+    if msg.tag in [16, 17, 18]:
+        return [(_kid(p, u), alg)]
+    i = {96: 3, 97: 4, 98: 3}.get(msg.tag, 0)
+    if i == 0 or len(msg.value) <= i or not isinstance(msg.value[i], list):
+        return []
+    res = []
+    for v in msg.value[i]:
+        if isinstance(v, list) and len(v) >= 2:
+            vp, vu = _headers(v[0], v[1])
+            res.append((_kid(vp, vu), _alg(vp, vu, alg)))
+    return res
@@ -1,9 +1,7 @@
-from typing import Any, Dict, List
-
-from certvalidator import CertificateValidator, ValidationContext
+from typing import Any, Dict, List, Union
 
+from ..cert_validator import CertValidator
 from ..cose_key_interface import COSEKeyInterface
-from ..exceptions import VerifyError
 
 
 class AsymmetricKey(COSEKeyInterface):
@@ -23,16 +21,11 @@ class AsymmetricKey(COSEKeyInterface):
                 self._intermediates = certs[1:]
             return
 
-    def validate_certificate(self, ca_certs: List[bytes]) -> bool:
+    def validate_certificate(self, ca_certs: Union[List[bytes], CertValidator]) -> bool:
         if not ca_certs:
             raise ValueError("ca_certs should be set.")
         if not self._cert:
             return False
 
-        ctx = ValidationContext(trust_roots=ca_certs)
-        try:
-            validator = CertificateValidator(self._cert, self._intermediates, validation_context=ctx)
-            validator.validate_usage(set(["digital_signature"]), extended_optional=True)
-        except Exception as err:
-            raise VerifyError("Failed to validate the certificate bound to the key.") from err
-        return True
+        validator = ca_certs if isinstance(ca_certs, CertValidator) else CertValidator(ca_certs, ttl=0)
+        return validator.validate(self._cert, self._intermediates)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterable, Optional, Union
 
 import cryptography
 from cryptography.hazmat.primitives import hashes
@@ -8,6 +8,7 @@ from cryptography.hazmat.primitives.asymmetric.ec import (
     EllipticCurvePublicKey,
 )
 from cryptography.hazmat.primitives.asymmetric.utils import (
+    Prehashed,
     decode_dss_signature,
     encode_dss_signature,
 )
@@ -238,6 +239,16 @@ class EC2Key(AsymmetricKey):
         cose_key[-4] = k.private_numbers().private_value.to_bytes(key_len, byteorder="big")
         return cose_key
 
+    @classmethod
+    def from_ephemeral_key(cls, k: EllipticCurvePrivateKey, crv: int, alg: int) -> "EC2Key":
+        # An ephemeral key for ECDH-ES which uses a private key generated in advance
+        # on key derivation. The key is not encoded into the parameters.
+        key = cls({1: 2, -1: crv, 3: alg})
+        if not isinstance(k, EllipticCurvePrivateKey) or k.curve.name != key._crv_obj.name:
+            raise ValueError(f"k should be EllipticCurvePrivateKey on crv {crv}.")
+        key._private_key = k
+        return key
+
     @property
     def key(self) -> Union[EllipticCurvePublicKey, EllipticCurvePrivateKey]:
         return self._key
@@ -277,6 +288,25 @@ class EC2Key(AsymmetricKey):
         except ValueError as err:
             raise VerifyError("Invalid signature.") from err
 
+    def sign_chunks(self, chunks: Iterable[Any]) -> bytes:
+        if self._public_key:
+            raise ValueError("Public key cannot be used for signing.")
+        try:
+            sig = self._private_key.sign(self._digest(chunks), ec.ECDSA(Prehashed(self._hash_alg())))
+            return self._der_to_os(self._private_key.curve.key_size, sig)
+        except Exception as err:
+            raise EncodeError("Failed to sign.") from err
+
+    def verify_chunks(self, chunks: Iterable[Any], sig: bytes):
+        try:
+            public_key = self._private_key.public_key() if self._private_key else self._public_key
+            der_sig = self._os_to_der(public_key.curve.key_size, sig)
+            public_key.verify(der_sig, self._digest(chunks), ec.ECDSA(Prehashed(self._hash_alg())))
+        except cryptography.exceptions.InvalidSignature as err:
+            raise VerifyError("Failed to verify.") from err
+        except ValueError as err:
+            raise VerifyError("Invalid signature.") from err
+
     def derive_bytes(self, length: int, material: bytes = b"", info: bytes = b"", public_key: Optional[Any] = None) -> bytes:
         if self._public_key:
             raise ValueError("Public key cannot be used for key derivation.")
@@ -301,6 +331,12 @@ class EC2Key(AsymmetricKey):
         except Exception as err:
             raise EncodeError("Failed to derive bytes.") from err
 
+    def _digest(self, chunks: Iterable[Any]) -> bytes:
+        h = hashes.Hash(self._hash_alg())
+        for c in chunks:
+            h.update(c)
+        return h.finalize()
+
     def _der_to_os(self, key_size: int, sig: bytes) -> bytes:
         num_bytes = (key_size + 7) // 8
         r, s = decode_dss_signature(sig)
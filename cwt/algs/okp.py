@@ -81,8 +81,8 @@ class OKPKey(AsymmetricKey):
         else:
             raise ValueError(f"Unsupported or unknown crv(-1) for OKP: {self._crv}.")
 
-        # Check the existence of the key.
-        if -2 not in params and -4 not in params:
+        # Check the existence of the key. An ephemeral key for ECDH-ES is generated on key derivation.
+        if -2 not in params and -4 not in params and self._alg not in COSE_ALGORITHMS_CKDM_KEY_AGREEMENT_ES.values():
             raise ValueError("The body of the key not found.")
 
         # Validate alg and key_ops.
@@ -259,6 +259,16 @@ class OKPKey(AsymmetricKey):
             raise ValueError("Unsupported or unknown key for OKP.")
         return cose_key
 
+    @classmethod
+    def from_ephemeral_key(cls, k: Union[X25519PrivateKey, X448PrivateKey], crv: int, alg: int) -> "OKPKey":
+        # An ephemeral key for ECDH-ES which uses a private key generated in advance
+        # on key derivation. The key is not encoded into the parameters.
+        key = cls({1: 1, -1: crv, 3: alg})
+        if not (crv == 4 and isinstance(k, X25519PrivateKey) or crv == 5 and isinstance(k, X448PrivateKey)):
+            raise ValueError(f"k should be X25519PrivateKey or X448PrivateKey on crv {crv}.")
+        key._private_key = k
+        return key
+
     @property
     def key(
         self,
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterable
 
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
@@ -7,6 +7,7 @@ from cryptography.hazmat.primitives.asymmetric.rsa import (
     RSAPublicKey,
     RSAPublicNumbers,
 )
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 
 from ..const import COSE_ALGORITHMS_RSA, COSE_KEY_OPERATION_VALUES
 from ..exceptions import EncodeError, VerifyError
@@ -134,3 +135,24 @@ class RSAKey(AsymmetricKey):
                 self._key.public_key().verify(sig, msg, self._padding, self._hash())
         except Exception as err:
             raise VerifyError("Failed to verify.") from err
+
+    def sign_chunks(self, chunks: Iterable[Any]) -> bytes:
+        if isinstance(self._key, RSAPublicKey):
+            raise ValueError("Public key cannot be used for signing.")
+        try:
+            return self._key.sign(self._digest(chunks), self._padding, Prehashed(self._hash()))
+        except Exception as err:
+            raise EncodeError("Failed to sign.") from err
+
+    def verify_chunks(self, chunks: Iterable[Any], sig: bytes):
+        try:
+            public_key = self._key if isinstance(self._key, RSAPublicKey) else self._key.public_key()
+            public_key.verify(sig, self._digest(chunks), self._padding, Prehashed(self._hash()))
+        except Exception as err:
+            raise VerifyError("Failed to verify.") from err
+
+    def _digest(self, chunks: Iterable[Any]) -> bytes:
+        h = hashes.Hash(self._hash())
+        for c in chunks:
+            h.update(c)
+        return h.finalize()
@@ -1,7 +1,7 @@
 import hashlib
 import hmac
 from secrets import token_bytes
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 
 from cryptography.hazmat.primitives.ciphers.aead import AESCCM, AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
@@ -135,6 +135,22 @@ class HMACKey(MACAuthenticationKey):
             return
         raise VerifyError("Failed to compare digest.")
 
+    def sign_chunks(self, chunks: Iterable[Any]) -> bytes:
+        """ """
+        try:
+            h = hmac.new(self._key, digestmod=self._hash_alg)
+            for c in chunks:
+                h.update(c)
+            return h.digest()[0 : self._trunc]
+        except Exception as err:
+            raise EncodeError("Failed to sign.") from err
+
+    def verify_chunks(self, chunks: Iterable[Any], sig: bytes):
+        """ """
+        if hmac.compare_digest(sig, self.sign_chunks(chunks)):
+            return
+        raise VerifyError("Failed to compare digest.")
+
 
 class AESCCMKey(ContentEncryptionKey):
     """ """
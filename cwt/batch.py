@@ -0,0 +1,169 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, ThreadPoolExecutor
+
+BATCH_DEFAULT_CHUNK_SIZE = 16
+
+# The maximum number of threads of the shared pool. Threads are started on demand.
+SHARED_POOL_MAX_WORKERS = max(32, (os.cpu_count() or 1) + 4)
+
+_executor: Optional["ThreadPoolExecutor"] = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def shared_executor() -> "ThreadPoolExecutor":
+    """
+    Returns the thread pool shared by batch decoding and parallel trials of
+    candidate keys. It is created on first use and lives as long as the
+    process, so that the threads are reused instead of being started for each
+    batch.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # concurrent.futures is imported on first use to keep ``import cwt`` fast.
+                from concurrent.futures import ThreadPoolExecutor
+
+                _executor = ThreadPoolExecutor(
+                    max_workers=SHARED_POOL_MAX_WORKERS, thread_name_prefix="cwt", initializer=_mark_pool_thread
+                )
+    return _executor
+
+
+def in_shared_pool() -> bool:
+    """
+    Returns whether the calling thread is a thread of the shared pool. Work
+    submitted from it to the pool and waited for could deadlock the pool, so
+    it is done on the calling thread instead.
+    """
+    return getattr(_local, "pool_thread", False)
+
+
+def _mark_pool_thread():
+    _local.pool_thread = True
+
+
+def run_batch(
+    func: Callable[[Any], Any],
+    items: Sequence[Any],
+    workers: Optional[int] = None,
+    chunk_size: int = BATCH_DEFAULT_CHUNK_SIZE,
+) -> List[Any]:
+    """
+    Applies ``func`` to each item and returns the results in input order.
+    An exception raised for an item is returned in place of its result.
+    The items are split into chunks of ``chunk_size`` and the chunks are
+    processed by at most ``workers`` threads of the shared pool. A batch
+    which fits in one chunk, or a single worker, is processed on the calling
+    thread.
+    """
+    if workers is None:
+        workers = default_workers()
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError("workers should be positive int.")
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError("chunk_size should be positive int.")
+
+    def run_chunk(chunk: Sequence[Any]) -> List[Any]:
+        res: List[Any] = []
+        for item in chunk:
+            try:
+                res.append(func(item))
+            except Exception as err:
+                res.append(err)
+        return res
+
+    if workers == 1 or len(items) <= chunk_size or in_shared_pool():
+        return run_chunk(items)
+
+    chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+    chunk_results: List[List[Any]] = [[] for _ in chunks]
+    next_chunk = iter(range(len(chunks)))
+    lock = threading.Lock()
+
+    def run_chunks():
+        while True:
+            with lock:
+                i = next(next_chunk, -1)
+            if i < 0:
+                return
+            chunk_results[i] = run_chunk(chunks[i])
+
+    executor = shared_executor()
+    for f in [executor.submit(run_chunks) for _ in range(min(workers, len(chunks)))]:
+        f.result()
+    return [r for res in chunk_results for r in res]
+
+
+def run_trials(
+    trial: Callable[[Any], Any],
+    candidates: Sequence[Any],
+    workers: int = 1,
+    executor: Optional["Executor"] = None,
+) -> Tuple[int, Any, int]:
+    """
+    Calls ``trial`` with each candidate until one of them succeeds, and returns
+    the index of the candidate (``-1`` if none of them succeeds), the result
+    and the number of candidates tried. If all of the candidates fail, the
+    exception raised for the last one is returned in place of the result
+    (``None`` if there is no candidate).
+
+    With two or more ``workers``, the candidates are dealt into ``workers``
+    groups which are tried in parallel in the order of the candidates on the
+    ``executor`` (the shared pool by default). The first success is returned,
+    and the other groups stop before their next candidates. On a thread of the
+    shared pool, e.g., in a batch, the candidates are tried on the calling thread.
+    """
+    groups = min(workers, len(candidates))
+    if executor is None and in_shared_pool():
+        groups = 1
+    if groups < 2:
+        err: Optional[Exception] = None
+        for i, c in enumerate(candidates):
+            try:
+                return i, trial(c), i + 1
+            except Exception as e:
+                err = e
+        return -1, err, len(candidates)
+
+    done = threading.Event()
+    errors: List[Optional[Exception]] = [None] * len(candidates)
+    tried = [0] * groups
+
+    def run_group(g: int) -> Optional[Tuple[int, Any]]:
+        for i in range(g, len(candidates), groups):
+            if done.is_set():
+                return None
+            tried[g] += 1
+            try:
+                res = trial(candidates[i])
+            except Exception as e:
+                errors[i] = e
+                continue
+            done.set()
+            return i, res
+        return None
+
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    if executor is None:
+        executor = shared_executor()
+    pending = {executor.submit(run_group, g) for g in range(groups)}
+    while pending:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in finished:
+            res = f.result()
+            if res is not None:
+                for p in pending:
+                    p.cancel()
+                return res[0], res[1], sum(tried)
+    return -1, errors[-1], sum(tried)
@@ -2,10 +2,13 @@ from typing import Any, Dict
 
 from cbor2 import dumps, loads
 
+from .cose_peek import LARGE_ITEM_SIZE, loads_large
 from .exceptions import DecodeError, EncodeError
 
 
 class CBORProcessor:
+    __slots__ = ()
+
     def _dumps(self, obj: Any) -> bytes:
         try:
             return dumps(obj)
@@ -14,6 +17,8 @@ class CBORProcessor:
 
     def _loads(self, s: bytes) -> Dict[int, Any]:
         try:
+            if isinstance(s, (bytes, bytearray, memoryview)) and len(s) >= LARGE_ITEM_SIZE:
+                return loads_large(s)
             return loads(s)
         except Exception as err:
             raise DecodeError("Failed to decode.") from err
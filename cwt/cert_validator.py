@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from .exceptions import VerifyError
+
+CERT_VALIDATION_CACHE_TTL = 3600  # 1 hour
+CERT_VALIDATION_CACHE_SIZE = 1024
+
+
+class CertValidator:
+    """
+    A validator for the certificate chains (``x5c``) bound to COSE keys.
+
+    The successful validation results are cached with the fingerprint of the
+    certificate chain and the set of the trusted root CA certificates. Each
+    cached result expires at the earliest ``notAfter`` of the certificates in
+    the validated path or after ``ttl`` seconds, whichever comes first. The cache
+    is bounded by ``max_entries`` and the least recently used entry is evicted
+    first.
+
+    The trusted root CA certificates are parsed once, and each validation uses
+    its own ``certvalidator.ValidationContext`` built from them, so that the
+    validations run in parallel without holding the lock of the cache and no
+    validated paths accumulate. The same chain may be validated more than once
+    if it is validated by several threads at the same time.
+    """
+
+    def __init__(
+        self,
+        ca_certs: List[bytes],
+        ttl: int = CERT_VALIDATION_CACHE_TTL,
+        max_entries: int = CERT_VALIDATION_CACHE_SIZE,
+    ):
+        """
+        Constructor.
+
+        Args:
+            ca_certs (List[bytes]): A list of DER-formatted trusted root CA
+                certificates.
+            ttl (int): The maximum lifetime in seconds of a cached validation
+                result. If ``0`` is specified, the results are not cached.
+            max_entries (int): The maximum number of cached validation results.
+                If ``0`` is specified, the results are not cached.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not ca_certs:
+            raise ValueError("ca_certs should be set.")
+        if not isinstance(ttl, int) or ttl < 0:
+            raise ValueError("ttl should be non-negative int.")
+        if not isinstance(max_entries, int) or max_entries < 0:
+            raise ValueError("max_entries should be non-negative int.")
+        self._ca_certs = ca_certs
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._trust_roots_fingerprint = self._fingerprint(sorted(hashlib.sha256(c).digest() for c in ca_certs))
+        # certvalidator and asn1crypto are imported on first use to keep ``import cwt`` fast.
+        from asn1crypto import pem, x509
+
+        self._trust_roots = [x509.Certificate.load(pem.unarmor(c)[2] if pem.detect(c) else c) for c in ca_certs]
+        self._cache: OrderedDict[bytes, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of validations answered from the cache.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of validations which were not found in the cache.
+        """
+        return self._misses
+
+    def clear(self):
+        """
+        Clears the cached validation results and the counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._hits = 0
+            self._misses = 0
+        return
+
+    def validate(self, cert: bytes, intermediates: List[bytes] = []) -> bool:
+        """
+        Validates a certificate chain with the trusted root CA certificates.
+
+        Args:
+            cert (bytes): A DER-formatted end-entity certificate.
+            intermediates (List[bytes]): DER-formatted intermediate certificates.
+        Returns:
+            bool: The indicator whether the validation is done or not.
+        Raises:
+            VerifyError: Failed to verify.
+        """
+        cache_key = self._fingerprint([self._trust_roots_fingerprint, cert, *intermediates])
+        now = time.time()
+        with self._lock:
+            expires_at = self._cache.get(cache_key)
+            if expires_at is not None:
+                if now < expires_at:
+                    self._cache.move_to_end(cache_key)
+                    self._hits += 1
+                    return True
+                del self._cache[cache_key]
+            self._misses += 1
+
+        try:
+            from datetime import datetime, timezone
+
+            from asn1crypto import x509
+            from certvalidator import CertificateValidator, ValidationContext
+
+            certs = [x509.Certificate.load(c) for c in [cert, *intermediates]]
+            ctx = ValidationContext(trust_roots=self._trust_roots, moment=datetime.now(timezone.utc))
+            validator = CertificateValidator(certs[0], certs[1:], validation_context=ctx)
+            path = validator.validate_usage(set(["digital_signature"]), extended_optional=True)
+        except Exception as err:
+            raise VerifyError("Failed to validate the certificate bound to the key.") from err
+
+        if self._ttl > 0 and self._max_entries > 0:
+            not_after = min(c.not_valid_after.timestamp() for c in path)
+            with self._lock:
+                self._cache[cache_key] = min(now + self._ttl, not_after)
+                self._cache.move_to_end(cache_key)
+                while len(self._cache) > self._max_entries:
+                    self._cache.popitem(last=False)
+        return True
+
+    @staticmethod
+    def _fingerprint(items: List[bytes]) -> bytes:
+        h = hashlib.sha256()
+        for v in items:
+            h.update(len(v).to_bytes(4, "big"))
+            h.update(v)
+        return h.digest()
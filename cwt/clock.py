@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Any, Callable, Union
+
+# A function which returns the current time in seconds since the epoch.
+Clock = Callable[[], float]
+
+
+class CoarseClock:
+    """
+    A clock for :class:`CWT <cwt.CWT>` which returns the time cached by a
+    background thread. The thread reads ``time.time()`` once per ``tick``, so
+    reading the clock costs only an attribute access, and the time may lag
+    behind by up to ``tick`` seconds. The lag should be much smaller than the
+    ``leeway`` of the CWT.
+
+    Examples:
+
+        >>> from cwt import CWT, CoarseClock
+        >>> clock = CoarseClock(tick=1.0)
+        >>> ctx = CWT.new(clock=clock)
+        >>> claims = ctx.decode(token, public_key)
+        >>> clock.close()
+    """
+
+    def __init__(self, tick: Union[int, float] = 1.0):
+        """
+        Constructor.
+
+        Args:
+            tick (Union[int, float]): The interval in seconds of refreshing the time
+                (default value: ``1.0``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if isinstance(tick, bool) or not isinstance(tick, (int, float)) or tick <= 0:
+            raise ValueError("tick should be positive number.")
+        self._tick = tick
+        self._now = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cwt-coarse-clock", daemon=True)
+        self._thread.start()
+
+    def __call__(self) -> float:
+        return self._now
+
+    def __enter__(self) -> "CoarseClock":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def tick(self) -> Union[int, float]:
+        """
+        The interval in seconds of refreshing the time.
+        """
+        return self._tick
+
+    def close(self):
+        """
+        Stops the background thread. The time is not refreshed afterwards. It
+        can be called more than once.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._tick):
+            self._now = time.time()
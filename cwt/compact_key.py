@@ -0,0 +1,284 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .cert_validator import CertValidator
+from .const import (
+    COSE_ALGORITHMS_RSA,
+    COSE_ALGORITHMS_SIG_EC2,
+    COSE_ALGORITHMS_SIG_OKP,
+    COSE_KEY_TYPES,
+    COSE_NAMED_ALGORITHMS_SUPPORTED,
+)
+from .cose_key import COSEKey
+from .cose_key_interface import COSEKeyInterface
+
+COMPACT_KEY_CACHE_SIZE = 1024
+
+# crv -> the length of a coordinate.
+_EC2_COORD_LEN = {1: 32, 2: 48, 3: 66, 8: 32}
+_OKP_X_LEN = {6: 32, 7: 57}
+
+
+class CompactKeyCache:
+    """
+    A bounded cache of the materialized keys of :class:`CompactPublicKey
+    <cwt.CompactPublicKey>`. When it is full, the least recently used key is
+    released, and it is built again from the compact representation on the
+    next use.
+    """
+
+    def __init__(self, max_entries: int = COMPACT_KEY_CACHE_SIZE):
+        """
+        Constructor.
+
+        Args:
+            max_entries (int): The maximum number of materialized keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries should be positive int.")
+        self._max_entries = max_entries
+        self._cache: OrderedDict[CompactPublicKey, COSEKeyInterface] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of uses of already materialized keys.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of keys materialized.
+        """
+        return self._misses
+
+    def clear(self):
+        """
+        Releases the materialized keys and clears the counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._hits = 0
+            self._misses = 0
+        return
+
+    def get(self, key: "CompactPublicKey") -> COSEKeyInterface:
+        """
+        Returns the materialized key of a compact key, building it if needed.
+
+        Args:
+            key (CompactPublicKey): A compact key.
+        Returns:
+            COSEKeyInterface: The materialized COSE key.
+        Raises:
+            ValueError: The compact key has an invalid public key.
+        """
+        with self._lock:
+            res = self._cache.get(key)
+            if res is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return res
+            self._misses += 1
+        # Built outside the lock. Concurrent misses for the same key may build it twice.
+        res = COSEKey.new(key.to_dict())
+        with self._lock:
+            self._cache[key] = res
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return res
+
+
+_DEFAULT_CACHE = CompactKeyCache()
+
+
+class CompactPublicKey(COSEKeyInterface):
+    """
+    A compact, verify-only COSE public key (EC2, OKP or RSA) for large key sets.
+
+    It holds only ``kid``, ``alg`` and the raw public key bytes (``x`` and
+    ``y`` for EC2, ``x`` for OKP, and ``n`` and ``e`` for RSA). The
+    ``pyca/cryptography`` key is built on first use and kept in a
+    :class:`CompactKeyCache <cwt.CompactKeyCache>`, which releases the least
+    recently used ones. Therefore, the public key itself is validated on first
+    use, not when the compact key is created. Other parameters like ``x5c``
+    are not kept.
+
+    It can be used in place of any other public key, e.g., in a
+    :class:`KeyRing <cwt.KeyRing>` or with :func:`COSE.decode <cwt.COSE.decode>`.
+
+    Examples:
+
+        >>> from cwt import COSE, CompactPublicKey
+        >>> keys = [CompactPublicKey.new(params) for params in device_key_params]
+        >>> payload = COSE.new().decode(encoded, keys)
+    """
+
+    __slots__ = ("_crv", "_data", "_e", "_cache")
+
+    def __init__(
+        self, kty: int, kid: Optional[bytes], alg: Optional[int], crv: int, data: bytes, e: bytes, cache: CompactKeyCache
+    ):
+        # Use new() or from_key() instead.
+        self._kty = kty
+        self._kid = kid
+        self._alg = alg
+        self._crv = crv
+        self._data = data
+        self._e = e
+        self._cache = cache
+
+    @classmethod
+    def new(cls, params: Dict[int, Any], cache: Optional[CompactKeyCache] = None) -> "CompactPublicKey":
+        """
+        Creates a compact key from a COSE_Key structure of a public key for
+        signature verification.
+
+        Args:
+            params (Dict[int, Any]): A dictionary with numeric keys of a COSE key.
+            cache (Optional[CompactKeyCache]): The cache of the materialized keys.
+                If it is not specified, a cache shared by all the compact keys is used.
+        Returns:
+            CompactPublicKey: A compact key.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if cache is not None and not isinstance(cache, CompactKeyCache):
+            raise ValueError("cache should be CompactKeyCache.")
+        kty = params.get(1)
+        kty = COSE_KEY_TYPES.get(kty, 0) if isinstance(kty, str) else kty
+        if kty not in [1, 2, 3]:
+            raise ValueError("kty(1) should be OKP(1), EC2(2) or RSA(3).")
+        kid = params.get(2)
+        if kid is not None and not isinstance(kid, bytes):
+            raise ValueError("kid(2) should be bytes(bstr).")
+        alg = params.get(3)
+        if isinstance(alg, str):
+            if alg not in COSE_NAMED_ALGORITHMS_SUPPORTED:
+                raise ValueError(f"Unsupported or unknown alg(3): {alg}.")
+            alg = COSE_NAMED_ALGORITHMS_SUPPORTED[alg]
+        if alg is not None and not isinstance(alg, int):
+            raise ValueError("alg(3) should be int or str(tstr).")
+        key_ops = params.get(4, [])
+        if not isinstance(key_ops, list) or [op for op in key_ops if op not in [2, "verify"]]:
+            raise ValueError("key_ops(4) should be empty or [2] for CompactPublicKey.")
+
+        if kty == 3:
+            if alg not in COSE_ALGORITHMS_RSA.values():
+                raise ValueError(f"Unsupported or unknown alg(3) for RSA: {alg}.")
+            if -3 in params:
+                raise ValueError("CompactPublicKey should not have private parameter: -3.")
+            if not isinstance(params.get(-1), bytes):
+                raise ValueError("n(-1) should be set as bytes.")
+            if not isinstance(params.get(-2), bytes):
+                raise ValueError("e(-2) should be set as bytes.")
+            return cls(kty, kid, alg, 0, params[-1], params[-2], cache if cache is not None else _DEFAULT_CACHE)
+
+        if -4 in params:
+            raise ValueError("CompactPublicKey should not have private parameter: -4.")
+        crv = params.get(-1)
+        if kty == 2:
+            if alg is not None and alg not in COSE_ALGORITHMS_SIG_EC2.values():
+                raise ValueError(f"Unsupported or unknown alg(3) for EC2: {alg}.")
+            if crv not in _EC2_COORD_LEN:
+                raise ValueError(f"Unsupported or unknown crv(-1) for EC2: {crv}.")
+            x, y = params.get(-2), params.get(-3)
+            if not isinstance(x, bytes) or not isinstance(y, bytes):
+                raise ValueError("x(-2) and y(-3) should be bytes(bstr).")
+            if not (len(x) == len(y) == _EC2_COORD_LEN[crv]):
+                raise ValueError(f"Coords should be {_EC2_COORD_LEN[crv]} bytes for crv {crv}.")
+            return cls(kty, kid, alg, crv, x + y, b"", cache if cache is not None else _DEFAULT_CACHE)
+
+        # OKP
+        if alg is not None and alg not in COSE_ALGORITHMS_SIG_OKP.values():
+            raise ValueError(f"Unsupported or unknown alg(3) for OKP: {alg}.")
+        if crv not in _OKP_X_LEN:
+            raise ValueError(f"Unsupported or unknown crv(-1) for OKP: {crv}.")
+        x = params.get(-2)
+        if not isinstance(x, bytes) or len(x) != _OKP_X_LEN[crv]:
+            raise ValueError(f"x(-2) should be {_OKP_X_LEN[crv]} bytes for crv {crv}.")
+        return cls(kty, kid, alg, crv, x, b"", cache if cache is not None else _DEFAULT_CACHE)
+
+    @classmethod
+    def from_key(cls, key: COSEKeyInterface, cache: Optional[CompactKeyCache] = None) -> "CompactPublicKey":
+        """
+        Creates a compact key from the public part of a COSE key.
+
+        Args:
+            key (COSEKeyInterface): An EC2, OKP or RSA COSE key for signature.
+            cache (Optional[CompactKeyCache]): The cache of the materialized keys.
+                If it is not specified, a cache shared by all the compact keys is used.
+        Returns:
+            CompactPublicKey: A compact key.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(key, COSEKeyInterface):
+            raise ValueError("key should be COSEKeyInterface.")
+        params = key.to_dict()
+        public = [-1, -2] if key.kty == 3 else [-1, -2, -3]
+        return cls.new({k: v for k, v in params.items() if k in [1, 2, 3] or k in public}, cache)
+
+    @property
+    def key_ops(self) -> List[int]:
+        return [2]
+
+    @property
+    def base_iv(self) -> Union[bytes, None]:
+        return None
+
+    @property
+    def key(self) -> Any:
+        return self._cache.get(self).key
+
+    @property
+    def crv(self) -> int:
+        if self._kty == 3:
+            raise NotImplementedError
+        return self._crv
+
+    def to_dict(self) -> Dict[int, Any]:
+        res: Dict[int, Any] = {1: self._kty}
+        if self._kid:
+            res[2] = self._kid
+        if self._alg:
+            res[3] = self._alg
+        if self._kty == 3:
+            res[-1] = self._data
+            res[-2] = self._e
+        elif self._kty == 2:
+            n = len(self._data) // 2
+            res[-1] = self._crv
+            res[-2] = self._data[:n]
+            res[-3] = self._data[n:]
+        else:
+            res[-1] = self._crv
+            res[-2] = self._data
+        return res
+
+    def sign(self, msg: bytes) -> bytes:
+        raise ValueError("Public key cannot be used for signing.")
+
+    def sign_chunks(self, chunks: Iterable[Any]) -> bytes:
+        raise ValueError("Public key cannot be used for signing.")
+
+    def verify(self, msg: bytes, sig: bytes):
+        self._cache.get(self).verify(msg, sig)
+
+    def verify_chunks(self, chunks: Iterable[Any], sig: bytes):
+        self._cache.get(self).verify_chunks(chunks, sig)
+
+    def validate_certificate(self, ca_certs: Union[List[bytes], CertValidator]) -> bool:
+        if not ca_certs:
+            raise ValueError("ca_certs should be set.")
+        return False
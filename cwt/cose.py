@@ -1,9 +1,14 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-from asn1crypto import pem
 from cbor2 import CBORTag
 
+from .batch import BATCH_DEFAULT_CHUNK_SIZE, run_batch, run_trials
 from .cbor_processor import CBORProcessor
+from .cert_validator import (
+    CERT_VALIDATION_CACHE_SIZE,
+    CERT_VALIDATION_CACHE_TTL,
+    CertValidator,
+)
 from .const import (
     COSE_ALGORITHMS_CEK,
     COSE_ALGORITHMS_CEK_NON_AEAD,
@@ -17,11 +22,30 @@ from .const import (
     COSE_ALGORITHMS_SIGNATURE,
 )
 from .cose_key_interface import COSEKeyInterface
+from .cose_peek import PeekedHeaders, peek
+from .cose_structure import (
+    PayloadStream,
+    enc_structure,
+    is_payload_stream,
+    to_be_signed,
+)
+from .encoder import COSEEncoder
+from .key_ring import KeyRing, find_keys
 from .recipient_algs.hpke import HPKE
 from .recipient_interface import RecipientInterface
 from .recipients import Recipients
 from .signer import Signer
-from .utils import sort_keys_for_deterministic_encoding, to_cose_header
+from .tracer import NOOP_TRACER, Tracer
+from .trust_store import TrustStore
+from .utils import (
+    encode_deterministic_header,
+    sort_keys_for_deterministic_encoding,
+    to_cose_header,
+)
+
+
+def _size(v: Any) -> int:
+    return len(v) if isinstance(v, (bytes, bytearray, memoryview, PayloadStream)) else 0
 
 
 class COSE(CBORProcessor):
@@ -35,8 +59,12 @@ class COSE(CBORProcessor):
         alg_auto_inclusion: bool = False,
         kid_auto_inclusion: bool = False,
         verify_kid: bool = False,
-        ca_certs: str = "",
+        ca_certs: Union[str, TrustStore] = "",
         deterministic_header: bool = False,
+        cert_cache_ttl: int = CERT_VALIDATION_CACHE_TTL,
+        cert_cache_size: int = CERT_VALIDATION_CACHE_SIZE,
+        tracer: Optional[Tracer] = None,
+        trial_workers: int = 1,
     ):
         if not isinstance(alg_auto_inclusion, bool):
             raise ValueError("alg_auto_inclusion should be bool.")
@@ -50,27 +78,38 @@ class COSE(CBORProcessor):
             raise ValueError("verify_kid should be bool.")
         self._verify_kid = verify_kid
 
-        self._ca_certs = []
+        self._trust_store: Optional[TrustStore] = None
         if ca_certs:
-            if not isinstance(ca_certs, str):
-                raise ValueError("ca_certs should be str.")
-            self._trust_roots: List[bytes] = []
-            with open(ca_certs, "rb") as f:
-                for _, _, der_bytes in pem.unarmor(f.read(), multiple=True):
-                    self._ca_certs.append(der_bytes)
+            if isinstance(ca_certs, TrustStore):
+                self._trust_store = ca_certs
+            elif isinstance(ca_certs, str):
+                # A file given by path is loaded only once as before.
+                self._trust_store = TrustStore(ca_certs, 0, cert_cache_ttl, cert_cache_size)
+            else:
+                raise ValueError("ca_certs should be str or TrustStore.")
 
         if not isinstance(deterministic_header, bool):
             raise ValueError("deterministic_header should be bool.")
         self._deterministic_header = deterministic_header
 
+        self.tracer = tracer
+
+        if isinstance(trial_workers, bool) or not isinstance(trial_workers, int) or trial_workers < 1:
+            raise ValueError("trial_workers should be positive int.")
+        self._trial_workers = trial_workers
+
     @classmethod
     def new(
         cls,
         alg_auto_inclusion: bool = False,
         kid_auto_inclusion: bool = False,
         verify_kid: bool = False,
-        ca_certs: str = "",
+        ca_certs: Union[str, TrustStore] = "",
         deterministic_header: bool = False,
+        cert_cache_ttl: int = CERT_VALIDATION_CACHE_TTL,
+        cert_cache_size: int = CERT_VALIDATION_CACHE_SIZE,
+        tracer: Optional[Tracer] = None,
+        trial_workers: int = 1,
     ):
         """
         Constructor.
@@ -82,14 +121,48 @@ class COSE(CBORProcessor):
                 in a proper header bucket automatically or not.
             verify_kid(bool): The indicator whether ``kid`` verification is mandatory or
                 not.
-            ca_certs(str): The path to a file which contains a concatenated list
-                of trusted root certificates. You should specify private CA
-                certificates in your target system. There should be no need to
-                use the public CA certificates for the Web PKI.
+            ca_certs(Union[str, TrustStore]): The path to a file which contains a
+                concatenated list of trusted root certificates, or a
+                :class:`TrustStore <cwt.TrustStore>` which can be shared by multiple
+                instances. You should specify private CA certificates in your target
+                system. There should be no need to use the public CA certificates for
+                the Web PKI.
             deterministic_header(bool): The indicator whether the protected and unprotected
                 headers will be deterministically encoded defined in section 4.2.1 of RFC 8949.
+            cert_cache_ttl(int): The maximum lifetime in seconds of a cached certificate
+                validation result (default value: ``3600``). A cached result also expires
+                when one of the certificates in the validated path expires. If ``0`` is
+                specified, the results are not cached.
+            cert_cache_size(int): The maximum number of cached certificate validation
+                results (default value: ``1024``). ``cert_cache_ttl`` and ``cert_cache_size``
+                are not used if ``ca_certs`` is a ``TrustStore``.
+            tracer(Optional[Tracer]): A :class:`Tracer <cwt.Tracer>` which receives the
+                timings of the phases of encoding and decoding (e.g., CBOR parsing, key
+                lookup and cryptographic operations). If it is not specified, nothing is
+                measured.
+            trial_workers(int): The maximum number of threads which try candidate keys
+                in parallel when decoding Encrypt0, MAC0, Signature1, Encrypt and MAC
+                messages with several candidate keys, e.g., keys sharing a ``kid`` during
+                key rotation or keys for messages without ``kid`` (default value: ``1``).
+                The first key which succeeds is used and the rest are not tried. If all
+                of them fail, the error of the last candidate is raised as in the
+                sequential case. If ``1`` is specified, the keys are tried one by one on
+                the calling thread. The threads are taken from a thread pool shared by
+                all instances, so no thread is started per instance and nothing has to
+                be closed. It pays off for expensive trials (e.g., RSA, large payloads or
+                certificate validation).
         """
-        return cls(alg_auto_inclusion, kid_auto_inclusion, verify_kid, ca_certs, deterministic_header)
+        return cls(
+            alg_auto_inclusion,
+            kid_auto_inclusion,
+            verify_kid,
+            ca_certs,
+            deterministic_header,
+            cert_cache_ttl,
+            cert_cache_size,
+            tracer,
+            trial_workers,
+        )
 
     @property
     def alg_auto_inclusion(self) -> bool:
@@ -131,6 +204,39 @@ class COSE(CBORProcessor):
         self._verify_kid = verify_kid
         return
 
+    @property
+    def cert_validator(self) -> Optional[CertValidator]:
+        """
+        The validator for the certificates bound to the keys, which is shared by all
+        of the decode() calls on this object. It is ``None`` if ``ca_certs`` is not
+        specified. The cache hits and misses can be obtained through it.
+        """
+        return self._trust_store.validator if self._trust_store else None
+
+    @property
+    def trust_store(self) -> Optional[TrustStore]:
+        """
+        The trusted root CA certificates specified with ``ca_certs``. It is ``None`` if
+        ``ca_certs`` is not specified.
+        """
+        return self._trust_store
+
+    @property
+    def tracer(self) -> Tracer:
+        """
+        The tracer which receives the timings of the phases of encoding and decoding.
+        """
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, tracer: Optional[Tracer]):
+        if tracer is None:
+            tracer = NOOP_TRACER
+        if not isinstance(tracer, Tracer):
+            raise ValueError("tracer should be Tracer.")
+        self._tracer = tracer
+        return
+
     def encode(
         self,
         payload: bytes,
@@ -175,14 +281,17 @@ class COSE(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode data.
         """
-        p, u = self._encode_headers(key, protected, unprotected, enable_non_aead)
-        typ = self._validate_cose_message(key, p, u, recipients, signers)
-        if typ == 0:
-            return self._encode_and_encrypt(payload, key, p, u, recipients, external_aad, out)
-        elif typ == 1:
-            return self._encode_and_mac(payload, key, p, u, recipients, external_aad, out)
-        # elif typ == 2:
-        return self._encode_and_sign(payload, key, p, u, signers, external_aad, out)
+        with self._tracer.span("cose.encode") as span:
+            p, u = self._encode_headers(key, protected, unprotected, enable_non_aead)
+            typ = self._validate_cose_message(key, p, u, recipients, signers)
+            span.set("alg", p.get(1, u.get(1, 0)))
+            span.set("payload_size", _size(payload))
+            if typ == 0:
+                return self._encode_and_encrypt(payload, key, p, u, recipients, external_aad, out)
+            elif typ == 1:
+                return self._encode_and_mac(payload, key, p, u, recipients, external_aad, out)
+            # elif typ == 2:
+            return self._encode_and_sign(payload, key, p, u, signers, external_aad, out)
 
     def encode_and_encrypt(
         self,
@@ -225,11 +334,14 @@ class COSE(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode data.
         """
-        p, u = self._encode_headers(key, protected, unprotected, enable_non_aead)
-        typ = self._validate_cose_message(key, p, u, recipients, [])
-        if typ != 0:
-            raise ValueError("The COSE message is not suitable for COSE Encrypt0/Encrypt.")
-        return self._encode_and_encrypt(payload, key, p, u, recipients, external_aad, out)
+        with self._tracer.span("cose.encode") as span:
+            p, u = self._encode_headers(key, protected, unprotected, enable_non_aead)
+            typ = self._validate_cose_message(key, p, u, recipients, [])
+            if typ != 0:
+                raise ValueError("The COSE message is not suitable for COSE Encrypt0/Encrypt.")
+            span.set("alg", p.get(1, u.get(1, 0)))
+            span.set("payload_size", _size(payload))
+            return self._encode_and_encrypt(payload, key, p, u, recipients, external_aad, out)
 
     def encode_and_mac(
         self,
@@ -240,12 +352,14 @@ class COSE(CBORProcessor):
         recipients: List[RecipientInterface] = [],
         external_aad: bytes = b"",
         out: str = "",
+        detached_payload: Optional[Any] = None,
     ) -> Union[bytes, CBORTag]:
         """
         Encodes data with MAC.
 
         Args:
-            payload (bytes): A content to be MACed.
+            payload (bytes): A content to be MACed. It should be ``b""`` when
+                ``detached_payload`` is set.
             key (COSEKeyInterface): A COSE key as a MAC Authentication key.
             protected (Optional[dict]): Parameters that are to be cryptographically protected.
             unprotected (Optional[dict]): Parameters that are not cryptographically protected.
@@ -255,17 +369,31 @@ class COSE(CBORProcessor):
                 is specified. This function will return encoded data as
                 `cbor2 <https://cbor2.readthedocs.io/en/stable/>`_'s ``CBORTag`` object.
                 If any other value is specified, it will return encoded data as bytes.
+            detached_payload (Optional[Any]): A content to be MACed but not to be
+                included in the COSE message (the payload is encoded as ``nil``). In
+                addition to a byte string, a file-like object, a ``mmap.mmap`` object
+                or an iterator of byte strings can be used. They are read in chunks
+                and MACed incrementally without being loaded into memory.
         Returns:
             Union[bytes, CBORTag]: A byte string of the encoded COSE or a cbor2.CBORTag object.
         Raises:
             ValueError: Invalid arguments.
             EncodeError: Failed to encode data.
         """
-        p, u = self._encode_headers(key, protected, unprotected, False)
-        typ = self._validate_cose_message(key, p, u, recipients, [])
-        if typ != 1:
-            raise ValueError("The COSE message is not suitable for COSE MAC0/MAC.")
-        return self._encode_and_mac(payload, key, p, u, recipients, external_aad, out)
+        with self._tracer.span("cose.encode") as span:
+            p, u = self._encode_headers(key, protected, unprotected, False)
+            typ = self._validate_cose_message(key, p, u, recipients, [])
+            if typ != 1:
+                raise ValueError("The COSE message is not suitable for COSE MAC0/MAC.")
+            span.set("alg", p.get(1, u.get(1, 0)))
+            if detached_payload is not None:
+                if payload:
+                    raise ValueError("payload should be empty when detached_payload is set.")
+                content = PayloadStream(detached_payload) if is_payload_stream(detached_payload) else detached_payload
+                span.set("payload_size", _size(content))
+                return self._encode_and_mac(content, key, p, u, recipients, external_aad, out, detached=True)
+            span.set("payload_size", _size(payload))
+            return self._encode_and_mac(payload, key, p, u, recipients, external_aad, out)
 
     def encode_and_sign(
         self,
@@ -276,12 +404,14 @@ class COSE(CBORProcessor):
         signers: List[Signer] = [],
         external_aad: bytes = b"",
         out: str = "",
+        detached_payload: Optional[Any] = None,
     ) -> Union[bytes, CBORTag]:
         """
         Encodes data with signing.
 
         Args:
-            payload (bytes): A content to be signed.
+            payload (bytes): A content to be signed. It should be ``b""`` when
+                ``detached_payload`` is set.
             key (Optional[COSEKeyInterface]): A signing key for single signer
                 cases. When the ``signers`` parameter is set, this ``key`` will
                 be ignored and should not be set.
@@ -296,6 +426,12 @@ class COSE(CBORProcessor):
                 data as `cbor2 <https://cbor2.readthedocs.io/en/stable/>`_'s
                 ``CBORTag`` object. If any other value is specified, it will return
                 encoded data as bytes.
+            detached_payload (Optional[Any]): A content to be signed but not to be
+                included in the COSE message (the payload is encoded as ``nil``). In
+                addition to a byte string, a file-like object, a ``mmap.mmap`` object
+                or an iterator of byte strings can be used. They are read in chunks
+                and hashed incrementally without being loaded into memory, except
+                with EdDSA keys, which read the whole payload into memory.
         Returns:
             Union[bytes, CBORTag]: A byte string of the encoded COSE or a
                 cbor2.CBORTag object.
@@ -303,19 +439,123 @@ class COSE(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode data.
         """
-        p, u = self._encode_headers(key, protected, unprotected, False)
+        with self._tracer.span("cose.encode") as span:
+            p, u = self._encode_headers(key, protected, unprotected, False)
+            typ = self._validate_cose_message(key, p, u, [], signers)
+            if typ != 2:
+                raise ValueError("The COSE message is not suitable for COSE Sign0/Sign.")
+            span.set("alg", p.get(1, u.get(1, 0)))
+            if detached_payload is not None:
+                if payload:
+                    raise ValueError("payload should be empty when detached_payload is set.")
+                content = PayloadStream(detached_payload) if is_payload_stream(detached_payload) else detached_payload
+                span.set("payload_size", _size(content))
+                return self._encode_and_sign(content, key, p, u, signers, external_aad, out, detached=True)
+            span.set("payload_size", _size(payload))
+            return self._encode_and_sign(payload, key, p, u, signers, external_aad, out)
+
+    def prepare_signer(
+        self,
+        key: Optional[COSEKeyInterface] = None,
+        protected: Optional[dict] = None,
+        unprotected: Optional[dict] = None,
+        signers: List[Signer] = [],
+    ) -> COSEEncoder:
+        """
+        Validates and encodes the headers for signing in advance, and returns an
+        encoder which signs payloads with them. It is useful to encode many messages
+        with the same key and headers.
+
+        Args:
+            key (Optional[COSEKeyInterface]): A signing key for single signer
+                cases. When the ``signers`` parameter is set, this ``key`` will
+                be ignored and should not be set.
+            protected (Optional[dict]): Parameters that are to be cryptographically protected.
+            unprotected (Optional[dict]): Parameters that are not cryptographically protected.
+            signers (List[Signer]): A list of signer information objects for
+                multiple signer cases.
+        Returns:
+            COSEEncoder: An encoder whose :func:`encode <cwt.COSEEncoder.encode>` returns
+            the same message as :func:`encode_and_sign <cwt.COSE.encode_and_sign>`.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        p, u = self._encode_headers(key, dict(protected or {}), dict(unprotected or {}), False)
         typ = self._validate_cose_message(key, p, u, [], signers)
         if typ != 2:
             raise ValueError("The COSE message is not suitable for COSE Sign0/Sign.")
-        return self._encode_and_sign(payload, key, p, u, signers, external_aad, out)
+        return COSEEncoder(self, typ, key, p, u, signers=list(signers))
+
+    def prepare_mac(
+        self,
+        key: Optional[COSEKeyInterface] = None,
+        protected: Optional[dict] = None,
+        unprotected: Optional[dict] = None,
+        recipients: List[RecipientInterface] = [],
+    ) -> COSEEncoder:
+        """
+        Validates and encodes the headers for MAC in advance, and returns an
+        encoder which MACs payloads with them.
+
+        Args:
+            key (COSEKeyInterface): A COSE key as a MAC Authentication key.
+            protected (Optional[dict]): Parameters that are to be cryptographically protected.
+            unprotected (Optional[dict]): Parameters that are not cryptographically protected.
+            recipients (List[RecipientInterface]): A list of recipient information structures.
+        Returns:
+            COSEEncoder: An encoder whose :func:`encode <cwt.COSEEncoder.encode>` returns
+            the same message as :func:`encode_and_mac <cwt.COSE.encode_and_mac>`.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        p, u = self._encode_headers(key, dict(protected or {}), dict(unprotected or {}), False)
+        typ = self._validate_cose_message(key, p, u, recipients, [])
+        if typ != 1:
+            raise ValueError("The COSE message is not suitable for COSE MAC0/MAC.")
+        return COSEEncoder(self, typ, key, p, u, recipients=list(recipients))
+
+    def prepare_encrypter(
+        self,
+        key: Optional[COSEKeyInterface] = None,
+        protected: Optional[dict] = None,
+        unprotected: Optional[dict] = None,
+        recipients: List[RecipientInterface] = [],
+        enable_non_aead: bool = False,
+    ) -> COSEEncoder:
+        """
+        Validates and encodes the headers for encryption in advance, and returns an
+        encoder which encrypts payloads with them. A nonce is generated for each
+        message, so the unprotected header should not have an IV.
+
+        Args:
+            key (Optional[COSEKeyInterface]): A content encryption key as COSEKey.
+            protected (Optional[dict]): Parameters that are to be cryptographically protected.
+            unprotected (Optional[dict]): Parameters that are not cryptographically protected.
+            recipients (List[RecipientInterface]): A list of recipient information structures.
+            enable_non_aead (bool): Enable non-AEAD content ecnryption algorithms
+                (False = disabled by default). See :func:`encode_and_encrypt <cwt.COSE.encode_and_encrypt>`.
+        Returns:
+            COSEEncoder: An encoder whose :func:`encode <cwt.COSEEncoder.encode>` returns
+            the same message as :func:`encode_and_encrypt <cwt.COSE.encode_and_encrypt>`
+            except for the nonce.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        p, u = self._encode_headers(key, dict(protected or {}), dict(unprotected or {}), enable_non_aead)
+        typ = self._validate_cose_message(key, p, u, recipients, [])
+        if typ != 0:
+            raise ValueError("The COSE message is not suitable for COSE Encrypt0/Encrypt.")
+        if 5 in u:
+            raise ValueError("unprotected header should not have IV since it is generated for each message.")
+        return COSEEncoder(self, typ, key, p, u, recipients=list(recipients))
 
     def decode(
         self,
         data: Union[bytes, CBORTag],
-        keys: Union[COSEKeyInterface, List[COSEKeyInterface]],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
         context: Optional[Union[Dict[str, Any], List[Any]]] = None,
         external_aad: bytes = b"",
-        detached_payload: Optional[bytes] = None,
+        detached_payload: Optional[Any] = None,
         enable_non_aead: bool = False,
     ) -> bytes:
         """
@@ -324,13 +564,19 @@ class COSE(CBORProcessor):
         Args:
             data (Union[bytes, CBORTag]): A byte string or cbor2.CBORTag of an
                 encoded data.
-            keys (Union[COSEKeyInterface, List[COSEKeyInterface]]): COSE key(s)
-                to verify and decrypt the encoded data.
+            keys (Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]): COSE key(s)
+                to verify and decrypt the encoded data. A :class:`KeyRing <cwt.KeyRing>`
+                can be used to look up the keys by ``kid`` without scanning all of them.
             context (Optional[Union[Dict[str, Any], List[Any]]]): A context information
                 structure for key deriviation functions.
             external_aad(bytes): External additional authenticated data supplied by
                 application.
-            detached_payload (Optional[bytes]): The detached payload that should be verified with data.
+            detached_payload (Optional[Any]): The detached payload that should be verified with data.
+                For MAC0/MAC and Signature1/Signature messages, a file-like object, a
+                ``mmap.mmap`` object or an iterator of byte strings can also be used. It
+                is read in chunks and hashed incrementally without being loaded into
+                memory (except with EdDSA keys, which read the whole payload into
+                memory), and is returned as it is.
             enable_non_aead (bool): Enable non-AEAD content ecnryption algorithms
                 (False = disabled by default). Before enable non-AEAD ciphers,
                 read and understand Security considerations of RFC 9459 carefully.
@@ -349,10 +595,10 @@ class COSE(CBORProcessor):
     def decode_with_headers(
         self,
         data: Union[bytes, CBORTag],
-        keys: Union[COSEKeyInterface, List[COSEKeyInterface]],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
         context: Optional[Union[Dict[str, Any], List[Any]]] = None,
         external_aad: bytes = b"",
-        detached_payload: Optional[bytes] = None,
+        detached_payload: Optional[Any] = None,
         enable_non_aead: bool = False,
     ) -> Tuple[Dict[int, Any], Dict[int, Any], bytes]:
         """
@@ -361,13 +607,19 @@ class COSE(CBORProcessor):
         Args:
             data (Union[bytes, CBORTag]): A byte string or cbor2.CBORTag of an
                 encoded data.
-            keys (Union[COSEKeyInterface, List[COSEKeyInterface]]): COSE key(s)
-                to verify and decrypt the encoded data.
+            keys (Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]): COSE key(s)
+                to verify and decrypt the encoded data. A :class:`KeyRing <cwt.KeyRing>`
+                can be used to look up the keys by ``kid`` without scanning all of them.
             context (Optional[Union[Dict[str, Any], List[Any]]]): A context information
                 structure for key deriviation functions.
             external_aad(bytes): External additional authenticated data supplied by
                 application.
-            detached_payload (Optional[bytes]): The detached payload that should be verified with data.
+            detached_payload (Optional[Any]): The detached payload that should be verified with data.
+                For MAC0/MAC and Signature1/Signature messages, a file-like object, a
+                ``mmap.mmap`` object or an iterator of byte strings can also be used. It
+                is read in chunks and hashed incrementally without being loaded into
+                memory (except with EdDSA keys, which read the whole payload into
+                memory), and is returned as it is.
             enable_non_aead (bool): Enable non-AEAD content ecnryption algorithms
                 (False = disabled by default). Before enable non-AEAD ciphers,
                 read and understand Security considerations of RFC 9459 carefully.
@@ -380,42 +632,133 @@ class COSE(CBORProcessor):
             DecodeError: Failed to decode data.
             VerifyError: Failed to verify data.
         """
+        with self._tracer.span("cose.decode") as span:
+            return self._decode_with_headers(span, data, keys, context, external_aad, detached_payload, enable_non_aead)
+
+    def decode_many(
+        self,
+        data: Sequence[Union[bytes, CBORTag]],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
+        context: Optional[Union[Dict[str, Any], List[Any]]] = None,
+        external_aad: bytes = b"",
+        enable_non_aead: bool = False,
+        *,
+        workers: Optional[int] = None,
+        chunk_size: int = BATCH_DEFAULT_CHUNK_SIZE,
+    ) -> List[Union[bytes, Exception]]:
+        """
+        Verifies and decodes multiple COSE data with the same keys on a thread pool,
+        and returns the payloads. Since ``pyca/cryptography`` releases the GIL
+        during signature verification and decryption, the throughput scales with
+        the number of workers.
+
+        Args:
+            data (Sequence[Union[bytes, CBORTag]]): A list of encoded COSE data.
+            keys (Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]): COSE key(s)
+                to verify and decrypt the encoded data.
+            context (Optional[Union[Dict[str, Any], List[Any]]]): A context information
+                structure for key deriviation functions.
+            external_aad(bytes): External additional authenticated data supplied by
+                application.
+            enable_non_aead (bool): Enable non-AEAD content ecnryption algorithms
+                (False = disabled by default).
+            workers (Optional[int]): The maximum number of worker threads. If it is not
+                specified, the number of CPUs is used.
+            chunk_size (int): The number of items processed by a worker at a time
+                (default value: ``16``). A batch which is not larger than it is processed
+                on the calling thread without the thread pool.
+        Returns:
+            List[Union[bytes, Exception]]: The decoded payloads in input order. If
+            decoding an item fails, the exception (e.g., ``VerifyError``) is set in
+            place of its payload.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(keys, (list, KeyRing)):
+            if not isinstance(keys, COSEKeyInterface):
+                raise ValueError("key in keys should have COSEKeyInterface.")
+            keys = [keys]
+        return run_batch(
+            lambda d: self.decode(d, keys, context, external_aad, None, enable_non_aead),
+            data,
+            workers,
+            chunk_size,
+        )
+
+    def peek(self, data: Union[bytes, bytearray, memoryview], nested: bool = False) -> PeekedHeaders:
+        """
+        Reads the tag and the headers of encoded COSE data without verifying or
+        decrypting it, e.g., to route the message by ``kid`` or ``alg`` before
+        calling :func:`decode <cwt.COSE.decode>`. The payload, the ciphertexts and
+        the signatures are skipped without being copied or decoded, so the cost
+        does not depend on the size of the payload.
+
+        Since the headers are not authenticated yet, they should be used only as
+        hints.
+
+        Args:
+            data (Union[bytes, bytearray, memoryview]): An encoded COSE message,
+                which may be wrapped in a CWT CBOR tag (61).
+            nested (bool): Whether to read the headers of the recipients of a
+                COSE_Encrypt/COSE_Mac message and of the signatures of a COSE_Sign
+                message as well (default value: ``False``).
+        Returns:
+            PeekedHeaders: The tag, the protected headers, the unprotected headers
+            and the size of the payload.
+        Raises:
+            ValueError: Invalid COSE message format.
+            DecodeError: Failed to decode data.
+        """
+        return peek(data, nested)
+
+    def _decode_with_headers(
+        self,
+        span: Any,
+        data: Union[bytes, CBORTag],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
+        context: Optional[Union[Dict[str, Any], List[Any]]],
+        external_aad: bytes,
+        detached_payload: Optional[Any],
+        enable_non_aead: bool,
+    ) -> Tuple[Dict[int, Any], Dict[int, Any], bytes]:
         if isinstance(data, bytes):
-            data = self._loads(data)
+            with self._tracer.span("cose.parse", size=len(data)):
+                data = self._loads(data)
         if not isinstance(data, CBORTag):
             raise ValueError("Invalid COSE format.")
 
-        if not isinstance(keys, list):
+        if not isinstance(keys, (list, KeyRing)):
             if not isinstance(keys, COSEKeyInterface):
                 raise ValueError("key in keys should have COSEKeyInterface.")
             keys = [keys]
 
         if data.tag == 16:
-            keys = self._filter_by_key_ops(keys, 4)
+            op = 4
             if not isinstance(data.value, list) or len(data.value) != 3:
                 raise ValueError("Invalid Encrypt0 format.")
         elif data.tag == 96:
-            keys = self._filter_by_key_ops(keys, 4)
+            op = 4
             if not isinstance(data.value, list) or len(data.value) != 4:
                 raise ValueError("Invalid Encrypt format.")
         elif data.tag == 17:
-            keys = self._filter_by_key_ops(keys, 10)
+            op = 10
             if not isinstance(data.value, list) or len(data.value) != 4:
                 raise ValueError("Invalid MAC0 format.")
         elif data.tag == 97:
-            keys = self._filter_by_key_ops(keys, 10)
+            op = 10
             if not isinstance(data.value, list) or len(data.value) != 5:
                 raise ValueError("Invalid MAC format.")
         elif data.tag == 18:
-            keys = self._filter_by_key_ops(keys, 2)
+            op = 2
             if not isinstance(data.value, list) or len(data.value) != 4:
                 raise ValueError("Invalid Signature1 format.")
         elif data.tag == 98:
-            keys = self._filter_by_key_ops(keys, 2)
+            op = 2
             if not isinstance(data.value, list) or len(data.value) != 4:
                 raise ValueError("Invalid Signature format.")
         else:
             raise ValueError(f"Unsupported or unknown CBOR tag({data.tag}).")
+        span.set("tag", data.tag)
 
         payload = data.value[2]
         if detached_payload is not None:
@@ -424,15 +767,23 @@ class COSE(CBORProcessor):
             payload = detached_payload
         if payload is None:
             raise ValueError("detached_payload should be set.")
+        content = payload
+        if is_payload_stream(payload):
+            if data.tag not in [17, 97, 18, 98]:
+                raise ValueError("detached_payload should be bytes for Encrypt0/Encrypt.")
+            content = PayloadStream(payload)
+        span.set("payload_size", _size(content))
 
         # protected: Union[Dict[int, Any], bytes] = self._loads(data.value[0]) if data.value[0] else b""
         # unprotected = data.value[1]
         # if not isinstance(unprotected, dict):
         #     raise ValueError("unprotected header should be dict.")
-        p, u = self._decode_headers(data.value[0], data.value[1])
-        alg = p[1] if 1 in p else u.get(1, 0)
-        if enable_non_aead is False and alg in COSE_ALGORITHMS_CEK_NON_AEAD.values():
-            raise ValueError(f"Deprecated non-AEAD algorithm: {alg}.")
+        with self._tracer.span("cose.headers"):
+            p, u = self._decode_headers(data.value[0], data.value[1])
+            alg = p[1] if 1 in p else u.get(1, 0)
+            if enable_non_aead is False and alg in COSE_ALGORITHMS_CEK_NON_AEAD.values():
+                raise ValueError(f"Deprecated non-AEAD algorithm: {alg}.")
+        span.set("alg", alg)
 
         # Local variable `protected` is byte encoded protected header
         # Sender is allowed to encode empty protected header into a bstr-wrapped zero-length map << {} >> (0x40A0)
@@ -444,99 +795,86 @@ class COSE(CBORProcessor):
         # Encrypt0
         if data.tag == 16:
             kid = self._get_kid(p, u)
-            aad = self._dumps(["Encrypt0", protected, external_aad])
+            aad = enc_structure("Encrypt0", protected, external_aad)
             nonce = u.get(5, None)
-            if kid:
-                for _, k in enumerate(keys):
-                    if k.kid != kid:
-                        continue
-                    try:
-                        if not isinstance(p, bytes) and alg in COSE_ALGORITHMS_HPKE.values():  # HPKE
-                            hpke = HPKE(p, u, payload)
-                            res = hpke.decode(k, aad)
-                            if not isinstance(res, bytes):
-                                raise TypeError("Internal type error.")
-                            return p, u, res
-                        return p, u, k.decrypt(payload, nonce, aad)
-                    except Exception as e:
-                        err = e
-                raise err
-            for _, k in enumerate(keys):
-                try:
-                    return p, u, k.decrypt(payload, nonce, aad)
-                except Exception as e:
-                    err = e
-            raise err
+
+            def decrypt(k: COSEKeyInterface) -> bytes:
+                if kid and not isinstance(p, bytes) and alg in COSE_ALGORITHMS_HPKE.values():  # HPKE
+                    hpke = HPKE(p, u, payload)
+                    res = hpke.decode(k, aad)
+                    if not isinstance(res, bytes):
+                        raise TypeError("Internal type error.")
+                    return res
+                return k.decrypt(payload, nonce, aad)
+
+            with self._tracer.span("cose.crypto", alg=alg) as cs:
+                cands = self._lookup_keys(keys, op, kid, alg)
+                i, res, tried = self._run_trials(decrypt, cands, cs)
+                if i < 0:
+                    self._record(keys, None, tried)
+                    raise res or err
+                self._record(keys, cands[i], tried)
+                return p, u, res
 
         # Encrypt
         if data.tag == 96:
             rs = Recipients.from_list(data.value[3], self._verify_kid, context)
             nonce = u.get(5, b"")
-            enc_key = rs.derive_key(keys, alg, external_aad, "Enc_Recipient")
-            aad = self._dumps(["Encrypt", data.value[0], external_aad])
-            return p, u, enc_key.decrypt(payload, nonce, aad)
+            with self._tracer.span("cose.recipients", alg=alg, recipients=len(data.value[3])):
+                enc_key = rs.derive_key(keys, alg, external_aad, "Enc_Recipient", self._trial_workers, op)
+            aad = enc_structure("Encrypt", data.value[0], external_aad)
+            with self._tracer.span("cose.crypto", alg=alg, keys_tried=1):
+                return p, u, enc_key.decrypt(payload, nonce, aad)
 
         # MAC0
         if data.tag == 17:
             kid = self._get_kid(p, u)
-            msg = self._dumps(["MAC0", protected, external_aad, payload])
-            if kid:
-                for _, k in enumerate(keys):
-                    if k.kid != kid:
-                        continue
-                    try:
-                        k.verify(msg, data.value[3])
-                        return p, u, payload
-                    except Exception as e:
-                        err = e
-                raise err
-            for _, k in enumerate(keys):
-                try:
-                    k.verify(msg, data.value[3])
-                    return p, u, payload
-                except Exception as e:
-                    err = e
-            raise err
+            msg = to_be_signed("MAC0", [protected, external_aad], content)
+            with self._tracer.span("cose.crypto", alg=alg) as cs:
+                cands = self._lookup_keys(keys, op, kid, alg)
+                i, res, tried = self._run_trials(lambda k: k.verify_chunks(msg, data.value[3]), cands, cs, content)
+                if i < 0:
+                    self._record(keys, None, tried)
+                    raise res or err
+                self._record(keys, cands[i], tried)
+                return p, u, payload
 
         # MAC
         if data.tag == 97:
-            to_be_maced = self._dumps(["MAC", protected, external_aad, payload])
+            to_be_maced = to_be_signed("MAC", [protected, external_aad], content)
             rs = Recipients.from_list(data.value[4], self._verify_kid, context)
-            mac_auth_key = rs.derive_key(keys, alg, external_aad, "Mac_Recipient")
-            mac_auth_key.verify(to_be_maced, data.value[3])
+            with self._tracer.span("cose.recipients", alg=alg, recipients=len(data.value[4])):
+                mac_auth_key = rs.derive_key(keys, alg, external_aad, "Mac_Recipient", self._trial_workers, op)
+            with self._tracer.span("cose.crypto", alg=alg, keys_tried=1):
+                mac_auth_key.verify_chunks(to_be_maced, data.value[3])
             return p, u, payload
 
         # Signature1
         if data.tag == 18:
             kid = self._get_kid(p, u)
-            to_be_signed = self._dumps(["Signature1", protected, external_aad, payload])
-            if kid:
-                for _, k in enumerate(keys):
-                    if k.kid != kid:
-                        continue
-                    try:
-                        if self._ca_certs:
-                            k.validate_certificate(self._ca_certs)
-                        k.verify(to_be_signed, data.value[3])
-                        return p, u, payload
-                    except Exception as e:
-                        err = e
-                raise err
-            for _, k in enumerate(keys):
-                try:
-                    if self._ca_certs:
-                        k.validate_certificate(self._ca_certs)
-                    k.verify(to_be_signed, data.value[3])
-                    return p, u, payload
-                except Exception as e:
-                    err = e
-            raise err
+            tbs = to_be_signed("Signature1", [protected, external_aad], content)
+
+            def verify(k: COSEKeyInterface):
+                if self._trust_store:
+                    with self._tracer.span("cose.cert_validation", alg=alg):
+                        k.validate_certificate(self._trust_store.validator)
+                k.verify_chunks(tbs, data.value[3])
+
+            with self._tracer.span("cose.crypto", alg=alg) as cs:
+                cands = self._lookup_keys(keys, op, kid, alg)
+                i, res, tried = self._run_trials(verify, cands, cs, content)
+                if i < 0:
+                    self._record(keys, None, tried)
+                    raise res or err
+                self._record(keys, cands[i], tried)
+                return p, u, payload
 
         # Signature
         # if data.tag == 98:
         sigs = data.value[3]
         if not isinstance(sigs, list):
             raise ValueError("Invalid Signature format.")
+        tried = 0
         for sig in sigs:
             if not isinstance(sig, list) or len(sig) != 3:
                 raise ValueError("Invalid Signature format.")
@@ -546,40 +884,18 @@ class COSE(CBORProcessor):
             if not isinstance(su, dict):
                 raise ValueError("unprotected header in signature structure should be dict.")
             kid = self._get_kid(sp, su)
-            if kid:
-                for _, k in enumerate(keys):
-                    if k.kid != kid:
-                        continue
+            s_alg = self._get_alg(sp) or su.get(1, 0)
+            with self._tracer.span("cose.crypto", alg=s_alg) as cs:
+                for i, k in enumerate(self._lookup_keys(keys, op, kid, s_alg), 1):
+                    cs.set("keys_tried", i)
+                    tried += 1
                     try:
-                        to_be_signed = self._dumps(
-                            [
-                                "Signature",
-                                protected,
-                                sig[0],
-                                external_aad,
-                                payload,
-                            ]
-                        )
-                        k.verify(to_be_signed, sig[2])
+                        k.verify_chunks(to_be_signed("Signature", [protected, sig[0], external_aad], content), sig[2])
+                        self._record(keys, k, tried)
                         return p, u, payload
                     except Exception as e:
                         err = e
-                continue
-            for _, k in enumerate(keys):
-                try:
-                    to_be_signed = self._dumps(
-                        [
-                            "Signature",
-                            protected,
-                            sig[0],
-                            external_aad,
-                            payload,
-                        ]
-                    )
-                    k.verify(to_be_signed, sig[2])
-                    return p, u, payload
-                except Exception as e:
-                    err = e
+        self._record(keys, None, tried)
         raise err
 
     def _encode_headers(
@@ -615,6 +931,13 @@ class COSE(CBORProcessor):
                 raise ValueError("protected header MUST be zero-length")
         return p, u
 
+    def _encode_protected(self, p: Dict[int, Any]) -> bytes:
+        if not p:
+            return b""
+        if self._deterministic_header:
+            return encode_deterministic_header(p)
+        return self._dumps(p)
+
     def _decode_headers(self, protected: Any, unprotected: Any) -> Tuple[Dict[int, Any], Dict[int, Any]]:
         p: Union[Dict[int, Any], bytes]
         p = self._loads(protected) if protected else {}
@@ -754,13 +1077,12 @@ class COSE(CBORProcessor):
         external_aad: bytes,
         out: str,
     ) -> bytes:
-        b_protected = self._dumps(p) if p else b""
+        b_protected = self._encode_protected(p)
         ciphertext: bytes = b""
 
         # Encrypt0
         if len(recipients) == 0:
-            enc_structure = ["Encrypt0", b_protected, external_aad]
-            aad = self._dumps(enc_structure)
+            aad = enc_structure("Encrypt0", b_protected, external_aad)
             if 1 in p and p[1] in COSE_ALGORITHMS_HPKE.values():  # HPKE
                 hpke = HPKE(p, u, recipient_key=key)
                 encoded, _ = hpke.encode(payload, aad)
@@ -785,7 +1107,7 @@ class COSE(CBORProcessor):
         b_key = key.to_bytes() if isinstance(key, COSEKeyInterface) else b""
         cek: Optional[COSEKeyInterface] = None
         for rec in recipients:
-            aad = self._dumps(["Enc_Recipient", self._dumps(rec.protected) if len(rec.protected) > 0 else b"", external_aad])
+            aad = enc_structure("Enc_Recipient", self._dumps(rec.protected) if len(rec.protected) > 0 else b"", external_aad)
             encoded, derived_key = rec.encode(b_key, aad)
             cek = derived_key if derived_key else key
             recs.append(encoded)
@@ -797,8 +1119,7 @@ class COSE(CBORProcessor):
                 u[5] = cek.generate_nonce()
             except NotImplementedError:
                 raise ValueError("Nonce generation is not supported for the key. Set a nonce explicitly.")
-        enc_structure = ["Encrypt", b_protected, external_aad]
-        aad = self._dumps(enc_structure)
+        aad = enc_structure("Encrypt", b_protected, external_aad)
         ciphertext = cek.encrypt(payload, u[5], aad)
         cose_enc: List[Any] = [b_protected, u, ciphertext]
         cose_enc.append(recs)
@@ -807,84 +1128,100 @@ class COSE(CBORProcessor):
 
     def _encode_and_mac(
         self,
-        payload: bytes,
+        payload: Any,
         key: Optional[COSEKeyInterface],
         p: Dict[int, Any],
         u: Dict[int, Any],
         recipients: List[RecipientInterface],
         external_aad: bytes,
         out: str,
+        detached: bool = False,
     ) -> Union[bytes, CBORTag]:
-        b_protected = self._dumps(p) if p else b""
+        b_protected = self._encode_protected(p)
+        content = None if detached else payload
 
         # MAC0
         if len(recipients) == 0:
             if key is None:
                 raise ValueError("key should be set.")
-            mac_structure = ["MAC0", b_protected, external_aad, payload]
-            tag = key.sign(self._dumps(mac_structure))
-            res = CBORTag(17, [b_protected, u, payload, tag])
+            tag = key.sign_chunks(to_be_signed("MAC0", [b_protected, external_aad], payload))
+            res = CBORTag(17, [b_protected, u, content, tag])
             return res if out == "cbor2/CBORTag" else self._dumps(res)
 
         # MAC
         if recipients[0].alg not in COSE_ALGORITHMS_RECIPIENT.values():
             raise NotImplementedError("Algorithms other than direct are not supported for recipients.")
 
-        mac_structure = ["MAC", b_protected, external_aad, payload]
-
         recs = []
         b_key = key.to_bytes() if isinstance(key, COSEKeyInterface) else b""
         for rec in recipients:
-            aad = self._dumps(["Mac_Recipient", self._dumps(rec.protected), external_aad])
+            aad = enc_structure("Mac_Recipient", self._dumps(rec.protected), external_aad)
             encoded, derived_key = rec.encode(b_key, aad)
             key = derived_key if derived_key else key
             recs.append(encoded)
 
         if key is None:
             raise ValueError("key should be set.")
-        tag = key.sign(self._dumps(mac_structure))
-        cose_mac: List[Any] = [b_protected, u, payload, tag]
+        tag = key.sign_chunks(to_be_signed("MAC", [b_protected, external_aad], payload))
+        cose_mac: List[Any] = [b_protected, u, content, tag]
         cose_mac.append(recs)
         res = CBORTag(97, cose_mac)
         return res if out == "cbor2/CBORTag" else self._dumps(res)
 
     def _encode_and_sign(
         self,
-        payload: bytes,
+        payload: Any,
         key: Optional[COSEKeyInterface],
         p: Dict[int, Any],
         u: Dict[int, Any],
         signers: List[Signer],
         external_aad: bytes,
         out: str,
+        detached: bool = False,
     ) -> Union[bytes, CBORTag]:
-        b_protected = self._dumps(p) if p else b""
+        b_protected = self._encode_protected(p)
+        content = None if detached else payload
 
         # Signature1
         if not signers and key is not None:
-            sig_structure = ["Signature1", b_protected, external_aad, payload]
-            sig = key.sign(self._dumps(sig_structure))
-            res = CBORTag(18, [b_protected, u, payload, sig])
+            sig = key.sign_chunks(to_be_signed("Signature1", [b_protected, external_aad], payload))
+            res = CBORTag(18, [b_protected, u, content, sig])
             return res if out == "cbor2/CBORTag" else self._dumps(res)
 
         # Signature
         sigs = []
         for s in signers:
-            sig_structure = ["Signature", b_protected, s.protected, external_aad, payload]
-            s.sign(self._dumps(sig_structure))
+            s.sign_chunks(to_be_signed("Signature", [b_protected, s.protected, external_aad], payload))
             sigs.append([s.protected, s.unprotected, s.signature])
-        res = CBORTag(98, [b_protected, u, payload, sigs])
+        res = CBORTag(98, [b_protected, u, content, sigs])
         return res if out == "cbor2/CBORTag" else self._dumps(res)
 
-    def _filter_by_key_ops(self, keys: List[COSEKeyInterface], op: int) -> List[COSEKeyInterface]:
-        res: List[COSEKeyInterface] = []
-        for k in keys:
-            if op in k.key_ops:
-                res.append(k)
-        if len(res) == 0:
-            res = keys
+    def _lookup_keys(
+        self,
+        keys: Union[List[COSEKeyInterface], KeyRing],
+        op: int,
+        kid: bytes,
+        alg: int,
+    ) -> Sequence[COSEKeyInterface]:
+        with self._tracer.span("cose.key_lookup", kid=kid, alg=alg) as span:
+            res = find_keys(keys, kid, op, alg)
+            span.set("keys", len(res))
         return res
 
+    def _run_trials(
+        self, trial: Callable[[COSEKeyInterface], Any], cands: Sequence[COSEKeyInterface], span: Any, content: Any = b""
+    ) -> Tuple[int, Any, int]:
+        # A payload stream cannot be read by several threads at once.
+        workers = 1 if isinstance(content, PayloadStream) else self._trial_workers
+        i, res, tried = run_trials(trial, cands, workers)
+        if tried:
+            span.set("keys_tried", tried)
+        return i, res, tried
+
+    def _record(self, keys: Union[List[COSEKeyInterface], KeyRing], key: Optional[COSEKeyInterface], attempts: int):
+        if isinstance(keys, KeyRing) and keys.adaptive:
+            keys.record(key, attempts)
+
     def _get_alg(self, protected: Any) -> int:
         return protected[1] if isinstance(protected, dict) and 1 in protected else 0
 
@@ -1,6 +1,7 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 from .cbor_processor import CBORProcessor
+from .cert_validator import CertValidator
 from .const import (
     COSE_KEY_OPERATION_VALUES,
     COSE_KEY_TYPES,
@@ -13,6 +14,8 @@ class COSEKeyInterface(CBORProcessor):
     The interface class for a COSE Key used for MAC, signing/verifying and encryption/decryption.
     """
 
+    __slots__ = ("_kty", "_kid", "_alg", "_key_ops", "_base_iv")
+
     def __init__(self, params: Dict[int, Any]):
         """
         Constructor.
@@ -185,17 +188,60 @@ class COSEKeyInterface(CBORProcessor):
         """
         raise NotImplementedError
 
-    def validate_certificate(self, ca_certs: List[bytes]) -> bool:
+    def sign_chunks(self, chunks: Iterable[Any]) -> bytes:
+        """
+        Returns a digital signature (or a MAC) for the message given as
+        a sequence of byte strings. Keys which support incremental hashing
+        (HMAC, ECDSA and RSA keys) process the byte strings one by one without
+        concatenating them. Otherwise (e.g., EdDSA keys, since Ed25519 and
+        Ed448 hash the message twice), the whole message is read into memory,
+        concatenated and passed to :func:`sign`.
+
+        Args:
+            chunks (Iterable[Any]): The byte strings (``bytes``, ``bytearray``
+                or ``memoryview``) of a message to be signed.
+        Returns:
+            bytes: The digital signature.
+        Raises:
+            NotImplementedError: Not implemented.
+            ValueError: Invalid arguments.
+            EncodeError: Failed to sign the message.
+        """
+        return self.sign(b"".join(chunks))
+
+    def verify_chunks(self, chunks: Iterable[Any], sig: bytes):
+        """
+        Verifies that the specified digital signature (or MAC) is valid
+        for the message given as a sequence of byte strings. Keys which
+        support incremental hashing (HMAC, ECDSA and RSA keys) process the
+        byte strings one by one without concatenating them. Otherwise (e.g.,
+        EdDSA keys), the whole message is read into memory, concatenated and
+        passed to :func:`verify`.
+
+        Args:
+            chunks (Iterable[Any]): The byte strings (``bytes``, ``bytearray``
+                or ``memoryview``) of a message to be verified.
+            sig (bytes): A digital signature of the message.
+        Raises:
+            NotImplementedError: Not implemented.
+            ValueError: Invalid arguments.
+            VerifyError: Failed to verify.
+        """
+        self.verify(b"".join(chunks), sig)
+        return
+
+    def validate_certificate(self, ca_certs: Union[List[bytes], CertValidator]) -> bool:
         """
         Validate a certificate bound to the key with given trusted CA
         certificates if the key has `x5c` parameter.
 
         Args:
-            ca_certs(List[bytes]): A list of DER-formatted trusted root CA
-                certificates which contains a concatenated list of trusted root
-                certificates. You should specify private CA certificates in your
-                target system. There should be no need to use the public CA
-                certificates for the Web PKI.
+            ca_certs(Union[List[bytes], CertValidator]): A list of DER-formatted
+                trusted root CA certificates which contains a concatenated list of
+                trusted root certificates, or a :class:`CertValidator <cwt.CertValidator>`
+                which caches the validation results. You should specify private CA
+                certificates in your target system. There should be no need to use
+                the public CA certificates for the Web PKI.
         Returns:
             bool: The indicator whether the validation is done or not.
         Raises:
@@ -0,0 +1,294 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from cbor2 import CBORTag, loads
+
+from .exceptions import DecodeError
+
+# Items of at least this size are decoded by split_message() and loads_large()
+# without cbor2, which reads large byte strings and text strings slowly.
+LARGE_ITEM_SIZE = 65536  # 64 KiB
+
+# tag -> (message type, the number of items)
+_MESSAGE_TYPES = {
+    16: ("Encrypt0", 3),
+    96: ("Encrypt", 4),
+    17: ("MAC0", 4),
+    97: ("MAC", 5),
+    18: ("Signature1", 4),
+    98: ("Signature", 4),
+}
+
+
+class PeekedHeaders(NamedTuple):
+    """
+    The headers of a COSE message returned by :func:`COSE.peek <cwt.COSE.peek>`.
+    """
+
+    #: The CBOR tag of the message (e.g., ``18`` for COSE_Sign1). It is ``0``
+    #: for a recipient or a signature.
+    tag: int
+    #: The protected headers.
+    protected: Dict[int, Any]
+    #: The unprotected headers.
+    unprotected: Dict[int, Any]
+    #: The size of the payload (or the ciphertext) in bytes. It is ``None``
+    #: for a detached payload and for a signature.
+    payload_size: Optional[int]
+    #: The headers of the recipients of a COSE_Encrypt/COSE_Mac message
+    #: (or of a recipient), if requested.
+    recipients: Tuple["PeekedHeaders", ...] = ()
+    #: The headers of the signatures of a COSE_Sign message, if requested.
+    signatures: Tuple["PeekedHeaders", ...] = ()
+
+    @property
+    def kid(self) -> bytes:
+        """
+        The ``kid`` in the protected headers, or in the unprotected headers.
+        It is empty if not found.
+        """
+        kid = self.protected.get(4, self.unprotected.get(4, b""))
+        return kid if isinstance(kid, bytes) else b""
+
+    @property
+    def alg(self) -> int:
+        """
+        The ``alg`` in the protected headers, or in the unprotected headers.
+        It is ``0`` if not found.
+        """
+        alg = self.protected.get(1, self.unprotected.get(1, 0))
+        return alg if isinstance(alg, int) else 0
+
+
+def peek(data: Union[bytes, bytearray, memoryview], nested: bool = False) -> PeekedHeaders:
+    """
+    Parses only the tag and the headers of a COSE message (optionally wrapped
+    in a CWT tag). The payload, the signatures and the ciphertexts are skipped
+    by their lengths without being copied or decoded.
+    """
+    mv = _view(data)
+    try:
+        pos = 0
+        tag = 0
+        while True:
+            major, arg, p = _head(mv, pos)
+            if major != 6:
+                break
+            pos = p
+            if arg != 61:  # Not a CWT tag.
+                tag = arg
+                break
+        if tag == 0:
+            raise ValueError("Invalid COSE format.")
+        if tag not in _MESSAGE_TYPES:
+            raise ValueError(f"Unsupported or unknown CBOR tag({tag}).")
+        name, n = _MESSAGE_TYPES[tag]
+        major, arg, pos = _head(mv, pos)
+        if major != 4 or arg != n:
+            raise ValueError(f"Invalid {name} format.")
+
+        protected, unprotected, pos = _headers(mv, pos)
+        payload_size, pos = _payload(mv, pos)
+        res = PeekedHeaders(tag, protected, unprotected, payload_size)
+        if not nested or tag not in [96, 97, 98]:
+            return res
+        if tag == 97:
+            pos = _skip(mv, pos)  # tag
+        if tag == 98:
+            return res._replace(signatures=_list(mv, pos, False)[0])
+        return res._replace(recipients=_list(mv, pos, True)[0])
+    except (DecodeError, ValueError):
+        raise
+    except Exception as err:
+        raise DecodeError("Failed to decode.") from err
+
+
+def split_message(data: Any, untag: bool = False) -> Optional[CBORTag]:
+    """
+    Splits an encoded COSE message into its fields in a single pass. The result
+    is the same as ``cbor2.loads(data)`` except that the payload of a MAC or
+    signed message is a memoryview of ``data``, so that it can be verified and
+    decoded without being copied.
+
+    ``None`` is returned if the data is not a COSE message encoded in this way
+    (e.g., with an unknown tag or trailing bytes). Such data should be decoded
+    with cbor2, which reports the error if any.
+
+    Args:
+        data (Any): The encoded COSE message.
+        untag (bool): Whether to remove a CWT tag (61) wrapping the message.
+    Returns:
+        Optional[CBORTag]: The COSE message, or ``None``.
+    """
+    try:
+        mv = _view(data)
+        major, tag, pos = _head(mv, 0)
+        if major == 6 and tag == 61 and untag:
+            major, tag, pos = _head(mv, pos)
+        if major != 6 or tag not in _MESSAGE_TYPES:
+            return None
+        major, n, pos = _head(mv, pos)
+        if major != 4 or n != _MESSAGE_TYPES[tag][1]:
+            return None
+        fields: List[Any] = []
+        for i in range(n):
+            major, arg, p = _head(mv, pos)
+            end = _skip(mv, pos)
+            if major != 2 or arg == -1:
+                fields.append(_decode(mv, pos)[0])
+            elif i == 2 and tag in [17, 97, 18, 98]:
+                fields.append(mv[p:end])
+            else:
+                fields.append(bytes(mv[p:end]))
+            pos = end
+        if pos != len(mv):
+            return None
+        return CBORTag(tag, fields)
+    except Exception:
+        return None
+
+
+def loads_large(data: Any) -> Any:
+    """
+    Decodes CBOR data in the same way as ``cbor2.loads(data)`` except that the
+    byte strings and the text strings of at least ``LARGE_ITEM_SIZE`` bytes are
+    copied out of ``data`` at once. cbor2 reads such strings in chunks, which
+    takes time superlinear in their length.
+    """
+    try:
+        return _decode(_view(data), 0)[0]
+    except Exception:
+        # e.g., shared values which cannot be decoded separately.
+        return loads(data)
+
+
+def _view(data: Any) -> memoryview:
+    mv = memoryview(data)
+    if mv.ndim != 1 or mv.itemsize != 1:
+        mv = mv.cast("B")
+    return mv
+
+
+def _decode(mv: memoryview, pos: int) -> Tuple[Any, int]:
+    end = _skip(mv, pos)
+    major, arg, p = _head(mv, pos)
+    if end - pos < LARGE_ITEM_SIZE or arg == -1:
+        return loads(mv[pos:end]), end
+    if major == 2:
+        return bytes(mv[p:end]), end
+    if major == 3:
+        return str(mv[p:end], "utf-8"), end
+    if major == 4:
+        items = []
+        for _ in range(arg):
+            v, p = _decode(mv, p)
+            items.append(v)
+        return items, end
+    if major == 5:
+        d = {}
+        for _ in range(arg):
+            if mv[p] >> 5 > 3:  # A key which cbor2 decodes as an immutable value.
+                raise ValueError("Unsupported map key.")
+            k, p = _decode(mv, p)
+            d[k], p = _decode(mv, p)
+        return d, end
+    if major == 6 and (arg == 61 or arg in _MESSAGE_TYPES):
+        return CBORTag(arg, _decode(mv, p)[0]), end
+    return loads(mv[pos:end]), end
+
+
+def _head(mv: memoryview, pos: int) -> Tuple[int, int, int]:
+    # Returns the major type, the argument (-1 for an indefinite length) and the next position.
+    ib = mv[pos]
+    major, ai = ib >> 5, ib & 0x1F
+    pos += 1
+    if ai < 24:
+        return major, ai, pos
+    if ai <= 27:
+        n = 1 << (ai - 24)
+        if pos + n > len(mv):
+            raise DecodeError("Failed to decode.")
+        return major, int.from_bytes(mv[pos : pos + n], "big"), pos + n
+    if ai == 31 and major in [2, 3, 4, 5]:
+        return major, -1, pos
+    raise DecodeError("Failed to decode.")
+
+
+def _skip(mv: memoryview, pos: int) -> int:
+    major, arg, pos = _head(mv, pos)
+    if major in [0, 1, 7]:
+        return pos
+    if major == 6:
+        return _skip(mv, pos)
+    if arg == -1:
+        while mv[pos] != 0xFF:
+            pos = _skip(mv, pos)
+        return pos + 1
+    if major in [2, 3]:
+        if pos + arg > len(mv):
+            raise DecodeError("Failed to decode.")
+        return pos + arg
+    for _ in range(arg * 2 if major == 5 else arg):
+        pos = _skip(mv, pos)
+    return pos
+
+
+def _headers(mv: memoryview, pos: int) -> Tuple[Dict[int, Any], Dict[int, Any], int]:
+    major, arg, p = _head(mv, pos)
+    if major != 2 or arg == -1:
+        raise ValueError("Invalid protected header.")
+    if p + arg > len(mv):
+        raise DecodeError("Failed to decode.")
+    protected = loads(mv[p : p + arg]) if arg else {}
+    if protected == b"":
+        protected = {}
+    if not isinstance(protected, dict):
+        raise ValueError("Invalid protected header.")
+    pos = _skip(mv, p + arg)
+    unprotected = loads(mv[p + arg : pos])
+    if not isinstance(unprotected, dict):
+        raise ValueError("unprotected header should be dict.")
+    return protected, unprotected, pos
+
+
+def _payload(mv: memoryview, pos: int) -> Tuple[Optional[int], int]:
+    if mv[pos] == 0xF6:  # null
+        return None, pos + 1
+    major, arg, p = _head(mv, pos)
+    if major != 2:
+        raise ValueError("Invalid payload.")
+    if arg != -1:
+        if p + arg > len(mv):
+            raise DecodeError("Failed to decode.")
+        return arg, p + arg
+    size = 0
+    while mv[p] != 0xFF:
+        _, arg, p = _head(mv, p)
+        if p + arg > len(mv):
+            raise DecodeError("Failed to decode.")
+        size += arg
+        p += arg
+    return size, p + 1
+
+
+def _list(mv: memoryview, pos: int, recipients: bool) -> Tuple[Tuple[PeekedHeaders, ...], int]:
+    major, n, pos = _head(mv, pos)
+    if major != 4 or n == -1:
+        raise ValueError("Invalid recipients." if recipients else "Invalid Signature format.")
+    res: List[PeekedHeaders] = []
+    for _ in range(n):
+        major, arg, pos = _head(mv, pos)
+        if recipients and (major != 4 or arg not in [3, 4]):
+            raise ValueError("Invalid recipient format.")
+        if not recipients and (major != 4 or arg != 3):
+            raise ValueError("Invalid Signature format.")
+        p, u, pos = _headers(mv, pos)
+        if recipients:
+            size, pos = _payload(mv, pos)
+            nested: Tuple[PeekedHeaders, ...] = ()
+            if arg == 4:
+                nested, pos = _list(mv, pos, True)
+            res.append(PeekedHeaders(0, p, u, size, recipients=nested))
+        else:
+            pos = _skip(mv, pos)
+            res.append(PeekedHeaders(0, p, u, None))
+    return tuple(res), pos
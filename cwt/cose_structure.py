@@ -0,0 +1,275 @@
+import mmap
+from collections.abc import Iterator
+from typing import Any, Iterable, List, Union
+
+from cbor2 import CBORTag, dumps
+
+from .exceptions import EncodeError
+
+ByteString = Union[bytes, bytearray, memoryview]
+
+STREAM_CHUNK_SIZE = 65536  # 64 KiB
+STREAM_SPOOL_MAX_SIZE = 1048576  # 1 MiB
+# Byte strings shorter than this are copied into the neighboring chunks by message_chunks().
+INLINE_MAX_SIZE = 1024  # 1 KiB
+
+
+def cbor_head(major_type: int, length: int) -> bytes:
+    """
+    Encodes the initial byte(s) of a CBOR data item of the major type with the length.
+    """
+    mt = major_type << 5
+    if length < 24:
+        return bytes([mt | length])
+    if length < 0x100:
+        return bytes([mt | 24, length])
+    if length < 0x10000:
+        return bytes([mt | 25]) + length.to_bytes(2, "big")
+    if length < 0x100000000:
+        return bytes([mt | 26]) + length.to_bytes(4, "big")
+    return bytes([mt | 27]) + length.to_bytes(8, "big")
+
+
+def _dumps(v: Any) -> bytes:
+    try:
+        return dumps(v)
+    except Exception as err:
+        raise EncodeError("Failed to encode.") from err
+
+
+def message_chunks(message: CBORTag) -> List[ByteString]:
+    """
+    Encodes a COSE message built as a ``CBORTag`` object into byte strings to be
+    concatenated, which are the same as ``cbor2.dumps(message)``. The message may
+    be wrapped by other tags (e.g., the CWT tag). The byte string fields of the
+    message (e.g., the payload) are not copied unless they are shorter than
+    ``INLINE_MAX_SIZE``, and the other fields are encoded with cbor2. A message
+    without such byte strings is returned as one byte string.
+
+    Args:
+        message (CBORTag): A COSE message whose value is a list of the fields.
+    Returns:
+        List[ByteString]: The byte strings of the encoded message.
+    Raises:
+        EncodeError: Failed to encode the fields.
+    """
+    head = b""
+    inner = message
+    while isinstance(inner.value, CBORTag):
+        head += cbor_head(6, inner.tag)
+        inner = inner.value
+    for v in inner.value:
+        if isinstance(v, bytes) and len(v) >= INLINE_MAX_SIZE:
+            break
+    else:
+        # cbor2 encodes small messages at once faster than they are split.
+        return [_dumps(message)]
+    head += cbor_head(6, inner.tag) + cbor_head(4, len(inner.value))
+    res: List[ByteString] = []
+    for v in inner.value:
+        if not isinstance(v, bytes):
+            head += _dumps(v)
+        elif len(v) < INLINE_MAX_SIZE:
+            head += cbor_head(2, len(v)) + v
+        else:
+            res.append(head + cbor_head(2, len(v)))
+            res.append(v)
+            head = b""
+    if head:
+        res.append(head)
+    return res
+
+
+def write_chunks(buffer: bytearray, offset: int, chunks: List[ByteString]) -> int:
+    """
+    Writes byte strings into a buffer in order from the offset. The buffer is
+    extended if it is too short, and the bytes after the written ones are left
+    as they are, so that a buffer can be reused without being reallocated.
+
+    Args:
+        buffer (bytearray): The buffer to be written.
+        offset (int): The position in the buffer to start writing at.
+        chunks (List[ByteString]): The byte strings to be written.
+    Returns:
+        int: The number of bytes written.
+    Raises:
+        ValueError: Invalid arguments.
+    """
+    if not isinstance(buffer, bytearray):
+        raise ValueError("buffer should be bytearray.")
+    if isinstance(offset, bool) or not isinstance(offset, int) or not 0 <= offset <= len(buffer):
+        raise ValueError("offset should be int between 0 and the length of the buffer.")
+    end = offset
+    for c in chunks:
+        end += len(c)
+    if end > len(buffer):
+        buffer.extend(bytes(end - len(buffer)))
+    # Assigning to slices of a memoryview is faster than to the ones of a bytearray.
+    with memoryview(buffer) as view:
+        pos = offset
+        for c in chunks:
+            n = pos + len(c)
+            view[pos:n] = c
+            pos = n
+    return end - offset
+
+
+def _encode_item(v: Any) -> bytes:
+    if isinstance(v, bytes):
+        return cbor_head(2, len(v)) + v
+    if isinstance(v, str):
+        b = v.encode("utf-8")
+        return cbor_head(3, len(b)) + b
+    return _dumps(v)
+
+
+class PayloadStream:
+    """
+    A detached payload which is read in chunks instead of being loaded into
+    memory. It can be iterated over more than once, and each iteration yields
+    the payload from the beginning, so that it can be verified with several
+    candidate keys.
+
+    A file-like object is read from its current position. If it is not seekable,
+    or the payload is given as an iterator of byte strings, the payload is spooled
+    into a temporary file (kept in memory up to ``STREAM_SPOOL_MAX_SIZE`` bytes)
+    on first use because the length of the payload has to be known before hashing it.
+
+    Only the keys which support incremental hashing (HMAC, ECDSA and RSA keys)
+    read the payload in chunks. EdDSA keys read the whole payload into memory
+    since Ed25519 and Ed448 cannot sign or verify a message incrementally.
+    """
+
+    def __init__(self, source: Any, chunk_size: int = STREAM_CHUNK_SIZE):
+        self._source = source
+        self._chunk_size = chunk_size
+        self._file: Any = None
+        self._start = 0
+        self._length = -1
+
+    def __len__(self) -> int:
+        if self._length < 0:
+            self._open()
+        return self._length
+
+    def __iter__(self) -> Iterator:
+        if self._length < 0:
+            self._open()
+        if isinstance(self._source, mmap.mmap):
+            for i in range(0, self._length, self._chunk_size):
+                yield self._source[i : i + self._chunk_size]
+            return
+        self._file.seek(self._start)
+        remaining = self._length
+        while remaining > 0:
+            chunk = self._file.read(min(self._chunk_size, remaining))
+            if not chunk:
+                raise ValueError("detached_payload has been truncated while reading.")
+            remaining -= len(chunk)
+            yield chunk
+
+    def _open(self):
+        if isinstance(self._source, mmap.mmap):
+            self._length = len(self._source)
+            return
+        if hasattr(self._source, "read") and self._is_seekable(self._source):
+            self._file = self._source
+            self._start = self._source.tell()
+            self._length = self._source.seek(0, 2) - self._start
+            return
+        chunks: Iterable[Any] = self._source
+        if hasattr(self._source, "read"):
+            chunks = iter(lambda: self._source.read(self._chunk_size), b"")
+        # tempfile is imported on first use to keep ``import cwt`` fast.
+        import tempfile
+
+        self._file = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MAX_SIZE)
+        length = 0
+        for c in chunks:
+            if not isinstance(c, (bytes, bytearray, memoryview)):
+                raise ValueError("detached_payload should yield bytes-like objects.")
+            length += self._file.write(c)
+        self._length = length
+        return
+
+    @staticmethod
+    def _is_seekable(f: Any) -> bool:
+        try:
+            return f.seekable()
+        except Exception:
+            return False
+
+
+def is_payload_stream(v: Any) -> bool:
+    """
+    Returns whether the payload should be read as a :class:`PayloadStream`:
+    a ``mmap.mmap`` object, a file-like object or an iterator of byte strings.
+    """
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return False
+    return isinstance(v, (mmap.mmap, Iterator)) or hasattr(v, "read")
+
+
+class _Chunks:
+    """
+    A re-iterable sequence of the byte strings of a structure whose payload
+    is a :class:`PayloadStream`.
+    """
+
+    def __init__(self, head: bytes, payload: PayloadStream, tail: bytes):
+        self._head = head
+        self._payload = payload
+        self._tail = tail
+
+    def __iter__(self) -> Iterator:
+        yield self._head + cbor_head(2, len(self._payload))
+        yield from self._payload
+        if self._tail:
+            yield self._tail
+
+
+def to_be_signed(context: str, items: List[Any], payload: Any, other_fields: List[Any] = []) -> Iterable[ByteString]:
+    """
+    Builds a Sig_structure, MAC_structure or Countersign_structure without
+    copying the payload. The structure is returned as a list of byte strings
+    to be concatenated: the encoded leading fields with the length prefix of
+    the payload, the payload itself, and the encoded trailing fields if any.
+
+    Args:
+        context (str): The context string (e.g., ``"Signature1"``, ``"MAC0"``).
+        items (List[Any]): The fields between the context and the payload (e.g.,
+            ``[body_protected, external_aad]``).
+        payload (Any): The payload. A :class:`PayloadStream` is read in chunks
+            each time the returned byte strings are iterated over.
+        other_fields (List[Any]): The fields after the payload.
+    Returns:
+        Iterable[ByteString]: The byte strings of the encoded structure.
+    """
+    head = cbor_head(4, 2 + len(items) + len(other_fields)) + _encode_item(context)
+    for v in items:
+        head += _encode_item(v)
+    if isinstance(payload, PayloadStream):
+        return _Chunks(head, payload, b"".join(_encode_item(v) for v in other_fields))
+    res: List[ByteString]
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        view = memoryview(payload)
+        res = [head + cbor_head(2, view.nbytes), view]
+    else:
+        res = [head + _dumps(payload)]
+    if other_fields:
+        res.append(b"".join(_encode_item(v) for v in other_fields))
+    return res
+
+
+def enc_structure(context: str, protected: Any, external_aad: Any) -> bytes:
+    """
+    Builds an Enc_structure (or a recipient's one) as bytes.
+
+    Args:
+        context (str): The context string (e.g., ``"Encrypt0"``, ``"Enc_Recipient"``).
+        protected (Any): The encoded protected header.
+        external_aad (Any): The external additional authenticated data.
+    Returns:
+        bytes: The encoded Enc_structure.
+    """
+    return b"\x83" + _encode_item(context) + _encode_item(protected) + _encode_item(external_aad)
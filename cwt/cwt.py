@@ -1,17 +1,39 @@
-from calendar import timegm
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Union
+import math
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from cbor2 import CBORTag
 
+from .batch import BATCH_DEFAULT_CHUNK_SIZE, run_batch
 from .cbor_processor import CBORProcessor
 from .claims import Claims
+from .clock import Clock
 from .const import COSE_KEY_OPERATION_VALUES
 from .cose import COSE
 from .cose_key_interface import COSEKeyInterface
+from .cose_peek import LARGE_ITEM_SIZE, split_message
+from .cose_structure import ByteString, message_chunks, write_chunks
+from .encoder import CWTEncoder
 from .exceptions import DecodeError, VerifyError
+from .key_ring import KeyRing
 from .recipient_interface import RecipientInterface
 from .signer import Signer
+from .token_cache import TOKEN_CACHE_TTL, TokenCache
+from .tracer import Tracer
+from .trust_store import TrustStore
+
+if TYPE_CHECKING:
+    from .replay_guard import ReplayGuard
 
 CWT_DEFAULT_EXPIRES_IN = 3600  # 1 hour
 CWT_DEFAULT_LEEWAY = 60  # 1 min
@@ -31,7 +53,13 @@ class CWT(CBORProcessor):
         self,
         expires_in: int = CWT_DEFAULT_EXPIRES_IN,
         leeway: int = CWT_DEFAULT_LEEWAY,
-        ca_certs: str = "",
+        ca_certs: Union[str, TrustStore] = "",
+        token_cache_size: int = 0,
+        token_cache_ttl: int = TOKEN_CACHE_TTL,
+        tracer: Optional[Tracer] = None,
+        replay_guard: Optional["ReplayGuard"] = None,
+        clock: Optional[Clock] = None,
+        trial_workers: int = 1,
     ):
         if not isinstance(expires_in, int):
             raise ValueError("expires_in should be int.")
@@ -50,15 +78,35 @@ class CWT(CBORProcessor):
             alg_auto_inclusion=True,
             verify_kid=True,
             ca_certs=ca_certs,
+            tracer=tracer,
+            trial_workers=trial_workers,
         )
+        if isinstance(token_cache_size, bool) or not isinstance(token_cache_size, int) or token_cache_size < 0:
+            raise ValueError("token_cache_size should be non-negative int.")
         self._claim_names: Dict[str, int] = {}
+        self._token_cache = TokenCache(token_cache_ttl, token_cache_size) if token_cache_size > 0 else None
+        if replay_guard is not None:
+            from .replay_guard import ReplayGuard
+
+            if not isinstance(replay_guard, ReplayGuard):
+                raise ValueError("replay_guard should be ReplayGuard.")
+        self._replay_guard = replay_guard
+        if clock is not None and not callable(clock):
+            raise ValueError("clock should be callable.")
+        self._clock = clock or time.time
 
     @classmethod
     def new(
         cls,
         expires_in: int = CWT_DEFAULT_EXPIRES_IN,
         leeway: int = CWT_DEFAULT_LEEWAY,
-        ca_certs: str = "",
+        ca_certs: Union[str, TrustStore] = "",
+        token_cache_size: int = 0,
+        token_cache_ttl: int = TOKEN_CACHE_TTL,
+        tracer: Optional[Tracer] = None,
+        replay_guard: Optional["ReplayGuard"] = None,
+        clock: Optional[Clock] = None,
+        trial_workers: int = 1,
     ):
         """
         Constructor.
@@ -68,10 +116,36 @@ class CWT(CBORProcessor):
                 (default value: ``3600``).
             leeway(int): The default leeway in seconds for validating
                 ``exp`` and ``nbf`` (default value: ``60``).
-            ca_certs(str): The path to a file which contains a concatenated list
-                of trusted root certificates. You should specify private CA
-                certificates in your target system. There should be no need to
-                use the public CA certificates for the Web PKI.
+            ca_certs(Union[str, TrustStore]): The path to a file which contains a
+                concatenated list of trusted root certificates, or a
+                :class:`TrustStore <cwt.TrustStore>` which can be shared by multiple
+                instances. You should specify private CA certificates in your target
+                system. There should be no need to use the public CA certificates for
+                the Web PKI.
+            token_cache_size(int): The maximum number of verified CWTs whose claims
+                are cached by :func:`decode <cwt.CWT.decode>` (default value: ``0``).
+                If ``0`` is specified, the cache is disabled. See
+                :class:`TokenCache <cwt.TokenCache>`.
+            token_cache_ttl(int): The maximum lifetime in seconds of a cached entry
+                (default value: ``3600``). An entry also expires at ``exp`` of the
+                CWT minus ``leeway``.
+            tracer(Optional[Tracer]): A :class:`Tracer <cwt.Tracer>` which receives the
+                timings of the phases of encoding and decoding. In addition to the phases
+                of :class:`COSE <cwt.COSE>`, the parsing of the claims and the validation
+                of them are measured. If it is not specified, nothing is measured.
+            replay_guard(Optional[ReplayGuard]): A :class:`ReplayGuard <cwt.ReplayGuard>`
+                with which :func:`decode <cwt.CWT.decode>` rejects a verified CWT whose
+                ``cti`` has already been seen. A CWT without ``cti`` is not checked.
+                If it is not specified, replays are not detected.
+            clock(Optional[Callable[[], float]]): A function which returns the current
+                time in seconds since the epoch. It is used to set the default values
+                of ``exp``, ``nbf`` and ``iat``, and to validate ``exp`` and ``nbf``.
+                A :class:`CoarseClock <cwt.CoarseClock>` can be used to avoid reading
+                the system clock for each CWT. If it is not specified, ``time.time``
+                is used.
+            trial_workers(int): The maximum number of threads which try candidate keys
+                in parallel, e.g., keys sharing a ``kid`` during key rotation (default
+                value: ``1``). See :func:`COSE.new <cwt.COSE.new>`.
 
         Examples:
 
@@ -91,8 +165,35 @@ class CWT(CBORProcessor):
             ...     {"iss": "coaps://as.example", "sub": "dajiaji", "cti": "123"},
             ...     key,
             ... )
+
+
+            >>> from cwt import CWT
+            >>> ctx = CWT.new(token_cache_size=10000)
+            >>> claims = ctx.decode(token, public_key)  # verified
+            >>> claims = ctx.decode(token, public_key)  # answered from the cache
+            >>> ctx.token_cache.hits
+            1
+
+
+            >>> from cwt import CWT, HistogramTracer
+            >>> tracer = HistogramTracer()
+            >>> ctx = CWT.new(tracer=tracer)
+            >>> claims = ctx.decode(token, public_key)
+            >>> tracer.histograms()["cose.crypto"].count
+            1
+
+
+            >>> from cwt import CWT, MemoryReplayGuard
+            >>> ctx = CWT.new(replay_guard=MemoryReplayGuard())
+            >>> claims = ctx.decode(token, public_key)
+            >>> claims = ctx.decode(token, public_key)
+            cwt.exceptions.VerifyError: The token has been replayed.
+
+
+            >>> from cwt import CWT, CoarseClock
+            >>> ctx = CWT.new(clock=CoarseClock(tick=1.0))
         """
-        return cls(expires_in, leeway, ca_certs)
+        return cls(expires_in, leeway, ca_certs, token_cache_size, token_cache_ttl, tracer, replay_guard, clock, trial_workers)
 
     @property
     def expires_in(self) -> int:
@@ -130,6 +231,35 @@ class CWT(CBORProcessor):
         """
         return self._cose
 
+    @property
+    def token_cache(self) -> Optional[TokenCache]:
+        """
+        The cache of verified CWTs used by :func:`decode <cwt.CWT.decode>`.
+        ``None`` if ``token_cache_size`` is not specified.
+        """
+        return self._token_cache
+
+    @property
+    def replay_guard(self) -> Optional["ReplayGuard"]:
+        """
+        The :class:`ReplayGuard <cwt.ReplayGuard>` used by :func:`decode <cwt.CWT.decode>`,
+        or ``None`` if ``replay_guard`` is not specified.
+        """
+        return self._replay_guard
+
+    @property
+    def tracer(self) -> Tracer:
+        """
+        The tracer which receives the timings of the phases of encoding and decoding.
+        It is shared with the underlying COSE object.
+        """
+        return self._cose.tracer
+
+    @tracer.setter
+    def tracer(self, tracer: Optional[Tracer]):
+        self._cose.tracer = tracer
+        return
+
     def encode(
         self,
         claims: Union[Claims, Dict[str, Any], Dict[int, Any], bytes],
@@ -167,29 +297,53 @@ class CWT(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode the claims.
         """
-        if isinstance(claims, Claims):
-            return self._encode(claims, key, nonce, recipients, signers, tagged)
-        if isinstance(claims, str):
-            claims = claims.encode("utf-8")
-        if isinstance(claims, bytes):
-            try:
-                claims = Claims.from_json(claims, self._claim_names)
-            except ValueError:
-                return self._encode(claims, key, nonce, recipients, signers, tagged)
-        else:
-            # Following code causes mypy error:
-            # for k, v in claims.items():
-            #     if isinstance(k, str):
-            #         claims = Claims.from_json(claims)
-            #     break
-            # To avoid the error:
-            json_claims: Dict[str, Any] = {}
-            for k, v in claims.items():
-                if isinstance(k, str):
-                    json_claims[k] = v
-            if json_claims:
-                claims = Claims.from_json(json_claims, self._claim_names)
-        return self._encode(claims, key, nonce, recipients, signers, tagged)
+        return b"".join(self._encode(self._normalize(claims), key, nonce, recipients, signers, tagged))
+
+    def encode_into(
+        self,
+        buffer: bytearray,
+        claims: Union[Claims, Dict[str, Any], Dict[int, Any], bytes],
+        key: COSEKeyInterface,
+        nonce: bytes = b"",
+        recipients: List[RecipientInterface] = [],
+        signers: List[Signer] = [],
+        tagged: bool = False,
+        offset: int = 0,
+    ) -> int:
+        """
+        Encodes CWT in the same way as :func:`encode <cwt.CWT.encode>` and writes
+        it into ``buffer`` from ``offset``. Large claims are written into the
+        buffer without building the token as a separate byte string. The buffer
+        is extended if it is too short, and the bytes after the token are left
+        as they are, so that an issuer can reuse one buffer for many tokens.
+
+        Args:
+            buffer (bytearray): A buffer to write the encoded CWT into.
+            claims (Union[Claims, Dict[str, Any], Dict[int, Any], bytes]): A CWT
+                claims object, or a JWT claims object, text string or byte string.
+            key (COSEKeyInterface): A COSE key used to sign, MAC or encrypt the claims.
+            nonce (bytes): A nonce for encryption.
+            recipients (List[RecipientInterface]): A list of recipient information structures.
+            signers (List[Signer]): A list of signer information structures for
+                multiple signer cases.
+            tagged (bool): An indicator whether the response is wrapped by CWT
+                tag(61) or not.
+            offset (int): The position in the buffer to start writing at.
+        Returns:
+            int: The number of bytes written.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to encode the claims.
+
+        Examples:
+
+            >>> from cwt import CWT, COSEKey
+            >>> ctx = CWT.new()
+            >>> buf = bytearray(256)
+            >>> n = ctx.encode_into(buf, {"iss": "coaps://as.example"}, private_key)
+            >>> token = bytes(buf[:n])
+        """
+        return write_chunks(buffer, offset, self._encode(self._normalize(claims), key, nonce, recipients, signers, tagged))
 
     def encode_and_mac(
         self,
@@ -215,16 +369,7 @@ class CWT(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode the claims.
         """
-        if not isinstance(claims, Claims):
-            self._validate(claims)
-        else:
-            claims = claims.to_dict()
-        self._set_default_value(claims)
-        b_claims = self._dumps(claims)
-        res = self._cose.encode_and_mac(b_claims, key, {}, {}, recipients, out="cbor2/CBORTag")
-        if tagged:
-            return self._dumps(CBORTag(CWT.CBOR_TAG, res))
-        return self._dumps(res)
+        return b"".join(self._mac_chunks(claims, key, recipients, tagged))
 
     def encode_and_sign(
         self,
@@ -252,16 +397,7 @@ class CWT(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode the claims.
         """
-        if not isinstance(claims, Claims):
-            self._validate(claims)
-        else:
-            claims = claims.to_dict()
-        self._set_default_value(claims)
-        b_claims = self._dumps(claims)
-        res = self._cose.encode_and_sign(b_claims, key, {}, {}, signers=signers, out="cbor2/CBORTag")
-        if tagged:
-            return self._dumps(CBORTag(CWT.CBOR_TAG, res))
-        return self._dumps(res)
+        return b"".join(self._sign_chunks(claims, key, signers, tagged))
 
     def encode_and_encrypt(
         self,
@@ -289,43 +425,73 @@ class CWT(CBORProcessor):
             ValueError: Invalid arguments.
             EncodeError: Failed to encode the claims.
         """
-        if not isinstance(claims, Claims):
-            self._validate(claims)
-        else:
-            claims = claims.to_dict()
-        self._set_default_value(claims)
-        b_claims = b""
-        if isinstance(claims, dict):
-            b_claims = self._dumps(claims)
-        else:
-            b_claims = claims
-        res = self._cose.encode_and_encrypt(
-            b_claims,
-            key,
-            {},
-            {5: nonce} if nonce != b"" else {},
-            recipients,
-            out="cbor2/CBORTag",
-        )
-        if tagged:
-            return self._dumps(CBORTag(CWT.CBOR_TAG, res))
-        return self._dumps(res)
+        return b"".join(self._encrypt_chunks(claims, key, nonce, recipients, tagged))
+
+    def prepare_encoder(
+        self,
+        key: Optional[COSEKeyInterface] = None,
+        recipients: List[RecipientInterface] = [],
+        signers: List[Signer] = [],
+        tagged: bool = False,
+    ) -> CWTEncoder:
+        """
+        Determines the usage of the key and encodes the COSE headers in advance, and
+        returns an encoder which encodes claims with them. It is useful to issue many
+        CWTs with the same key. The usage is determined with ``key_ops`` in the same
+        way as :func:`encode <cwt.CWT.encode>`. For encryption, a nonce is generated
+        for each CWT.
+
+        Args:
+            key (Optional[COSEKeyInterface]): A COSE key used to sign, MAC or encrypt
+                the claims. When the ``signers`` parameter is set, this ``key``
+                parameter will be ignored and should not be set.
+            recipients (List[RecipientInterface]): A list of recipient information structures.
+            signers (List[Signer]): A list of signer information structures for
+                multiple signer cases.
+            tagged (bool): An indicator whether the response is wrapped by CWT
+                tag(61) or not.
+        Returns:
+            CWTEncoder: An encoder of CWTs.
+        Raises:
+            ValueError: Invalid arguments.
+
+        Examples:
+
+            >>> from cwt import CWT, COSEKey
+            >>> ctx = CWT.new()
+            >>> encoder = ctx.prepare_encoder(private_key)
+            >>> token = encoder.encode({"iss": "coaps://as.example", "sub": "dajiaji"})
+        """
+        if signers:
+            return CWTEncoder(self, self._cose.prepare_signer(None, {}, {}, signers), tagged)
+        if key is None:
+            raise ValueError("key should be set.")
+        usage = self._key_usage(key)
+        if usage == "sign":
+            return CWTEncoder(self, self._cose.prepare_signer(key, {}, {}), tagged)
+        if usage == "encrypt":
+            return CWTEncoder(self, self._cose.prepare_encrypter(key, {}, {}, recipients), tagged)
+        return CWTEncoder(self, self._cose.prepare_mac(key, {}, {}, recipients), tagged)
 
     def decode(
         self,
         data: bytes,
-        keys: Union[COSEKeyInterface, List[COSEKeyInterface]],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
         no_verify: bool = False,
+        now: Optional[int] = None,
     ) -> Union[Dict[int, Any], bytes]:
         """
         Verifies and decodes CWT.
 
         Args:
             data (bytes): A byte string of an encoded CWT.
-            keys (Union[COSEKeyInterface, List[COSEKeyInterface]]): A COSE key
-                or a list of the keys used to verify and decrypt the encoded CWT.
+            keys (Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]): A COSE key,
+                a list of the keys or a :class:`KeyRing <cwt.KeyRing>` used to verify
+                and decrypt the encoded CWT.
             no_verify (bool): An indicator whether token verification is skiped
                 or not.
+            now (Optional[int]): The time (UNIX time) at which ``exp`` and ``nbf`` are
+                validated. If it is not specified, the clock of the CWT is read.
         Returns:
             Union[Dict[int, Any], bytes]: A byte string of the decoded CWT.
         Raises:
@@ -333,17 +499,58 @@ class CWT(CBORProcessor):
             DecodeError: Failed to decode the CWT.
             VerifyError: Failed to verify the CWT.
         """
-        cwt: Union[bytes, CBORTag, Dict[int, Any]] = self._loads(data)
-        if isinstance(cwt, CBORTag) and cwt.tag == CWT.CBOR_TAG:
-            cwt = cwt.value
+        with self._cose.tracer.span("cwt.decode") as span:
+            return self._decode(span, data, keys, no_verify, now)
+
+    def decode_many(
+        self,
+        tokens: Sequence[bytes],
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
+        no_verify: bool = False,
+        *,
+        workers: Optional[int] = None,
+        chunk_size: int = BATCH_DEFAULT_CHUNK_SIZE,
+        now: Optional[int] = None,
+    ) -> List[Union[Dict[int, Any], bytes, Exception]]:
+        """
+        Verifies and decodes multiple CWTs with the same keys on a thread pool.
+        Since ``pyca/cryptography`` releases the GIL during signature verification
+        and decryption, the throughput scales with the number of workers.
+
+        Args:
+            tokens (Sequence[bytes]): A list of encoded CWTs.
+            keys (Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing]): A COSE key,
+                a list of the keys or a :class:`KeyRing <cwt.KeyRing>` used to verify
+                and decrypt the encoded CWTs.
+            no_verify (bool): An indicator whether token verification is skiped
+                or not.
+            workers (Optional[int]): The maximum number of worker threads. If it is not
+                specified, the number of CPUs is used.
+            chunk_size (int): The number of tokens processed by a worker at a time
+                (default value: ``16``). A batch which is not larger than it is processed
+                on the calling thread without the thread pool.
+            now (Optional[int]): The time (UNIX time) at which ``exp`` and ``nbf`` of
+                all of the CWTs are validated. If it is not specified, the clock of
+                the CWT is read once at the start of the batch.
+        Returns:
+            List[Union[Dict[int, Any], bytes, Exception]]: The decoded CWTs in input
+            order. If decoding a token fails, the exception (e.g., ``VerifyError``) is
+            set in place of its claims.
+        Raises:
+            ValueError: Invalid arguments.
+
+        Examples:
+
+            >>> from cwt import CWT, VerifyError
+            >>> ctx = CWT.new()
+            >>> results = ctx.decode_many(tokens, public_key, workers=8)
+            >>> for res in results:
+            ...     if isinstance(res, Exception):
+            ...         print(f"rejected: {res}")
+        """
         keys = [keys] if isinstance(keys, COSEKeyInterface) else keys
-        p: Dict[int, Any] = {}
-        while isinstance(cwt, CBORTag):
-            p, u, cwt = self._cose.decode_with_headers(cwt, keys)
-            cwt = self._loads(cwt)
-        if not no_verify:
-            self._verify(cwt, p)
-        return cwt
+        now = int(self._clock()) if now is None else now
+        return run_batch(lambda t: self.decode(t, keys, no_verify, now), tokens, workers, chunk_size)
 
     def set_private_claim_names(self, claim_names: Dict[str, int]):
         """
@@ -362,6 +569,88 @@ class CWT(CBORProcessor):
         self._claim_names = claim_names
         return
 
+    def _decode(
+        self,
+        span: Any,
+        data: bytes,
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
+        no_verify: bool,
+        now: Optional[int] = None,
+    ) -> Union[Dict[int, Any], bytes]:
+        return next_step(self._decode_steps(span, data, keys, no_verify, now, False))[1]
+
+    def _decode_steps(
+        self,
+        span: Any,
+        data: bytes,
+        keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
+        no_verify: bool,
+        now: Optional[int],
+        resolve: bool,
+    ) -> Generator[Any, List[COSEKeyInterface], Union[Dict[int, Any], bytes]]:
+        # If resolve is True, each parsed layer is yielded and its keys are sent back in place of
+        # keys, so that the caller can look them up between the steps, e.g., on the event loop in
+        # AsyncCWT. The keys of the outermost layer are also used as the key set of the token cache.
+        tracer = self._cose.tracer
+        keys = [keys] if isinstance(keys, COSEKeyInterface) else keys
+        cwt: Any = None
+        if resolve:
+            with tracer.span("cwt.parse"):
+                cwt = self._parse(data, True)
+            keys = yield cwt
+        cache = self._token_cache if not no_verify and isinstance(data, bytes) else None
+        generation = 0
+        if cache is not None:
+            # The cache uses the same time as the claims so that a pinned now or an injected clock is honored.
+            if now is None:
+                now = int(self._clock())
+            cached = cache.get(data, keys, now)
+            span.set("cache_hit", cached is not None)
+            if cached is not None:
+                # The cached claims have been verified but nbf and exp depend on the current time.
+                with tracer.span("cwt.claims"):
+                    now = self._verify(cached, {}, now)
+                    self._check_replay(cached, now)
+                return cached
+            if isinstance(keys, KeyRing):
+                generation = keys.generation
+        if cwt is None:
+            with tracer.span("cwt.parse"):
+                cwt = self._parse(data, True)
+        p: Dict[int, Any] = {}
+        kids = set()
+        layer_keys = keys
+        while isinstance(cwt, CBORTag):
+            p, u, payload = self._cose.decode_with_headers(cwt, layer_keys)
+            kids.add(p.get(4, u.get(4, b"")) or b"")
+            with tracer.span("cwt.parse"):
+                cwt = self._parse(payload)
+            if resolve and isinstance(cwt, CBORTag):
+                layer_keys = yield cwt
+        if not no_verify:
+            with tracer.span("cwt.claims"):
+                now = self._verify(cwt, p, now)
+                self._check_replay(cwt, now)
+        if cache is not None and isinstance(cwt, dict):
+            # The entry is bound to a kid only if all of the layers have been verified with the kid.
+            kid = kids.pop() if len(kids) == 1 else b""
+            exp = cwt.get(4)
+            cache.put(data, keys, cwt, kid, generation, None if exp is None else exp - self._leeway, now)
+        return cwt
+
+    def _parse(self, data: Any, untag: bool = False) -> Any:
+        # A large COSE message is split into its fields in one pass, and the payload
+        # of a MAC or signed message is verified and decoded as a slice of the data.
+        # cbor2 decodes small ones faster.
+        if isinstance(data, (bytes, memoryview)) and len(data) >= LARGE_ITEM_SIZE:
+            msg = split_message(data, untag)
+            if msg is not None:
+                return msg
+        res = self._loads(data)
+        if untag and isinstance(res, CBORTag) and res.tag == CWT.CBOR_TAG:
+            return res.value
+        return res
+
     def _encode(
         self,
         claims: Union[Claims, Dict[Any, Any], bytes],
@@ -370,21 +659,116 @@ class CWT(CBORProcessor):
         recipients: List[RecipientInterface] = [],
         signers: List[Signer] = [],
         tagged: bool = False,
-    ) -> bytes:
+    ) -> List[ByteString]:
+        usage = self._key_usage(key)
+        if usage == "sign":
+            return self._sign_chunks(claims, key, signers, tagged)
+        if usage == "encrypt":
+            return self._encrypt_chunks(claims, key, nonce, recipients, tagged)
+        return self._mac_chunks(claims, key, recipients, tagged)
+
+    # The tokens are encoded as byte strings to be concatenated instead of being
+    # encoded again as trees of CBORTag objects, so that large claims are copied
+    # only once into the output.
+
+    def _mac_chunks(
+        self,
+        claims: Union[Claims, Dict[Any, Any], bytes],
+        key: COSEKeyInterface,
+        recipients: List[RecipientInterface],
+        tagged: bool,
+    ) -> List[ByteString]:
+        b_claims = self._serialize(claims)
+        res = self._cose.encode_and_mac(b_claims, key, {}, {}, recipients, out="cbor2/CBORTag")
+        return self._message_chunks(res, tagged)
+
+    def _sign_chunks(
+        self,
+        claims: Union[Claims, Dict[Any, Any], bytes],
+        key: Optional[COSEKeyInterface],
+        signers: List[Signer],
+        tagged: bool,
+    ) -> List[ByteString]:
+        b_claims = self._serialize(claims)
+        res = self._cose.encode_and_sign(b_claims, key, {}, {}, signers=signers, out="cbor2/CBORTag")
+        return self._message_chunks(res, tagged)
+
+    def _encrypt_chunks(
+        self,
+        claims: Union[Claims, Dict[Any, Any], bytes],
+        key: COSEKeyInterface,
+        nonce: bytes,
+        recipients: List[RecipientInterface],
+        tagged: bool,
+    ) -> List[ByteString]:
+        b_claims = self._serialize(claims, nested=True)
+        res = self._cose.encode_and_encrypt(
+            b_claims,
+            key,
+            {},
+            {5: nonce} if nonce != b"" else {},
+            recipients,
+            out="cbor2/CBORTag",
+        )
+        return self._message_chunks(res, tagged)
+
+    def _message_chunks(self, res: Union[bytes, CBORTag], tagged: bool) -> List[ByteString]:
+        if not isinstance(res, CBORTag):
+            raise TypeError("Internal type error.")
+        return message_chunks(CBORTag(CWT.CBOR_TAG, res) if tagged else res)
+
+    def _key_usage(self, key: COSEKeyInterface) -> str:
         if COSE_KEY_OPERATION_VALUES["sign"] in key.key_ops:
             if [ops for ops in key.key_ops if ops in [3, 4, 9, 10]]:
                 raise ValueError("The key operation could not be specified.")
-            return self.encode_and_sign(claims, key, signers, tagged)
+            return "sign"
         if COSE_KEY_OPERATION_VALUES["encrypt"] in key.key_ops:
             if [ops for ops in key.key_ops if ops in [1, 2, 9, 10]]:
                 raise ValueError("The key operation could not be specified.")
-            return self.encode_and_encrypt(claims, key, nonce, recipients, tagged)
+            return "encrypt"
         if COSE_KEY_OPERATION_VALUES["MAC create"] in key.key_ops:
             if [ops for ops in key.key_ops if ops in [1, 2, 3, 4]]:
                 raise ValueError("The key operation could not be specified.")
-            return self.encode_and_mac(claims, key, recipients, tagged)
+            return "mac"
         raise ValueError("The key operation could not be specified.")
 
+    def _normalize(
+        self, claims: Union[Claims, Dict[str, Any], Dict[int, Any], bytes, str]
+    ) -> Union[Claims, Dict[Any, Any], bytes]:
+        if isinstance(claims, Claims):
+            return claims
+        if isinstance(claims, str):
+            claims = claims.encode("utf-8")
+        if isinstance(claims, bytes):
+            try:
+                return Claims.from_json(claims, self._claim_names)
+            except ValueError:
+                return claims
+        # Following code causes mypy error:
+        # for k, v in claims.items():
+        #     if isinstance(k, str):
+        #         claims = Claims.from_json(claims)
+        #     break
+        # To avoid the error:
+        json_claims: Dict[str, Any] = {}
+        for k, v in claims.items():
+            if isinstance(k, str):
+                json_claims[k] = v
+        if json_claims:
+            return Claims.from_json(json_claims, self._claim_names)
+        return claims
+
+    def _serialize(self, claims: Union[Claims, Dict[Any, Any], bytes], nested: bool = False) -> bytes:
+        if not isinstance(claims, Claims):
+            self._validate(claims)
+        else:
+            claims = claims.to_dict()
+        self._set_default_value(claims)
+        # A nested COSE message is encrypted as it is.
+        if nested and isinstance(claims, bytes):
+            return claims
+        return self._dumps(claims)
+
     def _validate(self, claims: Union[Dict[int, Any], bytes]):
         if isinstance(claims, bytes):
             try:
@@ -399,11 +783,12 @@ class CWT(CBORProcessor):
         Claims.validate(claims)
         return
 
-    def _verify(self, claims: Union[Dict[int, Any], bytes], protected: Dict[int, Any] = {}):
+    def _verify(self, claims: Union[Dict[int, Any], bytes], protected: Dict[int, Any] = {}, now: Optional[int] = None) -> int:
         if not isinstance(claims, dict):
             raise DecodeError("Failed to decode.")
 
-        now = timegm(datetime.now(tz=timezone.utc).utctimetuple())
+        if now is None:
+            now = int(self._clock())
         if 4 in claims:  # exp
             if isinstance(claims[4], int) or isinstance(claims[4], float):
                 if claims[4] < (now - self._leeway):
@@ -422,12 +807,24 @@ class CWT(CBORProcessor):
             for k, v in protected[13].items():
                 if k in claims and claims[k] != v:
                     raise VerifyError(f"The CWT claim({k}) value in protected header does not match the values in the payload.")
+        return now
+
+    def _check_replay(self, claims: Union[Dict[int, Any], bytes], now: Optional[int] = None):
+        # It should be called after the CWT has been verified so that forged CWTs cannot occupy the cti.
+        if self._replay_guard is None or not isinstance(claims, dict) or 7 not in claims:
+            return
+        cti = claims[7] if isinstance(claims[7], bytes) else self._dumps(claims[7])
+        exp = claims.get(4)
+        # The token is accepted while now <= exp + leeway, so the entry should be kept a second longer.
+        expires_at = None if exp is None else math.ceil(exp) + self._leeway + 1
+        if not self._replay_guard.check(cti, expires_at, now):
+            raise VerifyError("The token has been replayed.")
         return
 
     def _set_default_value(self, claims: Union[Dict[int, Any], bytes]):
         if isinstance(claims, bytes):
             return
-        now = timegm(datetime.now(tz=timezone.utc).utctimetuple())
+        now = int(self._clock())
         if 4 not in claims:
             claims[4] = now + self._expires_in
         if 5 not in claims:
@@ -482,7 +879,7 @@ def encode_and_encrypt(
 
 def decode(
     data: bytes,
-    keys: Union[COSEKeyInterface, List[COSEKeyInterface]],
+    keys: Union[COSEKeyInterface, List[COSEKeyInterface], KeyRing],
     no_verify: bool = False,
 ) -> Union[Dict[int, Any], bytes]:
     return _cwt.decode(data, keys, no_verify)
@@ -490,3 +887,14 @@ def decode(
 
 def set_private_claim_names(claim_names: Dict[str, int]):
     return _cwt.set_private_claim_names(claim_names)
+
+
+def next_step(steps: Generator[Any, Any, Any], keys: Any = None) -> Tuple[bool, Any]:
+    """
+    Resumes the steps of a decoding with the keys, and returns ``True`` and the
+    result if it has finished, or ``False`` and the message whose keys are needed.
+    """
+    try:
+        return False, steps.send(keys)
+    except StopIteration as res:
+        return True, res.value
@@ -0,0 +1,250 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from cbor2 import CBORTag
+
+from .const import COSE_ALGORITHMS_HPKE
+from .cose_key_interface import COSEKeyInterface
+from .cose_structure import (
+    ByteString,
+    _dumps,
+    _encode_item,
+    cbor_head,
+    enc_structure,
+    message_chunks,
+    to_be_signed,
+    write_chunks,
+)
+from .recipient_interface import RecipientInterface
+from .signer import Signer
+
+if TYPE_CHECKING:
+    from .claims import Claims
+    from .cose import COSE
+    from .cwt import CWT
+
+_CONTEXTS = {16: "Encrypt0", 17: "MAC0", 18: "Signature1"}
+# The heads of the tags and the arrays of the single-layer messages.
+_HEADS = {16: b"\xd0\x83", 17: b"\xd1\x84", 18: b"\xd2\x84"}
+
+
+class COSEEncoder:
+    """
+    A COSE encoder bound to a key and headers which have been validated and
+    encoded in advance. It is created by :func:`COSE.prepare_signer <cwt.COSE.prepare_signer>`,
+    :func:`COSE.prepare_mac <cwt.COSE.prepare_mac>` or
+    :func:`COSE.prepare_encrypter <cwt.COSE.prepare_encrypter>` and only does the
+    per-message work (e.g., signing and nonce generation) on :func:`encode`.
+    The encoded messages are the same as the ones of the corresponding
+    ``COSE.encode_and_*`` with the same arguments.
+
+    Examples:
+
+        >>> from cwt import COSE, COSEKey
+        >>> ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        >>> signer = ctx.prepare_signer(private_key)
+        >>> encoded = [signer.encode(payload) for payload in payloads]
+    """
+
+    def __init__(
+        self,
+        cose: "COSE",
+        typ: int,
+        key: Optional[COSEKeyInterface],
+        p: Dict[int, Any],
+        u: Dict[int, Any],
+        recipients: List[RecipientInterface] = [],
+        signers: List[Signer] = [],
+    ):
+        self._cose = cose
+        self._typ = typ
+        self._key = key
+        self._p = p
+        self._u = u
+        self._recipients = recipients
+        self._signers = signers
+        self._alg = p[1] if 1 in p else u.get(1, 0)
+        self._b_protected = _dumps(p) if p else b""
+
+        # Single-layer messages are encoded by concatenating the pre-encoded fields.
+        self._tag = 0
+        if typ == 0 and not recipients and key is not None and self._alg not in COSE_ALGORITHMS_HPKE.values():
+            self._tag = 16
+        elif typ == 1 and not recipients:
+            self._tag = 17
+        elif typ == 2 and not signers:
+            self._tag = 18
+        if self._tag == 0:
+            return
+        self._head = _HEADS[self._tag] + _encode_item(self._b_protected)
+        self._b_unprotected = _dumps(u)
+        self._aad = enc_structure("Encrypt0", self._b_protected, b"") if self._tag == 16 else b""
+
+    @property
+    def protected(self) -> Dict[int, Any]:
+        """
+        The protected header.
+        """
+        return self._p
+
+    @property
+    def unprotected(self) -> Dict[int, Any]:
+        """
+        The unprotected header. For encryption, the IV generated for each message
+        is added to the one of the message.
+        """
+        return self._u
+
+    def encode(self, payload: bytes, external_aad: bytes = b"", out: str = "") -> Union[bytes, CBORTag]:
+        """
+        Encodes a payload into a COSE message.
+
+        Args:
+            payload (bytes): A content to be signed, MACed or encrypted.
+            external_aad(bytes): External additional authenticated data supplied
+                by application.
+            out(str): An output format. Only ``"cbor2/CBORTag"`` can be used. If
+                ``"cbor2/CBORTag"`` is specified. This function will return encoded
+                data as `cbor2 <https://cbor2.readthedocs.io/en/stable/>`_'s
+                ``CBORTag`` object. If any other value is specified, it will return
+                encoded data as bytes.
+        Returns:
+            Union[bytes, CBORTag]: A byte string of the encoded COSE or a
+                cbor2.CBORTag object.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to encode data.
+        """
+        if out != "cbor2/CBORTag":
+            return b"".join(self._encode_chunks(payload, external_aad))
+        with self._cose.tracer.span("cose.encode", alg=self._alg) as span:
+            if isinstance(payload, bytes):
+                span.set("payload_size", len(payload))
+            return self._encode_message(payload, external_aad, out)
+
+    def encode_into(self, buffer: bytearray, payload: bytes, external_aad: bytes = b"", offset: int = 0) -> int:
+        """
+        Encodes a payload into a COSE message and writes it into ``buffer`` from
+        ``offset`` without building the message as a separate byte string. The
+        buffer is extended if it is too short, so that one buffer can be reused
+        for many messages.
+
+        Args:
+            buffer (bytearray): A buffer to write the encoded COSE message into.
+            payload (bytes): A content to be signed, MACed or encrypted.
+            external_aad(bytes): External additional authenticated data supplied
+                by application.
+            offset (int): The position in the buffer to start writing at.
+        Returns:
+            int: The number of bytes written.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to encode data.
+        """
+        return write_chunks(buffer, offset, self._encode_chunks(payload, external_aad))
+
+    def _encode_chunks(self, payload: bytes, external_aad: bytes) -> List[ByteString]:
+        # Returns the encoded message as byte strings to be concatenated, so that
+        # the payload is copied only once into the output.
+        with self._cose.tracer.span("cose.encode", alg=self._alg) as span:
+            if isinstance(payload, bytes):
+                span.set("payload_size", len(payload))
+            if self._tag == 0:
+                res = self._encode_message(payload, external_aad, "cbor2/CBORTag")
+                if not isinstance(res, CBORTag):
+                    raise TypeError("Internal type error.")
+                return message_chunks(res)
+
+            key = self._key
+            if key is None:
+                raise ValueError("key should be set.")
+            if self._tag == 16:
+                try:
+                    nonce = key.generate_nonce()
+                except NotImplementedError:
+                    raise ValueError("Nonce generation is not supported for the key.")
+                aad = enc_structure("Encrypt0", self._b_protected, external_aad) if external_aad else self._aad
+                u = dict(self._u)
+                u[5] = nonce
+                ciphertext = key.encrypt(payload, nonce, aad)
+                return [self._head + _dumps(u) + cbor_head(2, len(ciphertext)), ciphertext]
+            tag = key.sign_chunks(to_be_signed(_CONTEXTS[self._tag], [self._b_protected, external_aad], payload))
+            return [self._head + self._b_unprotected + cbor_head(2, len(payload)), payload, _encode_item(tag)]
+
+    def _encode_message(self, payload: bytes, external_aad: bytes, out: str) -> Union[bytes, CBORTag]:
+        # The headers are copied since the nonce is set to the unprotected one.
+        p, u = dict(self._p), dict(self._u)
+        if self._typ == 0:
+            return self._cose._encode_and_encrypt(payload, self._key, p, u, self._recipients, external_aad, out)
+        if self._typ == 1:
+            return self._cose._encode_and_mac(payload, self._key, p, u, self._recipients, external_aad, out)
+        return self._cose._encode_and_sign(payload, self._key, p, u, self._signers, external_aad, out)
+
+
+class CWTEncoder:
+    """
+    A CWT encoder bound to a key which is created by
+    :func:`CWT.prepare_encoder <cwt.CWT.prepare_encoder>`. The usage of the key
+    is determined and the COSE headers are encoded in advance.
+
+    Examples:
+
+        >>> from cwt import CWT, COSEKey
+        >>> ctx = CWT.new()
+        >>> encoder = ctx.prepare_encoder(private_key)
+        >>> token = encoder.encode({"iss": "coaps://as.example", "sub": "dajiaji"})
+    """
+
+    def __init__(self, cwt: "CWT", encoder: COSEEncoder, tagged: bool = False):
+        self._cwt = cwt
+        self._encoder = encoder
+        self._tagged = tagged
+
+    @property
+    def cose_encoder(self) -> COSEEncoder:
+        """
+        The underlying COSE encoder.
+        """
+        return self._encoder
+
+    def encode(self, claims: Union["Claims", Dict[str, Any], Dict[int, Any], bytes]) -> bytes:
+        """
+        Encodes claims into a CWT.
+
+        Args:
+            claims (Union[Claims, Dict[str, Any], Dict[int, Any], bytes]): A CWT
+                claims object, or a JWT claims object, text string or byte string.
+        Returns:
+            bytes: A byte string of the encoded CWT.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to encode the claims.
+        """
+        return b"".join(self._encode_chunks(self._serialize(claims)))
+
+    def encode_into(
+        self, buffer: bytearray, claims: Union["Claims", Dict[str, Any], Dict[int, Any], bytes], offset: int = 0
+    ) -> int:
+        """
+        Encodes claims into a CWT and writes it into ``buffer`` from ``offset``.
+        See :func:`CWT.encode_into <cwt.CWT.encode_into>`.
+
+        Args:
+            buffer (bytearray): A buffer to write the encoded CWT into.
+            claims (Union[Claims, Dict[str, Any], Dict[int, Any], bytes]): A CWT
+                claims object, or a JWT claims object, text string or byte string.
+            offset (int): The position in the buffer to start writing at.
+        Returns:
+            int: The number of bytes written.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to encode the claims.
+        """
+        return write_chunks(buffer, offset, self._encode_chunks(self._serialize(claims)))
+
+    def _serialize(self, claims: Union["Claims", Dict[str, Any], Dict[int, Any], bytes]) -> bytes:
+        return self._cwt._serialize(self._cwt._normalize(claims), self._encoder._typ == 0)
+
+    def _encode_chunks(self, b_claims: bytes) -> List[ByteString]:
+        chunks = self._encoder._encode_chunks(b_claims, b"")
+        # The head of tag(61) is 0xd83d.
+        return [b"\xd8\x3d", *chunks] if self._tagged else chunks
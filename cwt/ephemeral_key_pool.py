@@ -0,0 +1,217 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Union
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.x448 import X448PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from .algs.ec2 import EC2Key
+from .algs.okp import OKPKey
+from .const import JWK_ELLIPTIC_CURVES
+from .cose_key_interface import COSEKeyInterface
+
+EPHEMERAL_KEY_POOL_SIZE = 32
+EPHEMERAL_KEY_POOL_LOW_WATERMARK = 8
+
+_EC2_CURVES: Dict[int, ec.EllipticCurve] = {
+    1: ec.SECP256R1(),
+    2: ec.SECP384R1(),
+    3: ec.SECP521R1(),
+    8: ec.SECP256K1(),
+}
+
+
+def _generate(crv: int) -> Any:
+    if crv in _EC2_CURVES:
+        return ec.generate_private_key(_EC2_CURVES[crv])
+    if crv == 4:
+        return X25519PrivateKey.generate()
+    return X448PrivateKey.generate()
+
+
+class EphemeralKeyPool:
+    """
+    A pool of ephemeral private keys for ECDH-ES recipients, which is refilled
+    by a background thread. Generating a key pair is the most expensive part of
+    encoding a COSE_Encrypt/COSE_Mac message with ECDH-ES recipients, so it is
+    moved off the calling thread.
+
+    Each key is handed out only once. When the keys of a curve fall below
+    ``low_watermark``, the thread refills them up to ``size``. If no key is
+    available, a key is generated on the calling thread.
+
+    The pool is used by passing it to :func:`Recipient.new <cwt.Recipient.new>`,
+    and should be closed with :func:`close` or used as a context manager.
+
+    Examples:
+
+        >>> from cwt import COSE, EphemeralKeyPool, Recipient
+        >>> pool = EphemeralKeyPool(crvs=["P-256"])
+        >>> r = Recipient.new(
+        ...     unprotected={"alg": "ECDH-ES+HKDF-256"},
+        ...     recipient_key=public_key,
+        ...     context={"alg": "A128GCM"},
+        ...     ephemeral_key_pool=pool,
+        ... )
+        >>> encoded = COSE.new().encode_and_encrypt(b"Hello world!", recipients=[r])
+    """
+
+    def __init__(
+        self,
+        crvs: List[Union[int, str]] = ["P-256", "P-384", "P-521", "X25519", "X448"],
+        size: int = EPHEMERAL_KEY_POOL_SIZE,
+        low_watermark: int = EPHEMERAL_KEY_POOL_LOW_WATERMARK,
+    ):
+        """
+        Constructor.
+
+        Args:
+            crvs (List[Union[int, str]]): The curves (e.g., ``"P-256"`` or ``1``) whose
+                keys are pooled. ``P-256``, ``P-384``, ``P-521``, ``secp256k1``,
+                ``X25519`` and ``X448`` can be used.
+            size (int): The maximum number of keys pooled per curve (default value: ``32``).
+            low_watermark (int): The number of keys per curve below which the pool is
+                refilled (default value: ``8``). It should be less than ``size``.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("size should be positive int.")
+        if not isinstance(low_watermark, int) or low_watermark < 0:
+            raise ValueError("low_watermark should be non-negative int.")
+        if low_watermark >= size:
+            raise ValueError("low_watermark should be less than size.")
+        self._keys: Dict[int, Deque[Any]] = {}
+        for c in crvs:
+            crv = JWK_ELLIPTIC_CURVES.get(c, 0) if isinstance(c, str) else c
+            if crv not in _EC2_CURVES and crv not in [4, 5]:
+                raise ValueError(f"Unsupported or unknown crv for ephemeral keys: {c}.")
+            self._keys[crv] = deque()
+
+        self._size = size
+        self._low_watermark = low_watermark
+        self._hits = 0
+        self._misses = 0
+        self._closed = False
+        # The curves being refilled up to size. All of them are filled at start.
+        self._refilling: Set[int] = set(self._keys)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._fill, name="cwt-ephemeral-key-pool", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "EphemeralKeyPool":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of keys taken from the pool.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of keys generated on the calling thread since the pool was empty.
+        """
+        return self._misses
+
+    def available(self, crv: Union[int, str]) -> int:
+        """
+        Returns the number of keys pooled for the curve.
+
+        Args:
+            crv (Union[int, str]): A curve (e.g., ``"P-256"`` or ``1``).
+        Returns:
+            int: The number of keys.
+        """
+        crv = JWK_ELLIPTIC_CURVES.get(crv, 0) if isinstance(crv, str) else crv
+        with self._cond:
+            keys = self._keys.get(crv)
+            return len(keys) if keys is not None else 0
+
+    def take(self, crv: int) -> Any:
+        """
+        Takes an ephemeral private key out of the pool. The key is never handed
+        out again. If no key of the curve is pooled, a key is generated on the
+        calling thread.
+
+        Args:
+            crv (int): A COSE curve identifier (e.g., ``1`` for P-256).
+        Returns:
+            Any: A ``pyca/cryptography`` private key.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if crv not in _EC2_CURVES and crv not in [4, 5]:
+            raise ValueError(f"Unsupported or unknown crv for ephemeral keys: {crv}.")
+        with self._cond:
+            keys = self._keys.get(crv)
+            if keys is not None:
+                if keys:
+                    self._hits += 1
+                    k = keys.popleft()
+                    if len(keys) < self._low_watermark:
+                        self._cond.notify()
+                    return k
+                self._misses += 1
+                self._cond.notify()
+        return _generate(crv)
+
+    def close(self):
+        """
+        Stops the background thread and discards the pooled keys. Keys taken
+        afterwards are generated on the calling thread. It can be called more
+        than once.
+        """
+        with self._cond:
+            self._closed = True
+            for keys in self._keys.values():
+                keys.clear()
+            self._keys = {}
+            self._cond.notify()
+        self._thread.join()
+
+    def _next_crv(self) -> Optional[int]:
+        # The curve with the fewest keys is refilled first.
+        res: Optional[int] = None
+        for crv, keys in self._keys.items():
+            if len(keys) < self._low_watermark:
+                self._refilling.add(crv)
+            if crv not in self._refilling:
+                continue
+            if len(keys) >= self._size:
+                self._refilling.discard(crv)
+            elif res is None or len(keys) < len(self._keys[res]):
+                res = crv
+        return res
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                crv = self._next_crv()
+                while crv is None and not self._closed:
+                    self._cond.wait()
+                    crv = self._next_crv()
+                if self._closed or crv is None:
+                    return
+            k = _generate(crv)
+            with self._cond:
+                if crv in self._keys:
+                    self._keys[crv].append(k)
+
+
+def ephemeral_key(crv: int, alg: int, pool: Optional[EphemeralKeyPool] = None) -> COSEKeyInterface:
+    """
+    Returns a single-use COSE private key for ECDH-ES on the curve. The private
+    key is taken from the pool if it is specified, otherwise it is generated when
+    the key is used for the first time.
+    """
+    if pool is not None:
+        k = pool.take(crv)
+        return EC2Key.from_ephemeral_key(k, crv, alg) if crv in _EC2_CURVES else OKPKey.from_ephemeral_key(k, crv, alg)
+    return EC2Key({1: 2, -1: crv, 3: alg}) if crv in _EC2_CURVES else OKPKey({1: 1, -1: crv, 3: alg})
@@ -1,6 +1,5 @@
 from typing import Any, Dict, Union
 
-from cryptography import x509
 from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 from cryptography.hazmat.primitives.hashes import SHA256
@@ -13,6 +12,8 @@ from ..utils import uint_to_bytes
 
 
 def _generate_kid(cert: bytes) -> bytes:
+    from cryptography import x509
+
     c = x509.load_pem_x509_certificate(cert)
     fp = c.fingerprint(SHA256())
     return fp[0:8]
@@ -35,6 +36,8 @@ def load_pem_hcert_dsc(cert: Union[str, bytes]) -> COSEKeyInterface:
         cert = cert.encode("utf-8")
     k: Any = None
     if b"BEGIN CERTIFICATE" in cert:
+        from cryptography import x509
+
         k = x509.load_pem_x509_certificate(cert).public_key()
     else:
         raise ValueError("Invalid PEM data.")
@@ -0,0 +1,384 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
+
+import cbor2
+
+from .cose_key import COSEKey
+from .cose_key_interface import COSEKeyInterface
+from .key_ring import KeyRing
+
+KEY_REGISTRY_CACHE_TTL = 60  # 1 min
+KEY_REGISTRY_CACHE_SIZE = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cose_keys (
+    kid BLOB NOT NULL,
+    alg INTEGER,
+    not_before INTEGER,
+    not_after INTEGER,
+    key BLOB NOT NULL,
+    UNIQUE (kid, key)
+);
+CREATE INDEX IF NOT EXISTS cose_keys_kid_alg ON cose_keys (kid, alg);
+CREATE INDEX IF NOT EXISTS cose_keys_not_after ON cose_keys (not_after);
+"""
+
+# (key, not_before, not_after)
+_Row = Tuple[COSEKeyInterface, Optional[int], Optional[int]]
+
+
+class KeyRegistry(KeyRing):
+    """
+    A persistent set of COSE keys stored in an SQLite database, which can be
+    used in place of a :class:`KeyRing <cwt.KeyRing>` in :func:`COSE.decode
+    <cwt.COSE.decode>` and :func:`CWT.decode <cwt.CWT.decode>` when the keys
+    do not fit in memory.
+
+    The keys are stored as CBOR-encoded COSE_Keys with their ``kid``, ``alg``
+    and an optional validity window (``not_before`` and ``not_after`` in UNIX
+    time), and are looked up only by ``kid``, so messages and recipients
+    without ``kid`` cannot be decoded with the registry. Iterating over the
+    registry yields all of the stored keys including the ones outside of their
+    validity window. The keys of a ``kid`` are read
+    with one indexed query and kept in an LRU of ``cache_size`` entries for
+    ``cache_ttl`` seconds. Updates through the registry take effect
+    immediately, but updates of the database by other processes are seen
+    after the cached entries expire.
+
+    Each thread uses its own connection to the database, so the registry can
+    be shared by threads, e.g., by :class:`AsyncCWT <cwt.aio.AsyncCWT>`.
+
+    Examples:
+
+        >>> from cwt import CWT, KeyRegistry
+        >>> registry = KeyRegistry("/var/lib/keys.db")
+        >>> registry.import_jwks("/path/to/jwks.json")
+        >>> claims = CWT.new().decode(token, registry)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        read_only: bool = False,
+        mmap_size: int = 0,
+        cache_ttl: int = KEY_REGISTRY_CACHE_TTL,
+        cache_size: int = KEY_REGISTRY_CACHE_SIZE,
+    ):
+        """
+        Constructor.
+
+        Args:
+            path (str): The path to the SQLite database file. It is created if it
+                does not exist and ``read_only`` is ``False``.
+            read_only (bool): Whether the database is opened read-only or not.
+            mmap_size (int): The maximum number of bytes of the database file read
+                through memory-mapped I/O (``PRAGMA mmap_size``). ``0`` disables it.
+            cache_ttl (int): The lifetime in seconds of a cached entry (default value: ``60``).
+            cache_size (int): The maximum number of cached ``kid`` s (default value: ``1024``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(path, str) or not path:
+            raise ValueError("path should be str.")
+        if read_only and not os.path.exists(path):
+            raise ValueError(f"path not found: {path}.")
+        if not isinstance(mmap_size, int) or mmap_size < 0:
+            raise ValueError("mmap_size should be non-negative int.")
+        if not isinstance(cache_ttl, int) or cache_ttl <= 0:
+            raise ValueError("cache_ttl should be positive int.")
+        if not isinstance(cache_size, int) or cache_size <= 0:
+            raise ValueError("cache_size should be positive int.")
+        self._path = path
+        self._read_only = read_only
+        self._mmap_size = mmap_size
+        self._cache_ttl = cache_ttl
+        self._cache_size = cache_size
+        self._cache: OrderedDict[bytes, Tuple[float, Tuple[_Row, ...]]] = OrderedDict()
+        self._local = threading.local()
+        self._conns: List[Any] = []
+        self._conns_lock = threading.Lock()
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+        # The number of updates through the registry. A cache entry read from the
+        # database is stored only if no update has been committed while reading it.
+        self._version = 0
+        conn = self._conn()
+        try:
+            if read_only:
+                conn.execute("SELECT 1 FROM cose_keys LIMIT 1")
+            else:
+                conn.executescript(_SCHEMA)
+        except Exception as err:
+            self.close()
+            raise ValueError(f"Failed to open the key registry: {path}.") from err
+        super().__init__()
+
+    def __enter__(self) -> "KeyRegistry":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cose_keys").fetchone()[0]
+
+    def __iter__(self) -> Iterator[COSEKeyInterface]:
+        for (b,) in self._conn().execute("SELECT key FROM cose_keys ORDER BY rowid"):
+            yield COSEKey.new(cbor2.loads(b))
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, COSEKeyInterface) or not key.kid:
+            return False
+        row = (
+            self._conn()
+            .execute("SELECT 1 FROM cose_keys WHERE kid = ? AND key = ?", (key.kid, cbor2.dumps(key.to_dict())))
+            .fetchone()
+        )
+        return row is not None
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of lookups answered from the cache.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of lookups which read the database.
+        """
+        return self._misses
+
+    def close(self):
+        """
+        Closes the connections to the database. It can be called more than once.
+        """
+        with self._conns_lock:
+            self._closed = True
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+        return
+
+    def add(self, key: COSEKeyInterface, not_before: Optional[int] = None, not_after: Optional[int] = None):
+        """
+        Adds a COSE key to the registry.
+
+        Args:
+            key (COSEKeyInterface): A COSE key to be added. It should have ``kid``.
+            not_before (Optional[int]): The time (UNIX time) before which the key
+                is not used.
+            not_after (Optional[int]): The time (UNIX time) on and after which the
+                key is not used.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        self.update(add=[key], not_before=not_before, not_after=not_after)
+        return
+
+    def update(
+        self,
+        add: List[COSEKeyInterface] = [],
+        remove: List[Union[COSEKeyInterface, bytes]] = [],
+        not_before: Optional[int] = None,
+        not_after: Optional[int] = None,
+    ) -> List[COSEKeyInterface]:
+        """
+        Adds and removes COSE keys in a transaction. The removal is applied
+        before the addition. Adding a key which is already registered updates
+        its validity window.
+
+        Args:
+            add (List[COSEKeyInterface]): COSE keys to be added. They should have ``kid``.
+            remove (List[Union[COSEKeyInterface, bytes]]): COSE keys or ``kid`` s
+                to be removed.
+            not_before (Optional[int]): The time (UNIX time) before which the added
+                keys are not used.
+            not_after (Optional[int]): The time (UNIX time) on and after which the
+                added keys are not used.
+        Returns:
+            List[COSEKeyInterface]: The removed keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        for k in add:
+            if not isinstance(k, COSEKeyInterface):
+                raise ValueError("key in keys should have COSEKeyInterface.")
+            if not k.kid:
+                raise ValueError("key in keys should have kid.")
+        for r in remove:
+            if not isinstance(r, (COSEKeyInterface, bytes)):
+                raise ValueError("key to be removed should be COSEKeyInterface or bytes.")
+        if not_before is not None and not isinstance(not_before, int):
+            raise ValueError("not_before should be int.")
+        if not_after is not None and not isinstance(not_after, int):
+            raise ValueError("not_after should be int.")
+        if not add and not remove:
+            return []
+        if self._read_only:
+            raise ValueError("The key registry is read-only.")
+
+        removed: List[COSEKeyInterface] = []
+        kids: Set[bytes] = set()
+        conn = self._conn()
+        with self._lock, conn:
+            for r in remove:
+                if isinstance(r, bytes):
+                    rows = conn.execute("SELECT rowid, key FROM cose_keys WHERE kid = ?", (r,)).fetchall()
+                else:
+                    rows = conn.execute(
+                        "SELECT rowid, key FROM cose_keys WHERE kid = ? AND key = ?", (r.kid, cbor2.dumps(r.to_dict()))
+                    ).fetchall()
+                for rowid, b in rows:
+                    conn.execute("DELETE FROM cose_keys WHERE rowid = ?", (rowid,))
+                    k = COSEKey.new(cbor2.loads(b))
+                    removed.append(k)
+                    kids.add(k.kid or b"")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cose_keys (kid, alg, not_before, not_after, key) VALUES (?, ?, ?, ?, ?)",
+                [(k.kid, k.alg, not_before, not_after, cbor2.dumps(k.to_dict())) for k in add],
+            )
+            kids.update(k.kid or b"" for k in add)
+            for kid in kids:
+                self._cache.pop(kid, None)
+            self._version += 1
+            if removed:
+                self._removed_at[None] = self._generation + 1
+                for k in removed:
+                    self._removed_at[k.kid] = self._generation + 1
+                self._generation += 1
+        return removed
+
+    def import_jwks(self, path: str, not_before: Optional[int] = None, not_after: Optional[int] = None) -> int:
+        """
+        Imports the keys in a JWK Set file (``{"keys": [...]}``) in a transaction.
+
+        Args:
+            path (str): The path to the JWK Set file.
+            not_before (Optional[int]): The time (UNIX time) before which the keys
+                are not used.
+            not_after (Optional[int]): The time (UNIX time) on and after which the
+                keys are not used.
+        Returns:
+            int: The number of imported keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        try:
+            with open(path, "rb") as f:
+                jwks = json.load(f)
+        except Exception as err:
+            raise ValueError(f"Failed to load JWK Set: {path}.") from err
+        if not isinstance(jwks, dict) or not isinstance(jwks.get("keys"), list):
+            raise ValueError("JWK Set should have keys.")
+        keys = [COSEKey.from_jwk(jwk) for jwk in jwks["keys"]]
+        self.update(add=keys, not_before=not_before, not_after=not_after)
+        return len(keys)
+
+    def import_key_set(self, path: str, not_before: Optional[int] = None, not_after: Optional[int] = None) -> int:
+        """
+        Imports the keys in a CBOR-encoded COSE_KeySet file in a transaction.
+
+        Args:
+            path (str): The path to the COSE_KeySet file.
+            not_before (Optional[int]): The time (UNIX time) before which the keys
+                are not used.
+            not_after (Optional[int]): The time (UNIX time) on and after which the
+                keys are not used.
+        Returns:
+            int: The number of imported keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        try:
+            with open(path, "rb") as f:
+                params = cbor2.load(f)
+        except Exception as err:
+            raise ValueError(f"Failed to load COSE_KeySet: {path}.") from err
+        if not isinstance(params, list):
+            raise ValueError("COSE_KeySet should be array.")
+        keys = [COSEKey.new(p) for p in params]
+        self.update(add=keys, not_before=not_before, not_after=not_after)
+        return len(keys)
+
+    def find(self, kid: Optional[bytes] = None, op: int = 0, alg: int = 0) -> Tuple[COSEKeyInterface, ...]:
+        """
+        Looks up the candidate keys which are valid at the current time.
+
+        Args:
+            kid (Optional[bytes]): A key identifier. If it is not specified, no
+                key is returned.
+            op (int): A key operation value (e.g., ``2`` for verify). If none
+                of the keys of the ``kid`` has the operation, keys are not
+                narrowed down by ``key_ops``.
+            alg (int): An algorithm identifier. Keys which have a different
+                ``alg`` are excluded. Keys which have no ``alg`` are always
+                included. If ``0`` is specified, keys are not narrowed down by
+                ``alg``.
+        Returns:
+            Tuple[COSEKeyInterface, ...]: The candidate keys.
+        """
+        if not kid:
+            return ()
+        now = int(time.time())
+        keys = [
+            k
+            for k, nbf, naf in self._rows(kid)
+            if (nbf is None or nbf <= now) and (naf is None or now < naf) and (not alg or not k.alg or k.alg == alg)
+        ]
+        if op:
+            narrowed = [k for k in keys if op in k.key_ops]
+            keys = narrowed or keys
+        return tuple(keys)
+
+    def _rows(self, kid: bytes) -> Tuple[_Row, ...]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(kid)
+            if entry is not None:
+                if entry[0] > now:
+                    self._cache.move_to_end(kid)
+                    self._hits += 1
+                    return entry[1]
+                del self._cache[kid]
+            self._misses += 1
+            version = self._version
+        cur = self._conn().execute("SELECT key, not_before, not_after FROM cose_keys WHERE kid = ? ORDER BY rowid", (kid,))
+        rows = tuple((COSEKey.new(cbor2.loads(b)), nbf, naf) for b, nbf, naf in cur)
+        with self._lock:
+            if version != self._version:
+                # The rows may have been read before the update was committed.
+                return rows
+            self._cache[kid] = (now + self._cache_ttl, rows)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+    def _conn(self) -> Any:
+        if self._closed:
+            raise ValueError("The key registry has been closed.")
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        # sqlite3 is imported on first use to keep ``import cwt`` fast.
+        import sqlite3
+
+        with self._conns_lock:
+            if self._closed:
+                raise ValueError("The key registry has been closed.")
+            if self._read_only:
+                conn = sqlite3.connect(f"file:{quote(self._path)}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self._path, check_same_thread=False)
+            if self._mmap_size:
+                conn.execute(f"PRAGMA mmap_size = {self._mmap_size}")
+            self._conns.append(conn)
+        self._local.conn = conn
+        return conn
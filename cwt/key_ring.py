@@ -0,0 +1,313 @@
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .const import COSE_ALGORITHMS_SIG_RSA, COSE_ALGORITHMS_SYMMETRIC
+from .cose_key_interface import COSEKeyInterface
+
+# alg -> (kty, crvs) of the keys which can be used with the alg.
+# Empty crvs means that the key type has no crv.
+_ALG_KEY_TYPES: Dict[int, Tuple[int, Tuple[int, ...]]] = {
+    **{alg: (4, ()) for alg in COSE_ALGORITHMS_SYMMETRIC.values()},
+    **{alg: (3, ()) for alg in COSE_ALGORITHMS_SIG_RSA.values()},
+    -8: (1, (6, 7)),  # EdDSA: Ed25519, Ed448
+    -7: (2, (1,)),  # ES256: P-256
+    -35: (2, (2,)),  # ES384: P-384
+    -36: (2, (3,)),  # ES512: P-521
+    -47: (2, (8,)),  # ES256K: secp256k1
+    35: (2, (1,)),  # HPKE-Base-P256-*
+    36: (2, (1,)),
+    37: (2, (2,)),  # HPKE-Base-P384-*
+    38: (2, (2,)),
+    39: (2, (3,)),  # HPKE-Base-P521-*
+    40: (2, (3,)),
+    41: (1, (4,)),  # HPKE-Base-X25519-*
+    42: (1, (4,)),
+    43: (1, (5,)),  # HPKE-Base-X448-*
+    44: (1, (5,)),
+}
+
+# Index key: (kid, key_ops, alg).
+# kid=None means "any kid", op=0 means "any key_ops" and alg=0 means "any alg".
+# Keys which have no alg are registered with alg=None.
+_IndexKey = Tuple[Optional[bytes], int, Optional[int]]
+
+
+class KeyRing:
+    """
+    An indexed set of COSE keys which can be used in place of a list of keys
+    in :func:`COSE.decode <cwt.COSE.decode>`, :func:`COSE.decode_with_headers
+    <cwt.COSE.decode_with_headers>` and :func:`CWT.decode <cwt.CWT.decode>`.
+
+    The keys are indexed by ``kid`` and pre-split by ``key_ops`` and ``alg`` so
+    that the candidate keys for a COSE message can be looked up without
+    scanning all of the keys. The keys can be added and removed while the
+    ring is in use. Each update is applied atomically: a concurrent decode
+    sees either the whole update or none of it.
+
+    In the adaptive mode, the candidate keys are ordered by their last
+    successful use (move-to-front), so that a message without ``kid`` is
+    verified or decrypted with the key which most recently succeeded first.
+    The keys which have no ``alg`` are also narrowed down by the ``kty`` and
+    the ``crv`` required by the ``alg`` in the headers. Since the order is
+    learned per ring, a ring per source (e.g., per partner) should be used.
+
+    Examples:
+
+        >>> from cwt import COSE, KeyRing
+        >>> ring = KeyRing(partner_keys, adaptive=True)
+        >>> payload = COSE.new().decode(token, ring)
+        >>> ring.attempts / ring.decodes  # The average number of keys tried.
+    """
+
+    def __init__(self, keys: List[COSEKeyInterface] = [], adaptive: bool = False):
+        """
+        Constructor.
+
+        Args:
+            keys (List[COSEKeyInterface]): The initial COSE keys.
+            adaptive (bool): Whether to order the candidate keys by their last
+                successful use and to narrow them down by ``kty`` and ``crv``
+                (default value: ``False``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(adaptive, bool):
+            raise ValueError("adaptive should be bool.")
+        self._adaptive = adaptive
+        # id(key) -> the sequence number of the last successful use of the key.
+        self._last_used: Dict[int, int] = {}
+        self._attempts = 0
+        self._decodes = 0
+        self._lock = threading.Lock()
+        self._keys: Tuple[COSEKeyInterface, ...] = ()
+        self._index: Dict[_IndexKey, Tuple[COSEKeyInterface, ...]] = {}
+        self._generation = 0
+        # kid (None for any kid) -> the generation in which a key having the kid was last removed.
+        self._removed_at: Dict[Optional[bytes], int] = {}
+        self.update(add=keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[COSEKeyInterface]:
+        return iter(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return any(k is key for k in self._keys)
+
+    @property
+    def adaptive(self) -> bool:
+        """
+        Whether the ring is in the adaptive mode.
+        """
+        return self._adaptive
+
+    @property
+    def attempts(self) -> int:
+        """
+        The number of keys tried by the decodes recorded in the adaptive mode.
+        """
+        return self._attempts
+
+    @property
+    def decodes(self) -> int:
+        """
+        The number of decodes recorded in the adaptive mode.
+        """
+        return self._decodes
+
+    @property
+    def generation(self) -> int:
+        """
+        The number of updates which have removed keys from the ring.
+        """
+        return self._generation
+
+    def removed_since(self, generation: int, kid: Optional[bytes] = None) -> bool:
+        """
+        Returns whether a key has been removed from the ring after the
+        ``generation``. It can be used to invalidate the results verified
+        with the keys in the ring.
+
+        Args:
+            generation (int): A :attr:`generation` value previously read.
+            kid (Optional[bytes]): A key identifier. If it is specified, only
+                the removal of the keys which have the ``kid`` is checked.
+        Returns:
+            bool: Whether a key has been removed or not.
+        """
+        if generation == self._generation:
+            return False
+        return self._removed_at.get(kid if kid else None, 0) > generation
+
+    def add(self, key: COSEKeyInterface):
+        """
+        Adds a COSE key to the ring.
+
+        Args:
+            key (COSEKeyInterface): A COSE key to be added.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        self.update(add=[key])
+        return
+
+    def remove(self, key: Union[COSEKeyInterface, bytes]) -> List[COSEKeyInterface]:
+        """
+        Removes a COSE key from the ring.
+
+        Args:
+            key (Union[COSEKeyInterface, bytes]): A COSE key to be removed or a
+                ``kid``. If a ``kid`` is specified, all of the keys which have
+                the ``kid`` will be removed.
+        Returns:
+            List[COSEKeyInterface]: The removed keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        return self.update(remove=[key])
+
+    def update(
+        self,
+        add: List[COSEKeyInterface] = [],
+        remove: List[Union[COSEKeyInterface, bytes]] = [],
+    ) -> List[COSEKeyInterface]:
+        """
+        Adds and removes COSE keys atomically. It can be used for key rotation.
+        The removal is applied before the addition.
+
+        Args:
+            add (List[COSEKeyInterface]): COSE keys to be added.
+            remove (List[Union[COSEKeyInterface, bytes]]): COSE keys or ``kid`` s
+                to be removed.
+        Returns:
+            List[COSEKeyInterface]: The removed keys.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        for k in add:
+            if not isinstance(k, COSEKeyInterface):
+                raise ValueError("key in keys should have COSEKeyInterface.")
+        for r in remove:
+            if not isinstance(r, (COSEKeyInterface, bytes)):
+                raise ValueError("key to be removed should be COSEKeyInterface or bytes.")
+
+        with self._lock:
+            keys = list(self._keys)
+            # Copy-on-write: readers keep using the previous index until it is swapped.
+            index = dict(self._index)
+            removed: List[COSEKeyInterface] = []
+            for r in remove:
+                for k in keys:
+                    if any(v is k for v in removed):
+                        continue
+                    if (k is r) if isinstance(r, COSEKeyInterface) else (k.kid == r):
+                        removed.append(k)
+            for k in removed:
+                keys.remove(k)
+                self._last_used.pop(id(k), None)
+                for ik in self._index_keys(k):
+                    bucket = tuple(v for v in index[ik] if v is not k)
+                    if bucket:
+                        index[ik] = bucket
+                    else:
+                        del index[ik]
+            for k in add:
+                if any(v is k for v in keys):
+                    continue
+                keys.append(k)
+                for ik in self._index_keys(k):
+                    index[ik] = index.get(ik, ()) + (k,)
+            self._index = index
+            self._keys = tuple(keys)
+            # The generation is advanced after the swap so that a result verified with
+            # the previous index is never recorded with the new generation.
+            if removed:
+                self._removed_at[None] = self._generation + 1
+                for k in removed:
+                    if k.kid:
+                        self._removed_at[k.kid] = self._generation + 1
+                self._generation += 1
+        return removed
+
+    def find(self, kid: Optional[bytes] = None, op: int = 0, alg: int = 0) -> Tuple[COSEKeyInterface, ...]:
+        """
+        Looks up the candidate keys.
+
+        Args:
+            kid (Optional[bytes]): A key identifier. If it is not specified,
+                keys are not narrowed down by ``kid``.
+            op (int): A key operation value (e.g., ``2`` for verify). If none
+                of the keys of the ``kid`` has the operation, keys are not
+                narrowed down by ``key_ops`` (same as the list of keys).
+            alg (int): An algorithm identifier. Keys which have a different
+                ``alg`` are excluded. Keys which have no ``alg`` are always
+                included. If ``0`` is specified, keys are not narrowed down by
+                ``alg``.
+        Returns:
+            Tuple[COSEKeyInterface, ...]: The candidate keys.
+        """
+        index = self._index
+        kid = kid if kid else None
+        if op and (kid, op, 0) not in index:
+            op = 0
+        if not alg:
+            res = index.get((kid, op, 0), ())
+        elif not self._adaptive:
+            return index.get((kid, op, alg), ()) + index.get((kid, op, None), ())
+        else:
+            res = index.get((kid, op, alg), ()) + tuple(k for k in index.get((kid, op, None), ()) if _can_use(k, alg))
+        if not self._adaptive or len(res) < 2:
+            return res
+        last_used = self._last_used
+        return tuple(sorted(res, key=lambda k: -last_used.get(id(k), 0)))
+
+    def record(self, key: Optional[COSEKeyInterface], attempts: int):
+        """
+        Records the result of a decode with the keys found in the ring. It is
+        called by :class:`COSE <cwt.COSE>` in the adaptive mode.
+
+        Args:
+            key (Optional[COSEKeyInterface]): The key which succeeded, or
+                ``None`` if all of the keys failed.
+            attempts (int): The number of keys tried.
+        """
+        with self._lock:
+            self._decodes += 1
+            self._attempts += attempts
+            if key is not None and any(k is key for k in self._keys):
+                self._last_used[id(key)] = self._decodes
+        return
+
+    @staticmethod
+    def _index_keys(k: COSEKeyInterface) -> List[_IndexKey]:
+        kids: List[Optional[bytes]] = [None, k.kid] if k.kid else [None]
+        algs: List[Optional[int]] = [0, k.alg if k.alg else None]
+        return [(kid, op, alg) for kid in kids for op in [0, *set(k.key_ops)] for alg in algs]
+
+
+def find_keys(
+    keys: Union[List[COSEKeyInterface], KeyRing], kid: Optional[bytes] = None, op: int = 0, alg: int = 0
+) -> Sequence[COSEKeyInterface]:
+    """
+    Looks up the candidate keys in a list of keys or a :class:`KeyRing`.
+
+    A list of keys is narrowed down by ``kid`` and then by ``key_ops`` in the
+    same way as :func:`KeyRing.find`, but not by ``alg``.
+    """
+    if isinstance(keys, KeyRing):
+        return keys.find(kid, op, alg)
+    cands = [k for k in keys if k.kid == kid] if kid else keys
+    if op:
+        narrowed = [k for k in cands if op in k.key_ops]
+        cands = narrowed or cands
+    return cands
+
+
+def _can_use(k: COSEKeyInterface, alg: int) -> bool:
+    if alg not in _ALG_KEY_TYPES:
+        return True
+    kty, crvs = _ALG_KEY_TYPES[alg]
+    if k.kty != kty:
+        return False
+    return not crvs or k.crv in crvs
@@ -0,0 +1,311 @@
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import cbor2
+
+from .cose_key import COSEKey
+from .cose_key_interface import COSEKeyInterface
+from .cwt import CWT, CWT_DEFAULT_EXPIRES_IN, CWT_DEFAULT_LEEWAY
+from .exceptions import CWTError
+from .key_ring import KeyRing
+
+KeySet = Union[bytes, Sequence[COSEKeyInterface]]
+
+
+def _load_key_set(key_set: bytes) -> KeyRing:
+    try:
+        params = cbor2.loads(key_set)
+    except Exception as err:
+        raise ValueError("key_set should be a CBOR-encoded COSE_KeySet.") from err
+    if not isinstance(params, list):
+        raise ValueError("key_set should be a CBOR-encoded COSE_KeySet.")
+    return KeyRing([COSEKey.new(p) for p in params])
+
+
+def _to_key_set(key_set: KeySet) -> bytes:
+    if isinstance(key_set, bytes):
+        return key_set
+    if not isinstance(key_set, (list, tuple)) or not all(isinstance(k, COSEKeyInterface) for k in key_set):
+        raise ValueError("key_set should be bytes or list of COSEKeyInterface.")
+    return cbor2.dumps([k.to_dict() for k in key_set])
+
+
+def _pickleable(err: Exception) -> Exception:
+    # An exception which cannot be pickled would break the pipe to the parent process.
+    try:
+        pickle.dumps(err)
+        return err
+    except Exception:
+        return CWTError(str(err))
+
+
+def _worker(conn: Connection, key_set: bytes, ca_certs: str, expires_in: int, leeway: int):
+    ctx = CWT.new(expires_in=expires_in, leeway=leeway, ca_certs=ca_certs)
+    keys = _load_key_set(key_set)
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        op, arg, no_verify, now = msg
+        if op == "keys":
+            try:
+                keys = _load_key_set(arg)
+                conn.send(None)
+            except Exception as err:
+                conn.send(_pickleable(err))
+            continue
+        res: List[Any] = []
+        for token in arg:
+            try:
+                res.append(ctx.decode(token, keys, no_verify, now))
+            except Exception as err:
+                res.append(_pickleable(err))
+        conn.send(res)
+
+
+class VerifierPool:
+    """
+    A pool of worker processes which verify and decode CWTs with a key set
+    loaded in advance. Since each worker has its own interpreter, the
+    throughput scales with the number of CPU cores regardless of the GIL.
+
+    The key set is sent to the workers as a CBOR-encoded COSE_KeySet once when
+    the pool is started and on :func:`update_keys`, so that the keys are
+    not pickled with each batch of tokens. The keys are indexed with
+    :class:`KeyRing <cwt.KeyRing>` in the workers.
+
+    The pool can be shared by threads. Each batch is dealt to the workers which
+    are idle when it starts (at least one), so that the batches of several
+    threads are verified at the same time. If a worker fails to load the key
+    set on :func:`update_keys`, the workers may have different key sets and the
+    pool becomes unusable.
+
+    The pool should be closed with :func:`close` or used as a context manager.
+
+    Examples:
+
+        >>> from cwt.parallel import VerifierPool
+        >>> with VerifierPool([public_key], processes=4) as pool:
+        ...     results = pool.decode(tokens)
+        ...     pool.update_keys([public_key, new_public_key])
+        ...     results = pool.decode(tokens)
+    """
+
+    def __init__(
+        self,
+        key_set: KeySet,
+        processes: Optional[int] = None,
+        ca_certs: str = "",
+        expires_in: int = CWT_DEFAULT_EXPIRES_IN,
+        leeway: int = CWT_DEFAULT_LEEWAY,
+        mp_context: Optional[str] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            key_set (Union[bytes, List[COSEKeyInterface]]): A CBOR-encoded
+                COSE_KeySet or a list of COSE keys used to verify and decrypt CWTs.
+            processes (Optional[int]): The number of worker processes. If it is
+                not specified, the number of CPUs is used.
+            ca_certs(str): The path to a file which contains a concatenated list
+                of trusted root certificates. It is loaded by each worker.
+            expires_in(int): The default lifetime in seconds of CWT
+                (default value: ``3600``).
+            leeway(int): The default leeway in seconds for validating
+                ``exp`` and ``nbf`` (default value: ``60``).
+            mp_context(Optional[str]): The start method of the worker processes
+                (e.g., ``"spawn"``). If it is not specified, the default method of
+                the platform is used.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if not isinstance(processes, int) or processes < 1:
+            raise ValueError("processes should be positive int.")
+        b_key_set = _to_key_set(key_set)
+        # Invalid key sets are rejected before starting the workers.
+        _load_key_set(b_key_set)
+        if not isinstance(ca_certs, str):
+            raise ValueError("ca_certs should be str.")
+
+        mp: Any = multiprocessing.get_context(mp_context)
+        # The lock serializes update_keys and close. A batch only takes idle workers from the queue.
+        self._lock = threading.Lock()
+        self._idle: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+        self._conns: List[Connection] = []
+        self._procs: List[Any] = []
+        self._closed = False
+        self._broken = ""
+        for i in range(processes):
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_worker, args=(child, b_key_set, ca_certs, expires_in, leeway), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+            self._idle.put(i)
+
+    def __enter__(self) -> "VerifierPool":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def processes(self) -> int:
+        """
+        The number of worker processes.
+        """
+        return len(self._procs)
+
+    def decode(
+        self, tokens: Sequence[bytes], no_verify: bool = False, now: Optional[int] = None
+    ) -> List[Union[Dict[int, Any], bytes, Exception]]:
+        """
+        Verifies and decodes CWTs on the worker processes. The tokens are split
+        into one contiguous chunk per idle worker.
+
+        Args:
+            tokens (Sequence[bytes]): A list of encoded CWTs.
+            no_verify (bool): An indicator whether token verification is skiped
+                or not.
+            now (Optional[int]): The time (UNIX time) at which ``exp`` and ``nbf`` of
+                all of the CWTs are validated. If it is not specified, the current time
+                at the start of the batch is used.
+        Returns:
+            List[Union[Dict[int, Any], bytes, Exception]]: The decoded CWTs in input
+            order. If decoding a token fails, the exception (e.g., ``VerifyError``) is
+            set in place of its claims.
+        Raises:
+            ValueError: Invalid arguments.
+            CWTError: The pool has been closed or a worker process has terminated.
+        """
+        if not all(isinstance(t, bytes) for t in tokens):
+            raise ValueError("tokens should be list of bytes.")
+        if not tokens:
+            return []
+        now = int(time.time()) if now is None else now
+        workers = self._acquire(len(tokens))
+        try:
+            n = len(workers)
+            size, rest = divmod(len(tokens), n)
+            start = 0
+            for i, w in enumerate(workers):
+                end = start + size + (1 if i < rest else 0)
+                self._send(self._conns[w], ("decode", list(tokens[start:end]), no_verify, now))
+                start = end
+            results: List[Any] = []
+            for w in workers:
+                results.extend(self._recv(self._conns[w]))
+            return results
+        finally:
+            self._release(workers)
+
+    def update_keys(self, key_set: KeySet):
+        """
+        Replaces the key set of all of the workers without restarting them.
+        It waits for the batches in progress. The tokens passed to
+        :func:`decode` after this call returns are verified with the new key
+        set. If a worker fails to load the key set, the pool becomes unusable
+        since the workers may have different key sets.
+
+        Args:
+            key_set (Union[bytes, List[COSEKeyInterface]]): A CBOR-encoded
+                COSE_KeySet or a list of COSE keys.
+        Raises:
+            ValueError: Invalid arguments.
+            CWTError: The pool has been closed, a worker process has terminated or
+                a worker has failed to load the key set.
+        """
+        b_key_set = _to_key_set(key_set)
+        _load_key_set(b_key_set)
+        with self._lock:
+            self._check_open()
+            workers = self._acquire_all()
+            try:
+                self._check_open()
+                for w in workers:
+                    self._send(self._conns[w], ("keys", b_key_set, False, None))
+                errors = [self._recv(self._conns[w]) for w in workers]
+                err = next((e for e in errors if e is not None), None)
+                if err is not None:
+                    self._broken = "The keys of the workers have failed to be updated."
+                    raise CWTError("Failed to update the keys of the workers.") from err
+            finally:
+                self._release(workers)
+
+    def close(self):
+        """
+        Stops the worker processes. It can be called more than once.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # The batches in progress are finished before the workers are stopped.
+            workers = self._acquire_all()
+            for conn in self._conns:
+                try:
+                    conn.send(None)
+                except (OSError, ValueError):
+                    pass
+            for proc in self._procs:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join()
+            for conn in self._conns:
+                conn.close()
+            # The callers waiting for a worker are woken up to find the pool closed.
+            self._release(workers)
+
+    def _check_open(self):
+        if self._closed:
+            raise CWTError("The pool has been closed.")
+        if self._broken:
+            raise CWTError(self._broken)
+
+    def _acquire(self, n: int) -> List[int]:
+        # Waits for one idle worker and takes up to n - 1 more which are idle.
+        self._check_open()
+        workers = [self._idle.get()]
+        while len(workers) < n:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        if self._closed or self._broken:
+            self._release(workers)
+            self._check_open()
+        return workers
+
+    def _acquire_all(self) -> List[int]:
+        return [self._idle.get() for _ in self._conns]
+
+    def _release(self, workers: List[int]):
+        for w in workers:
+            self._idle.put(w)
+
+    def _send(self, conn: Connection, msg: Any):
+        try:
+            conn.send(msg)
+        except (OSError, ValueError) as err:
+            self._broken = "A worker process has terminated."
+            raise CWTError("A worker process has terminated.") from err
+
+    def _recv(self, conn: Connection) -> Any:
+        try:
+            return conn.recv()
+        except (EOFError, OSError) as err:
+            self._broken = "A worker process has terminated."
+            raise CWTError("A worker process has terminated.") from err
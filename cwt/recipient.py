@@ -12,6 +12,7 @@ from .const import (  # COSE_ALGORITHMS_CKDM_KEY_AGREEMENT_WITH_KEY_WRAP,
 )
 from .cose_key import COSEKey
 from .cose_key_interface import COSEKeyInterface
+from .ephemeral_key_pool import EphemeralKeyPool
 from .recipient_algs.aes_key_wrap import AESKeyWrap
 from .recipient_algs.direct_hkdf import DirectHKDF
 from .recipient_algs.direct_key import DirectKey
@@ -37,6 +38,7 @@ class Recipient:
         sender_key: Optional[COSEKeyInterface] = None,
         recipient_key: Optional[COSEKeyInterface] = None,
         context: Optional[Union[List[Any], Dict[str, Any]]] = None,
+        ephemeral_key_pool: Optional[EphemeralKeyPool] = None,
     ) -> RecipientInterface:
         """
         Creates a recipient from a CBOR-like dictionary with numeric keys.
@@ -49,11 +51,16 @@ class Recipient:
             recipient_key (Optional[COSEKeyInterface]): A recipient public key as COSEKey.
             context (Optional[Union[List[Any], Dict[str, Any]]]): Context
                 information structure.
+            ephemeral_key_pool (Optional[EphemeralKeyPool]): A pool of ephemeral keys
+                used by ECDH-ES recipients instead of generating a key on each encoding.
+                See :class:`EphemeralKeyPool <cwt.EphemeralKeyPool>`.
         Returns:
             RecipientInterface: A recipient object.
         Raises:
             ValueError: Invalid arguments.
         """
+        if ephemeral_key_pool is not None and not isinstance(ephemeral_key_pool, EphemeralKeyPool):
+            raise ValueError("ephemeral_key_pool should be EphemeralKeyPool.")
         p = to_cose_header(protected, algs=COSE_ALGORITHMS_RECIPIENT)
         u = to_cose_header(unprotected, algs=COSE_ALGORITHMS_RECIPIENT)
 
@@ -89,9 +96,9 @@ class Recipient:
         if alg in [-10, -11]:
             return DirectHKDF(p, u, ctx)
         if alg in COSE_ALGORITHMS_CKDM_KEY_AGREEMENT_DIRECT.values():
-            return ECDH_DirectHKDF(p, u, ciphertext, recipients, sender_key, recipient_key, ctx)
+            return ECDH_DirectHKDF(p, u, ciphertext, recipients, sender_key, recipient_key, ctx, ephemeral_key_pool)
         if alg in COSE_ALGORITHMS_CKDM_KEY_AGREEMENT_WITH_KEY_WRAP.values():
-            return ECDH_AESKeyWrap(p, u, ciphertext, recipients, sender_key, recipient_key, ctx)
+            return ECDH_AESKeyWrap(p, u, ciphertext, recipients, sender_key, recipient_key, ctx, ephemeral_key_pool)
         raise ValueError(f"Unsupported or unknown alg(1): {alg}.")
 
     @classmethod
@@ -2,10 +2,10 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
 
-from ..algs.ec2 import EC2Key
 from ..const import COSE_KEY_LEN, COSE_KEY_OPERATION_VALUES
 from ..cose_key import COSEKey
 from ..cose_key_interface import COSEKeyInterface
+from ..ephemeral_key_pool import EphemeralKeyPool, ephemeral_key
 from ..exceptions import DecodeError, EncodeError
 from ..recipient_interface import RecipientInterface
 
@@ -25,12 +25,14 @@ class ECDH_AESKeyWrap(RecipientInterface):
         sender_key: Optional[COSEKeyInterface] = None,
         recipient_key: Optional[COSEKeyInterface] = None,
         context: List[Any] = [],
+        ephemeral_key_pool: Optional[EphemeralKeyPool] = None,
     ):
         super().__init__(protected, unprotected, ciphertext, recipients)
         self._sender_public_key: Any = None
         self._sender_key = sender_key
         self._recipient_key = recipient_key
         self._context = context
+        self._ephemeral_key_pool = ephemeral_key_pool
 
         if self._alg in [-29, -30, -31]:  # ECDH-ES
             if -1 in self.unprotected:
@@ -51,7 +53,7 @@ class ECDH_AESKeyWrap(RecipientInterface):
 
         if self._alg in [-29, -30, -31]:
             # ECDH-ES
-            self._sender_key = EC2Key({1: 2, -1: self._recipient_key.crv, 3: self._alg})
+            self._sender_key = ephemeral_key(self._recipient_key.crv, self._alg, self._ephemeral_key_pool)
         else:
             # ECDH-SS (alg=-32, -33, -34)
             if not self._sender_key:
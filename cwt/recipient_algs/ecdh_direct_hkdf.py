@@ -1,11 +1,10 @@
 from secrets import token_bytes
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from ..algs.ec2 import EC2Key
-from ..algs.okp import OKPKey
 from ..const import COSE_KEY_LEN, COSE_KEY_OPERATION_VALUES
 from ..cose_key import COSEKey
 from ..cose_key_interface import COSEKeyInterface
+from ..ephemeral_key_pool import EphemeralKeyPool, ephemeral_key
 from ..exceptions import DecodeError
 from .direct import Direct
 
@@ -25,12 +24,14 @@ class ECDH_DirectHKDF(Direct):
         sender_key: Optional[COSEKeyInterface] = None,
         recipient_key: Optional[COSEKeyInterface] = None,
         context: List[Any] = [],
+        ephemeral_key_pool: Optional[EphemeralKeyPool] = None,
     ):
         super().__init__(protected, unprotected, ciphertext, recipients)
         self._sender_public_key: Any = None
         self._sender_key = sender_key
         self._recipient_key = recipient_key
         self._context = context
+        self._ephemeral_key_pool = ephemeral_key_pool
 
         self._salt = None
         if -20 in unprotected:
@@ -67,11 +68,7 @@ class ECDH_DirectHKDF(Direct):
         # Derive key.
         if self._alg in [-25, -26]:
             # ECDH-ES
-            if self._recipient_key.kty == 2:
-                self._sender_key = EC2Key({1: 2, -1: self._recipient_key.crv, 3: self._alg})
-            else:
-                # should drop this support.
-                self._sender_key = OKPKey({1: 1, -1: self._recipient_key.crv, 3: self._alg})
+            self._sender_key = ephemeral_key(self._recipient_key.crv, self._alg, self._ephemeral_key_pool)
         else:
             # ECDH-SS (alg=-27 or -28)
             if not self._sender_key:
@@ -1,6 +1,6 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
-
-from pyhpke import AEADId, CipherSuite, KDFId, KEMId, KEMKey, KEMKeyInterface
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 from ..cose_key import COSEKey
 from ..cose_key_interface import COSEKeyInterface
@@ -8,6 +8,16 @@ from ..enums import COSEAlgs
 from ..exceptions import DecodeError, EncodeError
 from ..recipient_interface import RecipientInterface
 
+if TYPE_CHECKING:
+    from pyhpke import CipherSuite, KEMKeyInterface
+
+# The cipher suites are stateless and shared by all of the messages with the same alg.
+_SUITES: Dict[int, "CipherSuite"] = {}
+
+# The KEM keys converted from COSE keys. The entries are removed with the COSE keys.
+_KEM_KEYS: "weakref.WeakKeyDictionary[COSEKeyInterface, KEMKeyInterface]" = weakref.WeakKeyDictionary()
+_KEM_KEYS_LOCK = threading.Lock()
+
 
 def to_hpke_ciphersuites(alg: int) -> Tuple[int, int, int]:
     if alg == COSEAlgs.HPKE_BASE_P256_SHA256_AES128GCM:
@@ -33,6 +43,28 @@ def to_hpke_ciphersuites(alg: int) -> Tuple[int, int, int]:
     raise ValueError("alg should be one of the HPKE algorithms.")
 
 
+def _cipher_suite(alg: int) -> "CipherSuite":
+    suite = _SUITES.get(alg)
+    if suite is None:
+        # pyhpke is imported on first use to keep ``import cwt`` fast.
+        from pyhpke import AEADId, CipherSuite, KDFId, KEMId
+
+        kem, kdf, aead = to_hpke_ciphersuites(alg)
+        suite = _SUITES[alg] = CipherSuite.new(KEMId(kem), KDFId(kdf), AEADId(aead))
+    return suite
+
+
+def _to_kem_key(src: COSEKeyInterface) -> "KEMKeyInterface":
+    kem_key = _KEM_KEYS.get(src)
+    if kem_key is None:
+        from pyhpke import KEMKey
+
+        kem_key = KEMKey.from_pyca_cryptography_key(src.key)
+        with _KEM_KEYS_LOCK:
+            _KEM_KEYS[src] = kem_key
+    return kem_key
+
+
 class HPKE(RecipientInterface):
     def __init__(
         self,
@@ -44,14 +76,13 @@ class HPKE(RecipientInterface):
     ):
         super().__init__(protected, unprotected, ciphertext, recipients)
         self._recipient_key = recipient_key
-        kem, kdf, aead = to_hpke_ciphersuites(self._alg)
-        self._suite = CipherSuite.new(KEMId(kem), KDFId(kdf), AEADId(aead))
+        self._suite = _cipher_suite(self._alg)
         return
 
     def encode(self, plaintext: bytes = b"", aad: bytes = b"") -> Tuple[List[Any], Optional[COSEKeyInterface]]:
         if self._recipient_key is None:
             raise ValueError("recipient_key should be set in advance.")
-        self._kem_key = self._to_kem_key(self._recipient_key)
+        self._kem_key = _to_kem_key(self._recipient_key)
         try:
             enc, ctx = self._suite.create_sender_context(self._kem_key)
             self._unprotected[-4] = enc
@@ -68,13 +99,10 @@ class HPKE(RecipientInterface):
         as_cose_key: bool = False,
     ) -> Union[bytes, COSEKeyInterface]:
         try:
-            ctx = self._suite.create_recipient_context(self._unprotected[-4], self._to_kem_key(key))
+            ctx = self._suite.create_recipient_context(self._unprotected[-4], _to_kem_key(key))
             raw = ctx.open(self._ciphertext, aad=aad)
             if not as_cose_key:
                 return raw
             return COSEKey.from_symmetric_key(raw, alg=alg, kid=self._kid)
         except Exception as err:
             raise DecodeError("Failed to open.") from err
-
-    def _to_kem_key(self, src: COSEKeyInterface) -> KEMKeyInterface:
-        return KEMKey.from_pyca_cryptography_key(src.key)
@@ -1,8 +1,12 @@
+from functools import partial
 from typing import Any, Dict, List, Optional, Union
 
+from .batch import run_trials
 from .cbor_processor import CBORProcessor
 from .cose_key import COSEKey
 from .cose_key_interface import COSEKeyInterface
+from .cose_structure import enc_structure
+from .key_ring import KeyRing, find_keys
 from .recipient import Recipient
 from .recipient_interface import RecipientInterface
 
@@ -32,9 +36,20 @@ class Recipients(CBORProcessor):
             res.append(Recipient.from_list(r, context))
         return cls(res, verify_kid)
 
-    def derive_key(self, keys: List[COSEKeyInterface], alg: int, external_aad: bytes, content_aad: bytes) -> COSEKeyInterface:
+    def derive_key(
+        self,
+        keys: Union[List[COSEKeyInterface], KeyRing],
+        alg: int,
+        external_aad: bytes,
+        content_aad: str,
+        workers: int = 1,
+        op: int = 0,
+    ) -> COSEKeyInterface:
         """
         Decodes an appropriate key from recipients or keys provided as a parameter ``keys``.
+        The candidate keys for each recipient are looked up by its ``kid`` and
+        ``op`` (the key operation of the content key). With two or more
+        ``workers``, they are tried in parallel on the shared thread pool.
         """
         if not self._recipients:
             raise ValueError("No recipients.")
@@ -42,29 +57,21 @@ class Recipients(CBORProcessor):
         for r in self._recipients:
             if not r.kid and self._verify_kid:
                 raise ValueError("kid should be specified in recipient.")
-            aad = self._dumps([content_aad, r.b_protected, external_aad])
-            if r.kid:
-                for k in keys:
-                    if k.kid != r.kid:
-                        continue
-                    try:
-                        res = r.decode(k, aad, alg=alg, as_cose_key=True)
-                        if not isinstance(res, COSEKeyInterface):
-                            raise TypeError("Internal type error.")
-                        return res
-                    except Exception as e:
-                        err = e
-                continue
-            for k in keys:
-                try:
-                    res = r.decode(k, aad, alg=alg, as_cose_key=True)
-                    if not isinstance(res, COSEKeyInterface):
-                        raise TypeError("Internal type error.")
-                    return res
-                except Exception as e:
-                    err = e
+            aad = enc_structure(content_aad, r.b_protected, external_aad)
+            cands = find_keys(keys, r.kid, op)
+            i, res, _ = run_trials(partial(self._decode_key, r, aad=aad, alg=alg), cands, workers)
+            if i >= 0:
+                return res
+            if res is not None:
+                err = res
         raise err
 
+    def _decode_key(self, r: RecipientInterface, k: COSEKeyInterface, aad: bytes, alg: int) -> COSEKeyInterface:
+        res = r.decode(k, aad, alg=alg, as_cose_key=True)
+        if not isinstance(res, COSEKeyInterface):
+            raise TypeError("Internal type error.")
+        return res
+
     def _create_key(self, alg: int, k: COSEKeyInterface, r: RecipientInterface) -> COSEKeyInterface:
         if r.alg == -6:  # direct
             # if k.alg != alg:
@@ -0,0 +1,505 @@
+import hashlib
+import heapq
+import math
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .exceptions import VerifyError
+
+REPLAY_GUARD_TTL = 3600  # 1 hour
+REPLAY_GUARD_SIZE = 1_000_000
+REPLAY_GUARD_BUCKET_SECONDS = 60  # 1 min
+
+BLOOM_REPLAY_GUARD_CAPACITY = 100_000
+BLOOM_REPLAY_GUARD_ERROR_RATE = 1e-6
+BLOOM_REPLAY_GUARD_WINDOW = 600  # 10 min
+BLOOM_REPLAY_GUARD_SLOTS = 8
+
+# magic, salt, bits per slot, hashes, slots, window
+_BLOOM_HEADER = struct.Struct("<8s16sQQQQ")
+_BLOOM_MAGIC = b"CWTRPG01"
+# window index, the latest expiry of the entries
+_BLOOM_SLOT_HEADER = struct.Struct("<qq")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cwt_replay (
+    cti BLOB PRIMARY KEY,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cwt_replay_expires_at ON cwt_replay (expires_at);
+"""
+
+
+class ReplayGuard:
+    """
+    The base class of the replay guards used by :func:`CWT.decode <cwt.CWT.decode>`
+    to reject a CWT whose ``cti`` has already been seen.
+
+    Each ``cti`` is remembered until the CWT expires, i.e., until ``exp`` plus
+    ``leeway``, or for ``ttl`` seconds if the CWT has no ``exp``. A CWT without
+    ``cti`` cannot be distinguished from its replay, so it is not checked.
+
+    A backend is implemented by overriding :func:`add`, which should check and
+    store a ``cti`` atomically.
+
+    Examples:
+
+        >>> from cwt import CWT, MemoryReplayGuard
+        >>> ctx = CWT.new(replay_guard=MemoryReplayGuard())
+        >>> claims = ctx.decode(token, public_key)
+        >>> claims = ctx.decode(token, public_key)
+        cwt.exceptions.VerifyError: The token has been replayed.
+    """
+
+    def __init__(self, ttl: int = REPLAY_GUARD_TTL):
+        """
+        Constructor.
+
+        Args:
+            ttl (int): The lifetime in seconds of an entry of a CWT without ``exp``
+                (default value: ``3600``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(ttl, int) or ttl <= 0:
+            raise ValueError("ttl should be positive int.")
+        self._ttl = ttl
+        self._counter_lock = threading.Lock()
+        self._accepted = 0
+        self._replayed = 0
+
+    @property
+    def accepted(self) -> int:
+        """
+        The number of ``cti`` s seen for the first time.
+        """
+        return self._accepted
+
+    @property
+    def replayed(self) -> int:
+        """
+        The number of rejected replays.
+        """
+        return self._replayed
+
+    def check(self, cti: bytes, expires_at: Optional[int] = None, now: Optional[int] = None) -> bool:
+        """
+        Checks whether a ``cti`` is seen for the first time and remembers it.
+
+        Args:
+            cti (bytes): The ``cti`` of a verified CWT.
+            expires_at (Optional[int]): The time (UNIX time) when the entry expires.
+                If it is not specified, the entry expires after ``ttl`` seconds.
+            now (Optional[int]): The current time (UNIX time). If it is not specified,
+                ``time.time()`` is used.
+        Returns:
+            bool: ``True`` if the ``cti`` is seen for the first time, or ``False``
+            if it is a replay.
+        Raises:
+            VerifyError: The ``cti`` cannot be remembered.
+        """
+        if now is None:
+            now = int(time.time())
+        if expires_at is None:
+            expires_at = now + self._ttl
+        fresh = expires_at <= now or self.add(cti, expires_at, now)
+        with self._counter_lock:
+            if fresh:
+                self._accepted += 1
+            else:
+                self._replayed += 1
+        return fresh
+
+    def add(self, cti: bytes, expires_at: int, now: int) -> bool:
+        """
+        Stores a ``cti`` unless it is stored with an expiry after ``now``. It
+        should be overridden by a backend.
+
+        Args:
+            cti (bytes): The ``cti``.
+            expires_at (int): The time (UNIX time) when the entry expires.
+            now (int): The current time (UNIX time).
+        Returns:
+            bool: ``True`` if the ``cti`` has been stored, or ``False`` if it has
+            already been stored.
+        Raises:
+            VerifyError: The ``cti`` cannot be stored.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Clears the entries and the counters.
+        """
+        with self._counter_lock:
+            self._accepted = 0
+            self._replayed = 0
+        return
+
+
+class MemoryReplayGuard(ReplayGuard):
+    """
+    An in-process replay guard which remembers the exact ``cti`` s in a dict,
+    so it has no false positives. The entries are grouped into buckets of
+    ``bucket_seconds`` by their expiry, and a whole bucket is dropped once it
+    has expired, so the cost of the expiry is amortized O(1).
+
+    The memory is bounded by ``max_entries``. Since an unexpired entry cannot
+    be dropped without accepting its replay, a new ``cti`` is rejected with
+    ``VerifyError`` while the guard is full. Use :class:`BloomReplayGuard
+    <cwt.BloomReplayGuard>` if the number of unexpired CWTs cannot be bounded.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = REPLAY_GUARD_SIZE,
+        ttl: int = REPLAY_GUARD_TTL,
+        bucket_seconds: int = REPLAY_GUARD_BUCKET_SECONDS,
+    ):
+        """
+        Constructor.
+
+        Args:
+            max_entries (int): The maximum number of unexpired entries (default
+                value: ``1000000``).
+            ttl (int): The lifetime in seconds of an entry of a CWT without ``exp``
+                (default value: ``3600``).
+            bucket_seconds (int): The granularity in seconds of the expiry (default
+                value: ``60``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        super().__init__(ttl)
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries should be positive int.")
+        if not isinstance(bucket_seconds, int) or bucket_seconds <= 0:
+            raise ValueError("bucket_seconds should be positive int.")
+        self._max_entries = max_entries
+        self._bucket_seconds = bucket_seconds
+        self._entries: Dict[bytes, int] = {}
+        self._buckets: Dict[int, List[bytes]] = {}
+        self._heap: List[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, cti: bytes, expires_at: int, now: int) -> bool:
+        with self._lock:
+            self._purge(now)
+            exp = self._entries.get(cti)
+            if exp is not None and exp > now:
+                return False
+            if exp is None and len(self._entries) >= self._max_entries:
+                raise VerifyError("The replay guard is full.")
+            self._entries[cti] = expires_at
+            b = expires_at // self._bucket_seconds
+            bucket = self._buckets.get(b)
+            if bucket is None:
+                bucket = self._buckets[b] = []
+                heapq.heappush(self._heap, b)
+            bucket.append(cti)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._heap.clear()
+        super().clear()
+        return
+
+    def _purge(self, now: int):
+        # All of the entries in bucket b expire before (b + 1) * bucket_seconds.
+        while self._heap and (self._heap[0] + 1) * self._bucket_seconds <= now:
+            for cti in self._buckets.pop(heapq.heappop(self._heap)):
+                # The cti may have been stored again with a later expiry.
+                if self._entries.get(cti, now + 1) <= now:
+                    del self._entries[cti]
+        return
+
+
+class BloomReplayGuard(ReplayGuard):
+    """
+    A replay guard with a fixed memory size, which remembers the ``cti`` s in
+    rotating Bloom filters. It never accepts a replay, but may reject a fresh
+    CWT as a replay with a small probability.
+
+    The ``cti`` s received in each ``window`` seconds are added to one of
+    ``slots`` filters, and a filter is cleared for reuse once all of its
+    entries have expired. A lookup tests all of the unexpired filters, so it
+    costs O(``slots``) hash probes regardless of the number of entries.
+
+    The false positive rate (:attr:`false_positive_rate`) does not exceed
+    ``error_rate`` as long as at most ``capacity`` CWTs are received in each
+    window and each CWT expires within ``(slots - 1) * window`` seconds after it
+    is received. Otherwise a filter is reused before its entries expire, and
+    the rate increases as the filters fill up.
+
+    The filters can be placed in a shared memory (e.g.,
+    ``multiprocessing.shared_memory.SharedMemory``) or a shared ``mmap`` to
+    share the guard among processes. The buffer should be initialized by one
+    process (i.e., by creating the guard) before the others use it. Since
+    the processes do not lock each other, the same CWT received by two
+    processes at the same moment may be accepted by both. Use
+    :class:`SQLiteReplayGuard <cwt.SQLiteReplayGuard>` if it matters.
+
+    Examples:
+
+        >>> from multiprocessing import shared_memory
+        >>> from cwt import CWT, BloomReplayGuard
+        >>> size = BloomReplayGuard.buffer_size(capacity=100000)
+        >>> shm = shared_memory.SharedMemory(create=True, size=size)
+        >>> ctx = CWT.new(replay_guard=BloomReplayGuard(capacity=100000, buffer=shm.buf))
+    """
+
+    def __init__(
+        self,
+        capacity: int = BLOOM_REPLAY_GUARD_CAPACITY,
+        error_rate: float = BLOOM_REPLAY_GUARD_ERROR_RATE,
+        window: int = BLOOM_REPLAY_GUARD_WINDOW,
+        slots: int = BLOOM_REPLAY_GUARD_SLOTS,
+        ttl: int = REPLAY_GUARD_TTL,
+        buffer: Optional[Any] = None,
+    ):
+        """
+        Constructor.
+
+        Args:
+            capacity (int): The number of CWTs expected in a window (default value:
+                ``100000``).
+            error_rate (float): The maximum false positive rate of a lookup
+                (default value: ``1e-6``).
+            window (int): The length in seconds of the window of a filter (default
+                value: ``600``).
+            slots (int): The number of the filters (default value: ``8``).
+            ttl (int): The lifetime in seconds of an entry of a CWT without ``exp``
+                (default value: ``3600``).
+            buffer (Optional[Any]): A writable buffer of at least
+                :func:`buffer_size` bytes where the filters are placed. If it is
+                not specified, a ``bytearray`` is allocated.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        super().__init__(ttl)
+        if not isinstance(window, int) or window <= 0:
+            raise ValueError("window should be positive int.")
+        m, k = self._params(capacity, error_rate, slots)
+        self._capacity = capacity
+        self._bits = m
+        self._hashes = k
+        self._slots = slots
+        self._window = window
+        self._slot_size = _BLOOM_SLOT_HEADER.size + m // 8
+        size = _BLOOM_HEADER.size + self._slot_size * slots
+        if buffer is None:
+            buffer = bytearray(size)
+        buf = memoryview(buffer)
+        if buf.readonly:
+            raise ValueError("buffer should be writable.")
+        buf = buf.cast("B")
+        if len(buf) < size:
+            raise ValueError(f"buffer should be at least {size} bytes.")
+        self._buf = buf[:size]
+        self._lock = threading.Lock()
+
+        magic, salt, hm, hk, hslots, hwindow = _BLOOM_HEADER.unpack_from(self._buf, 0)
+        if magic == _BLOOM_MAGIC:
+            if (hm, hk, hslots, hwindow) != (m, k, slots, window):
+                raise ValueError("buffer has been initialized with different parameters.")
+        else:
+            salt = os.urandom(16)
+            _BLOOM_HEADER.pack_into(self._buf, 0, _BLOOM_MAGIC, salt, m, k, slots, window)
+        self._salt = salt
+
+    @classmethod
+    def buffer_size(
+        cls,
+        capacity: int = BLOOM_REPLAY_GUARD_CAPACITY,
+        error_rate: float = BLOOM_REPLAY_GUARD_ERROR_RATE,
+        slots: int = BLOOM_REPLAY_GUARD_SLOTS,
+    ) -> int:
+        """
+        Returns the size in bytes of the buffer needed for the parameters.
+
+        Args:
+            capacity (int): The number of CWTs expected in a window.
+            error_rate (float): The maximum false positive rate of a lookup.
+            slots (int): The number of the filters.
+        Returns:
+            int: The size in bytes.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        m, _ = cls._params(capacity, error_rate, slots)
+        return _BLOOM_HEADER.size + (_BLOOM_SLOT_HEADER.size + m // 8) * slots
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        The probability that a fresh CWT is rejected as a replay when all of the
+        filters hold ``capacity`` entries.
+        """
+        p = (1 - math.exp(-self._hashes * self._capacity / self._bits)) ** self._hashes
+        return 1 - (1 - p) ** self._slots
+
+    def add(self, cti: bytes, expires_at: int, now: int) -> bool:
+        d = hashlib.blake2b(cti, digest_size=16, key=self._salt).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        positions = [h % self._bits for h in range(h1, h1 + h2 * self._hashes, h2)]
+        buf = self._buf
+        cur = now // self._window
+        with self._lock:
+            for s in range(self._slots):
+                offset = _BLOOM_HEADER.size + self._slot_size * s
+                _, max_exp = _BLOOM_SLOT_HEADER.unpack_from(buf, offset)
+                if max_exp <= now:
+                    continue
+                offset += _BLOOM_SLOT_HEADER.size
+                if all(buf[offset + (p >> 3)] & (1 << (p & 7)) for p in positions):
+                    return False
+
+            offset = _BLOOM_HEADER.size + self._slot_size * (cur % self._slots)
+            w, max_exp = _BLOOM_SLOT_HEADER.unpack_from(buf, offset)
+            if w != cur and max_exp <= now:
+                # All of the entries of the previous window have expired.
+                buf[offset + _BLOOM_SLOT_HEADER.size : offset + self._slot_size] = bytes(self._bits // 8)
+                max_exp = 0
+            _BLOOM_SLOT_HEADER.pack_into(buf, offset, cur, max(max_exp, expires_at))
+            offset += _BLOOM_SLOT_HEADER.size
+            for p in positions:
+                buf[offset + (p >> 3)] |= 1 << (p & 7)
+        return True
+
+    def clear(self):
+        with self._lock:
+            start = _BLOOM_HEADER.size
+            self._buf[start:] = bytes(len(self._buf) - start)
+        super().clear()
+        return
+
+    @staticmethod
+    def _params(capacity: int, error_rate: float, slots: int):
+        if not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError("capacity should be positive int.")
+        if not isinstance(error_rate, float) or not 0 < error_rate < 1:
+            raise ValueError("error_rate should be float between 0 and 1.")
+        if not isinstance(slots, int) or slots < 2:
+            raise ValueError("slots should be int greater than 1.")
+        # A lookup tests all of the filters, so each of them has a share of the error rate.
+        p = error_rate / slots
+        m = math.ceil(-capacity * math.log(p) / math.log(2) ** 2 / 8) * 8
+        k = max(1, round(m / capacity * math.log(2)))
+        return m, k
+
+
+class SQLiteReplayGuard(ReplayGuard):
+    """
+    A replay guard which remembers the exact ``cti`` s in an SQLite database,
+    so it can be shared by processes on the same host and survives restarts.
+    A ``cti`` is checked and stored with one atomic statement, and the expired
+    entries are deleted every ``purge_interval`` seconds.
+
+    Each thread uses its own connection to the database.
+
+    Examples:
+
+        >>> from cwt import CWT, SQLiteReplayGuard
+        >>> ctx = CWT.new(replay_guard=SQLiteReplayGuard("/var/lib/cwt/replay.db"))
+    """
+
+    def __init__(self, path: str, ttl: int = REPLAY_GUARD_TTL, purge_interval: int = 60):
+        """
+        Constructor.
+
+        Args:
+            path (str): The path to the SQLite database file. It is created if it
+                does not exist.
+            ttl (int): The lifetime in seconds of an entry of a CWT without ``exp``
+                (default value: ``3600``).
+            purge_interval (int): The interval in seconds of deleting the expired
+                entries (default value: ``60``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        super().__init__(ttl)
+        if not isinstance(path, str) or not path:
+            raise ValueError("path should be str.")
+        if not isinstance(purge_interval, int) or purge_interval <= 0:
+            raise ValueError("purge_interval should be positive int.")
+        self._path = path
+        self._purge_interval = purge_interval
+        self._next_purge = 0
+        self._local = threading.local()
+        self._conns: List[Any] = []
+        self._conns_lock = threading.Lock()
+        self._closed = False
+        try:
+            conn = self._conn()
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(_SCHEMA)
+        except Exception as err:
+            self.close()
+            raise ValueError(f"Failed to open the replay guard: {path}.") from err
+
+    def __enter__(self) -> "SQLiteReplayGuard":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        now = int(time.time())
+        return self._conn().execute("SELECT COUNT(*) FROM cwt_replay WHERE expires_at > ?", (now,)).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the connections to the database. It can be called more than once.
+        """
+        with self._conns_lock:
+            self._closed = True
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+        return
+
+    def add(self, cti: bytes, expires_at: int, now: int) -> bool:
+        conn = self._conn()
+        with conn:
+            if now >= self._next_purge:
+                self._next_purge = now + self._purge_interval
+                conn.execute("DELETE FROM cwt_replay WHERE expires_at <= ?", (now,))
+            cur = conn.execute(
+                "INSERT INTO cwt_replay (cti, expires_at) VALUES (?, ?) "
+                "ON CONFLICT (cti) DO UPDATE SET expires_at = excluded.expires_at WHERE expires_at <= ?",
+                (cti, expires_at, now),
+            )
+        return cur.rowcount == 1
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cwt_replay")
+        super().clear()
+        return
+
+    def _conn(self) -> Any:
+        if self._closed:
+            raise ValueError("The replay guard has been closed.")
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        # sqlite3 is imported on first use to keep ``import cwt`` fast.
+        import sqlite3
+
+        with self._conns_lock:
+            if self._closed:
+                raise ValueError("The replay guard has been closed.")
+            conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conns.append(conn)
+        self._local.conn = conn
+        return conn
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Union
+from typing import Any, Dict, Iterable, Union
 
 from .cbor_processor import CBORProcessor
 from .const import COSE_ALGORITHMS_SIGNATURE
@@ -169,6 +169,20 @@ class Signer(CBORProcessor):
         self._signature = self._cose_key.sign(msg)
         return
 
+    def sign_chunks(self, chunks: Iterable[Any]):
+        """
+        Returns a digital signature for the message given as a sequence of
+        byte strings using the specified key value.
+
+        Args:
+            chunks (Iterable[Any]): The byte strings of a message to be signed.
+        Raises:
+            ValueError: Invalid arguments.
+            EncodeError: Failed to sign the message.
+        """
+        self._signature = self._cose_key.sign_chunks(chunks)
+        return
+
     def verify(self, msg: bytes):
         """
         Verifies that the specified digital signature is valid
@@ -0,0 +1,170 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .cose_key_interface import COSEKeyInterface
+from .key_ring import KeyRing
+
+TOKEN_CACHE_TTL = 3600  # 1 hour
+TOKEN_CACHE_SIZE = 1024
+
+
+class _Entry(NamedTuple):
+    claims: Dict[int, Any]
+    expires_at: float
+    # A strong reference to the key set keeps the ids in the cache key from being reused.
+    keys: Union[Tuple[COSEKeyInterface, ...], KeyRing]
+    kid: bytes
+    generation: int
+
+
+class TokenCache:
+    """
+    A cache of the claims of successfully verified CWTs used by
+    :func:`CWT.decode <cwt.CWT.decode>`.
+
+    The entries are keyed by the SHA-256 digest of the token and the identity
+    of the key set (the list of keys or the :class:`KeyRing <cwt.KeyRing>`)
+    used to verify it. Each entry expires at ``exp`` of the token minus
+    ``leeway``, or after ``ttl`` seconds, whichever comes first. The cache is
+    bounded by ``max_entries`` and the least recently used entry is evicted
+    first. When a key is removed from a ``KeyRing``, the entries which may have
+    been verified with the key are invalidated.
+
+    The claims are copied, including the nested maps and arrays, when they are
+    stored and looked up, so that modifying the returned claims does not
+    affect the cache.
+    """
+
+    def __init__(self, ttl: int = TOKEN_CACHE_TTL, max_entries: int = TOKEN_CACHE_SIZE):
+        """
+        Constructor.
+
+        Args:
+            ttl (int): The maximum lifetime in seconds of a cached entry.
+            max_entries (int): The maximum number of cached entries.
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if not isinstance(ttl, int) or ttl <= 0:
+            raise ValueError("ttl should be positive int.")
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries should be positive int.")
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._cache: OrderedDict[Tuple[bytes, Tuple[int, ...]], _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of decodings answered from the cache.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of decodings which were not found in the cache.
+        """
+        return self._misses
+
+    def clear(self):
+        """
+        Clears the cached entries and the counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._hits = 0
+            self._misses = 0
+        return
+
+    def get(
+        self, data: bytes, keys: Union[List[COSEKeyInterface], KeyRing], now: Optional[float] = None
+    ) -> Optional[Dict[int, Any]]:
+        """
+        Looks up the claims of a verified CWT.
+
+        Args:
+            data (bytes): A byte string of an encoded CWT.
+            keys (Union[List[COSEKeyInterface], KeyRing]): The keys used to verify the CWT.
+            now (Optional[float]): The current time (UNIX time). If it is not
+                specified, ``time.time()`` is used.
+        Returns:
+            Optional[Dict[int, Any]]: A copy of the cached claims or ``None``.
+        """
+        cache_key = self._cache_key(data, keys)
+        if now is None:
+            now = time.time()
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                if now < entry.expires_at and not (
+                    isinstance(entry.keys, KeyRing) and entry.keys.removed_since(entry.generation, entry.kid)
+                ):
+                    self._cache.move_to_end(cache_key)
+                    self._hits += 1
+                    return _copy(entry.claims)
+                del self._cache[cache_key]
+            self._misses += 1
+        return None
+
+    def put(
+        self,
+        data: bytes,
+        keys: Union[List[COSEKeyInterface], KeyRing],
+        claims: Dict[int, Any],
+        kid: bytes,
+        generation: int,
+        expires_at: Optional[float] = None,
+        now: Optional[float] = None,
+    ):
+        """
+        Stores the claims of a verified CWT.
+
+        Args:
+            data (bytes): A byte string of an encoded CWT.
+            keys (Union[List[COSEKeyInterface], KeyRing]): The keys used to verify the CWT.
+            claims (Dict[int, Any]): The verified claims.
+            kid (bytes): The ``kid`` in the outermost COSE headers of the CWT.
+            generation (int): The :attr:`KeyRing.generation <cwt.KeyRing.generation>`
+                read before the verification. It is ignored for a list of keys.
+            expires_at (Optional[float]): The time when the entry expires. It is
+                capped by ``ttl``.
+            now (Optional[float]): The current time (UNIX time). If it is not
+                specified, ``time.time()`` is used.
+        """
+        if now is None:
+            now = time.time()
+        expires_at = now + self._ttl if expires_at is None else min(now + self._ttl, expires_at)
+        if expires_at <= now:
+            return
+        entry = _Entry(_copy(claims), expires_at, keys if isinstance(keys, KeyRing) else tuple(keys), kid, generation)
+        cache_key = self._cache_key(data, keys)
+        with self._lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return
+
+    @staticmethod
+    def _cache_key(data: bytes, keys: Union[List[COSEKeyInterface], KeyRing]) -> Tuple[bytes, Tuple[int, ...]]:
+        ids = (id(keys),) if isinstance(keys, KeyRing) else tuple(id(k) for k in keys)
+        return hashlib.sha256(data).digest(), ids
+
+
+def _copy(v: Any) -> Any:
+    # Claims are decoded from CBOR, so only maps and arrays have to be copied.
+    if isinstance(v, dict):
+        return {k: _copy(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_copy(x) for x in v]
+    return v
@@ -0,0 +1,250 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Span:
+    """
+    A timed phase of COSE/CWT processing. It is used as a context manager and
+    passed to :func:`Tracer.on_span <cwt.Tracer.on_span>` when it ends.
+
+    The phases are named as follows:
+
+    - ``cose.encode``: An entire encoding.
+    - ``cose.decode``, ``cwt.decode``: An entire decoding.
+    - ``cose.parse``, ``cwt.parse``: CBOR parsing of the message or the claims.
+    - ``cose.headers``: Decoding and validation of the headers.
+    - ``cose.key_lookup``: Looking up the candidate keys.
+    - ``cwt.key_resolve``: Looking up the keys of a layer with the resolver of
+      :class:`AsyncCWT <cwt.aio.AsyncCWT>`, which is awaited on the event loop.
+    - ``cose.cert_validation``: Validation of the certificate bound to a key.
+    - ``cose.recipients``: Key derivation through the recipients.
+    - ``cose.crypto``: Signature/MAC verification or decryption with the candidate keys.
+    - ``cwt.claims``: Validation of the claims (e.g., ``exp`` and ``nbf``).
+
+    The attributes include ``tag``, ``alg``, ``keys_tried`` and ``payload_size``
+    where applicable. If the phase fails, the class name of the exception is set
+    to ``error``.
+    """
+
+    __slots__ = ("name", "attrs", "start_ns", "duration_ns", "_tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = 0
+        self.duration_ns = 0
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.duration_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer.on_span(self)
+        return
+
+    def set(self, key: str, value: Any):
+        """
+        Sets an attribute of the span.
+        """
+        self.attrs[key] = value
+        return
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        return
+
+    def set(self, key: str, value: Any):
+        return
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    A tracer which receives a :class:`Span <cwt.Span>` for each phase of
+    encoding and decoding by :class:`COSE <cwt.COSE>` and :class:`CWT <cwt.CWT>`.
+    The spans can be received with a callback or by overriding :func:`on_span`.
+
+    Examples:
+
+        >>> from cwt import COSE, Tracer
+        >>> ctx = COSE.new(tracer=Tracer(lambda s: print(s.name, s.duration_ns, s.attrs)))
+    """
+
+    def __init__(self, callback: Optional[Callable[[Span], Any]] = None):
+        """
+        Constructor.
+
+        Args:
+            callback (Optional[Callable[[Span], Any]]): A function called with each span.
+        """
+        self._callback = callback
+
+    def span(self, name: str, **attrs: Any) -> Any:
+        """
+        Creates a span of a phase.
+
+        Args:
+            name (str): The name of the phase.
+            attrs (Any): The attributes of the span.
+        Returns:
+            Span: A span to be used as a context manager.
+        """
+        return Span(self, name, attrs)
+
+    def on_span(self, span: Span):
+        """
+        Receives a span which has ended. It calls the callback by default.
+
+        Args:
+            span (Span): The span.
+        """
+        if self._callback is not None:
+            self._callback(span)
+        return
+
+
+class NoopTracer(Tracer):
+    """
+    The default tracer which does nothing. It returns a shared span object
+    without reading the clock.
+    """
+
+    def span(self, name: str, **attrs: Any) -> Any:
+        return _NOOP_SPAN
+
+
+NOOP_TRACER = NoopTracer()
+
+
+class Histogram:
+    """
+    A histogram of the durations of a phase. The durations are counted in
+    buckets whose upper bounds are powers of two in nanoseconds.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, duration_ns: int):
+        """
+        Adds a duration.
+        """
+        if self.count == 0 or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.count += 1
+        self.total_ns += duration_ns
+        b = max(duration_ns, 1).bit_length()
+        self._buckets[b] = self._buckets.get(b, 0) + 1
+        return
+
+    @property
+    def buckets(self) -> List[Tuple[int, int]]:
+        """
+        The pairs of the upper bound in nanoseconds and the count of each non-empty bucket.
+        """
+        return [(1 << b, n) for b, n in sorted(self._buckets.items())]
+
+    @property
+    def mean_ns(self) -> float:
+        """
+        The mean duration in nanoseconds.
+        """
+        return self.total_ns / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> int:
+        """
+        Returns the upper bound in nanoseconds of the bucket which contains the p-th percentile.
+
+        Args:
+            p (float): The percentile (e.g., ``99``).
+        Returns:
+            int: The upper bound in nanoseconds.
+        """
+        if self.count == 0:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for upper, n in self.buckets:
+            seen += n
+            if seen >= rank:
+                return min(upper, self.max_ns)
+        return self.max_ns
+
+
+class HistogramTracer(Tracer):
+    """
+    A tracer which aggregates the durations of the spans into a
+    :class:`Histogram <cwt.Histogram>` per phase. The histograms can be
+    narrowed down by an attribute, e.g., ``group_by="alg"`` aggregates
+    ``cose.crypto`` of each algorithm separately.
+
+    Examples:
+
+        >>> from cwt import CWT, HistogramTracer
+        >>> tracer = HistogramTracer()
+        >>> ctx = CWT.new(tracer=tracer)
+        >>> ...
+        >>> for name, h in tracer.histograms().items():
+        ...     print(name, h.count, h.percentile(50), h.percentile(99))
+    """
+
+    def __init__(self, group_by: str = "", callback: Optional[Callable[[Span], Any]] = None):
+        """
+        Constructor.
+
+        Args:
+            group_by (str): An attribute name. If it is specified, the histograms
+                are keyed by ``<name>[<attribute value>]`` for the spans which have
+                the attribute.
+            callback (Optional[Callable[[Span], Any]]): A function called with each span.
+        """
+        super().__init__(callback)
+        self._group_by = group_by
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, span: Span):
+        key = span.name
+        if self._group_by and self._group_by in span.attrs:
+            key = f"{span.name}[{span.attrs[self._group_by]}]"
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = Histogram()
+            h.add(span.duration_ns)
+        super().on_span(span)
+        return
+
+    def histograms(self) -> Dict[str, Histogram]:
+        """
+        Returns the histograms keyed by the phase names.
+        """
+        with self._lock:
+            return dict(self._histograms)
+
+    def clear(self):
+        """
+        Clears the histograms.
+        """
+        with self._lock:
+            self._histograms.clear()
+        return
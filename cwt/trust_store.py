@@ -0,0 +1,240 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .cert_validator import (
+    CERT_VALIDATION_CACHE_SIZE,
+    CERT_VALIDATION_CACHE_TTL,
+    CertValidator,
+)
+
+TRUST_STORE_CHECK_INTERVAL = 60  # 1 min
+
+
+class _Snapshot(NamedTuple):
+    certs: Tuple[bytes, ...]
+    by_fingerprint: Dict[bytes, bytes]
+    by_key_id: Dict[bytes, Tuple[bytes, ...]]
+    validator: CertValidator
+    stamp: Any
+
+
+class TrustStore:
+    """
+    A set of trusted root CA certificates (trust anchors) which is loaded once
+    and can be shared by reference by any number of :class:`COSE <cwt.COSE>`
+    and :class:`CWT <cwt.CWT>` instances through their ``ca_certs`` parameter.
+    The :class:`CertValidator <cwt.CertValidator>`, including its cache of
+    validation results, is shared as well.
+
+    The anchors are indexed by the SHA-256 fingerprint of the DER-encoded
+    certificate and by the subject key identifier.
+
+    If the anchors are loaded from a file or a directory, the file (or the
+    files in the directory) are checked for changes at most once every
+    ``check_interval`` seconds when the validator is used, and reloaded if
+    changed. A reload is applied atomically: a concurrent validation uses
+    either the previous anchors or the new ones. If the reload fails, the
+    previous anchors are kept.
+
+    Examples:
+
+        >>> from cwt import CWT, TrustStore
+        >>> store = TrustStore("/path/to/ca_certs.pem")
+        >>> contexts = {tenant: CWT.new(ca_certs=store) for tenant in tenants}
+    """
+
+    def __init__(
+        self,
+        source: Union[str, List[bytes]],
+        check_interval: int = TRUST_STORE_CHECK_INTERVAL,
+        cert_cache_ttl: int = CERT_VALIDATION_CACHE_TTL,
+        cert_cache_size: int = CERT_VALIDATION_CACHE_SIZE,
+    ):
+        """
+        Constructor.
+
+        Args:
+            source (Union[str, List[bytes]]): The path to a file which contains a
+                concatenated list of PEM-formatted (or a DER-formatted) trusted root
+                CA certificates, the path to a directory which contains such files,
+                or a list of DER-formatted certificates.
+            check_interval (int): The minimum interval in seconds between the checks
+                for changes of the files (default value: ``60``). If ``0`` is
+                specified, the files are reloaded only by :func:`reload`.
+            cert_cache_ttl (int): The maximum lifetime in seconds of a cached
+                validation result of the :class:`CertValidator <cwt.CertValidator>`
+                (default value: ``3600``).
+            cert_cache_size (int): The maximum number of cached validation results
+                (default value: ``1024``).
+        Raises:
+            ValueError: Invalid arguments.
+        """
+        if isinstance(source, str):
+            if not os.path.exists(source):
+                raise ValueError(f"source not found: {source}.")
+        elif not isinstance(source, list) or not all(isinstance(c, bytes) for c in source):
+            raise ValueError("source should be str or list of bytes.")
+        if not isinstance(check_interval, int) or check_interval < 0:
+            raise ValueError("check_interval should be non-negative int.")
+        self._source = source
+        self._check_interval = check_interval
+        self._cert_cache_ttl = cert_cache_ttl
+        self._cert_cache_size = cert_cache_size
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._next_check = time.monotonic() + check_interval
+        self._snapshot = self._load(self._stamp())
+
+    def __len__(self) -> int:
+        return len(self._snapshot.certs)
+
+    def __contains__(self, cert: object) -> bool:
+        return isinstance(cert, bytes) and hashlib.sha256(cert).digest() in self._snapshot.by_fingerprint
+
+    @property
+    def certs(self) -> Tuple[bytes, ...]:
+        """
+        The DER-formatted trusted root CA certificates.
+        """
+        return self._snapshot.certs
+
+    @property
+    def generation(self) -> int:
+        """
+        The number of times the certificates have been reloaded.
+        """
+        return self._generation
+
+    @property
+    def validator(self) -> CertValidator:
+        """
+        The validator with the current certificates. The files are checked for
+        changes before it is returned if ``check_interval`` has passed.
+        """
+        if self._check_interval > 0 and time.monotonic() >= self._next_check:
+            self._check()
+        return self._snapshot.validator
+
+    def find_by_fingerprint(self, fingerprint: bytes) -> Optional[bytes]:
+        """
+        Looks up a certificate by its fingerprint.
+
+        Args:
+            fingerprint (bytes): The SHA-256 digest of a DER-formatted certificate.
+        Returns:
+            Optional[bytes]: The DER-formatted certificate or ``None``.
+        """
+        return self._snapshot.by_fingerprint.get(fingerprint)
+
+    def find_by_key_id(self, key_id: bytes) -> Tuple[bytes, ...]:
+        """
+        Looks up certificates by their subject key identifier.
+
+        Args:
+            key_id (bytes): A subject key identifier.
+        Returns:
+            Tuple[bytes, ...]: The DER-formatted certificates. It is empty if not found.
+        """
+        return self._snapshot.by_key_id.get(key_id, ())
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Reloads the certificates if the files have been changed.
+
+        Args:
+            force (bool): Whether the certificates are reloaded even if the files have
+                not been changed.
+        Returns:
+            bool: Whether the certificates have been reloaded or not. It is always
+            ``False`` for the certificates given as a list.
+        Raises:
+            ValueError: Failed to load the certificates. The previous ones are kept.
+        """
+        if not isinstance(self._source, str):
+            return False
+        with self._lock:
+            self._next_check = time.monotonic() + self._check_interval
+            stamp = self._stamp()
+            if not force and stamp == self._snapshot.stamp:
+                return False
+            self._snapshot = self._load(stamp)
+            self._generation += 1
+        return True
+
+    def _check(self):
+        # Only one thread checks the files. The others keep using the current snapshot.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self._check_interval
+            stamp = self._stamp()
+            if stamp != self._snapshot.stamp:
+                self._snapshot = self._load(stamp)
+                self._generation += 1
+        except Exception:
+            # The files may be being written. They are checked again after the interval.
+            pass
+        finally:
+            self._lock.release()
+
+    def _files(self) -> List[str]:
+        if not isinstance(self._source, str):
+            return []
+        if not os.path.isdir(self._source):
+            return [self._source]
+        res = []
+        for name in sorted(os.listdir(self._source)):
+            path = os.path.join(self._source, name)
+            if not name.startswith(".") and os.path.isfile(path):
+                res.append(path)
+        return res
+
+    def _stamp(self) -> Any:
+        if not isinstance(self._source, str):
+            return None
+        try:
+            res = []
+            for path in self._files():
+                st = os.stat(path)
+                res.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+            return tuple(res)
+        except OSError as err:
+            raise ValueError(f"Failed to load the certificates from {self._source}.") from err
+
+    def _load(self, stamp: Any) -> _Snapshot:
+        # asn1crypto is imported on first use to keep ``import cwt`` fast.
+        from asn1crypto import pem, x509
+
+        ders: List[bytes] = []
+        if isinstance(self._source, str):
+            for path in self._files():
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError as err:
+                    raise ValueError(f"Failed to load the certificates from {path}.") from err
+                if pem.detect(data):
+                    ders += [der for typ, _, der in pem.unarmor(data, multiple=True) if typ == "CERTIFICATE"]
+                else:
+                    ders.append(data)
+        else:
+            ders = list(self._source)
+        if not ders:
+            raise ValueError("source should contain at least one certificate.")
+
+        by_fingerprint: Dict[bytes, bytes] = {}
+        by_key_id: Dict[bytes, Tuple[bytes, ...]] = {}
+        for der in ders:
+            try:
+                key_id = x509.Certificate.load(der).key_identifier
+            except Exception as err:
+                raise ValueError("source should contain only X.509 certificates.") from err
+            by_fingerprint[hashlib.sha256(der).digest()] = der
+            if key_id:
+                by_key_id[key_id] = by_key_id.get(key_id, ()) + (der,)
+        certs = tuple(by_fingerprint.values())
+        validator = CertValidator(list(certs), self._cert_cache_ttl, self._cert_cache_size)
+        return _Snapshot(certs, by_fingerprint, by_key_id, validator, stamp)
@@ -1,6 +1,8 @@
 import base64
 import json
-from typing import Any, Dict, List, Optional, Union
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import cbor2
 
@@ -346,5 +348,91 @@ def to_recipient_context(alg: int, u: Dict[int, Any], context: Union[List[Any],
     return ctx
 
 
+DETERMINISTIC_HEADER_CACHE_SIZE = 256
+
+_UINT64_MAX = 2**64 - 1
+_CACHEABLE_TYPES = (int, str, bytes)
+_deterministic_header_cache: "OrderedDict[Any, bytes]" = OrderedDict()
+_deterministic_header_cache_lock = threading.Lock()
+
+
+def _deterministic_key(label: Any) -> Tuple[Any, ...]:
+    # Returns a key which orders the labels in the bytewise lexicographic order of
+    # their deterministic encodings (RFC 8949 section 4.2.1) without encoding them.
+    # The first item is the major type, which is the high-order 3 bits of the first
+    # byte. For unsigned/negative integers and byte/text strings, the length of the
+    # encoded argument grows with the argument, so the order is arithmetic.
+    t = type(label)
+    if t is int:
+        if 0 <= label <= _UINT64_MAX:
+            return (0, label)
+        if -(2**64) <= label < 0:
+            return (1, -1 - label)
+    elif t is str:
+        b = label.encode("utf-8")
+        return (3, len(b), b)
+    elif t is bytes:
+        return (2, len(label), label)
+    # Others, e.g., bool, float and bignum, are ordered by their encodings.
+    b = cbor2.dumps(label)
+    return (b[0] >> 5, -1, b)
+
+
+def _sort_nested(v: Any) -> Any:
+    if isinstance(v, dict):
+        return sort_keys_for_deterministic_encoding(v)
+    if isinstance(v, list):
+        return [_sort_nested(x) for x in v]
+    return v
+
+
 def sort_keys_for_deterministic_encoding(d: Dict[int, Any]) -> Dict[int, Any]:
-    return {k: v for k, v in sorted(d.items(), key=lambda kv: cbor2.dumps(kv[0]))}
+    """
+    Sorts the keys of a map, including the maps nested in it (e.g., a COSE_Key
+    in a header parameter), in the core deterministic encoding order defined
+    in section 4.2.1 of RFC 8949.
+    """
+    if len(d) <= 1 and not any(isinstance(v, (dict, list)) for v in d.values()):
+        return dict(d)
+    return {k: _sort_nested(v) for k, v in sorted(d.items(), key=lambda kv: _deterministic_key(kv[0]))}
+
+
+def _freeze(v: Any) -> Any:
+    # Returns a hashable form of a header value, or None if it should not be cached.
+    # The types are included since, e.g., True == 1 but they are encoded differently.
+    t = type(v)
+    if t in _CACHEABLE_TYPES:
+        return (t, v)
+    if t is list or t is dict:
+        items = v.items() if t is dict else enumerate(v)
+        res = []
+        for k, x in items:
+            fk, fx = _freeze(k), _freeze(x)
+            if fk is None or fx is None:
+                return None
+            res.append((fk, fx))
+        return (t, tuple(res))
+    return None
+
+
+def encode_deterministic_header(d: Dict[int, Any]) -> bytes:
+    """
+    Encodes a header map with the core deterministic encoding defined in
+    section 4.2.1 of RFC 8949. The encoded forms of the maps which consist
+    of int/str/bytes items, lists and maps are cached, so encoding the same
+    header again costs only a lookup.
+    """
+    cache_key = _freeze(d)
+    if cache_key is not None:
+        with _deterministic_header_cache_lock:
+            res = _deterministic_header_cache.get(cache_key)
+            if res is not None:
+                _deterministic_header_cache.move_to_end(cache_key)
+                return res
+    res = cbor2.dumps(sort_keys_for_deterministic_encoding(d))
+    if cache_key is not None:
+        with _deterministic_header_cache_lock:
+            _deterministic_header_cache[cache_key] = res
+            if len(_deterministic_header_cache) > DETERMINISTIC_HEADER_CACHE_SIZE:
+                _deterministic_header_cache.popitem(last=False)
+    return res
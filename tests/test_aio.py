@@ -0,0 +1,433 @@
+"""
+Tests for cwt.aio.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cwt import COSE, CWT, COSEKey, Recipient, Signer, Tracer, VerifyError
+from cwt.aio import AsyncCOSE, AsyncCWT, CachingResolver
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+@pytest.fixture(scope="module")
+def public_key():
+    with open(key_path("public_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+class Resolver:
+    def __init__(self, keys: list, delay: float = 0):
+        self.keys = {k.kid: k for k in keys}
+        self.delay = delay
+        self.calls: list = []
+
+    async def __call__(self, kid: bytes, alg: int):
+        self.calls.append((kid, alg))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.keys.get(kid)
+
+
+class TestAsyncCOSE:
+    """
+    Tests for AsyncCOSE.
+    """
+
+    def test_async_cose_constructor(self):
+        ctx = AsyncCOSE.new()
+        assert isinstance(ctx.cose, COSE)
+        assert ctx.max_concurrency == 0
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"cose": "xxx"}, "cose should be COSE."),
+            ({"executor": "xxx"}, "executor should be concurrent.futures.Executor."),
+            ({"max_concurrency": -1}, "max_concurrency should be non-negative int."),
+            ({"max_concurrency": "1"}, "max_concurrency should be non-negative int."),
+            ({"resolver": "xxx"}, "resolver should be callable."),
+        ],
+    )
+    def test_async_cose_constructor_with_invalid_args(self, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            AsyncCOSE.new(**kwargs)
+            pytest.fail("AsyncCOSE.new() should fail.")
+        assert msg in str(err.value)
+
+    def test_async_cose_sign1(self, private_key, public_key):
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True))
+
+        async def run():
+            encoded = await ctx.encode_and_sign(b"Hello world!", private_key)
+            return await ctx.decode(encoded, public_key)
+
+        assert asyncio.run(run()) == b"Hello world!"
+
+    def test_async_cose_runs_on_executor(self, private_key, public_key):
+        threads = set()
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True))
+        original = ctx.cose.decode_with_headers
+
+        def decode_with_headers(*args):
+            threads.add(threading.get_ident())
+            return original(*args)
+
+        ctx.cose.decode_with_headers = decode_with_headers
+
+        async def run():
+            encoded = await ctx.encode(b"Hello world!", private_key)
+            return await ctx.decode(encoded, public_key)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ctx = AsyncCOSE.new(ctx.cose, executor=executor)
+            assert asyncio.run(run()) == b"Hello world!"
+        assert threads and threading.get_ident() not in threads
+
+    def test_async_cose_mac0_and_encrypt0(self):
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="02")
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True))
+
+        async def run():
+            maced = await ctx.encode_and_mac(b"Hello world!", mac_key)
+            encrypted = await ctx.encode_and_encrypt(b"Hello world!", enc_key)
+            return await ctx.decode(maced, mac_key), await ctx.decode_with_headers(encrypted, enc_key)
+
+        maced, (p, u, encrypted) = asyncio.run(run())
+        assert maced == b"Hello world!"
+        assert encrypted == b"Hello world!"
+        assert p[1] == 1
+        assert u[4] == b"02"
+
+    def test_async_cose_with_resolver(self, private_key, public_key):
+        resolver = Resolver([public_key])
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True), resolver=resolver)
+
+        async def run():
+            encoded = await ctx.encode_and_sign(b"Hello world!", private_key)
+            return await ctx.decode(encoded)
+
+        assert asyncio.run(run()) == b"Hello world!"
+        assert resolver.calls == [(b"01", -7)]
+
+    def test_async_cose_with_resolver_parses_on_executor(self, private_key, public_key):
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True), resolver=Resolver([public_key]))
+        threads = []
+        loads = ctx.cose._loads
+
+        def spy(data):
+            threads.append(threading.get_ident())
+            return loads(data)
+
+        ctx.cose._loads = spy
+        encoded = ctx.cose.encode_and_sign(b"Hello world!", private_key)
+
+        async def run():
+            return threading.get_ident(), await ctx.decode(encoded)
+
+        loop_thread, res = asyncio.run(run())
+        assert res == b"Hello world!"
+        assert threads
+        assert loop_thread not in threads
+
+    def test_async_cose_with_resolver_for_signatures(self, private_key, public_key):
+        resolver = Resolver([public_key])
+        ctx = AsyncCOSE.new(resolver=resolver)
+        signers = [
+            Signer.new(cose_key=private_key, protected={"alg": "ES256"}, unprotected={"kid": "01"}),
+            Signer.new(cose_key=private_key, protected={"alg": "ES256"}, unprotected={"kid": "02"}),
+        ]
+        encoded = COSE.new().encode_and_sign(b"Hello world!", signers=signers)
+        assert asyncio.run(ctx.decode(encoded)) == b"Hello world!"
+        assert resolver.calls == [(b"01", -7), (b"02", -7)]
+
+    def test_async_cose_with_resolver_for_recipients(self):
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        resolver = Resolver([key])
+        ctx = AsyncCOSE.new(resolver=resolver)
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        encoded = COSE.new().encode_and_encrypt(b"Hello world!", key, protected={"alg": "A128GCM"}, recipients=[r])
+        assert asyncio.run(ctx.decode(encoded)) == b"Hello world!"
+        assert resolver.calls == [(b"01", -6)]
+
+    def test_async_cose_with_resolver_without_key(self, private_key):
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True), resolver=Resolver([]))
+        encoded = ctx.cose.encode_and_sign(b"Hello world!", private_key)
+        with pytest.raises(ValueError) as err:
+            asyncio.run(ctx.decode(encoded))
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_async_cose_without_keys_and_resolver(self, private_key):
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True))
+        encoded = ctx.cose.encode_and_sign(b"Hello world!", private_key)
+        with pytest.raises(ValueError) as err:
+            asyncio.run(ctx.decode(encoded))
+            pytest.fail("decode() should fail.")
+        assert "keys should be set if resolver is not specified." in str(err.value)
+
+    def test_async_cose_with_max_concurrency(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        ctx = AsyncCOSE.new(COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True), max_concurrency=2)
+        original = ctx.cose.encode_and_mac
+
+        def encode_and_mac(*args):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.pop()
+            return original(*args)
+
+        ctx.cose.encode_and_mac = encode_and_mac
+
+        async def run():
+            return await asyncio.gather(*[ctx.encode_and_mac(b"Hello world!", key) for _ in range(8)])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ctx._executor = executor
+            assert len(asyncio.run(run())) == 8
+        assert max(peak) == 2
+
+
+class TestAsyncCWT:
+    """
+    Tests for AsyncCWT.
+    """
+
+    def test_async_cwt_constructor_with_invalid_args(self):
+        with pytest.raises(ValueError) as err:
+            AsyncCWT.new(cwt=COSE.new())
+            pytest.fail("AsyncCWT.new() should fail.")
+        assert "cwt should be CWT." in str(err.value)
+
+    def test_async_cwt(self, private_key, public_key):
+        ctx = AsyncCWT.new(max_concurrency=4)
+        assert isinstance(ctx.cwt, CWT)
+
+        async def run():
+            token = await ctx.encode({"iss": "coaps://as.example"}, private_key)
+            return await asyncio.gather(*[ctx.decode(token, public_key) for _ in range(4)])
+
+        for claims in asyncio.run(run()):
+            assert claims[1] == "coaps://as.example"
+
+    def test_async_cwt_encode_and_variants(self, private_key, public_key):
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="03")
+        ctx = AsyncCWT.new()
+
+        async def run():
+            signed = await ctx.encode_and_sign({1: "coaps://as.example"}, private_key)
+            maced = await ctx.encode_and_mac({1: "coaps://as.example"}, mac_key)
+            encrypted = await ctx.encode_and_encrypt(signed, enc_key)
+            return [
+                await ctx.decode(signed, public_key),
+                await ctx.decode(maced, mac_key),
+                await ctx.decode(encrypted, [enc_key, public_key]),
+            ]
+
+        for claims in asyncio.run(run()):
+            assert claims[1] == "coaps://as.example"
+
+    def test_async_cwt_with_resolver_for_nested_cwt(self, private_key, public_key):
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="02")
+        resolver = Resolver([public_key, enc_key])
+        ctx = AsyncCWT.new(resolver=resolver)
+        signed = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+        token = ctx.cwt.encode_and_encrypt(signed, enc_key, tagged=True)
+        claims = asyncio.run(ctx.decode(token))
+        assert claims[1] == "coaps://as.example"
+        assert resolver.calls == [(b"02", 1), (b"01", -7)]
+
+    def test_async_cwt_with_resolver_and_expired_token(self, private_key, public_key):
+        ctx = AsyncCWT.new(resolver=Resolver([public_key]))
+        token = ctx.cwt.encode({1: "coaps://as.example", 4: 1000000000, 5: 900000000}, private_key)
+        with pytest.raises(VerifyError) as err:
+            asyncio.run(ctx.decode(token))
+            pytest.fail("decode() should fail.")
+        assert "The token has expired." in str(err.value)
+        assert asyncio.run(ctx.decode(token, no_verify=True))[1] == "coaps://as.example"
+        assert asyncio.run(ctx.decode(token, now=950000000))[1] == "coaps://as.example"
+
+    def test_async_cwt_with_resolver_runs_on_executor(self, private_key, public_key):
+        spans = []
+        tracer = Tracer(lambda span: spans.append((span.name, threading.get_ident())))
+        ctx = AsyncCWT.new(CWT.new(tracer=tracer), resolver=Resolver([public_key]))
+        token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+        spans.clear()
+
+        async def run():
+            return threading.get_ident(), await ctx.decode(token)
+
+        loop_thread, claims = asyncio.run(run())
+        assert claims[1] == "coaps://as.example"
+        names = [name for name, _ in spans]
+        for name in ["cwt.decode", "cwt.parse", "cwt.key_resolve", "cose.crypto", "cwt.claims"]:
+            assert name in names
+        for name, thread in spans:
+            if name in ["cwt.decode", "cwt.key_resolve"]:
+                assert thread == loop_thread
+            else:
+                assert thread != loop_thread
+
+    def test_async_cwt_with_resolver_using_executor(self, private_key, public_key):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+
+            async def resolve(kid, alg):
+                # e.g., a lookup in KeyRegistry offloaded to the same executor.
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(executor, lambda: public_key if kid == b"01" else None)
+
+            ctx = AsyncCWT.new(executor=executor, resolver=resolve)
+            token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+
+            async def run():
+                return await asyncio.wait_for(asyncio.gather(*[ctx.decode(token) for _ in range(8)]), 10)
+
+            assert [claims[1] for claims in asyncio.run(run())] == ["coaps://as.example"] * 8
+
+    def test_async_cwt_with_resolver_and_token_cache(self, private_key, public_key):
+        resolver = Resolver([public_key])
+        ctx = AsyncCWT.new(CWT.new(token_cache_size=16), resolver=CachingResolver(resolver))
+        token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+
+        async def run():
+            return [await ctx.decode(token) for _ in range(3)]
+
+        for claims in asyncio.run(run()):
+            assert claims[1] == "coaps://as.example"
+        assert ctx.cwt.token_cache.hits == 2
+        assert ctx.cwt.token_cache.misses == 1
+        assert resolver.calls == [(b"01", -7)]
+
+    def test_async_cwt_with_resolver_without_key(self, private_key):
+        ctx = AsyncCWT.new(resolver=Resolver([]))
+        token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+        with pytest.raises(ValueError) as err:
+            asyncio.run(ctx.decode(token))
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_async_cwt_without_keys_and_resolver(self, private_key):
+        ctx = AsyncCWT.new()
+        token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+        with pytest.raises(ValueError) as err:
+            asyncio.run(ctx.decode(token))
+            pytest.fail("decode() should fail.")
+        assert "keys should be set if resolver is not specified." in str(err.value)
+
+
+class TestCachingResolver:
+    """
+    Tests for CachingResolver.
+    """
+
+    @pytest.mark.parametrize(
+        "args, msg",
+        [
+            (["xxx"], "resolve should be callable."),
+            ([Resolver([]), 0], "ttl should be positive int."),
+            ([Resolver([]), 10, 0], "max_entries should be positive int."),
+        ],
+    )
+    def test_caching_resolver_with_invalid_args(self, args, msg):
+        with pytest.raises(ValueError) as err:
+            CachingResolver(*args)
+            pytest.fail("CachingResolver() should fail.")
+        assert msg in str(err.value)
+
+    def test_caching_resolver(self, public_key):
+        resolver = Resolver([public_key])
+        cache = CachingResolver(resolver)
+
+        async def run():
+            return [await cache(b"01", -7), await cache(b"01", -7), await cache(b"99", -7), await cache(b"99", -7)]
+
+        res = asyncio.run(run())
+        assert res == [[public_key], [public_key], [], []]
+        assert resolver.calls == [(b"01", -7), (b"99", -7), (b"99", -7)]
+        assert cache.hits == 1
+        assert cache.misses == 3
+        assert len(cache) == 1
+        cache.invalidate(b"01")
+        assert len(cache) == 0
+
+    def test_caching_resolver_coalesces_lookups(self, public_key):
+        resolver = Resolver([public_key], delay=0.01)
+        cache = CachingResolver(resolver)
+
+        async def run():
+            return await asyncio.gather(*[cache(b"01", -7) for _ in range(5)])
+
+        assert asyncio.run(run()) == [[public_key]] * 5
+        assert resolver.calls == [(b"01", -7)]
+
+    def test_caching_resolver_with_error(self):
+        async def resolve(kid, alg):
+            await asyncio.sleep(0.01)
+            raise ValueError("unavailable")
+
+        cache = CachingResolver(resolve)
+
+        async def run():
+            return await asyncio.gather(*[cache(b"01", -7) for _ in range(3)], return_exceptions=True)
+
+        res = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in res)
+        assert len(cache) == 0
+
+    def test_caching_resolver_with_cancelled_lookup(self, public_key):
+        resolver = Resolver([public_key], delay=0.05)
+        cache = CachingResolver(resolver)
+
+        async def run():
+            first = asyncio.ensure_future(cache(b"01", -7))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(cache(b"01", -7))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await asyncio.wait_for(second, 5), first.cancelled()
+
+        assert asyncio.run(run()) == ([public_key], True)
+        assert resolver.calls == [(b"01", -7), (b"01", -7)]
+        assert len(cache) == 1
+
+    def test_caching_resolver_with_max_entries_and_clear(self, public_key):
+        cache = CachingResolver(Resolver([public_key]), max_entries=1)
+
+        async def run():
+            await cache(b"01", -7)
+            await cache(b"01", -8)
+
+        asyncio.run(run())
+        assert len(cache) == 1
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_caching_resolver_with_async_cwt(self, private_key, public_key):
+        resolver = Resolver([public_key])
+        ctx = AsyncCWT.new(resolver=CachingResolver(resolver))
+        token = ctx.cwt.encode({1: "coaps://as.example"}, private_key)
+
+        async def run():
+            return [await ctx.decode(token) for _ in range(3)]
+
+        for claims in asyncio.run(run()):
+            assert claims[1] == "coaps://as.example"
+        assert resolver.calls == [(b"01", -7)]
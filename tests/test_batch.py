@@ -0,0 +1,145 @@
+"""
+Tests for batch decoding.
+"""
+
+import threading
+import time
+
+import pytest
+
+from cwt import COSE, CWT, COSEKey, DecodeError, KeyRing, VerifyError
+from cwt.batch import in_shared_pool, run_batch, shared_executor
+
+from .utils import key_path
+
+
+class TestBatch:
+    """
+    Tests for batch decoding.
+    """
+
+    def test_run_batch_keeps_input_order(self):
+        res = run_batch(lambda x: x * 2, list(range(100)), workers=4, chunk_size=3)
+        assert res == [x * 2 for x in range(100)]
+
+    def test_run_batch_returns_errors_in_place(self):
+        def func(x):
+            if x % 3 == 0:
+                raise ValueError(f"invalid: {x}")
+            return x
+
+        res = run_batch(func, list(range(10)), workers=2, chunk_size=2)
+        for i, r in enumerate(res):
+            if i % 3 == 0:
+                assert isinstance(r, ValueError)
+                assert str(r) == f"invalid: {i}"
+            else:
+                assert r == i
+
+    def test_run_batch_small_batch_on_calling_thread(self):
+        thread_ids = run_batch(lambda _: threading.get_ident(), [0] * 4, workers=4, chunk_size=4)
+        assert thread_ids == [threading.get_ident()] * 4
+
+    def test_run_batch_with_thread_pool(self):
+        thread_ids = run_batch(lambda _: threading.get_ident(), [0] * 8, workers=2, chunk_size=4)
+        assert threading.get_ident() not in thread_ids
+
+    def test_run_batch_reuses_shared_pool(self):
+        run_batch(lambda x: x, list(range(64)), workers=4, chunk_size=4)
+        count = threading.active_count()
+        for _ in range(20):
+            thread_ids = run_batch(lambda _: threading.get_ident(), list(range(64)), workers=4, chunk_size=4)
+            assert threading.get_ident() not in thread_ids
+            assert len(set(thread_ids)) <= 4
+        assert threading.active_count() <= count + 4
+        assert shared_executor() is shared_executor()
+
+    def test_run_batch_caps_workers(self):
+        running = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def func(x):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.001)
+            with lock:
+                running[0] -= 1
+            return x
+
+        assert run_batch(func, list(range(60)), workers=3, chunk_size=2) == list(range(60))
+        assert peak[0] <= 3
+
+    def test_run_batch_on_shared_pool_thread(self):
+        def nested(_):
+            assert in_shared_pool()
+            return run_batch(lambda _: threading.get_ident(), [0] * 8, workers=2, chunk_size=2)
+
+        for thread_ids in run_batch(nested, [0] * 4, workers=2, chunk_size=1):
+            assert len(set(thread_ids)) == 1
+        assert not in_shared_pool()
+
+    def test_run_batch_with_empty_items(self):
+        assert run_batch(lambda x: x, []) == []
+
+    @pytest.mark.parametrize(
+        "workers, chunk_size, msg",
+        [
+            (0, 16, "workers should be positive int."),
+            ("4", 16, "workers should be positive int."),
+            (4, 0, "chunk_size should be positive int."),
+            (4, 1.5, "chunk_size should be positive int."),
+        ],
+    )
+    def test_run_batch_with_invalid_args(self, workers, chunk_size, msg):
+        with pytest.raises(ValueError) as err:
+            run_batch(lambda x: x, [1, 2, 3], workers, chunk_size)
+            pytest.fail("run_batch() should fail.")
+        assert msg in str(err.value)
+
+    def test_cose_decode_many(self):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        other = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        data = [ctx.encode_and_mac(f"msg{i}".encode(), other if i == 5 else key) for i in range(40)]
+        data[7] = b"xxx"
+        res = ctx.decode_many(data, key, workers=4, chunk_size=4)
+        assert len(res) == 40
+        for i, r in enumerate(res):
+            if i == 5:
+                assert isinstance(r, VerifyError)
+            elif i == 7:
+                assert isinstance(r, DecodeError)
+            else:
+                assert r == f"msg{i}".encode()
+
+    def test_cose_decode_many_with_invalid_key(self):
+        ctx = COSE.new()
+        with pytest.raises(ValueError) as err:
+            ctx.decode_many([b"xxx"], {1: 4})
+            pytest.fail("decode_many() should fail.")
+        assert "key in keys should have COSEKeyInterface." in str(err.value)
+
+    def test_cwt_decode_many(self):
+        ctx = CWT.new()
+        with open(key_path("private_key_es256.pem")) as key_file:
+            private_key = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_es256.pem")) as key_file:
+            public_key = COSEKey.from_pem(key_file.read(), kid="01")
+        tokens = [ctx.encode({"iss": "coaps://as.example", "cti": str(i)}, private_key) for i in range(20)]
+        tokens[3] = tokens[3][:-1] + bytes([tokens[3][-1] ^ 1])
+        res = ctx.decode_many(tokens, KeyRing([public_key]), workers=4, chunk_size=2)
+        assert len(res) == 20
+        for i, r in enumerate(res):
+            if i == 3:
+                assert isinstance(r, VerifyError)
+            else:
+                assert r[7] == str(i).encode()
+
+    def test_cwt_decode_many_with_single_worker(self):
+        ctx = CWT.new()
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        tokens = [ctx.encode({"iss": "coaps://as.example"}, key) for _ in range(3)]
+        res = ctx.decode_many(tokens, [key], workers=1)
+        assert all(r[1] == "coaps://as.example" for r in res)
@@ -0,0 +1,169 @@
+"""
+Tests for CertValidator.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from asn1crypto import pem
+
+from cwt import COSE, CertValidator, COSEKey, VerifyError
+from cwt.utils import base64url_decode
+
+from .utils import key_path
+
+
+def load_ca_certs(name: str) -> list:
+    with open(key_path(name), "rb") as f:
+        return [der_bytes for _, _, der_bytes in pem.unarmor(f.read(), multiple=True)]
+
+
+def load_x5c(name: str) -> list:
+    with open(key_path(name)) as f:
+        return [base64url_decode(v) for v in json.loads(f.read())["x5c"]]
+
+
+class TestCertValidator:
+    """
+    Tests for CertValidator.
+    """
+
+    def test_cert_validator_constructor(self):
+        validator = CertValidator(load_ca_certs("cacert.pem"))
+        assert validator.hits == 0
+        assert validator.misses == 0
+
+    @pytest.mark.parametrize(
+        "ca_certs, ttl, max_entries, msg",
+        [
+            ([], 3600, 1024, "ca_certs should be set."),
+            ([b"xxx"], -1, 1024, "ttl should be non-negative int."),
+            ([b"xxx"], "3600", 1024, "ttl should be non-negative int."),
+            ([b"xxx"], 3600, -1, "max_entries should be non-negative int."),
+        ],
+    )
+    def test_cert_validator_constructor_with_invalid_args(self, ca_certs, ttl, max_entries, msg):
+        with pytest.raises(ValueError) as err:
+            CertValidator(ca_certs, ttl, max_entries)
+            pytest.fail("CertValidator() should fail.")
+        assert msg in str(err.value)
+
+    def test_cert_validator_validate_with_cache(self):
+        x5c = load_x5c("cert_es256.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"))
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.hits == 1
+        assert validator.misses == 1
+        validator.clear()
+        assert validator.hits == 0
+        assert validator.misses == 0
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.misses == 1
+
+    def test_cert_validator_validate_without_cache(self):
+        x5c = load_x5c("cert_es256.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"), ttl=0)
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.hits == 0
+        assert validator.misses == 2
+
+    def test_cert_validator_validate_with_expired_entry(self, monkeypatch):
+        x5c = load_x5c("cert_es256.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"), ttl=10)
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 11)
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.hits == 0
+        assert validator.misses == 2
+
+    def test_cert_validator_validate_with_lru_eviction(self):
+        x5c = load_x5c("cert_es256.json")
+        x5c_2 = load_x5c("cert_es256_2.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"), max_entries=1)
+        validator.validate(x5c[0], x5c[1:])
+        validator.validate(x5c_2[0])
+        validator.validate(x5c[0], x5c[1:])
+        assert validator.hits == 0
+        assert validator.misses == 3
+        validator.validate(x5c[0], x5c[1:])
+        assert validator.hits == 1
+
+    def test_cert_validator_validate_outside_lock_with_own_context(self, monkeypatch):
+        from certvalidator import CertificateValidator
+
+        x5c = load_x5c("cert_es256.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"), ttl=0)
+        locked = []
+        contexts = []
+        validate_usage = CertificateValidator.validate_usage
+
+        def spy(self, *args, **kwargs):
+            locked.append(validator._lock.locked())
+            contexts.append(self._context)
+            return validate_usage(self, *args, **kwargs)
+
+        monkeypatch.setattr(CertificateValidator, "validate_usage", spy)
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert validator.validate(x5c[0], x5c[1:]) is True
+        assert locked == [False, False]
+        assert contexts[0] is not contexts[1]
+
+    def test_cert_validator_validate_in_parallel(self):
+        x5c = load_x5c("cert_es256.json")
+        x5c_2 = load_x5c("cert_es256_2.json")
+        validator = CertValidator(load_ca_certs("cacert.pem"), ttl=0)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            chains = [x5c, x5c_2] * 8
+            assert list(executor.map(lambda c: validator.validate(c[0], c[1:]), chains)) == [True] * 16
+        assert validator.misses == 16
+
+    def test_cert_validator_validate_with_another_ca_cert(self):
+        x5c = load_x5c("cert_es256.json")
+        validator = CertValidator(load_ca_certs("cacert_2.pem"))
+        for _ in range(2):
+            with pytest.raises(VerifyError) as err:
+                validator.validate(x5c[0], x5c[1:])
+                pytest.fail("validate() should fail.")
+            assert "Failed to validate the certificate bound to the key." in str(err.value)
+        assert validator.hits == 0
+        assert validator.misses == 2
+
+    def test_cert_validator_validate_with_invalid_cert(self):
+        validator = CertValidator(load_ca_certs("cacert.pem"))
+        with pytest.raises(VerifyError) as err:
+            validator.validate(b"xxxxx")
+            pytest.fail("validate() should fail.")
+        assert "Failed to validate the certificate bound to the key." in str(err.value)
+
+    def test_cert_validator_shared_by_cose(self):
+        with open(key_path("private_key_cert_es256.pem")) as f:
+            private_key = COSEKey.from_pem(f.read(), kid="P-256-01")
+        with open(key_path("cert_es256.json")) as f:
+            public_key = COSEKey.from_jwk(f.read())
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, ca_certs=key_path("cacert.pem"))
+        for _ in range(3):
+            encoded = ctx.encode_and_sign(b"Hello world!", private_key)
+            assert ctx.decode(encoded, public_key) == b"Hello world!"
+        assert ctx.cert_validator.hits == 2
+        assert ctx.cert_validator.misses == 1
+
+    def test_cert_validator_of_cose_without_ca_certs(self):
+        ctx = COSE.new()
+        assert ctx.cert_validator is None
+
+    def test_cert_validator_of_cose_with_cache_disabled(self):
+        with open(key_path("private_key_cert_es256.pem")) as f:
+            private_key = COSEKey.from_pem(f.read(), kid="P-256-01")
+        with open(key_path("cert_es256.json")) as f:
+            public_key = COSEKey.from_jwk(f.read())
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, ca_certs=key_path("cacert.pem"), cert_cache_ttl=0)
+        for _ in range(2):
+            encoded = ctx.encode_and_sign(b"Hello world!", private_key)
+            assert ctx.decode(encoded, public_key) == b"Hello world!"
+        assert ctx.cert_validator.hits == 0
+        assert ctx.cert_validator.misses == 2
@@ -0,0 +1,132 @@
+"""
+Tests for the clock of CWT.
+"""
+
+import time
+
+import pytest
+
+from cwt import CWT, CoarseClock, COSEKey, MemoryReplayGuard, VerifyError
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def keys():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        private_key = COSEKey.from_pem(key_file.read(), kid="01")
+    with open(key_path("public_key_es256.pem")) as key_file:
+        public_key = COSEKey.from_pem(key_file.read(), kid="01")
+    return private_key, public_key
+
+
+class TestCoarseClock:
+    """
+    Tests for CoarseClock.
+    """
+
+    def test_coarse_clock(self):
+        with CoarseClock(tick=0.01) as clock:
+            assert clock.tick == 0.01
+            t1 = clock()
+            assert abs(t1 - time.time()) < 1
+            time.sleep(0.1)
+            assert clock() > t1
+        t2 = clock()
+        time.sleep(0.05)
+        assert clock() == t2
+        clock.close()
+
+    def test_coarse_clock_is_cached(self):
+        with CoarseClock(tick=60) as clock:
+            assert clock() == clock()
+
+    @pytest.mark.parametrize("tick", [0, -1, "1", True])
+    def test_coarse_clock_with_invalid_tick(self, tick):
+        with pytest.raises(ValueError) as err:
+            CoarseClock(tick=tick)
+            pytest.fail("CoarseClock() should fail.")
+        assert "tick should be positive number." in str(err.value)
+
+
+class TestCWTClock:
+    """
+    Tests for the clock of CWT.
+    """
+
+    def test_cwt_encode_with_clock(self, keys):
+        ctx = CWT.new(expires_in=100, clock=lambda: 1000.5)
+        claims = ctx.decode(ctx.encode({"iss": "coaps://as.example"}, keys[0]), keys[1], no_verify=True)
+        assert claims[4] == 1100
+        assert claims[5] == 1000
+        assert claims[6] == 1000
+
+    def test_cwt_decode_with_clock(self, keys):
+        now = [1000]
+        ctx = CWT.new(leeway=10, clock=lambda: now[0])
+        token = ctx.encode({"iss": "coaps://as.example", "nbf": 2000, "exp": 3000}, keys[0])
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        assert "The token is not yet valid." in str(err.value)
+        now[0] = 1990
+        assert ctx.decode(token, keys[1])[4] == 3000
+        now[0] = 3011
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        assert "The token has expired." in str(err.value)
+
+    def test_cwt_decode_with_now(self, keys):
+        ctx = CWT.new(leeway=10)
+        token = ctx.encode({"iss": "coaps://as.example", "nbf": 2000, "exp": 3000}, keys[0])
+        assert ctx.decode(token, keys[1], now=2500)[4] == 3000
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        assert "The token has expired." in str(err.value)
+
+    def test_cwt_decode_many_pins_now(self, keys):
+        calls = []
+
+        def clock():
+            calls.append(1)
+            return 2500
+
+        ctx = CWT.new(clock=clock)
+        token = ctx.encode({"iss": "coaps://as.example", "nbf": 2000, "exp": 3000}, keys[0])
+        calls.clear()
+        res = ctx.decode_many([token] * 40, keys[1], workers=2)
+        assert [r[4] for r in res] == [3000] * 40
+        assert len(calls) == 1
+
+    def test_cwt_decode_many_with_now(self, keys):
+        ctx = CWT.new()
+        token = ctx.encode({"iss": "coaps://as.example", "nbf": 2000, "exp": 3000}, keys[0])
+        res = ctx.decode_many([token] * 3, keys[1], now=1000)
+        assert all(isinstance(r, VerifyError) for r in res)
+        res = ctx.decode_many([token] * 3, keys[1], now=2500)
+        assert [r[4] for r in res] == [3000] * 3
+
+    def test_cwt_decode_with_now_and_replay_guard(self, keys):
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(leeway=10, replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123", "nbf": 2000, "exp": 3000}, keys[0])
+        ctx.decode(token, keys[1], now=2500)
+        assert guard._entries[b"123"] == 3011
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1], now=2500)
+            pytest.fail("decode() should fail.")
+        assert "The token has been replayed." in str(err.value)
+
+    def test_cwt_with_coarse_clock(self, keys):
+        with CoarseClock() as clock:
+            ctx = CWT.new(clock=clock)
+            token = ctx.encode({"iss": "coaps://as.example"}, keys[0])
+            assert ctx.decode(token, keys[1])[1] == "coaps://as.example"
+
+    def test_cwt_with_invalid_clock(self):
+        with pytest.raises(ValueError) as err:
+            CWT.new(clock=1000)
+            pytest.fail("CWT.new() should fail.")
+        assert "clock should be callable." in str(err.value)
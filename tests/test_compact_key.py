@@ -0,0 +1,209 @@
+"""
+Tests for CompactPublicKey.
+"""
+
+import pytest
+
+from cwt import COSE, CompactKeyCache, CompactPublicKey, COSEKey, KeyRing, VerifyError
+from cwt.cose_key_interface import COSEKeyInterface
+
+from .utils import key_path
+
+
+def load_key(name: str, **kwargs) -> COSEKeyInterface:
+    with open(key_path(name)) as key_file:
+        return COSEKey.from_pem(key_file.read(), **kwargs)
+
+
+@pytest.fixture(scope="module")
+def ctx():
+    return COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+
+
+class TestCompactPublicKey:
+    """
+    Tests for CompactPublicKey.
+    """
+
+    @pytest.mark.parametrize(
+        "alg, private_key_path, public_key_path",
+        [
+            ("ES256", "private_key_es256.pem", "public_key_es256.pem"),
+            ("ES384", "private_key_es384.pem", "public_key_es384.pem"),
+            ("ES512", "private_key_es512.pem", "public_key_es512.pem"),
+            ("ES256K", "private_key_es256k.pem", "public_key_es256k.pem"),
+            ("EdDSA", "private_key_ed25519.pem", "public_key_ed25519.pem"),
+            ("EdDSA", "private_key_ed448.pem", "public_key_ed448.pem"),
+            ("PS256", "private_key_rsa.pem", "public_key_rsa.pem"),
+            ("RS512", "private_key_rsa.pem", "public_key_rsa.pem"),
+        ],
+    )
+    def test_compact_public_key_decode(self, ctx, alg, private_key_path, public_key_path):
+        priv = load_key(private_key_path, alg=alg, kid="01")
+        pub = load_key(public_key_path, alg=alg, kid="01")
+        cache = CompactKeyCache()
+        key = CompactPublicKey.new(pub.to_dict(), cache)
+        assert key.kty == pub.kty
+        assert key.kid == b"01"
+        assert key.alg == pub.alg
+        assert key.key_ops == [2]
+        assert key.base_iv is None
+        assert len(cache) == 0
+
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, key) == b"Hello world!"
+        assert ctx.decode(encoded, [key]) == b"Hello world!"
+        assert ctx.decode(encoded, KeyRing([key])) == b"Hello world!"
+        assert len(cache) == 1
+        assert cache.misses == 1
+        assert cache.hits == 2
+
+    def test_compact_public_key_without_alg(self, ctx):
+        priv = load_key("private_key_es256.pem", kid="01")
+        key = CompactPublicKey.from_key(load_key("public_key_es256.pem", kid="01"))
+        assert key.alg is None
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, key) == b"Hello world!"
+
+    def test_compact_public_key_from_private_key(self, ctx):
+        priv = load_key("private_key_ed25519.pem", alg="EdDSA", kid="01")
+        key = CompactPublicKey.from_key(priv)
+        assert -4 not in key.to_dict()
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, key) == b"Hello world!"
+
+    @pytest.mark.parametrize(
+        "public_key_path, alg",
+        [
+            ("public_key_es256.pem", "ES256"),
+            ("public_key_ed448.pem", "EdDSA"),
+            ("public_key_rsa.pem", "PS384"),
+        ],
+    )
+    def test_compact_public_key_to_dict(self, public_key_path, alg):
+        pub = load_key(public_key_path, alg=alg, kid="01")
+        params = {k: v for k, v in pub.to_dict().items() if k != 4}
+        key = CompactPublicKey.new(params)
+        assert key.to_dict() == params
+        if alg != "PS384":
+            assert type(key.key) is type(pub.key)
+            assert key.crv == pub.crv
+
+    def test_compact_public_key_with_named_params(self):
+        pub = load_key("public_key_es256.pem", kid="01")
+        key = CompactPublicKey.new({**pub.to_dict(), 1: "EC2", 3: "ES256", 4: ["verify"]})
+        assert key.kty == 2
+        assert key.alg == -7
+
+    def test_compact_public_key_has_no_dict(self):
+        key = CompactPublicKey.from_key(load_key("public_key_es256.pem", kid="01"))
+        assert not hasattr(key, "__dict__")
+
+    def test_compact_public_key_crv_of_rsa_key(self):
+        key = CompactPublicKey.from_key(load_key("public_key_rsa.pem", alg="PS256", kid="01"))
+        with pytest.raises(NotImplementedError):
+            key.crv
+            pytest.fail("crv should fail.")
+
+    def test_compact_public_key_sign(self):
+        key = CompactPublicKey.from_key(load_key("public_key_es256.pem", kid="01"))
+        with pytest.raises(ValueError) as err:
+            key.sign(b"Hello world!")
+            pytest.fail("sign() should fail.")
+        assert "Public key cannot be used for signing." in str(err.value)
+        with pytest.raises(ValueError) as err:
+            key.sign_chunks([b"Hello world!"])
+            pytest.fail("sign_chunks() should fail.")
+        assert "Public key cannot be used for signing." in str(err.value)
+
+    def test_compact_public_key_verify_with_invalid_signature(self):
+        key = CompactPublicKey.from_key(load_key("public_key_es256.pem", kid="01"))
+        with pytest.raises(VerifyError) as err:
+            key.verify(b"Hello world!", b"x" * 64)
+            pytest.fail("verify() should fail.")
+        assert "Failed to verify." in str(err.value)
+
+    def test_compact_public_key_validate_certificate(self):
+        key = CompactPublicKey.from_key(load_key("public_key_es256.pem", kid="01"))
+        assert key.validate_certificate([b"xxx"]) is False
+        with pytest.raises(ValueError) as err:
+            key.validate_certificate([])
+            pytest.fail("validate_certificate() should fail.")
+        assert "ca_certs should be set." in str(err.value)
+
+    def test_compact_public_key_with_invalid_point(self):
+        pub = load_key("public_key_es256.pem", kid="01").to_dict()
+        # Not on the curve. It is detected on first use.
+        key = CompactPublicKey.new({**pub, -3: b"\x00" * 32})
+        with pytest.raises(ValueError):
+            key.verify(b"Hello world!", b"x" * 64)
+            pytest.fail("verify() should fail.")
+
+    def test_compact_key_cache_releases_least_recently_used(self, ctx):
+        cache = CompactKeyCache(max_entries=2)
+        privs = [load_key("private_key_es256.pem", kid=f"{i}") for i in range(3)]
+        keys = [CompactPublicKey.from_key(load_key("public_key_es256.pem", kid=f"{i}"), cache) for i in range(3)]
+        encoded = [ctx.encode_and_sign(b"Hello world!", priv) for priv in privs]
+        for i in [0, 1, 0, 2, 1]:
+            assert ctx.decode(encoded[i], keys) == b"Hello world!"
+        # 1 was released by 2 since 0 was used more recently.
+        assert cache.misses == 4
+        assert cache.hits == 1
+        assert len(cache) == 2
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.hits == 0
+        assert cache.misses == 0
+
+    @pytest.mark.parametrize(
+        "max_entries",
+        [0, -1, "1"],
+    )
+    def test_compact_key_cache_with_invalid_args(self, max_entries):
+        with pytest.raises(ValueError) as err:
+            CompactKeyCache(max_entries=max_entries)
+            pytest.fail("CompactKeyCache() should fail.")
+        assert "max_entries should be positive int." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "params, msg",
+        [
+            ({1: 4, 3: 1, -1: b"xxx"}, "kty(1) should be OKP(1), EC2(2) or RSA(3)."),
+            ({1: "Symmetric", 3: 1, -1: b"xxx"}, "kty(1) should be OKP(1), EC2(2) or RSA(3)."),
+            ({1: 2, 2: "01", -1: 1}, "kid(2) should be bytes(bstr)."),
+            ({1: 2, 3: "xxx", -1: 1}, "Unsupported or unknown alg(3): xxx."),
+            ({1: 2, 3: 1.0, -1: 1}, "alg(3) should be int or str(tstr)."),
+            ({1: 2, 4: [1, 2], -1: 1}, "key_ops(4) should be empty or [2] for CompactPublicKey."),
+            ({1: 2, 4: "verify", -1: 1}, "key_ops(4) should be empty or [2] for CompactPublicKey."),
+            ({1: 3, 3: -7, -1: b"n", -2: b"e"}, "Unsupported or unknown alg(3) for RSA: -7."),
+            ({1: 3, 3: -37, -1: b"n", -2: b"e", -3: b"d"}, "CompactPublicKey should not have private parameter: -3."),
+            ({1: 3, 3: -37, -2: b"e"}, "n(-1) should be set as bytes."),
+            ({1: 3, 3: -37, -1: b"n"}, "e(-2) should be set as bytes."),
+            ({1: 2, -1: 1, -4: b"d"}, "CompactPublicKey should not have private parameter: -4."),
+            ({1: 2, 3: -25, -1: 1}, "Unsupported or unknown alg(3) for EC2: -25."),
+            ({1: 2, -1: 4}, "Unsupported or unknown crv(-1) for EC2: 4."),
+            ({1: 2, -1: 1, -2: b"x" * 32}, "x(-2) and y(-3) should be bytes(bstr)."),
+            ({1: 2, -1: 1, -2: b"x" * 32, -3: b"y" * 48}, "Coords should be 32 bytes for crv 1."),
+            ({1: 1, 3: -7, -1: 6}, "Unsupported or unknown alg(3) for OKP: -7."),
+            ({1: 1, -1: 4}, "Unsupported or unknown crv(-1) for OKP: 4."),
+            ({1: 1, -1: 6}, "x(-2) should be 32 bytes for crv 6."),
+            ({1: 1, -1: 7, -2: b"x" * 32}, "x(-2) should be 57 bytes for crv 7."),
+        ],
+    )
+    def test_compact_public_key_new_with_invalid_args(self, params, msg):
+        with pytest.raises(ValueError) as err:
+            CompactPublicKey.new(params)
+            pytest.fail("new() should fail.")
+        assert msg in str(err.value)
+
+    def test_compact_public_key_new_with_invalid_cache(self):
+        with pytest.raises(ValueError) as err:
+            CompactPublicKey.new({1: 1}, cache={})
+            pytest.fail("new() should fail.")
+        assert "cache should be CompactKeyCache." in str(err.value)
+
+    def test_compact_public_key_from_key_with_invalid_key(self):
+        with pytest.raises(ValueError) as err:
+            CompactPublicKey.from_key({1: 2})
+            pytest.fail("from_key() should fail.")
+        assert "key should be COSEKeyInterface." in str(err.value)
@@ -245,7 +245,7 @@ class TestCOSE:
         with pytest.raises(ValueError) as err:
             COSE.new(ca_certs=b"xxx")
             pytest.fail("COSE() should fail.")
-        assert "ca_certs should be str." in str(err.value)
+        assert "ca_certs should be str or TrustStore." in str(err.value)
 
     @pytest.mark.parametrize(
         "invalid, msg",
@@ -0,0 +1,290 @@
+"""
+Tests for COSE.peek and the other functions of cwt.cose_peek.
+"""
+
+import cbor2
+import pytest
+from cbor2 import CBORTag
+
+from cwt import COSE, COSEKey, DecodeError, PeekedHeaders, Recipient, Signer
+from cwt.cose_peek import LARGE_ITEM_SIZE, loads_large, split_message
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def ctx():
+    return COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+
+
+@pytest.fixture(scope="module")
+def sig_key():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+class TestCOSEPeek:
+    """
+    Tests for COSE.peek.
+    """
+
+    def test_cose_peek_sign1(self, ctx, sig_key):
+        encoded = ctx.encode_and_sign(b"Hello world!", sig_key)
+        res = ctx.peek(encoded)
+        assert isinstance(res, PeekedHeaders)
+        assert res.tag == 18
+        assert res.protected == {1: -7}
+        assert res.unprotected == {4: b"01"}
+        assert res.payload_size == 12
+        assert res.kid == b"01"
+        assert res.alg == -7
+        assert res.recipients == ()
+        assert res.signatures == ()
+
+    def test_cose_peek_default_nested_headers_are_immutable(self):
+        res = PeekedHeaders(18, {}, {}, 0)
+        assert isinstance(res.recipients, tuple)
+        assert isinstance(res.signatures, tuple)
+
+    def test_cose_peek_mac0(self, ctx):
+        mac_key = COSEKey.generate_symmetric_key(alg="HS256", kid="02")
+        encoded = ctx.encode_and_mac(b"Hello world!", mac_key)
+        res = ctx.peek(encoded)
+        assert res.tag == 17
+        assert res.kid == b"02"
+        assert res.alg == 5
+        assert res.payload_size == 12
+
+    def test_cose_peek_encrypt0(self, ctx):
+        enc_key = COSEKey.generate_symmetric_key(alg="ChaCha20/Poly1305", kid="03")
+        encoded = ctx.encode_and_encrypt(b"Hello world!", enc_key)
+        res = ctx.peek(encoded)
+        assert res.tag == 16
+        assert res.kid == b"03"
+        assert res.alg == 24
+        assert 5 in res.unprotected
+        # The ciphertext has a 16-byte tag.
+        assert res.payload_size == 28
+
+    def test_cose_peek_encrypt(self, ctx):
+        enc_key = COSEKey.generate_symmetric_key(alg="A128GCM")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "04"})
+        encoded = ctx.encode_and_encrypt(b"Hello world!", enc_key, recipients=[r])
+        res = ctx.peek(encoded)
+        assert res.tag == 96
+        assert res.alg == 1
+        assert res.recipients == ()
+        res = ctx.peek(encoded, nested=True)
+        assert len(res.recipients) == 1
+        assert res.recipients[0].tag == 0
+        assert res.recipients[0].kid == b"04"
+        assert res.recipients[0].alg == -6
+        assert res.recipients[0].payload_size == 0
+
+    def test_cose_peek_mac(self, ctx):
+        mac_key = COSEKey.generate_symmetric_key(alg="HS512")
+        r1 = Recipient.new(unprotected={"alg": "direct", "kid": "05"})
+        r2 = Recipient.new(unprotected={"alg": "direct", "kid": "06"})
+        encoded = ctx.encode_and_mac(b"Hello world!", mac_key, recipients=[r1, r2])
+        res = ctx.peek(encoded, nested=True)
+        assert res.tag == 97
+        assert res.alg == 7
+        assert [r.kid for r in res.recipients] == [b"05", b"06"]
+
+    def test_cose_peek_sign(self, ctx, sig_key):
+        signers = [
+            Signer.new(cose_key=sig_key, protected={"alg": "ES256"}, unprotected={"kid": "01"}),
+            Signer.new(cose_key=sig_key, protected={"alg": "ES256"}, unprotected={"kid": "02"}),
+        ]
+        encoded = ctx.encode_and_sign(b"Hello world!", signers=signers)
+        res = ctx.peek(encoded)
+        assert res.tag == 98
+        assert res.signatures == ()
+        res = ctx.peek(encoded, nested=True)
+        assert [(s.kid, s.alg, s.payload_size) for s in res.signatures] == [(b"01", -7, None), (b"02", -7, None)]
+
+    def test_cose_peek_nested_recipients(self):
+        inner = [cbor2.dumps({1: -3}), {4: b"inner"}, b"x" * 24]
+        outer = [cbor2.dumps({1: -29}), {4: b"outer"}, b"y" * 16, [inner]]
+        encoded = cbor2.dumps(CBORTag(96, [cbor2.dumps({1: 1}), {}, b"z" * 28, [outer]]))
+        res = COSE.new().peek(encoded, nested=True)
+        assert res.recipients[0].kid == b"outer"
+        assert res.recipients[0].payload_size == 16
+        assert res.recipients[0].recipients[0].kid == b"inner"
+        assert res.recipients[0].recipients[0].alg == -3
+
+    def test_cose_peek_with_cwt_tag(self, ctx, sig_key):
+        encoded = cbor2.dumps(CBORTag(61, cbor2.loads(ctx.encode_and_sign(b"Hello world!", sig_key))))
+        res = ctx.peek(encoded)
+        assert res.tag == 18
+        assert res.protected == {1: -7}
+
+    def test_cose_peek_with_detached_payload(self, ctx, sig_key):
+        encoded = ctx.encode_and_sign(b"", sig_key, detached_payload=b"Hello world!")
+        res = ctx.peek(encoded)
+        assert res.payload_size is None
+
+    def test_cose_peek_with_indefinite_length_items(self):
+        # 18([h'a10126', {_ 4: h'3031'}, (_ h'0102', h'03'), h'...'])
+        encoded = bytes.fromhex("d28443a10126bf044230 31ff5f42010241 03ff4100".replace(" ", ""))
+        res = COSE.new().peek(encoded)
+        assert res.kid == b"01"
+        assert res.alg == -7
+        assert res.payload_size == 3
+
+    def test_cose_peek_with_empty_bstr_protected_header(self):
+        encoded = cbor2.dumps(CBORTag(16, [cbor2.dumps(b""), {1: 1}, b"x" * 16]))
+        res = COSE.new().peek(encoded)
+        assert res.protected == {}
+        assert res.alg == 1
+
+    def test_cose_peek_with_memoryview(self, ctx, sig_key):
+        encoded = ctx.encode_and_sign(b"x" * 1024, sig_key)
+        res = ctx.peek(memoryview(bytearray(encoded)))
+        assert res.kid == b"01"
+        assert res.payload_size == 1024
+
+    def test_cose_peek_does_not_read_the_payload(self):
+        # The payload is truncated, but it is not read.
+        encoded = cbor2.dumps(CBORTag(18, [cbor2.dumps({1: -7}), {4: b"01"}, b"x" * 100, b"y" * 64]))
+        res = COSE.new().peek(encoded[:-60])
+        assert res.kid == b"01"
+        assert res.payload_size == 100
+
+    def test_cose_peek_without_kid_and_alg(self):
+        encoded = cbor2.dumps(CBORTag(18, [b"", {4: "01", 1: "ES256"}, b"", b""]))
+        res = COSE.new().peek(encoded)
+        assert res.kid == b""
+        assert res.alg == 0
+
+    @pytest.mark.parametrize(
+        "data, msg",
+        [
+            (cbor2.dumps([b"", {}, b""]), "Invalid COSE format."),
+            (cbor2.dumps(CBORTag(61, [b"", {}, b""])), "Invalid COSE format."),
+            (cbor2.dumps(CBORTag(999, [b"", {}, b""])), "Unsupported or unknown CBOR tag(999)."),
+            (cbor2.dumps(CBORTag(16, [b"", {}])), "Invalid Encrypt0 format."),
+            (cbor2.dumps(CBORTag(96, [b"", {}, b""])), "Invalid Encrypt format."),
+            (cbor2.dumps(CBORTag(17, [b"", {}, b""])), "Invalid MAC0 format."),
+            (cbor2.dumps(CBORTag(97, [b"", {}, b"", b""])), "Invalid MAC format."),
+            (cbor2.dumps(CBORTag(18, {})), "Invalid Signature1 format."),
+            (cbor2.dumps(CBORTag(98, [b"", {}, b""])), "Invalid Signature format."),
+            (cbor2.dumps(CBORTag(16, [{}, {}, b""])), "Invalid protected header."),
+            (cbor2.dumps(CBORTag(16, [cbor2.dumps([1]), {}, b""])), "Invalid protected header."),
+            (cbor2.dumps(CBORTag(16, [b"", [], b""])), "unprotected header should be dict."),
+            (cbor2.dumps(CBORTag(16, [b"", {}, "xxx"])), "Invalid payload."),
+        ],
+    )
+    def test_cose_peek_with_invalid_data(self, data, msg):
+        with pytest.raises(ValueError) as err:
+            COSE.new().peek(data)
+            pytest.fail("peek() should fail.")
+        assert msg in str(err.value)
+
+    @pytest.mark.parametrize(
+        "data, msg",
+        [
+            (cbor2.dumps(CBORTag(96, [b"", {}, b"", {}])), "Invalid recipients."),
+            (cbor2.dumps(CBORTag(96, [b"", {}, b"", [[b"", {}]]])), "Invalid recipient format."),
+            (cbor2.dumps(CBORTag(98, [b"", {}, b"", {}])), "Invalid Signature format."),
+            (cbor2.dumps(CBORTag(98, [b"", {}, b"", [[b"", {}]]])), "Invalid Signature format."),
+        ],
+    )
+    def test_cose_peek_nested_with_invalid_data(self, data, msg):
+        with pytest.raises(ValueError) as err:
+            COSE.new().peek(data, nested=True)
+            pytest.fail("peek() should fail.")
+        assert msg in str(err.value)
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"",
+            b"\xd2",
+            b"\xd2\x84\x43\xa1\x01",
+            b"\xd2\x84\x40\xa1\x04",
+            b"\xd2\x84\x40\xa0\x5a\xff\xff",
+            b"\xd2\x84\x40\xa0\x5f\x42\x01",
+            b"\xd2\x84\x40\xbf\x04\x1c",
+        ],
+    )
+    def test_cose_peek_with_broken_data(self, data):
+        with pytest.raises(DecodeError) as err:
+            COSE.new().peek(data)
+            pytest.fail("peek() should fail.")
+        assert "Failed to decode." in str(err.value)
+
+
+LARGE = b"x" * LARGE_ITEM_SIZE
+
+
+class TestSplitMessage:
+    """
+    Tests for split_message and loads_large.
+    """
+
+    @pytest.mark.parametrize(
+        "msg",
+        [
+            CBORTag(18, [b"\xa1\x01\x26", {4: b"01"}, LARGE, b"s" * 64]),
+            CBORTag(17, [b"", {}, b"Hello world!", b"t" * 32]),
+            CBORTag(17, [b"\xa1\x01\x05", {}, None, b"t" * 32]),
+            CBORTag(16, [b"", {5: b"n" * 12}, LARGE]),
+            CBORTag(98, [b"", {}, LARGE, [[b"\xa1\x01\x26", {4: b"01"}, b"s" * 64]]]),
+            CBORTag(97, [b"\xa1\x01\x05", {}, LARGE, b"t" * 32, [[b"", {1: -6, 4: b"01"}, b""]]]),
+        ],
+    )
+    def test_split_message(self, msg):
+        data = cbor2.dumps(msg)
+        res = split_message(data)
+        assert res == msg
+        if msg.tag in [17, 18, 97, 98] and msg.value[2] is not None:
+            assert isinstance(res.value[2], memoryview)
+            assert res.value[2].obj is data
+        assert split_message(cbor2.dumps(CBORTag(61, msg)), untag=True) == msg
+        assert split_message(memoryview(data)) == msg
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            cbor2.dumps(CBORTag(61, CBORTag(18, [b"", {}, b"", b""]))),
+            cbor2.dumps(CBORTag(19, [b"", {}, b"", b""])),
+            cbor2.dumps(CBORTag(18, [b"", {}, b""])),
+            cbor2.dumps(CBORTag(18, [b"", {}, b"", b""])) + b"\x00",
+            cbor2.dumps(CBORTag(18, [b"", {}, b"", b""]))[:-1],
+            cbor2.dumps([b"", {}, b"", b""]),
+            b"",
+            "\xd2",
+            None,
+        ],
+    )
+    def test_split_message_with_unsupported_data(self, data):
+        assert split_message(data) is None
+
+    @pytest.mark.parametrize(
+        "obj",
+        [
+            {1: "coaps://as.example", 7: LARGE, -70000: [LARGE, "y" * LARGE_ITEM_SIZE, {"a": LARGE}]},
+            [LARGE, 1, -1, 1.5, None, True, b"", "あ" * 30000],
+            CBORTag(61, CBORTag(17, [b"", {}, LARGE, b"t" * 32])),
+            {1: CBORTag(1, 1000000000), 2: 2**70, 3: LARGE},
+            LARGE,
+            b"small",
+        ],
+    )
+    def test_loads_large(self, obj):
+        data = cbor2.dumps(obj)
+        assert loads_large(data) == cbor2.loads(data)
+        assert loads_large(data + b"\x00") == cbor2.loads(data)
+
+    def test_loads_large_with_indefinite_length_items(self):
+        data = b"\xa2\x01\x5f" + cbor2.dumps(LARGE) + b"\xff\x02\x9f" + cbor2.dumps(LARGE) + b"\xff"
+        assert loads_large(data) == {1: LARGE, 2: [LARGE]}
+
+    def test_loads_large_falls_back_to_cbor2(self):
+        # An array as a map key is decoded as a tuple by cbor2.
+        data = cbor2.dumps({(1, 2): LARGE})
+        assert loads_large(data) == {(1, 2): LARGE}
+        with pytest.raises(cbor2.CBORDecodeError):
+            loads_large(data[:-1])
+            pytest.fail("loads_large() should fail.")
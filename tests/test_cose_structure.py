@@ -0,0 +1,368 @@
+"""
+Tests for COSE structure builders.
+"""
+
+import io
+import mmap
+import tracemalloc
+
+import cbor2
+import pytest
+from cbor2 import CBORTag
+
+from cwt import COSE, COSEKey, EncodeError, VerifyError
+from cwt.cose_structure import (
+    PayloadStream,
+    cbor_head,
+    enc_structure,
+    is_payload_stream,
+    message_chunks,
+    to_be_signed,
+    write_chunks,
+)
+
+from .utils import key_path
+
+
+class TestCOSEStructure:
+    """
+    Tests for COSE structure builders.
+    """
+
+    @pytest.mark.parametrize(
+        "length",
+        [0, 23, 24, 255, 256, 65535, 65536, 0xFFFFFFFF, 0x100000000],
+    )
+    def test_cbor_head(self, length):
+        assert cbor_head(2, length) == _bstr_head(length)
+
+    @pytest.mark.parametrize(
+        "context, items, payload, other_fields",
+        [
+            ("Signature1", [b"\xa1\x01\x26", b""], b"Hello world!", []),
+            ("MAC0", [b"\xa1\x01\x05", b"aad"], b"x" * 300, []),
+            ("Signature", [b"", b"\xa1\x01\x26", b""], b"x" * 70000, []),
+            ("CounterSignature", [b"", b"\xa1\x01\x26", b""], b"x", [b"\xa1\x01\x27"]),
+            ("Signature1", [b"", b""], bytearray(b"abc"), []),
+            ("Signature1", [b"", b""], memoryview(b"abc"), []),
+            ("Signature1", [b"", b""], None, []),
+        ],
+    )
+    def test_to_be_signed(self, context, items, payload, other_fields):
+        chunks = to_be_signed(context, items, payload, other_fields)
+        expected_payload = bytes(payload) if isinstance(payload, (bytearray, memoryview)) else payload
+        assert b"".join(chunks) == cbor2.dumps([context, *items, expected_payload, *other_fields])
+
+    def test_to_be_signed_without_copying_payload(self):
+        payload = b"x" * 1024
+        chunks = to_be_signed("Signature1", [b"", b""], payload)
+        assert isinstance(chunks[1], memoryview)
+        assert chunks[1].obj is payload
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            CBORTag(18, [b"\xa1\x01\x26", {4: b"01"}, b"Hello world!", b"x" * 64]),
+            CBORTag(17, [b"", {}, None, b"x" * 32]),
+            CBORTag(16, [b"", {5: b"x" * 12}, b"x" * 1024]),
+            CBORTag(61, CBORTag(18, [b"", {}, b"x" * 70000, b"x" * 64])),
+            CBORTag(61, CBORTag(98, [b"\xa1\x01\x26", {}, b"x" * 2000, [[b"", {}, b"x" * 64]]])),
+        ],
+    )
+    def test_message_chunks(self, message):
+        assert b"".join(message_chunks(message)) == cbor2.dumps(message)
+
+    def test_message_chunks_without_copying_payload(self):
+        payload = b"x" * 1024
+        chunks = message_chunks(CBORTag(61, CBORTag(18, [b"\xa1\x01\x26", {}, payload, b"x" * 64])))
+        assert len(chunks) == 3
+        assert chunks[1] is payload
+
+    @pytest.mark.parametrize(
+        "buffer, offset, expected",
+        [
+            (bytearray(), 0, b"abcdef"),
+            (bytearray(b"0123456789"), 0, b"abcdef6789"),
+            (bytearray(b"0123456789"), 8, b"01234567abcdef"),
+            (bytearray(b"0123"), 4, b"0123abcdef"),
+        ],
+    )
+    def test_write_chunks(self, buffer, offset, expected):
+        assert write_chunks(buffer, offset, [b"ab", b"", memoryview(b"cd"), b"ef"]) == 6
+        assert buffer == expected
+
+    @pytest.mark.parametrize(
+        "buffer, offset, msg",
+        [
+            (b"0123", 0, "buffer should be bytearray."),
+            (memoryview(bytearray(4)), 0, "buffer should be bytearray."),
+            (bytearray(4), -1, "offset should be int between 0 and the length of the buffer."),
+            (bytearray(4), 5, "offset should be int between 0 and the length of the buffer."),
+            (bytearray(4), "0", "offset should be int between 0 and the length of the buffer."),
+            (bytearray(4), True, "offset should be int between 0 and the length of the buffer."),
+        ],
+    )
+    def test_write_chunks_with_invalid_args(self, buffer, offset, msg):
+        with pytest.raises(ValueError) as err:
+            write_chunks(buffer, offset, [b"ab"])
+            pytest.fail("write_chunks() should fail.")
+        assert msg in str(err.value)
+
+    def test_to_be_signed_with_invalid_item(self):
+        with pytest.raises(EncodeError) as err:
+            to_be_signed("Signature1", [b"", object()], b"")
+            pytest.fail("to_be_signed() should fail.")
+        assert "Failed to encode." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "context, protected, external_aad",
+        [
+            ("Encrypt0", b"\xa1\x01\x01", b""),
+            ("Encrypt", b"", b"x" * 1000),
+            ("Enc_Recipient", b"\xa1\x01\x23", b"aad"),
+        ],
+    )
+    def test_enc_structure(self, context, protected, external_aad):
+        assert enc_structure(context, protected, external_aad) == cbor2.dumps([context, protected, external_aad])
+
+    @pytest.mark.parametrize(
+        "private_key_path, public_key_path, alg",
+        [
+            ("private_key_es256.pem", "public_key_es256.pem", None),
+            ("private_key_es384.pem", "public_key_es384.pem", None),
+            ("private_key_rsa.pem", "public_key_rsa.pem", "PS256"),
+            ("private_key_rsa.pem", "public_key_rsa.pem", "RS256"),
+            ("private_key_ed25519.pem", "public_key_ed25519.pem", None),
+        ],
+    )
+    def test_sign_and_verify_chunks(self, private_key_path, public_key_path, alg):
+        with open(key_path(private_key_path)) as f:
+            private_key = COSEKey.from_pem(f.read(), alg=alg)
+        with open(key_path(public_key_path)) as f:
+            public_key = COSEKey.from_pem(f.read(), alg=alg)
+        chunks = [b"abc", memoryview(b"x" * 1000), bytearray(b"def")]
+        sig = private_key.sign_chunks(chunks)
+        public_key.verify_chunks(chunks, sig)
+        public_key.verify(b"".join(chunks), sig)
+        public_key.verify_chunks([b"abc" + b"x" * 1000 + b"def"], private_key.sign(b"".join(chunks)))
+        with pytest.raises(VerifyError):
+            public_key.verify_chunks([b"abc"], sig)
+            pytest.fail("verify_chunks() should fail.")
+
+    @pytest.mark.parametrize("alg", ["HS256", "HS384", "HS512"])
+    def test_sign_and_verify_chunks_with_hmac(self, alg):
+        key = COSEKey.from_symmetric_key(alg=alg)
+        chunks = [b"abc", memoryview(b"x" * 1000)]
+        tag = key.sign_chunks(chunks)
+        assert tag == key.sign(b"abc" + b"x" * 1000)
+        key.verify_chunks(chunks, tag)
+        with pytest.raises(VerifyError) as err:
+            key.verify_chunks([b"abc"], tag)
+            pytest.fail("verify_chunks() should fail.")
+        assert "Failed to compare digest." in str(err.value)
+
+    def test_sign_chunks_with_public_key(self):
+        with open(key_path("public_key_es256.pem")) as f:
+            public_key = COSEKey.from_pem(f.read())
+        with pytest.raises(ValueError) as err:
+            public_key.sign_chunks([b"abc"])
+            pytest.fail("sign_chunks() should fail.")
+        assert "Public key cannot be used for signing." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            io.BytesIO(b"x" * 100000),
+            iter([b"x" * 60000, bytearray(b"x" * 40000)]),
+            (b"x" * 1000 for _ in range(100)),
+        ],
+    )
+    def test_payload_stream(self, source):
+        stream = PayloadStream(source, chunk_size=4096)
+        assert len(stream) == 100000
+        for _ in range(2):
+            chunks = list(stream)
+            assert max(len(c) for c in chunks) == 4096
+            assert b"".join(chunks) == b"x" * 100000
+
+    def test_payload_stream_from_current_position(self):
+        f = io.BytesIO(b"headerpayload")
+        f.read(6)
+        stream = PayloadStream(f)
+        assert len(stream) == 7
+        assert b"".join(stream) == b"payload"
+        assert b"".join(stream) == b"payload"
+
+    def test_payload_stream_with_mmap(self, tmp_path):
+        path = tmp_path / "payload"
+        path.write_bytes(b"Hello world!" * 1000)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            stream = PayloadStream(mm, chunk_size=1000)
+            assert len(stream) == 12000
+            assert b"".join(stream) == b"Hello world!" * 1000
+
+    def test_payload_stream_with_invalid_chunk(self):
+        with pytest.raises(ValueError) as err:
+            list(PayloadStream(iter(["xxx"])))
+            pytest.fail("PayloadStream should fail.")
+        assert "detached_payload should yield bytes-like objects." in str(err.value)
+
+    def test_payload_stream_with_truncated_file(self):
+        f = io.BytesIO(b"x" * 100)
+        stream = PayloadStream(f)
+        assert len(stream) == 100
+        f.truncate(50)
+        with pytest.raises(ValueError) as err:
+            b"".join(stream)
+            pytest.fail("PayloadStream should fail.")
+        assert "detached_payload has been truncated while reading." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "v, expected",
+        [
+            (b"xxx", False),
+            (bytearray(b"xxx"), False),
+            (memoryview(b"xxx"), False),
+            ([b"xxx"], False),
+            ("xxx", False),
+            (io.BytesIO(b"xxx"), True),
+            (iter([b"xxx"]), True),
+        ],
+    )
+    def test_is_payload_stream(self, v, expected):
+        assert is_payload_stream(v) is expected
+
+    def test_to_be_signed_with_payload_stream(self):
+        stream = PayloadStream(io.BytesIO(b"x" * 70000), chunk_size=1000)
+        chunks = to_be_signed("CounterSignature", [b"", b"\xa1\x01\x26", b""], stream, [b"\xa1\x01\x27"])
+        expected = cbor2.dumps(["CounterSignature", b"", b"\xa1\x01\x26", b"", b"x" * 70000, b"\xa1\x01\x27"])
+        assert b"".join(chunks) == expected
+        assert b"".join(chunks) == expected
+
+    @pytest.mark.parametrize(
+        "private_key_path, public_key_path, alg",
+        [
+            ("private_key_es256.pem", "public_key_es256.pem", None),
+            ("private_key_rsa.pem", "public_key_rsa.pem", "PS256"),
+            ("private_key_ed25519.pem", "public_key_ed25519.pem", None),
+        ],
+    )
+    def test_cose_sign1_with_detached_stream(self, private_key_path, public_key_path, alg):
+        with open(key_path(private_key_path)) as f:
+            private_key = COSEKey.from_pem(f.read(), alg=alg, kid="01")
+        with open(key_path(public_key_path)) as f:
+            public_key = COSEKey.from_pem(f.read(), alg=alg, kid="01")
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        payload = b"Hello world!" * 10000
+        encoded = ctx.encode_and_sign(b"", private_key, detached_payload=io.BytesIO(payload))
+        assert cbor2.loads(encoded).value[2] is None
+        assert ctx.decode(encoded, public_key, detached_payload=payload) == payload
+        f = io.BytesIO(payload)
+        assert ctx.decode(encoded, public_key, detached_payload=f) is f
+        assert ctx.decode(encoded, public_key, detached_payload=iter([payload[:5], payload[5:]])) is not None
+        with pytest.raises(VerifyError):
+            ctx.decode(encoded, public_key, detached_payload=io.BytesIO(payload[1:]))
+            pytest.fail("decode() should fail.")
+
+    def test_cose_sign1_with_detached_stream_and_keys(self):
+        with open(key_path("private_key_es256.pem")) as f:
+            private_key = COSEKey.from_pem(f.read())
+        with open(key_path("public_key_es256.pem")) as f:
+            public_key = COSEKey.from_pem(f.read())
+        with open(key_path("public_key_es384.pem")) as f:
+            other_key = COSEKey.from_pem(f.read())
+        ctx = COSE.new(alg_auto_inclusion=True)
+        encoded = ctx.encode_and_sign(b"", private_key, detached_payload=iter([b"Hello ", b"world!"]))
+        f = io.BytesIO(b"Hello world!")
+        assert ctx.decode(encoded, [other_key, public_key], detached_payload=f) is f
+
+    def test_cose_mac0_with_detached_stream(self):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+        payload = b"Hello world!" * 10000
+        encoded = ctx.encode_and_mac(b"", key, detached_payload=iter([payload]))
+        assert cbor2.loads(encoded).value[2] is None
+        assert ctx.decode(encoded, key, detached_payload=payload) == payload
+        assert ctx.decode(encoded, key, detached_payload=io.BytesIO(payload)) is not None
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(encoded, key, detached_payload=io.BytesIO(b"xxx"))
+            pytest.fail("decode() should fail.")
+        assert "Failed to compare digest." in str(err.value)
+
+    def test_cose_mac0_with_detached_bytes(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        ctx = COSE.new(alg_auto_inclusion=True)
+        encoded = ctx.encode_and_mac(b"", key, detached_payload=b"Hello world!")
+        assert cbor2.loads(encoded).value[2] is None
+        assert ctx.decode(encoded, key, detached_payload=b"Hello world!") == b"Hello world!"
+
+    def test_cose_encode_with_payload_and_detached_payload(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        ctx = COSE.new(alg_auto_inclusion=True)
+        with pytest.raises(ValueError) as err:
+            ctx.encode_and_mac(b"xxx", key, detached_payload=b"Hello world!")
+            pytest.fail("encode_and_mac() should fail.")
+        assert "payload should be empty when detached_payload is set." in str(err.value)
+
+    def test_cose_encrypt0_with_detached_stream(self):
+        key = COSEKey.from_symmetric_key(alg="A128GCM")
+        ctx = COSE.new(alg_auto_inclusion=True)
+        encoded = cbor2.loads(ctx.encode_and_encrypt(b"Hello world!", key))
+        encoded.value[2] = None
+        with pytest.raises(ValueError) as err:
+            ctx.decode(encoded, key, detached_payload=io.BytesIO(b"xxx"))
+            pytest.fail("decode() should fail.")
+        assert "detached_payload should be bytes for Encrypt0/Encrypt." in str(err.value)
+
+    def test_cose_sign1_with_detached_mmap_in_constant_memory(self, tmp_path):
+        path = tmp_path / "payload"
+        with open(path, "wb") as f:
+            for _ in range(128):
+                f.write(b"x" * 65536)
+        with open(key_path("private_key_es256.pem")) as f:
+            private_key = COSEKey.from_pem(f.read())
+        with open(key_path("public_key_es256.pem")) as f:
+            public_key = COSEKey.from_pem(f.read())
+        ctx = COSE.new(alg_auto_inclusion=True)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            tracemalloc.start()
+            try:
+                encoded = ctx.encode_and_sign(b"", private_key, detached_payload=mm)
+                ctx.decode(encoded, public_key, detached_payload=mm)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        assert peak < 1024 * 1024
+
+    def test_cose_sign1_with_detached_mmap_and_eddsa_buffers_payload(self, tmp_path):
+        path = tmp_path / "payload"
+        with open(path, "wb") as f:
+            for _ in range(64):
+                f.write(b"x" * 65536)
+        with open(key_path("private_key_ed25519.pem")) as f:
+            private_key = COSEKey.from_pem(f.read())
+        with open(key_path("public_key_ed25519.pem")) as f:
+            public_key = COSEKey.from_pem(f.read())
+        ctx = COSE.new(alg_auto_inclusion=True)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            tracemalloc.start()
+            try:
+                encoded = ctx.encode_and_sign(b"", private_key, detached_payload=mm)
+                assert ctx.decode(encoded, public_key, detached_payload=mm) is mm
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        # EdDSA cannot hash a message incrementally, so the whole payload is read into memory.
+        assert peak >= 64 * 65536
+
+
+def _bstr_head(length: int) -> bytes:
+    if length < 24:
+        return bytes([0x40 | length])
+    if length < 0x100:
+        return bytes([0x58, length])
+    if length < 0x10000:
+        return b"\x59" + length.to_bytes(2, "big")
+    if length < 0x100000000:
+        return b"\x5a" + length.to_bytes(4, "big")
+    return b"\x5b" + length.to_bytes(8, "big")
@@ -449,6 +449,41 @@ class TestCWT:
         assert 2 in decoded and decoded[2] == "someone"
         assert 7 in decoded and decoded[7] == b"123"
 
+    @pytest.mark.parametrize("tagged", [False, True])
+    def test_cwt_encode_and_mac_is_same_as_cbor_tag_tree(self, ctx, tagged):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        claims = {1: "https://as.example", 4: 9999999999, 5: 1000000000, 6: 1000000000, 7: b"x" * 300}
+        res = ctx._cose.encode_and_mac(cbor2.dumps(claims), key, {}, {}, out="cbor2/CBORTag")
+        expected = dumps(CBORTag(61, res) if tagged else res)
+        assert ctx.encode_and_mac(claims, key, tagged=tagged) == expected
+        assert ctx.encode(claims, key, tagged=tagged) == expected
+
+    def test_cwt_encode_into(self, ctx):
+        with open(key_path("private_key_ed25519.pem")) as key_file:
+            private_key = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_ed25519.pem")) as key_file:
+            public_key = COSEKey.from_pem(key_file.read(), kid="01")
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="03")
+        nonce = enc_key.generate_nonce()
+        claims = {1: "https://as.example", 4: 9999999999, 5: 1000000000, 6: 1000000000}
+        buf = bytearray()
+        for key, kwargs in [(private_key, {}), (mac_key, {"tagged": True}), (enc_key, {"nonce": nonce})]:
+            n = ctx.encode_into(buf, claims, key, **kwargs)
+            assert bytes(buf[:n]) == ctx.encode(claims, key, **kwargs)
+            assert ctx.decode(bytes(buf[:n]), [public_key, mac_key, enc_key])[1] == "https://as.example"
+
+    def test_cwt_encode_into_with_offset(self, ctx):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        buf = bytearray(b"head")
+        n = ctx.encode_into(buf, {1: "https://as.example"}, key, offset=4)
+        assert buf[:4] == b"head" and len(buf) == n + 4
+        assert ctx.decode(bytes(buf[4:]), key)[1] == "https://as.example"
+        with pytest.raises(ValueError) as err:
+            ctx.encode_into(buf, {1: "https://as.example"}, key, offset=len(buf) + 1)
+            pytest.fail("encode_into() should fail.")
+        assert "offset should be int between 0 and the length of the buffer." in str(err.value)
+
     def test_cwt_encode_and_sign_with_multiple_signatures(self, ctx):
         with open(key_path("private_key_es256.pem")) as key_file:
             signer_1 = Signer.from_pem(key_file.read(), kid="1")
@@ -574,6 +609,48 @@ class TestCWT:
             pytest.fail("decode should fail.")
         assert "Unsupported or unknown CBOR tag(62)." in str(err.value)
 
+    @pytest.mark.parametrize("tagged", [False, True])
+    def test_cwt_decode_large_token(self, ctx, tagged):
+        mac_key = COSEKey.from_symmetric_key("mysecret", alg="HS256", kid="01")
+        with open(key_path("private_key_ed25519.pem")) as key_file:
+            private_key = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_ed25519.pem")) as key_file:
+            public_key = COSEKey.from_pem(key_file.read(), kid="01")
+        claims = {1: "https://as.example", 2: "あ" * 30000, 7: b"x" * 100000, -70000: [{"a": b"y" * 70000}]}
+        token = ctx.encode_and_mac(claims, mac_key, tagged=tagged)
+        assert ctx.decode(token, mac_key) == claims
+        assert ctx.decode(memoryview(token), mac_key) == claims
+        token = ctx.encode_and_sign(claims, private_key, tagged=tagged)
+        assert ctx.decode(token, public_key) == claims
+
+    def test_cwt_decode_large_nested_token(self, ctx):
+        with open(key_path("private_key_ed25519.pem")) as key_file:
+            private_key = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_ed25519.pem")) as key_file:
+            public_key = COSEKey.from_pem(key_file.read(), kid="01")
+        enc_key = COSEKey.from_symmetric_key(alg="ChaCha20/Poly1305", kid="02")
+        claims = {1: "https://as.example", 7: b"x" * 100000}
+        token = ctx.encode_and_sign(claims, private_key)
+        nested = ctx.encode_and_encrypt(token, enc_key)
+        assert ctx.decode(nested, [enc_key, public_key]) == claims
+
+    def test_cwt_decode_large_token_with_invalid_mac(self, ctx):
+        mac_key = COSEKey.from_symmetric_key("mysecret", alg="HS256", kid="01")
+        token = bytearray(ctx.encode_and_mac({1: "https://as.example", 7: b"x" * 100000}, mac_key))
+        token[-40] ^= 1
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(bytes(token), mac_key)
+            pytest.fail("decode should fail.")
+        assert "Failed to compare digest." in str(err.value)
+
+    def test_cwt_decode_truncated_large_token(self, ctx):
+        mac_key = COSEKey.from_symmetric_key("mysecret", alg="HS256", kid="01")
+        token = ctx.encode_and_mac({1: "https://as.example", 7: b"x" * 100000}, mac_key)
+        with pytest.raises(DecodeError) as err:
+            ctx.decode(token[:-10], mac_key)
+            pytest.fail("decode should fail.")
+        assert "Failed to decode." in str(err.value)
+
     @pytest.mark.parametrize(
         "claims",
         [
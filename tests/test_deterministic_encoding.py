@@ -7,7 +7,19 @@ import pytest
 
 from cwt import COSE, COSEKey
 from cwt.const import COSE_ALGORITHMS_MAC, COSE_ALGORITHMS_SIGNATURE
-from cwt.utils import sort_keys_for_deterministic_encoding
+from cwt.utils import encode_deterministic_header, sort_keys_for_deterministic_encoding
+
+LABELS = (
+    [0, 1, 23, 24, 25, 255, 256, 65535, 65536, 2**32 - 1, 2**32, 2**64 - 1, 2**64]
+    + [-1, -2, -24, -25, -256, -257, -65536, -65537, -(2**32), -(2**32) - 1, -(2**64), -(2**64) - 1]
+    + ["", "a", "b", "aa", "z" * 23, "z" * 24, "a" * 255, "a" * 256, "\u00e9", "\u3042", "e\u0301"]
+    + [b"", b"\x00", b"\xff", b"\x00" * 24, True, False, None, 1.5, -0.0]
+)
+
+
+def _sort_by_encoding(d):
+    # The previous implementation, which is the definition of the order.
+    return {k: v for k, v in sorted(d.items(), key=lambda kv: cbor2.dumps(kv[0]))}
 
 
 class TestDeterministicEncoding:
@@ -109,3 +121,47 @@ class TestDeterministicEncoding:
         expected_p = cbor2.dumps(sorted_p)
 
         assert expected_p == encoded_p
+
+    def test_deterministic_order_conforms_to_encoding_order(self):
+        d = {label: i for i, label in enumerate(LABELS) if not isinstance(label, bool)}
+        assert list(sort_keys_for_deterministic_encoding(d)) == list(_sort_by_encoding(d))
+        # True, False and -0.0 are equal to 1, 0 and 0 as dict keys.
+        d = {label: i for i, label in enumerate(reversed(LABELS)) if not (type(label) in [int, float] and label in [0, 1])}
+        assert True in d and False in d
+        assert list(sort_keys_for_deterministic_encoding(d)) == list(_sort_by_encoding(d))
+
+    def test_deterministic_order_of_random_labels(self):
+        import random
+
+        rnd = random.Random(0)
+        for _ in range(200):
+            labels = [
+                rnd.choice([rnd.randint(-70000, 70000), rnd.randint(-(2**40), 2**40), rnd.choice(LABELS)]) for _ in range(8)
+            ]
+            labels += ["".join(rnd.choice("ab\u00e9") for _ in range(rnd.randint(0, 30))) for _ in range(4)]
+            d = {label: 0 for label in labels}
+            assert list(sort_keys_for_deterministic_encoding(d)) == list(_sort_by_encoding(d))
+            assert encode_deterministic_header(d) == cbor2.dumps(_sort_by_encoding(d))
+
+    def test_deterministically_sorted_nested_map(self):
+        cose_key = {-3: b"y", -2: b"x", -1: 1, 1: 2}
+        d = {-1: cose_key, 1: -25, 33: [b"a", {2: 0, 1: 0}]}
+        res = sort_keys_for_deterministic_encoding(d)
+        assert list(res) == [1, 33, -1]
+        assert list(res[-1]) == [1, -1, -2, -3]
+        assert list(res[33][1]) == [1, 2]
+        assert list(cose_key) == [-3, -2, -1, 1]
+        assert encode_deterministic_header(d) == cbor2.dumps(
+            {1: -25, 33: [b"a", {1: 0, 2: 0}], -1: {1: 2, -1: 1, -2: b"x", -3: b"y"}}
+        )
+
+    def test_encode_deterministic_header_cache(self):
+        d = {4: b"01", 1: -7}
+        res = encode_deterministic_header(d)
+        assert res == cbor2.dumps({1: -7, 4: b"01"})
+        assert encode_deterministic_header({4: b"01", 1: -7}) is res
+        # True == 1, but it is encoded differently.
+        assert encode_deterministic_header({1: 1}) == cbor2.dumps({1: 1})
+        assert encode_deterministic_header({1: True}) == cbor2.dumps({1: True})
+        assert encode_deterministic_header({True: 1}) == cbor2.dumps({True: 1})
+        assert encode_deterministic_header({}) == b"\xa0"
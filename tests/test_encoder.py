@@ -0,0 +1,324 @@
+"""
+Tests for COSEEncoder and CWTEncoder.
+"""
+
+import cbor2
+import pytest
+from cbor2 import CBORTag
+
+from cwt import COSE, CWT, COSEEncoder, COSEKey, CWTEncoder, Recipient, Signer
+from cwt.cose_key_interface import COSEKeyInterface
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def ctx():
+    return COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+
+
+@pytest.fixture(scope="module")
+def ed25519_keys():
+    with open(key_path("private_key_ed25519.pem")) as key_file:
+        private_key = COSEKey.from_pem(key_file.read(), kid="01")
+    with open(key_path("public_key_ed25519.pem")) as key_file:
+        public_key = COSEKey.from_pem(key_file.read(), kid="01")
+    return private_key, public_key
+
+
+@pytest.fixture(scope="module")
+def es256_keys():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        private_key = COSEKey.from_pem(key_file.read(), kid="01")
+    with open(key_path("public_key_es256.pem")) as key_file:
+        public_key = COSEKey.from_pem(key_file.read(), kid="01")
+    return private_key, public_key
+
+
+class TestCOSEEncoder:
+    """
+    Tests for COSEEncoder.
+    """
+
+    @pytest.mark.parametrize(
+        "protected, unprotected, external_aad",
+        [
+            (None, None, b""),
+            ({"content type": 60}, None, b""),
+            (None, {"content type": 60}, b"aad"),
+            ({3: 60}, {-70000: "x"}, b""),
+        ],
+    )
+    def test_cose_encoder_sign1(self, ctx, ed25519_keys, protected, unprotected, external_aad):
+        private_key, public_key = ed25519_keys
+        signer = ctx.prepare_signer(private_key, protected, unprotected)
+        assert isinstance(signer, COSEEncoder)
+        for payload in [b"", b"Hello world!", b"x" * 70000]:
+            encoded = signer.encode(payload, external_aad)
+            assert encoded == ctx.encode_and_sign(payload, private_key, protected, unprotected, external_aad=external_aad)
+            assert ctx.decode(encoded, public_key, external_aad=external_aad) == payload
+
+    def test_cose_encoder_sign1_with_es256(self, ctx, es256_keys):
+        private_key, public_key = es256_keys
+        signer = ctx.prepare_signer(private_key)
+        assert signer.protected == {1: -7}
+        assert signer.unprotected == {4: b"01"}
+        for i in range(3):
+            assert ctx.decode(signer.encode(f"message {i}".encode()), public_key) == f"message {i}".encode()
+
+    def test_cose_encoder_sign(self, es256_keys):
+        private_key, public_key = es256_keys
+        ctx = COSE.new()
+        signers = [Signer.new(cose_key=private_key, protected={"alg": "ES256"}, unprotected={"kid": "01"})]
+        signer = ctx.prepare_signer(signers=signers)
+        encoded = signer.encode(b"Hello world!")
+        assert cbor2.loads(encoded).tag == 98
+        assert ctx.decode(encoded, public_key) == b"Hello world!"
+
+    @pytest.mark.parametrize("alg", ["HS256", "HS384", "HS512", "HMAC 256/64"])
+    def test_cose_encoder_mac0(self, ctx, alg):
+        key = COSEKey.from_symmetric_key(alg=alg, kid="01")
+        mac = ctx.prepare_mac(key)
+        for payload in [b"", b"Hello world!"]:
+            encoded = mac.encode(payload)
+            assert encoded == ctx.encode_and_mac(payload, key)
+            assert ctx.decode(encoded, key) == payload
+
+    def test_cose_encoder_mac(self):
+        ctx = COSE.new()
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        mac = ctx.prepare_mac(key, protected={"alg": "HS256"}, recipients=[r])
+        encoded = mac.encode(b"Hello world!")
+        assert encoded == ctx.encode_and_mac(b"Hello world!", key, protected={"alg": "HS256"}, recipients=[r])
+        assert ctx.decode(encoded, key) == b"Hello world!"
+
+    @pytest.mark.parametrize("alg", ["A128GCM", "A256GCM", "ChaCha20/Poly1305", "AES-CCM-16-64-128"])
+    def test_cose_encoder_encrypt0(self, ctx, alg):
+        key = COSEKey.from_symmetric_key(alg=alg, kid="01")
+        enc = ctx.prepare_encrypter(key)
+        encoded = [enc.encode(b"Hello world!") for _ in range(2)]
+        nonces = [cbor2.loads(e).value[1][5] for e in encoded]
+        assert nonces[0] != nonces[1]
+        assert 5 not in enc.unprotected
+        for e in encoded:
+            assert ctx.decode(e, key) == b"Hello world!"
+        assert ctx.decode(enc.encode(b"Hello world!", b"aad"), key, external_aad=b"aad") == b"Hello world!"
+
+    def test_cose_encoder_encrypt0_same_as_encode_and_encrypt(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        enc = ctx.prepare_encrypter(key, unprotected={"content type": 60})
+        encoded = enc.encode(b"Hello world!")
+        nonce = cbor2.loads(encoded).value[1][5]
+        assert encoded == ctx.encode_and_encrypt(b"Hello world!", key, unprotected={"content type": 60, "iv": nonce})
+
+    def test_cose_encoder_encrypt0_with_non_aead(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        key = COSEKey.from_symmetric_key(alg="A128CTR", kid="01")
+        with pytest.raises(ValueError) as err:
+            ctx.prepare_encrypter(key)
+            pytest.fail("prepare_encrypter() should fail.")
+        assert "Deprecated non-AEAD algorithm: -65534." in str(err.value)
+        enc = ctx.prepare_encrypter(key, enable_non_aead=True)
+        assert ctx.decode(enc.encode(b"Hello world!"), key, enable_non_aead=True) == b"Hello world!"
+
+    def test_cose_encoder_encrypt0_with_hpke(self):
+        ctx = COSE.new()
+        rpk = COSEKey.from_jwk(
+            {
+                "kty": "EC",
+                "kid": "01",
+                "crv": "P-256",
+                "x": "usWxHK2PmfnHKwXPS54m0kTcGJ90UiglWiGahtagnv8",
+                "y": "IBOL-C3BttVivg-lSreASjpkttcsz-1rb7btKLv8EX4",
+            }
+        )
+        rsk = COSEKey.from_jwk(
+            {
+                "kty": "EC",
+                "kid": "01",
+                "crv": "P-256",
+                "x": "usWxHK2PmfnHKwXPS54m0kTcGJ90UiglWiGahtagnv8",
+                "y": "IBOL-C3BttVivg-lSreASjpkttcsz-1rb7btKLv8EX4",
+                "d": "V8kgd2ZBRuh2dgyVINBUqpPDr7BOMGcF22CQMIUHtNM",
+            }
+        )
+        enc = ctx.prepare_encrypter(rpk, protected={1: 35}, unprotected={4: b"01"})
+        for _ in range(2):
+            assert ctx.decode(enc.encode(b"Hello world!"), rsk) == b"Hello world!"
+
+    def test_cose_encoder_encrypt(self):
+        ctx = COSE.new()
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        enc = ctx.prepare_encrypter(key, protected={"alg": "A128GCM"}, recipients=[r])
+        assert ctx.decode(enc.encode(b"Hello world!"), key) == b"Hello world!"
+
+    def test_cose_encoder_encode_into(self, ctx, ed25519_keys):
+        private_key, public_key = ed25519_keys
+        signer = ctx.prepare_signer(private_key, unprotected={3: 60})
+        buf = bytearray()
+        for payload in [b"Hello world!", b"", b"x" * 70000, b"Hi"]:
+            n = signer.encode_into(buf, payload, b"aad")
+            assert bytes(buf[:n]) == signer.encode(payload, b"aad")
+            assert ctx.decode(bytes(buf[:n]), public_key, external_aad=b"aad") == payload
+        # The buffer is not shrunk after the largest message.
+        assert len(buf) > 70000 > n
+
+    def test_cose_encoder_encode_into_with_offset(self, ctx):
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        enc = ctx.prepare_encrypter(key)
+        buf = bytearray(b"\x00" * 4)
+        n = enc.encode_into(buf, b"Hello world!", offset=4)
+        assert buf[:4] == b"\x00" * 4 and len(buf) == n + 4
+        assert ctx.decode(bytes(buf[4:]), key) == b"Hello world!"
+
+    def test_cose_encoder_encode_into_with_recipients(self):
+        ctx = COSE.new()
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        mac = ctx.prepare_mac(key, protected={"alg": "HS256"}, recipients=[r])
+        buf = bytearray()
+        n = mac.encode_into(buf, b"Hello world!")
+        assert bytes(buf) == mac.encode(b"Hello world!")
+        assert n == len(buf)
+
+    def test_cose_encoder_encode_into_with_invalid_buffer(self, ctx):
+        mac = ctx.prepare_mac(COSEKey.from_symmetric_key(alg="HS256", kid="01"))
+        with pytest.raises(ValueError) as err:
+            mac.encode_into(bytes(16), b"Hello world!")
+            pytest.fail("encode_into() should fail.")
+        assert "buffer should be bytearray." in str(err.value)
+
+    def test_cose_encoder_with_cbor_tag_out(self, ctx, ed25519_keys):
+        private_key, public_key = ed25519_keys
+        signer = ctx.prepare_signer(private_key)
+        res = signer.encode(b"Hello world!", out="cbor2/CBORTag")
+        assert isinstance(res, CBORTag)
+        assert cbor2.dumps(res) == signer.encode(b"Hello world!")
+
+    def test_cose_encoder_does_not_modify_headers(self, ctx):
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        protected = {1: 1}
+        unprotected = {3: 60}
+        enc = ctx.prepare_encrypter(key, protected, unprotected)
+        enc.encode(b"Hello world!")
+        assert protected == {1: 1}
+        assert unprotected == {3: 60}
+
+    @pytest.mark.parametrize(
+        "method, key, protected, unprotected, msg",
+        [
+            ("prepare_signer", "HS256", None, None, "The COSE message is not suitable for COSE Sign0/Sign."),
+            ("prepare_mac", "A128GCM", None, None, "The COSE message is not suitable for COSE MAC0/MAC."),
+            ("prepare_encrypter", "HS256", None, None, "The COSE message is not suitable for COSE Encrypt0/Encrypt."),
+            (
+                "prepare_encrypter",
+                "A128GCM",
+                None,
+                {5: b"123456789012"},
+                "unprotected header should not have IV since it is generated for each message.",
+            ),
+            ("prepare_mac", "HS256", {1: 5}, {1: 5}, "The same keys are both in protected and unprotected headers."),
+        ],
+    )
+    def test_cose_encoder_with_invalid_args(self, method, key, protected, unprotected, msg):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        k = COSEKey.from_symmetric_key(alg=key, kid="01")
+        with pytest.raises(ValueError) as err:
+            getattr(ctx, method)(k, protected, unprotected)
+            pytest.fail(f"{method}() should fail.")
+        assert msg in str(err.value)
+
+
+class TestCWTEncoder:
+    """
+    Tests for CWTEncoder.
+    """
+
+    def test_cwt_encoder_sign(self, es256_keys):
+        private_key, public_key = es256_keys
+        ctx = CWT.new()
+        encoder = ctx.prepare_encoder(private_key)
+        assert isinstance(encoder, CWTEncoder)
+        assert encoder.cose_encoder.protected == {1: -7}
+        token = encoder.encode({"iss": "coaps://as.example", "sub": "dajiaji", "cti": "123"})
+        decoded = ctx.decode(token, public_key)
+        assert decoded[1] == "coaps://as.example"
+        assert decoded[2] == "dajiaji"
+        assert 4 in decoded and 5 in decoded and 6 in decoded
+
+    def test_cwt_encoder_same_as_encode(self, ed25519_keys):
+        private_key, _ = ed25519_keys
+        ctx = CWT.new()
+        claims = {1: "coaps://as.example", 4: 9999999999, 5: 1000000000, 6: 1000000000}
+        assert ctx.prepare_encoder(private_key).encode(claims) == ctx.encode(claims, private_key)
+        assert ctx.prepare_encoder(private_key, tagged=True).encode(claims) == ctx.encode(claims, private_key, tagged=True)
+
+    def test_cwt_encoder_encode_into(self, ed25519_keys):
+        private_key, public_key = ed25519_keys
+        ctx = CWT.new()
+        claims = {1: "coaps://as.example", 4: 9999999999, 5: 1000000000, 6: 1000000000}
+        for tagged in [False, True]:
+            encoder = ctx.prepare_encoder(private_key, tagged=tagged)
+            buf = bytearray(b"\xff" * 300)
+            n = encoder.encode_into(buf, claims)
+            assert bytes(buf[:n]) == encoder.encode(claims)
+            assert buf[n:] == b"\xff" * (300 - n)
+            assert ctx.decode(bytes(buf[:n]), public_key)[1] == "coaps://as.example"
+
+    def test_cwt_encoder_mac(self):
+        ctx = CWT.new()
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        encoder = ctx.prepare_encoder(key, tagged=True)
+        token = encoder.encode({1: "coaps://as.example"})
+        assert cbor2.loads(token).tag == 61
+        assert ctx.decode(token, key)[1] == "coaps://as.example"
+
+    def test_cwt_encoder_encrypt(self):
+        ctx = CWT.new()
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        encoder = ctx.prepare_encoder(key)
+        tokens = [encoder.encode({1: "coaps://as.example"}) for _ in range(2)]
+        assert tokens[0] != tokens[1]
+        for token in tokens:
+            assert ctx.decode(token, key)[1] == "coaps://as.example"
+
+    def test_cwt_encoder_nested(self, es256_keys):
+        private_key, public_key = es256_keys
+        ctx = CWT.new()
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="02")
+        signed = ctx.prepare_encoder(private_key).encode({1: "coaps://as.example"})
+        token = ctx.prepare_encoder(enc_key).encode(signed)
+        assert ctx.decode(token, [enc_key, public_key])[1] == "coaps://as.example"
+
+    def test_cwt_encoder_with_signers(self, es256_keys):
+        private_key, public_key = es256_keys
+        ctx = CWT.new()
+        signers = [Signer.new(cose_key=private_key, protected={"alg": "ES256"}, unprotected={"kid": "01"})]
+        token = ctx.prepare_encoder(signers=signers).encode({1: "coaps://as.example"})
+        assert ctx.decode(token, public_key)[1] == "coaps://as.example"
+
+    def test_cwt_encoder_without_key(self):
+        ctx = CWT.new()
+        with pytest.raises(ValueError) as err:
+            ctx.prepare_encoder()
+            pytest.fail("prepare_encoder() should fail.")
+        assert "key should be set." in str(err.value)
+
+    def test_cwt_encoder_with_invalid_key_ops(self):
+        ctx = CWT.new()
+        key = COSEKeyInterface({1: 4, 2: b"123", 3: 1, 4: [1, 3]})
+        with pytest.raises(ValueError) as err:
+            ctx.prepare_encoder(key)
+            pytest.fail("prepare_encoder() should fail.")
+        assert "The key operation could not be specified." in str(err.value)
+
+    def test_cwt_encoder_with_invalid_claims(self, es256_keys):
+        private_key, _ = es256_keys
+        encoder = CWT.new().prepare_encoder(private_key)
+        with pytest.raises(ValueError) as err:
+            encoder.encode({1: 123})
+            pytest.fail("encode() should fail.")
+        assert "iss(1) should be str." in str(err.value)
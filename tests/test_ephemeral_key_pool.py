@@ -0,0 +1,193 @@
+"""
+Tests for EphemeralKeyPool.
+"""
+
+import time
+
+import cbor2
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.x448 import X448PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from cwt import COSE, COSEKey, EphemeralKeyPool, Recipient
+from cwt.algs.ec2 import EC2Key
+from cwt.algs.okp import OKPKey
+from cwt.cose_key_interface import COSEKeyInterface
+
+from .utils import key_path
+
+
+def wait_for(cond, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            pytest.fail("The condition is not satisfied in time.")
+        time.sleep(0.001)
+
+
+def load_key(name: str, **kwargs) -> COSEKeyInterface:
+    with open(key_path(name)) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01", **kwargs)
+
+
+class TestEphemeralKeyPool:
+    """
+    Tests for EphemeralKeyPool.
+    """
+
+    def test_ephemeral_key_pool_constructor(self):
+        with EphemeralKeyPool() as pool:
+            for crv in ["P-256", "P-384", "P-521", "X25519", "X448"]:
+                wait_for(lambda crv=crv: pool.available(crv) == 32)
+            assert pool.available("secp256k1") == 0
+            assert pool.hits == 0
+            assert pool.misses == 0
+
+    def test_ephemeral_key_pool_constructor_with_crv_ids(self):
+        with EphemeralKeyPool(crvs=[1, 8], size=2, low_watermark=1) as pool:
+            wait_for(lambda: pool.available(1) == 2 and pool.available("secp256k1") == 2)
+            assert pool.available("P-384") == 0
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"crvs": ["Ed25519"]}, "Unsupported or unknown crv for ephemeral keys: Ed25519."),
+            ({"crvs": ["xxx"]}, "Unsupported or unknown crv for ephemeral keys: xxx."),
+            ({"crvs": [6]}, "Unsupported or unknown crv for ephemeral keys: 6."),
+            ({"size": 0}, "size should be positive int."),
+            ({"size": "1"}, "size should be positive int."),
+            ({"low_watermark": -1}, "low_watermark should be non-negative int."),
+            ({"low_watermark": "1"}, "low_watermark should be non-negative int."),
+            ({"size": 4, "low_watermark": 4}, "low_watermark should be less than size."),
+        ],
+    )
+    def test_ephemeral_key_pool_constructor_with_invalid_args(self, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            EphemeralKeyPool(**kwargs)
+            pytest.fail("EphemeralKeyPool() should fail.")
+        assert msg in str(err.value)
+
+    def test_ephemeral_key_pool_take_single_use(self):
+        with EphemeralKeyPool(crvs=["P-256"], size=8, low_watermark=2) as pool:
+            wait_for(lambda: pool.available(1) == 8)
+            keys = [pool.take(1) for _ in range(20)]
+            assert pool.hits + pool.misses == 20
+            assert pool.hits >= 6
+            assert len({k.private_numbers().private_value for k in keys}) == 20
+
+    def test_ephemeral_key_pool_refills_below_low_watermark(self):
+        with EphemeralKeyPool(crvs=["X25519"], size=4, low_watermark=2) as pool:
+            wait_for(lambda: pool.available("X25519") == 4)
+            pool.take(4)
+            pool.take(4)
+            time.sleep(0.05)
+            # Not refilled until it falls below the low watermark.
+            assert pool.available("X25519") == 2
+            pool.take(4)
+            wait_for(lambda: pool.available("X25519") == 4)
+            assert pool.hits == 3
+
+    def test_ephemeral_key_pool_take_when_empty(self):
+        with EphemeralKeyPool(crvs=["P-256"], size=1, low_watermark=0) as pool:
+            wait_for(lambda: pool.available(1) == 1)
+            assert pool.take(1) is not None
+            assert pool.take(1) is not None
+            assert pool.hits == 1
+            assert pool.misses == 1
+
+    def test_ephemeral_key_pool_take_not_pooled_crv(self):
+        with EphemeralKeyPool(crvs=["P-256"], size=2, low_watermark=1) as pool:
+            assert pool.take(5) is not None
+            assert pool.hits == 0
+            assert pool.misses == 0
+
+    def test_ephemeral_key_pool_take_with_invalid_crv(self):
+        with EphemeralKeyPool(crvs=["P-256"], size=2, low_watermark=1) as pool:
+            with pytest.raises(ValueError) as err:
+                pool.take(6)
+                pytest.fail("take() should fail.")
+            assert "Unsupported or unknown crv for ephemeral keys: 6." in str(err.value)
+
+    def test_ephemeral_key_pool_close(self):
+        pool = EphemeralKeyPool(crvs=["P-256"], size=2, low_watermark=1)
+        pool.close()
+        pool.close()
+        assert pool.available(1) == 0
+        assert pool.take(1) is not None
+        assert pool.hits == 0
+
+    @pytest.mark.parametrize(
+        "alg, private_key_path, public_key_path",
+        [
+            ("ECDH-ES+HKDF-256", "private_key_es256.pem", "public_key_es256.pem"),
+            ("ECDH-ES+HKDF-512", "private_key_es512.pem", "public_key_es512.pem"),
+            ("ECDH-ES+A128KW", "private_key_es256.pem", "public_key_es256.pem"),
+            ("ECDH-ES+A256KW", "private_key_es384.pem", "public_key_es384.pem"),
+            ("ECDH-ES+HKDF-256", "private_key_x25519.pem", "public_key_x25519.pem"),
+            ("ECDH-ES+HKDF-512", "private_key_x448.pem", "public_key_x448.pem"),
+        ],
+    )
+    def test_ephemeral_key_pool_with_recipient(self, alg, private_key_path, public_key_path):
+        pub_key = load_key(public_key_path)
+        priv_key = load_key(private_key_path, alg=alg)
+        ctx = COSE.new(alg_auto_inclusion=True)
+        # A content encryption key is wrapped for the key wrap algorithms.
+        cek = COSEKey.from_symmetric_key(alg="A128GCM") if alg.endswith("KW") else None
+        with EphemeralKeyPool(size=2, low_watermark=1) as pool:
+            wait_for(lambda: pool.available(pub_key.crv) == 2)
+            rec = Recipient.new(
+                unprotected={"alg": alg},
+                recipient_key=pub_key,
+                context={"alg": "A128GCM"},
+                ephemeral_key_pool=pool,
+            )
+            encoded1 = ctx.encode_and_encrypt(b"Hello world!", cek, recipients=[rec])
+            encoded2 = ctx.encode_and_encrypt(b"Hello world!", cek, recipients=[rec])
+            assert pool.hits == 2
+        # Each message has its own ephemeral key.
+        assert cbor2.loads(encoded1).value[3][0][1][-1] != cbor2.loads(encoded2).value[3][0][1][-1]
+        for encoded in [encoded1, encoded2]:
+            assert ctx.decode(encoded, priv_key, context={"alg": "A128GCM"}) == b"Hello world!"
+
+    def test_ephemeral_key_pool_with_invalid_recipient_arg(self):
+        with pytest.raises(ValueError) as err:
+            Recipient.new(unprotected={"alg": "ECDH-ES+HKDF-256"}, context={"alg": "A128GCM"}, ephemeral_key_pool="xxx")
+            pytest.fail("Recipient.new() should fail.")
+        assert "ephemeral_key_pool should be EphemeralKeyPool." in str(err.value)
+
+
+class TestEphemeralKey:
+    """
+    Tests for ephemeral keys created from the keys generated in advance.
+    """
+
+    @pytest.mark.parametrize(
+        "crv, k, public_key_path",
+        [
+            (1, ec.generate_private_key(ec.SECP256R1()), "public_key_es256.pem"),
+            (3, ec.generate_private_key(ec.SECP521R1()), "public_key_es512.pem"),
+            (4, X25519PrivateKey.generate(), "public_key_x25519.pem"),
+            (5, X448PrivateKey.generate(), "public_key_x448.pem"),
+        ],
+    )
+    def test_ephemeral_key_from_private_key(self, crv, k, public_key_path):
+        key = (EC2Key if crv in [1, 3] else OKPKey).from_ephemeral_key(k, crv, -25)
+        assert key.crv == crv
+        assert len(key.derive_bytes(16, public_key=load_key(public_key_path))) == 16
+        assert key.key is k
+
+    @pytest.mark.parametrize(
+        "cls, crv, k, msg",
+        [
+            (EC2Key, 1, ec.generate_private_key(ec.SECP384R1()), "k should be EllipticCurvePrivateKey on crv 1."),
+            (EC2Key, 1, X25519PrivateKey.generate(), "k should be EllipticCurvePrivateKey on crv 1."),
+            (OKPKey, 4, X448PrivateKey.generate(), "k should be X25519PrivateKey or X448PrivateKey on crv 4."),
+            (OKPKey, 5, ec.generate_private_key(ec.SECP256R1()), "k should be X25519PrivateKey or X448PrivateKey on crv 5."),
+        ],
+    )
+    def test_ephemeral_key_from_private_key_with_invalid_key(self, cls, crv, k, msg):
+        with pytest.raises(ValueError) as err:
+            cls.from_ephemeral_key(k, crv, -25)
+            pytest.fail("from_ephemeral_key() should fail.")
+        assert msg in str(err.value)
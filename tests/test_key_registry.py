@@ -0,0 +1,369 @@
+"""
+Tests for KeyRegistry.
+"""
+
+import json
+import threading
+import time
+
+import cbor2
+import pytest
+
+from cwt import COSE, CWT, COSEKey, KeyRegistry, Recipient, VerifyError
+from cwt.cose_key_interface import COSEKeyInterface
+
+from .utils import key_path
+
+
+def load_key(name: str, **kwargs) -> COSEKeyInterface:
+    with open(key_path(name)) as key_file:
+        return COSEKey.from_pem(key_file.read(), **kwargs)
+
+
+@pytest.fixture(scope="module")
+def ctx():
+    return COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    with KeyRegistry(str(tmp_path / "keys.db")) as r:
+        yield r
+
+
+class TestKeyRegistry:
+    """
+    Tests for KeyRegistry.
+    """
+
+    def test_key_registry_constructor(self, tmp_path):
+        path = str(tmp_path / "keys.db")
+        registry = KeyRegistry(path)
+        assert len(registry) == 0
+        assert list(registry) == []
+        assert registry.find(b"01") == ()
+        assert registry.generation == 0
+        assert registry.hits == 0
+        assert registry.misses == 1
+        registry.close()
+        registry.close()
+        # The database can be opened again.
+        with KeyRegistry(path, read_only=True, mmap_size=2**20) as registry:
+            assert len(registry) == 0
+
+    def test_key_registry_add_and_find(self, registry):
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        sig_key = load_key("public_key_es256.pem", kid="02")
+        registry.update(add=[mac_key, enc_key])
+        registry.add(sig_key)
+        assert len(registry) == 3
+        assert [k.to_dict() for k in registry] == [mac_key.to_dict(), enc_key.to_dict(), sig_key.to_dict()]
+        assert mac_key in registry
+        assert COSEKey.from_symmetric_key(alg="HS256", kid="01") not in registry
+        assert b"01" not in registry
+
+        assert registry.find() == ()
+        assert [k.to_dict() for k in registry.find(b"01")] == [mac_key.to_dict(), enc_key.to_dict()]
+        assert [k.to_dict() for k in registry.find(b"01", op=10)] == [mac_key.to_dict()]
+        assert [k.to_dict() for k in registry.find(b"01", op=4)] == [enc_key.to_dict()]
+        assert [k.to_dict() for k in registry.find(b"01", alg=5)] == [mac_key.to_dict()]
+        assert registry.find(b"01", alg=-7) == ()
+        assert registry.find(b"03") == ()
+        # Keys which have no alg are always included.
+        assert [k.to_dict() for k in registry.find(b"02", alg=-7)] == [sig_key.to_dict()]
+
+    def test_key_registry_add_same_key_twice(self, registry):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        registry.add(key)
+        registry.add(key, not_after=int(time.time()) - 1)
+        assert len(registry) == 1
+        assert registry.find(b"01") == ()
+
+    def test_key_registry_decode(self, ctx, registry):
+        priv = load_key("private_key_es256.pem", alg="ES256", kid="01")
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        registry.update(add=[load_key("public_key_es256.pem", alg="ES256", kid="01"), mac_key])
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, registry) == b"Hello world!"
+        encoded = ctx.encode_and_mac(b"Hello world!", mac_key)
+        assert ctx.decode(encoded, registry) == b"Hello world!"
+
+        token = CWT.new().encode({"iss": "coaps://as.example"}, priv)
+        assert CWT.new().decode(token, registry)[1] == "coaps://as.example"
+        assert registry.misses == 2
+        assert registry.hits == 1
+
+    def test_key_registry_decode_with_unknown_kid(self, ctx, registry):
+        priv = load_key("private_key_es256.pem", alg="ES256", kid="01")
+        registry.add(load_key("public_key_es256.pem", alg="ES256", kid="02"))
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        with pytest.raises(ValueError) as err:
+            ctx.decode(encoded, registry)
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_key_registry_decode_with_token_cache(self, registry):
+        priv = load_key("private_key_es256.pem", alg="ES256", kid="01")
+        pub = load_key("public_key_es256.pem", alg="ES256", kid="01")
+        registry.add(pub)
+        ctx = CWT.new(token_cache_size=16)
+        token = ctx.encode({"iss": "coaps://as.example"}, priv)
+        assert ctx.decode(token, registry)[1] == "coaps://as.example"
+        assert ctx.decode(token, registry)[1] == "coaps://as.example"
+        assert registry.misses == 1
+        # The cached token is invalidated when the key is removed.
+        registry.remove(b"01")
+        assert registry.generation == 1
+        with pytest.raises(ValueError) as err:
+            ctx.decode(token, registry)
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_key_registry_validity_window(self, registry):
+        now = int(time.time())
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k3 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        registry.add(k1, not_before=now - 10, not_after=now + 10)
+        registry.add(k2, not_before=now + 10)
+        registry.add(k3, not_after=now)
+        assert [k.to_dict() for k in registry.find(b"01")] == [k1.to_dict()]
+
+    @pytest.mark.parametrize("unprotected", [{"alg": "A128KW"}, {"alg": "A128KW", "kid": "01"}])
+    def test_key_registry_decode_with_expired_recipient_key(self, registry, unprotected):
+        key = COSEKey.from_symmetric_key(alg="A128KW", kid="01")
+        registry.add(key, not_after=1000)
+        r = Recipient.new(unprotected=unprotected, sender_key=key)
+        ctx = COSE.new(alg_auto_inclusion=True)
+        encoded = ctx.encode_and_encrypt(b"Hello world!", COSEKey.from_symmetric_key(alg="A128GCM"), recipients=[r])
+        assert ctx.decode(encoded, [key]) == b"Hello world!"
+        with pytest.raises(ValueError) as err:
+            ctx.decode(encoded, registry)
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_key_registry_remove(self, registry):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k3 = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        registry.update(add=[k1, k2, k3])
+        assert len(registry.find(b"01")) == 2
+        generation = registry.generation
+
+        removed = registry.remove(k1)
+        assert [k.to_dict() for k in removed] == [k1.to_dict()]
+        assert [k.to_dict() for k in registry.find(b"01")] == [k2.to_dict()]
+        assert registry.removed_since(generation, b"01")
+        assert not registry.removed_since(generation, b"02")
+
+        assert [k.to_dict() for k in registry.remove(b"02")] == [k3.to_dict()]
+        assert registry.remove(b"02") == []
+        assert registry.remove(COSEKey.from_symmetric_key(alg="HS256")) == []
+        assert len(registry) == 1
+
+    def test_key_registry_update_atomically(self, registry):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        registry.add(k1)
+        assert registry.update(add=[k2], remove=[b"01"])[0].to_dict() == k1.to_dict()
+        assert [k.to_dict() for k in registry.find(b"01")] == [k2.to_dict()]
+        assert registry.update() == []
+
+    def test_key_registry_cache(self, registry, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("cwt.key_registry.time.monotonic", lambda: now[0])
+        registry.update(add=[COSEKey.from_symmetric_key(alg="HS256", kid=f"{i}") for i in range(3)])
+        registry.find(b"0")
+        registry.find(b"0")
+        assert (registry.hits, registry.misses) == (1, 1)
+        now[0] += 60
+        registry.find(b"0")
+        assert (registry.hits, registry.misses) == (1, 2)
+        # Unknown kids are cached too.
+        registry.find(b"9")
+        registry.find(b"9")
+        assert (registry.hits, registry.misses) == (2, 3)
+
+    def test_key_registry_does_not_cache_rows_read_before_update(self, registry):
+        registry.add(COSEKey.from_symmetric_key(alg="HS256", kid="01"))
+        conn = registry._conn()
+
+        class RacingConnection:
+            def execute(self, *args):
+                rows = conn.execute(*args).fetchall()
+                # Another thread removes the key after the rows have been read.
+                t = threading.Thread(target=registry.remove, args=(b"01",))
+                t.start()
+                t.join()
+                return rows
+
+        registry._local.conn = RacingConnection()
+        assert len(registry.find(b"01")) == 1
+        registry._local.conn = conn
+        assert registry.find(b"01") == ()
+
+    def test_key_registry_cache_lru(self, tmp_path):
+        with KeyRegistry(str(tmp_path / "keys.db"), cache_size=2) as registry:
+            registry.update(add=[COSEKey.from_symmetric_key(alg="HS256", kid=f"{i}") for i in range(3)])
+            for kid in [b"0", b"1", b"0", b"2", b"0", b"1"]:
+                assert len(registry.find(kid)) == 1
+            # 1 was evicted by 2 since 0 was used more recently.
+            assert (registry.hits, registry.misses) == (2, 4)
+
+    def test_key_registry_sees_external_updates_after_ttl(self, tmp_path, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("cwt.key_registry.time.monotonic", lambda: now[0])
+        path = str(tmp_path / "keys.db")
+        with KeyRegistry(path) as writer, KeyRegistry(path, read_only=True, cache_ttl=10) as reader:
+            assert reader.find(b"01") == ()
+            writer.add(COSEKey.from_symmetric_key(alg="HS256", kid="01"))
+            assert reader.find(b"01") == ()
+            now[0] += 10
+            assert len(reader.find(b"01")) == 1
+
+    def test_key_registry_read_only(self, tmp_path):
+        path = str(tmp_path / "keys.db")
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        with KeyRegistry(path) as registry:
+            registry.add(key)
+        with KeyRegistry(path, read_only=True) as registry:
+            assert [k.to_dict() for k in registry.find(b"01")] == [key.to_dict()]
+            with pytest.raises(ValueError) as err:
+                registry.add(key)
+                pytest.fail("add() should fail.")
+            assert "The key registry is read-only." in str(err.value)
+
+    def test_key_registry_used_by_threads(self, registry):
+        registry.add(COSEKey.from_symmetric_key(alg="HS256", kid="01"))
+        res = []
+        threads = [threading.Thread(target=lambda: res.append(len(registry.find(b"01")))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert res == [1, 1, 1, 1]
+
+    def test_key_registry_closed(self, tmp_path):
+        registry = KeyRegistry(str(tmp_path / "keys.db"))
+        registry.close()
+        with pytest.raises(ValueError) as err:
+            registry.find(b"01")
+            pytest.fail("find() should fail.")
+        assert "The key registry has been closed." in str(err.value)
+
+    def test_key_registry_import_jwks(self, ctx, registry, tmp_path):
+        jwks = {"keys": []}
+        for name in ["public_key_es256.json", "public_key_ed25519.json", "hs256.json"]:
+            with open(key_path(name)) as f:
+                jwks["keys"].append(json.load(f))
+        path = tmp_path / "jwks.json"
+        path.write_text(json.dumps(jwks))
+        assert registry.import_jwks(str(path)) == 3
+        assert len(registry) == 3
+
+        with open(key_path("private_key_es256.json")) as f:
+            priv = COSEKey.from_jwk(f.read())
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, registry) == b"Hello world!"
+
+    def test_key_registry_import_key_set(self, registry, tmp_path):
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid=f"{i}") for i in range(3)]
+        path = tmp_path / "key_set.cbor"
+        path.write_bytes(cbor2.dumps([k.to_dict() for k in keys]))
+        assert registry.import_key_set(str(path), not_before=int(time.time()) + 10) == 3
+        assert len(registry) == 3
+        assert registry.find(b"0") == ()
+
+    @pytest.mark.parametrize(
+        "data, msg",
+        [
+            (b"xxx", "Failed to load JWK Set:"),
+            (b"[]", "JWK Set should have keys."),
+            (b'{"keys": {}}', "JWK Set should have keys."),
+            (b'{"keys": [{"kty": "xxx"}]}', "Unknown kty: xxx."),
+        ],
+    )
+    def test_key_registry_import_jwks_with_invalid_file(self, registry, tmp_path, data, msg):
+        path = tmp_path / "jwks.json"
+        path.write_bytes(data)
+        with pytest.raises(ValueError) as err:
+            registry.import_jwks(str(path))
+            pytest.fail("import_jwks() should fail.")
+        assert msg in str(err.value)
+        assert len(registry) == 0
+
+    @pytest.mark.parametrize(
+        "data, msg",
+        [
+            (b"", "Failed to load COSE_KeySet:"),
+            (cbor2.dumps({}), "COSE_KeySet should be array."),
+            (cbor2.dumps([{1: 9}]), "Unsupported or unknown kty(1): 9."),
+        ],
+    )
+    def test_key_registry_import_key_set_with_invalid_file(self, registry, tmp_path, data, msg):
+        path = tmp_path / "key_set.cbor"
+        path.write_bytes(data)
+        with pytest.raises(ValueError) as err:
+            registry.import_key_set(str(path))
+            pytest.fail("import_key_set() should fail.")
+        assert msg in str(err.value)
+
+    def test_key_registry_import_from_missing_file(self, registry, tmp_path):
+        with pytest.raises(ValueError) as err:
+            registry.import_key_set(str(tmp_path / "xxx"))
+            pytest.fail("import_key_set() should fail.")
+        assert "Failed to load COSE_KeySet:" in str(err.value)
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"add": [{1: 4}]}, "key in keys should have COSEKeyInterface."),
+            ({"add": [COSEKey.from_symmetric_key(alg="HS256")]}, "key in keys should have kid."),
+            ({"remove": ["01"]}, "key to be removed should be COSEKeyInterface or bytes."),
+            ({"not_before": "1"}, "not_before should be int."),
+            ({"not_after": 1.0}, "not_after should be int."),
+        ],
+    )
+    def test_key_registry_update_with_invalid_args(self, registry, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            registry.update(**kwargs)
+            pytest.fail("update() should fail.")
+        assert msg in str(err.value)
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"path": ""}, "path should be str."),
+            ({"path": 1}, "path should be str."),
+            ({"read_only": True}, "path not found:"),
+            ({"mmap_size": -1}, "mmap_size should be non-negative int."),
+            ({"cache_ttl": 0}, "cache_ttl should be positive int."),
+            ({"cache_size": "1"}, "cache_size should be positive int."),
+        ],
+    )
+    def test_key_registry_constructor_with_invalid_args(self, tmp_path, kwargs, msg):
+        kwargs = {"path": str(tmp_path / "keys.db"), **kwargs}
+        with pytest.raises(ValueError) as err:
+            KeyRegistry(**kwargs)
+            pytest.fail("KeyRegistry() should fail.")
+        assert msg in str(err.value)
+
+    def test_key_registry_constructor_with_invalid_file(self, tmp_path):
+        path = tmp_path / "keys.db"
+        path.write_bytes(b"x" * 1024)
+        for read_only in [False, True]:
+            with pytest.raises(ValueError) as err:
+                KeyRegistry(str(path), read_only=read_only)
+                pytest.fail("KeyRegistry() should fail.")
+            assert "Failed to open the key registry:" in str(err.value)
+
+    def test_key_registry_verify_with_invalid_signature(self, ctx, registry):
+        priv = load_key("private_key_es256.pem", alg="ES256", kid="01")
+        registry.add(load_key("public_key_es256.pem", kid="01"))
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, registry) == b"Hello world!"
+        tampered = encoded[:-1] + bytes([encoded[-1] ^ 1])
+        with pytest.raises(VerifyError):
+            ctx.decode(tampered, registry)
+            pytest.fail("decode() should fail.")
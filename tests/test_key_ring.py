@@ -0,0 +1,340 @@
+"""
+Tests for KeyRing.
+"""
+
+import pytest
+
+from cwt import COSE, CWT, COSEKey, KeyRing, Recipient, Signer, VerifyError
+from cwt.key_ring import find_keys
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="session", autouse=True)
+def ctx():
+    return COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True)
+
+
+class TestKeyRing:
+    """
+    Tests for KeyRing.
+    """
+
+    def test_key_ring_constructor(self):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="A128GCM", kid="02")
+        ring = KeyRing([k1, k2])
+        assert len(ring) == 2
+        assert k1 in ring
+        assert k2 in ring
+        assert list(ring) == [k1, k2]
+
+    def test_key_ring_constructor_without_keys(self):
+        ring = KeyRing()
+        assert len(ring) == 0
+        assert ring.find(b"01") == ()
+
+    def test_key_ring_constructor_with_invalid_key(self):
+        with pytest.raises(ValueError) as err:
+            KeyRing([{1: 4}])
+            pytest.fail("KeyRing() should fail.")
+        assert "key in keys should have COSEKeyInterface." in str(err.value)
+
+    def test_key_ring_find(self):
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        sig_key = COSEKey.from_jwk(
+            {
+                "kty": "EC",
+                "kid": "02",
+                "crv": "P-256",
+                "x": "usWxHK2PmfnHKwXPS54m0kTcGJ90UiglWiGahtagnv8",
+                "y": "IBOL-C3BttVivg-lSreASjpkttcsz-1rb7btKLv8EX4",
+            }
+        )
+        ring = KeyRing([mac_key, enc_key, sig_key])
+        assert ring.find() == (mac_key, enc_key, sig_key)
+        assert ring.find(b"01") == (mac_key, enc_key)
+        assert ring.find(b"01", op=10) == (mac_key,)
+        assert ring.find(b"01", op=4) == (enc_key,)
+        assert ring.find(b"01", alg=5) == (mac_key,)
+        assert ring.find(b"01", alg=-7) == ()
+        assert ring.find(b"02", op=2, alg=-7) == (sig_key,)
+        assert ring.find(b"03") == ()
+
+    def test_key_ring_find_falls_back_when_no_key_has_the_op(self):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        ring = KeyRing([k1, k2])
+        assert ring.find(b"01", op=2) == (k1,)
+        assert ring.find(op=2) == (k1, k2)
+
+    def test_key_ring_find_falls_back_per_kid(self):
+        mac_key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        enc_key1 = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        enc_key2 = COSEKey.from_symmetric_key(alg="A128GCM", kid="02")
+        ring = KeyRing([mac_key, enc_key1, enc_key2])
+        assert ring.find(b"01", op=10) == (mac_key,)
+        assert ring.find(b"02", op=10) == (enc_key2,)
+        assert ring.find(op=10) == (mac_key,)
+
+    @pytest.mark.parametrize(
+        "kid, op, expected",
+        [
+            (None, 0, [0, 1, 2]),
+            (None, 10, [0]),
+            (b"01", 0, [0, 1]),
+            (b"01", 10, [0]),
+            (b"01", 4, [1]),
+            (b"02", 10, [2]),
+            (b"03", 10, []),
+        ],
+    )
+    def test_key_ring_find_keys_same_as_list(self, kid, op, expected):
+        keys = [
+            COSEKey.from_symmetric_key(alg="HS256", kid="01"),
+            COSEKey.from_symmetric_key(alg="A128GCM", kid="01"),
+            COSEKey.from_symmetric_key(alg="A128GCM", kid="02"),
+        ]
+        assert list(find_keys(keys, kid, op)) == [keys[i] for i in expected]
+        assert list(find_keys(KeyRing(keys), kid, op)) == [keys[i] for i in expected]
+
+    def test_key_ring_find_includes_keys_without_alg(self):
+        key = COSEKey.from_jwk(
+            {
+                "kty": "OKP",
+                "kid": "01",
+                "crv": "Ed25519",
+                "x": "2E6dX83gqD_D0eAmqnaHe1TC1xuld6iAKXfw2OVATr0",
+            }
+        )
+        ring = KeyRing([key])
+        assert ring.find(b"01", op=2, alg=-8) == (key,)
+
+    def test_key_ring_add_and_remove(self):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        ring = KeyRing([k1])
+        ring.add(k2)
+        ring.add(k2)
+        assert len(ring) == 2
+        assert ring.find(b"02") == (k2,)
+        assert ring.remove(k1) == [k1]
+        assert len(ring) == 1
+        assert ring.find(b"01") == ()
+        assert ring.find() == (k2,)
+        assert ring.remove(k1) == []
+
+    def test_key_ring_remove_by_kid(self):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS384", kid="01")
+        k3 = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        ring = KeyRing([k1, k2, k3])
+        assert ring.remove(b"01") == [k1, k2]
+        assert list(ring) == [k3]
+
+    def test_key_ring_update(self):
+        old = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        new = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        ring = KeyRing([old])
+        assert ring.update(add=[new], remove=[b"01", old]) == [old]
+        assert ring.find(b"01") == (new,)
+
+    @pytest.mark.parametrize(
+        "invalid",
+        [
+            {},
+            "01",
+            123,
+        ],
+    )
+    def test_key_ring_remove_with_invalid_args(self, invalid):
+        ring = KeyRing()
+        with pytest.raises(ValueError) as err:
+            ring.remove(invalid)
+            pytest.fail("remove() should fail.")
+        assert "key to be removed should be COSEKeyInterface or bytes." in str(err.value)
+
+    def test_key_ring_decode_mac0(self, ctx):
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid=str(i)) for i in range(100)]
+        ring = KeyRing(keys)
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[42])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+
+    def test_key_ring_decode_encrypt0(self, ctx):
+        keys = [COSEKey.from_symmetric_key(alg="A128GCM", kid=str(i)) for i in range(100)]
+        ring = KeyRing(keys)
+        encoded = ctx.encode_and_encrypt(b"Hello world!", keys[42])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+
+    def test_key_ring_decode_signature1(self, ctx):
+        with open(key_path("private_key_es256.pem")) as key_file:
+            priv = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_es256.pem")) as key_file:
+            pub = COSEKey.from_pem(key_file.read(), kid="01")
+        ring = KeyRing([COSEKey.from_symmetric_key(alg="HS256", kid="01"), pub])
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+
+    def test_key_ring_decode_signature1_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        with open(key_path("private_key_es256.pem")) as key_file:
+            priv = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_es256.pem")) as key_file:
+            pub = COSEKey.from_pem(key_file.read(), kid="01")
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, KeyRing([pub])) == b"Hello world!"
+
+    def test_key_ring_decode_encrypt(self, ctx):
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        encoded = ctx.encode_and_encrypt(b"Hello world!", enc_key, recipients=[r])
+        ring = KeyRing([COSEKey.from_symmetric_key(alg="A128GCM", kid="00"), enc_key])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+
+    def test_key_ring_decode_after_key_rotation(self, ctx):
+        old = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        new = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        ring = KeyRing([old])
+        encoded = ctx.encode_and_mac(b"Hello world!", new)
+        with pytest.raises(VerifyError):
+            ctx.decode(encoded, ring)
+        ring.update(add=[new], remove=[old])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+
+    def test_key_ring_decode_without_keys(self, ctx):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        encoded = ctx.encode_and_mac(b"Hello world!", key)
+        with pytest.raises(ValueError) as err:
+            ctx.decode(encoded, KeyRing())
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_key_ring_cwt_decode(self):
+        ctx = CWT.new()
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid=str(i)) for i in range(10)]
+        token = ctx.encode({"iss": "coaps://as.example"}, keys[3])
+        decoded = ctx.decode(token, KeyRing(keys))
+        assert decoded[1] == "coaps://as.example"
+
+    def test_key_ring_generation(self):
+        k1 = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        k2 = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        ring = KeyRing([k1, k2])
+        assert ring.generation == 0
+        ring.add(COSEKey.from_symmetric_key(alg="HS256", kid="03"))
+        assert ring.generation == 0
+        assert ring.removed_since(0) is False
+        ring.remove(b"01")
+        assert ring.generation == 1
+        assert ring.removed_since(0) is True
+        assert ring.removed_since(0, b"01") is True
+        assert ring.removed_since(0, b"02") is False
+        assert ring.removed_since(1, b"01") is False
+        ring.remove(b"xx")
+        assert ring.generation == 1
+
+
+class TestAdaptiveKeyRing:
+    """
+    Tests for KeyRing in the adaptive mode.
+    """
+
+    def test_adaptive_key_ring_constructor(self):
+        ring = KeyRing(adaptive=True)
+        assert ring.adaptive is True
+        assert ring.attempts == 0
+        assert ring.decodes == 0
+        assert KeyRing().adaptive is False
+
+    @pytest.mark.parametrize("invalid", [1, "true", None])
+    def test_adaptive_key_ring_constructor_with_invalid_adaptive(self, invalid):
+        with pytest.raises(ValueError) as err:
+            KeyRing(adaptive=invalid)
+            pytest.fail("KeyRing() should fail.")
+        assert "adaptive should be bool." in str(err.value)
+
+    def test_adaptive_key_ring_find_orders_keys_by_last_use(self):
+        keys = [COSEKey.from_symmetric_key(alg="HS256") for _ in range(4)]
+        ring = KeyRing(keys, adaptive=True)
+        assert ring.find(op=10, alg=5) == tuple(keys)
+        ring.record(keys[2], 3)
+        assert ring.find(op=10, alg=5) == (keys[2], keys[0], keys[1], keys[3])
+        ring.record(keys[3], 4)
+        ring.record(None, 4)
+        assert ring.find(op=10, alg=5) == (keys[3], keys[2], keys[0], keys[1])
+        assert ring.attempts == 11
+        assert ring.decodes == 3
+        ring.remove(keys[3])
+        assert ring.find(op=10, alg=5) == (keys[2], keys[0], keys[1])
+        ring.record(keys[3], 1)
+        assert ring.find(op=10, alg=5) == (keys[2], keys[0], keys[1])
+
+    def test_adaptive_key_ring_find_narrows_keys_without_alg(self):
+        ed25519 = COSEKey.from_jwk({"kty": "OKP", "crv": "Ed25519", "x": "2E6dX83gqD_D0eAmqnaHe1TC1xuld6iAKXfw2OVATr0"})
+        x25519 = COSEKey.from_jwk({"kty": "OKP", "crv": "X25519", "x": "y3wJq3uXPHeoCO4FubvTc7VcBuqpvUrSvU6ZMbHDTCI"})
+        with open(key_path("public_key_es256.pem")) as key_file:
+            es256 = COSEKey.from_pem(key_file.read())
+        assert x25519.alg is None and es256.alg is None
+        keys = [x25519, es256, ed25519]
+        assert KeyRing(keys).find(alg=-7) == (x25519, es256)
+        assert KeyRing(keys).find(alg=-8) == (ed25519, x25519, es256)
+        ring = KeyRing(keys, adaptive=True)
+        assert ring.find(alg=-7) == (es256,)
+        assert ring.find(alg=-35) == ()
+        assert ring.find(alg=-8) == (ed25519,)
+        assert ring.find(alg=41) == (x25519,)
+        assert ring.find(alg=5) == ()
+        assert ring.find(alg=-65537) == (x25519, es256)
+        assert ring.find() == tuple(keys)
+
+    def test_adaptive_key_ring_decode_mac0_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        keys = [COSEKey.from_symmetric_key(alg="HS256") for _ in range(10)]
+        ring = KeyRing(keys, adaptive=True)
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[7])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (1, 8)
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (2, 9)
+        with pytest.raises(VerifyError):
+            ctx.decode(ctx.encode_and_mac(b"Hello world!", COSEKey.from_symmetric_key(alg="HS256")), ring)
+        assert (ring.decodes, ring.attempts) == (3, 19)
+        assert ring.find(op=10, alg=5)[0] is keys[7]
+
+    def test_adaptive_key_ring_decode_encrypt0_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        keys = [COSEKey.from_symmetric_key(alg="A128GCM") for _ in range(5)]
+        ring = KeyRing(keys, adaptive=True)
+        encoded = ctx.encode_and_encrypt(b"Hello world!", keys[4])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (2, 6)
+
+    def test_adaptive_key_ring_decode_signature1_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True)
+        with open(key_path("private_key_ed25519.pem")) as key_file:
+            priv = COSEKey.from_pem(key_file.read())
+        with open(key_path("public_key_ed25519.pem")) as key_file:
+            pub = COSEKey.from_pem(key_file.read())
+        with open(key_path("public_key_es256.pem")) as key_file:
+            es256 = COSEKey.from_pem(key_file.read())
+        others = [COSEKey.from_jwk({"kty": "OKP", "crv": "Ed25519", "x": "2E6dX83gqD_D0eAmqnaHe1TC1xuld6iAKXfw2OVATr0"})]
+        ring = KeyRing([es256, *others, pub], adaptive=True)
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (1, 2)
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (2, 3)
+
+    def test_adaptive_key_ring_decode_signature_without_kid(self):
+        ctx = COSE.new()
+        with open(key_path("private_key_es256.pem")) as key_file:
+            signer = Signer.from_pem(key_file.read())
+        with open(key_path("public_key_es256.pem")) as key_file:
+            pub = COSEKey.from_pem(key_file.read())
+        others = [COSEKey.from_symmetric_key(alg="HS256"), COSEKey.generate_symmetric_key(alg="HS256")]
+        ring = KeyRing([*others, pub], adaptive=True)
+        encoded = ctx.encode_and_sign(b"Hello world!", signers=[signer])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert (ring.decodes, ring.attempts) == (1, 1)
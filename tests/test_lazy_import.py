@@ -0,0 +1,108 @@
+"""
+Tests for lazily-loaded dependencies.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+from .utils import key_path
+
+LAZY_MODULES = [
+    "asn1crypto",
+    "certvalidator",
+    "pyhpke",
+    "cryptography.x509",
+    "concurrent.futures",
+    "sqlite3",
+    "tempfile",
+    "cwt.aio",
+    "cwt.key_registry",
+    "cwt.parallel",
+    "cwt.replay_guard",
+]
+
+
+def loaded_modules(script: str) -> list:
+    code = f"import sys\n{script}\nprint(','.join(m for m in sys.argv[1:] if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code, *LAZY_MODULES], capture_output=True, text=True, check=True)
+    return [m for m in proc.stdout.strip().split(",") if m]
+
+
+class TestLazyImport:
+    """
+    Tests for lazily-loaded dependencies.
+    """
+
+    def test_import_cwt(self):
+        assert loaded_modules("import cwt") == []
+
+    @pytest.mark.parametrize(
+        "name, module",
+        [
+            ("KeyRegistry", "cwt.key_registry"),
+            ("ReplayGuard", "cwt.replay_guard"),
+            ("MemoryReplayGuard", "cwt.replay_guard"),
+            ("BloomReplayGuard", "cwt.replay_guard"),
+            ("SQLiteReplayGuard", "cwt.replay_guard"),
+        ],
+    )
+    def test_import_cwt_and_access_lazy_attribute(self, name, module):
+        script = f"""
+import cwt
+assert {name!r} in dir(cwt)
+assert cwt.{name}.__module__ == {module!r}
+"""
+        assert module in loaded_modules(script)
+
+    def test_import_cwt_and_access_unknown_attribute(self):
+        import cwt
+
+        with pytest.raises(AttributeError) as err:
+            cwt.UnknownKeyStore
+            pytest.fail("cwt.UnknownKeyStore should fail.")
+        assert "module 'cwt' has no attribute 'UnknownKeyStore'" in str(err.value)
+
+    def test_import_cwt_and_use_hmac(self):
+        script = """
+import cwt
+from cwt import COSEKey
+key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+cwt.decode(cwt.encode({"iss": "coaps://as.example"}, key), key)
+"""
+        assert loaded_modules(script) == []
+
+    def test_import_cwt_and_use_hpke(self):
+        script = """
+from cwt import COSE, COSEKey
+rpk = COSEKey.from_jwk(
+    {
+        "kty": "EC",
+        "kid": "01",
+        "crv": "P-256",
+        "x": "usWxHK2PmfnHKwXPS54m0kTcGJ90UiglWiGahtagnv8",
+        "y": "IBOL-C3BttVivg-lSreASjpkttcsz-1rb7btKLv8EX4",
+    }
+)
+COSE.new().encode_and_encrypt(b"This is the content.", rpk, protected={1: 35}, unprotected={4: b"01"})
+"""
+        assert loaded_modules(script) == ["pyhpke"]
+
+    def test_import_cwt_and_use_ca_certs(self):
+        script = f"""
+from cwt import COSE
+COSE.new(ca_certs={key_path("cacert.pem")!r})
+"""
+        assert loaded_modules(script) == ["asn1crypto"]
+
+    @pytest.mark.parametrize("module", ["asn1crypto", "certvalidator"])
+    def test_import_cwt_and_validate_certificate(self, module):
+        script = f"""
+from cwt import TrustStore, VerifyError
+try:
+    TrustStore({key_path("cacert.pem")!r}).validator.validate(b"xxx")
+except VerifyError:
+    pass
+"""
+        assert module in loaded_modules(script)
@@ -0,0 +1,242 @@
+"""
+Tests for cwt.parallel.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cbor2
+import pytest
+
+from cwt import CWT, COSEKey, CWTError, DecodeError, VerifyError
+from cwt.cose_key_interface import COSEKeyInterface
+from cwt.parallel import VerifierPool
+
+from .utils import key_path
+
+
+def load_key(name: str, kid: str) -> COSEKeyInterface:
+    with open(key_path(name)) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid=kid)
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return {
+        "priv1": load_key("private_key_es256.pem", "01"),
+        "pub1": load_key("public_key_es256.pem", "01"),
+        "priv2": load_key("private_key_ed25519.pem", "02"),
+        "pub2": load_key("public_key_ed25519.pem", "02"),
+    }
+
+
+@pytest.fixture(scope="module")
+def pool(keys):
+    with VerifierPool([keys["pub1"]], processes=2) as pool:
+        yield pool
+
+
+class TestVerifierPool:
+    """
+    Tests for VerifierPool.
+    """
+
+    def test_verifier_pool_decode(self, keys, pool):
+        assert pool.processes == 2
+        tokens = [CWT.new().encode({"iss": "coaps://as.example", "cti": str(i)}, keys["priv1"]) for i in range(5)]
+        res = pool.decode(tokens)
+        assert [r[7] for r in res] == [str(i).encode() for i in range(5)]
+
+    def test_verifier_pool_decode_empty(self, pool):
+        assert pool.decode([]) == []
+
+    def test_verifier_pool_decode_returns_errors_in_place(self, keys, pool):
+        valid = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        unknown = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv2"])
+        res = pool.decode([valid, b"xxx", unknown, valid])
+        assert res[0][1] == "coaps://as.example"
+        assert isinstance(res[1], DecodeError)
+        assert isinstance(res[2], ValueError)
+        assert str(res[2]) == "key is not found."
+        assert res[3][1] == "coaps://as.example"
+
+    def test_verifier_pool_decode_with_no_verify(self, keys, pool):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        res = pool.decode([token], no_verify=True)
+        assert res[0][1] == "coaps://as.example"
+
+    def test_verifier_pool_decode_with_now(self, keys, pool):
+        token = CWT.new().encode({"iss": "coaps://as.example", "nbf": 2000, "exp": 3000}, keys["priv1"])
+        res = pool.decode([token, token], now=2500)
+        assert [r[4] for r in res] == [3000, 3000]
+        res = pool.decode([token], now=1000)
+        assert isinstance(res[0], VerifyError)
+        assert str(res[0]) == "The token is not yet valid."
+
+    def test_verifier_pool_update_keys(self, keys):
+        token1 = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        token2 = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv2"])
+        with VerifierPool([keys["pub1"]], processes=2) as pool:
+            res = pool.decode([token1, token2])
+            assert res[0][1] == "coaps://as.example"
+            assert isinstance(res[1], ValueError)
+
+            pool.update_keys(cbor2.dumps([keys["pub2"].to_dict()]))
+            res = pool.decode([token1, token2, token1, token2])
+            assert isinstance(res[0], ValueError)
+            assert res[1][1] == "coaps://as.example"
+            assert isinstance(res[2], ValueError)
+            assert res[3][1] == "coaps://as.example"
+
+    def test_verifier_pool_with_key_set_bytes(self, keys):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv2"])
+        key_set = cbor2.dumps([keys["pub1"].to_dict(), keys["pub2"].to_dict()])
+        with VerifierPool(key_set, processes=1) as pool:
+            res = pool.decode([token])
+            assert res[0][1] == "coaps://as.example"
+
+    def test_verifier_pool_with_expired_token(self, keys):
+        token = CWT.new(expires_in=1).encode({"iss": "coaps://as.example", "exp": 1}, keys["priv1"])
+        with VerifierPool([keys["pub1"]], processes=1) as pool:
+            res = pool.decode([token])
+            assert isinstance(res[0], VerifyError)
+            assert str(res[0]) == "The token has expired."
+
+    def test_verifier_pool_with_spawn(self, keys):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        with VerifierPool([keys["pub1"]], processes=1, mp_context="spawn") as pool:
+            res = pool.decode([token])
+            assert res[0][1] == "coaps://as.example"
+
+    def test_verifier_pool_closed(self, keys):
+        pool = VerifierPool([keys["pub1"]], processes=1)
+        pool.close()
+        pool.close()
+        with pytest.raises(CWTError) as err:
+            pool.decode([b"xxx"])
+            pytest.fail("decode() should fail.")
+        assert "The pool has been closed." in str(err.value)
+        with pytest.raises(CWTError) as err:
+            pool.update_keys([keys["pub1"]])
+            pytest.fail("update_keys() should fail.")
+        assert "The pool has been closed." in str(err.value)
+
+    def test_verifier_pool_with_terminated_worker(self, keys):
+        with VerifierPool([keys["pub1"]], processes=1) as pool:
+            pool._procs[0].terminate()
+            pool._procs[0].join()
+            with pytest.raises(CWTError) as err:
+                pool.decode([b"xxx"])
+                pytest.fail("decode() should fail.")
+            assert "A worker process has terminated." in str(err.value)
+            with pytest.raises(CWTError) as err:
+                pool.decode([b"xxx"])
+                pytest.fail("decode() should fail.")
+            assert "A worker process has terminated." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"key_set": "xxx"}, "key_set should be bytes or list of COSEKeyInterface."),
+            ({"key_set": ["xxx"]}, "key_set should be bytes or list of COSEKeyInterface."),
+            ({"key_set": b"\xff"}, "key_set should be a CBOR-encoded COSE_KeySet."),
+            ({"key_set": cbor2.dumps({1: 2})}, "key_set should be a CBOR-encoded COSE_KeySet."),
+            ({"processes": 0}, "processes should be positive int."),
+            ({"processes": "1"}, "processes should be positive int."),
+            ({"ca_certs": 1}, "ca_certs should be str."),
+        ],
+    )
+    def test_verifier_pool_constructor_with_invalid_args(self, keys, kwargs, msg):
+        kwargs = {"key_set": [keys["pub1"]], **kwargs}
+        with pytest.raises(ValueError) as err:
+            VerifierPool(**kwargs)
+            pytest.fail("VerifierPool() should fail.")
+        assert msg in str(err.value)
+
+    def test_verifier_pool_decode_with_invalid_tokens(self, pool):
+        with pytest.raises(ValueError) as err:
+            pool.decode(["xxx"])
+            pytest.fail("decode() should fail.")
+        assert "tokens should be list of bytes." in str(err.value)
+
+    def test_verifier_pool_update_keys_with_invalid_key_set(self, pool):
+        with pytest.raises(ValueError) as err:
+            pool.update_keys(b"\xff")
+            pytest.fail("update_keys() should fail.")
+        assert "key_set should be a CBOR-encoded COSE_KeySet." in str(err.value)
+
+    def test_verifier_pool_decode_from_threads(self, keys, pool):
+        tokens = [CWT.new().encode({"iss": "coaps://as.example", "cti": str(i)}, keys["priv1"]) for i in range(8)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: pool.decode(tokens[i:]), range(8)))
+        for i, res in enumerate(results):
+            assert [r[7] for r in res] == [str(j).encode() for j in range(i, 8)]
+
+    def test_verifier_pool_decode_while_worker_busy(self, keys, pool):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        busy = pool._acquire(1)
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                res = executor.submit(pool.decode, [token, token, token]).result(timeout=10)
+            assert [r[1] for r in res] == ["coaps://as.example"] * 3
+        finally:
+            pool._release(busy)
+
+    def test_verifier_pool_close_wakes_waiting_decode(self, keys, monkeypatch):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv1"])
+        pool = VerifierPool([keys["pub1"]], processes=1)
+        busy = pool._acquire(1)
+        check_open = pool._check_open
+        calls = []
+
+        def check_open_after_close_started():
+            # The first check is skipped as if decode() had passed it before close() started.
+            calls.append(1)
+            if len(calls) > 1:
+                check_open()
+
+        errors = []
+
+        def decode():
+            try:
+                pool.decode([token])
+            except CWTError as err:
+                errors.append(err)
+
+        closing = threading.Thread(target=pool.close, daemon=True)
+        closing.start()
+        time.sleep(0.1)
+        monkeypatch.setattr(pool, "_check_open", check_open_after_close_started)
+        decoding = threading.Thread(target=decode, daemon=True)
+        decoding.start()
+        time.sleep(0.1)
+        pool._release(busy)
+        closing.join(timeout=10)
+        decoding.join(timeout=10)
+        assert not decoding.is_alive()
+        assert len(errors) == 1
+        assert "The pool has been closed." in str(errors[0])
+
+    def test_verifier_pool_update_keys_failure_makes_pool_unusable(self, keys, monkeypatch):
+        token = CWT.new().encode({"iss": "coaps://as.example"}, keys["priv2"])
+        with VerifierPool([keys["pub1"]], processes=2) as pool:
+            recv = pool._recv
+            calls = []
+
+            def fail_on_second_worker(conn):
+                res = recv(conn)
+                calls.append(conn)
+                return ValueError("Failed to load.") if len(calls) == 2 else res
+
+            monkeypatch.setattr(pool, "_recv", fail_on_second_worker)
+            with pytest.raises(CWTError) as err:
+                pool.update_keys([keys["pub2"]])
+                pytest.fail("update_keys() should fail.")
+            assert "Failed to update the keys of the workers." in str(err.value)
+            assert isinstance(err.value.__cause__, ValueError)
+            assert len(calls) == 2
+            with pytest.raises(CWTError) as err:
+                pool.decode([token])
+                pytest.fail("decode() should fail.")
+            assert "The keys of the workers have failed to be updated." in str(err.value)
@@ -350,6 +350,8 @@ class TestECDH_DirectHKDF:
         [
             (-26, 3, "private_key_es512.pem", "public_key_es512.pem"),
             (-25, 1, "private_key_es256.pem", "public_key_es256.pem"),
+            (-25, 4, "private_key_x25519.pem", "public_key_x25519.pem"),
+            (-26, 5, "private_key_x448.pem", "public_key_x448.pem"),
         ],
     )
     def test_ecdh_direct_hkdf_through_cose_api_with_ecdh_es(self, alg, crv, private_key_path, public_key_path):
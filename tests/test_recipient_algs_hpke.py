@@ -2,10 +2,13 @@
 Tests for HPKE.
 """
 
+import gc
+
 import pytest
 
+from cwt import COSEKey
 from cwt.enums import COSEHeaders
-from cwt.recipient_algs.hpke import HPKE
+from cwt.recipient_algs.hpke import _KEM_KEYS, HPKE
 
 
 class TestHPKE:
@@ -38,3 +41,45 @@ class TestHPKE:
             HPKE({COSEHeaders.ALG: -1}, {})
             pytest.fail("HPKE should fail.")
         assert "alg should be one of the HPKE algorithms." in str(err.value)
+
+    def test_recipient_algs_hpke_shares_cipher_suite(self):
+        ctx1 = HPKE({COSEHeaders.ALG: 35}, {})
+        ctx2 = HPKE({COSEHeaders.ALG: 35}, {})
+        ctx3 = HPKE({COSEHeaders.ALG: 36}, {})
+        assert ctx1._suite is ctx2._suite
+        assert ctx1._suite is not ctx3._suite
+
+    def test_recipient_algs_hpke_caches_kem_key(self):
+        rsk = COSEKey.from_jwk(
+            {
+                "kty": "OKP",
+                "crv": "X25519",
+                "kid": "01",
+                "x": "y3wJq3uXPHeoCO4FubvTc7VcBuqpvUrSvU6ZMbHDTCI",
+                "d": "vsJ1oX5NNi0IGdwGldiac75r-Utmq3Jq4LGv48Q_Qc4",
+            }
+        )
+        rpk = COSEKey.from_jwk(
+            {
+                "kty": "OKP",
+                "crv": "X25519",
+                "kid": "01",
+                "x": "y3wJq3uXPHeoCO4FubvTc7VcBuqpvUrSvU6ZMbHDTCI",
+            }
+        )
+        sender = HPKE({COSEHeaders.ALG: 42}, {COSEHeaders.KID: b"01"}, recipient_key=rpk)
+        encoded, _ = sender.encode(b"Hello world!", b"")
+        kem_key = _KEM_KEYS[rpk]
+        assert HPKE({COSEHeaders.ALG: 42}, {}, recipient_key=rpk).encode(b"Hello world!", b"") is not None
+        assert _KEM_KEYS[rpk] is kem_key
+
+        for _ in range(2):
+            recipient = HPKE({COSEHeaders.ALG: 42}, encoded[1], encoded[2])
+            assert recipient.decode(rsk, b"") == b"Hello world!"
+        assert rsk in _KEM_KEYS
+
+        gc.collect()
+        n = len(_KEM_KEYS)
+        del rsk, rpk, sender
+        gc.collect()
+        assert len(_KEM_KEYS) == n - 2
@@ -0,0 +1,413 @@
+"""
+Tests for ReplayGuard.
+"""
+
+import threading
+import time
+
+import pytest
+
+from cwt import (
+    CWT,
+    BloomReplayGuard,
+    COSEKey,
+    MemoryReplayGuard,
+    ReplayGuard,
+    SQLiteReplayGuard,
+    VerifyError,
+)
+from cwt.aio import AsyncCWT
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def keys():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        private_key = COSEKey.from_pem(key_file.read(), kid="01")
+    with open(key_path("public_key_es256.pem")) as key_file:
+        public_key = COSEKey.from_pem(key_file.read(), kid="01")
+    return private_key, public_key
+
+
+@pytest.fixture(params=["memory", "bloom", "sqlite"])
+def guard(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryReplayGuard()
+    elif request.param == "bloom":
+        yield BloomReplayGuard(capacity=1000)
+    else:
+        with SQLiteReplayGuard(str(tmp_path / "replay.db")) as g:
+            yield g
+
+
+class TestReplayGuard:
+    """
+    Tests for ReplayGuard.
+    """
+
+    def test_replay_guard_decode(self, guard, keys):
+        ctx = CWT.new(replay_guard=guard)
+        assert ctx.replay_guard is guard
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        assert ctx.decode(token, keys[1])[7] == b"123"
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        assert "The token has been replayed." in str(err.value)
+        assert guard.accepted == 1
+        assert guard.replayed == 1
+
+        # A different token with the same cti is rejected as well.
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123", "sub": "x"}, keys[0])
+        with pytest.raises(VerifyError):
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"456"}, keys[0])
+        assert ctx.decode(token, keys[1])[7] == b"456"
+
+        guard.clear()
+        assert guard.accepted == 0
+        assert guard.replayed == 0
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        assert ctx.decode(token, keys[1])[7] == b"123"
+
+    def test_replay_guard_decode_without_cti(self, keys):
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example"}, keys[0])
+        ctx.decode(token, keys[1])
+        ctx.decode(token, keys[1])
+        assert guard.accepted == 0
+        assert len(guard) == 0
+
+    def test_replay_guard_decode_with_no_verify(self, keys):
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        ctx.decode(token, keys[1], no_verify=True)
+        ctx.decode(token, keys[1], no_verify=True)
+        assert len(guard) == 0
+
+    def test_replay_guard_decode_with_invalid_signature(self, keys):
+        # A forged token does not occupy the cti.
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(replay_guard=guard)
+        with open(key_path("private_key_es256k.pem")) as key_file:
+            other = COSEKey.from_pem(key_file.read(), alg="ES256", kid="01")
+        forged = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, other)
+        with pytest.raises(VerifyError):
+            ctx.decode(forged, keys[1])
+            pytest.fail("decode() should fail.")
+        assert len(guard) == 0
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        assert ctx.decode(token, keys[1])[7] == b"123"
+
+    def test_replay_guard_decode_with_token_cache(self, keys):
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(token_cache_size=10, replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        ctx.decode(token, keys[1])
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+        assert "The token has been replayed." in str(err.value)
+        assert ctx.token_cache.hits == 1
+
+    def test_replay_guard_entry_expires_after_exp_plus_leeway(self, keys):
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(leeway=30, replay_guard=guard)
+        now = int(time.time())
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123", "exp": now + 100}, keys[0])
+        ctx.decode(token, keys[1])
+        assert guard._entries[b"123"] == now + 131
+
+    def test_replay_guard_decode_at_exp_plus_leeway(self, guard, keys):
+        ctx = CWT.new(leeway=60, replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123", "exp": 1000, "nbf": 900, "iat": 900}, keys[0])
+        assert ctx.decode(token, keys[1], now=1060)[7] == b"123"
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1], now=1060)
+            pytest.fail("decode() should fail.")
+        assert "The token has been replayed." in str(err.value)
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(token, keys[1], now=1061)
+            pytest.fail("decode() should fail.")
+        assert "The token has expired." in str(err.value)
+
+    def test_replay_guard_decode_with_async_cwt(self, keys):
+        import asyncio
+
+        guard = MemoryReplayGuard()
+        ctx = CWT.new(replay_guard=guard)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+
+        async def resolve(kid, alg):
+            return keys[1]
+
+        async def run():
+            actx = AsyncCWT.new(ctx, resolver=resolve)
+            await actx.decode(token)
+            await actx.decode(token)
+
+        with pytest.raises(VerifyError) as err:
+            asyncio.run(run())
+            pytest.fail("decode() should fail.")
+        assert "The token has been replayed." in str(err.value)
+
+    def test_replay_guard_add(self, guard):
+        now = int(time.time())
+        assert guard.add(b"a", now + 10, now) is True
+        assert guard.add(b"a", now + 10, now) is False
+        assert guard.add(b"a", now + 10, now + 9) is False
+        # Expired.
+        assert guard.add(b"a", now + 30, now + 10) is True
+        assert guard.add(b"a", now + 30, now + 20) is False
+        assert guard.add(b"b", now + 10, now) is True
+
+    def test_replay_guard_check_expired_entry(self, guard):
+        assert guard.check(b"a", int(time.time()) - 1) is True
+        assert guard.check(b"a", int(time.time()) - 1) is True
+        assert guard.check(b"a") is True
+        assert guard.check(b"a") is False
+        assert guard.accepted == 3
+        assert guard.replayed == 1
+
+    def test_replay_guard_concurrent_check(self, guard):
+        results = []
+
+        def run():
+            for i in range(200):
+                results.append(guard.check(str(i).encode()))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results.count(True) == 200
+        assert guard.accepted == 200
+        assert guard.replayed == 600
+
+    def test_replay_guard_base_class(self):
+        with pytest.raises(NotImplementedError):
+            ReplayGuard().check(b"a")
+            pytest.fail("check() should fail.")
+
+    def test_replay_guard_custom_backend(self, keys):
+        class SetReplayGuard(ReplayGuard):
+            def __init__(self):
+                super().__init__()
+                self.seen = set()
+
+            def add(self, cti, expires_at, now):
+                if cti in self.seen:
+                    return False
+                self.seen.add(cti)
+                return True
+
+        ctx = CWT.new(replay_guard=SetReplayGuard())
+        token = ctx.encode({"iss": "coaps://as.example", "cti": b"123"}, keys[0])
+        ctx.decode(token, keys[1])
+        with pytest.raises(VerifyError):
+            ctx.decode(token, keys[1])
+            pytest.fail("decode() should fail.")
+
+    def test_replay_guard_with_invalid_replay_guard(self):
+        with pytest.raises(ValueError) as err:
+            CWT.new(replay_guard=set())
+            pytest.fail("CWT.new() should fail.")
+        assert "replay_guard should be ReplayGuard." in str(err.value)
+
+    @pytest.mark.parametrize("ttl", [0, -1, "1"])
+    def test_replay_guard_with_invalid_ttl(self, ttl):
+        with pytest.raises(ValueError) as err:
+            MemoryReplayGuard(ttl=ttl)
+            pytest.fail("MemoryReplayGuard() should fail.")
+        assert "ttl should be positive int." in str(err.value)
+
+
+class TestMemoryReplayGuard:
+    """
+    Tests for MemoryReplayGuard.
+    """
+
+    def test_memory_replay_guard_purge(self):
+        guard = MemoryReplayGuard(bucket_seconds=10)
+        now = 1000
+        for i in range(100):
+            guard.add(str(i).encode(), now + i, now)
+        assert len(guard) == 100
+        guard.add(b"x", now + 200, now + 50)
+        # The buckets which end by 1050 are dropped.
+        assert len(guard) == 51
+        guard.add(b"y", now + 200, now + 150)
+        assert len(guard) == 2
+        assert len(guard._buckets) == 1
+
+    def test_memory_replay_guard_keeps_entry_stored_again(self):
+        guard = MemoryReplayGuard(bucket_seconds=10)
+        assert guard.add(b"a", 1005, 1000)
+        assert guard.add(b"a", 1100, 1006)
+        guard.add(b"b", 1200, 1050)
+        assert not guard.add(b"a", 1200, 1060)
+
+    def test_memory_replay_guard_full(self):
+        guard = MemoryReplayGuard(max_entries=2)
+        guard.check(b"a")
+        guard.check(b"b")
+        with pytest.raises(VerifyError) as err:
+            guard.check(b"c")
+            pytest.fail("check() should fail.")
+        assert "The replay guard is full." in str(err.value)
+        assert guard.check(b"a") is False
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"max_entries": 0}, "max_entries should be positive int."),
+            ({"max_entries": "1"}, "max_entries should be positive int."),
+            ({"bucket_seconds": 0}, "bucket_seconds should be positive int."),
+            ({"bucket_seconds": 1.0}, "bucket_seconds should be positive int."),
+        ],
+    )
+    def test_memory_replay_guard_with_invalid_args(self, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            MemoryReplayGuard(**kwargs)
+            pytest.fail("MemoryReplayGuard() should fail.")
+        assert msg in str(err.value)
+
+
+class TestBloomReplayGuard:
+    """
+    Tests for BloomReplayGuard.
+    """
+
+    def test_bloom_replay_guard_false_positive_rate(self):
+        guard = BloomReplayGuard(capacity=2000, error_rate=1e-3, slots=4)
+        assert guard.false_positive_rate <= 1e-3
+        now = 1000
+        # The salt is random, so a new cti may hit a false positive while the filter is being filled.
+        assert sum(not guard.add(b"a" + str(i).encode(), now + 3000, now) for i in range(2000)) <= 8
+        # The probes are stored in the filter of the next window, which holds at most capacity entries as well.
+        fp = sum(not guard.add(b"b" + str(i).encode(), now + 3000, now + 600) for i in range(2000))
+        assert fp <= 8
+
+    def test_bloom_replay_guard_rotation(self):
+        guard = BloomReplayGuard(capacity=100, window=10, slots=3)
+        assert guard.add(b"a", 1015, 1000)
+        assert guard.add(b"b", 1100, 1010)
+        assert not guard.add(b"a", 1015, 1014)
+        # The filter of window 100 is cleared for window 103 since all of its entries have expired.
+        assert guard.add(b"c", 1200, 1031)
+        assert not guard.add(b"b", 1100, 1031)
+        assert guard.add(b"a", 1200, 1031)
+
+    def test_bloom_replay_guard_does_not_clear_live_filter(self):
+        guard = BloomReplayGuard(capacity=100, window=10, slots=2)
+        assert guard.add(b"a", 2000, 1000)
+        # The filter of window 100 is reused for window 102 without being cleared.
+        assert guard.add(b"b", 2000, 1020)
+        assert not guard.add(b"a", 2000, 1020)
+
+    def test_bloom_replay_guard_with_shared_buffer(self):
+        size = BloomReplayGuard.buffer_size(capacity=1000)
+        buf = bytearray(size + 10)
+        g1 = BloomReplayGuard(capacity=1000, buffer=buf)
+        g2 = BloomReplayGuard(capacity=1000, buffer=memoryview(buf))
+        assert g1.check(b"a") is True
+        assert g2.check(b"a") is False
+        assert g2.check(b"b") is True
+        assert g1.check(b"b") is False
+        g1.clear()
+        assert g2.check(b"a") is True
+
+    def test_bloom_replay_guard_with_mmap(self):
+        import mmap
+
+        size = BloomReplayGuard.buffer_size(capacity=1000)
+        with mmap.mmap(-1, size) as m:
+            guard = BloomReplayGuard(capacity=1000, buffer=m)
+            assert guard.check(b"a") is True
+            assert guard.check(b"a") is False
+            del guard
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({"capacity": 0}, "capacity should be positive int."),
+            ({"error_rate": 0.0}, "error_rate should be float between 0 and 1."),
+            ({"error_rate": 1.0}, "error_rate should be float between 0 and 1."),
+            ({"error_rate": 1}, "error_rate should be float between 0 and 1."),
+            ({"slots": 1}, "slots should be int greater than 1."),
+            ({"window": 0}, "window should be positive int."),
+            ({"buffer": b"x" * 100000}, "buffer should be writable."),
+            ({"buffer": bytearray(10)}, "buffer should be at least"),
+        ],
+    )
+    def test_bloom_replay_guard_with_invalid_args(self, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            BloomReplayGuard(**{"capacity": 1000, **kwargs})
+            pytest.fail("BloomReplayGuard() should fail.")
+        assert msg in str(err.value)
+
+    def test_bloom_replay_guard_with_buffer_of_different_params(self):
+        buf = bytearray(BloomReplayGuard.buffer_size(capacity=1000))
+        BloomReplayGuard(capacity=1000, buffer=buf, window=60)
+        with pytest.raises(ValueError) as err:
+            BloomReplayGuard(capacity=1000, buffer=buf, window=30)
+            pytest.fail("BloomReplayGuard() should fail.")
+        assert "buffer has been initialized with different parameters." in str(err.value)
+
+
+class TestSQLiteReplayGuard:
+    """
+    Tests for SQLiteReplayGuard.
+    """
+
+    def test_sqlite_replay_guard_shared_by_instances(self, tmp_path):
+        path = str(tmp_path / "replay.db")
+        with SQLiteReplayGuard(path) as g1, SQLiteReplayGuard(path) as g2:
+            assert g1.check(b"a") is True
+            assert g2.check(b"a") is False
+            assert len(g1) == 1
+        with SQLiteReplayGuard(path) as g3:
+            assert g3.check(b"a") is False
+
+    def test_sqlite_replay_guard_purge(self, tmp_path):
+        with SQLiteReplayGuard(str(tmp_path / "replay.db"), purge_interval=10) as guard:
+            guard.add(b"a", 1010, 1000)
+            guard.add(b"b", 1100, 1005)
+            guard.add(b"c", 1100, 1020)
+            assert guard._conn().execute("SELECT COUNT(*) FROM cwt_replay").fetchone()[0] == 2
+
+    def test_sqlite_replay_guard_closed(self, tmp_path):
+        guard = SQLiteReplayGuard(str(tmp_path / "replay.db"))
+        guard.close()
+        guard.close()
+        with pytest.raises(ValueError) as err:
+            guard.check(b"a")
+            pytest.fail("check() should fail.")
+        assert "The replay guard has been closed." in str(err.value)
+
+    @pytest.mark.parametrize(
+        "path, kwargs, msg",
+        [
+            ("", {}, "path should be str."),
+            (None, {}, "path should be str."),
+            ("replay.db", {"purge_interval": 0}, "purge_interval should be positive int."),
+        ],
+    )
+    def test_sqlite_replay_guard_with_invalid_args(self, tmp_path, path, kwargs, msg):
+        with pytest.raises(ValueError) as err:
+            SQLiteReplayGuard(str(tmp_path / path) if path else path, **kwargs)
+            pytest.fail("SQLiteReplayGuard() should fail.")
+        assert msg in str(err.value)
+
+    def test_sqlite_replay_guard_with_invalid_file(self, tmp_path):
+        path = tmp_path / "replay.db"
+        path.write_bytes(b"x" * 1024)
+        with pytest.raises(ValueError) as err:
+            SQLiteReplayGuard(str(path))
+            pytest.fail("SQLiteReplayGuard() should fail.")
+        assert "Failed to open the replay guard:" in str(err.value)
@@ -0,0 +1,198 @@
+"""
+Tests for TokenCache.
+"""
+
+import time
+
+import pytest
+
+from cwt import CWT, COSEKey, KeyRing, TokenCache, VerifyError
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+@pytest.fixture(scope="module")
+def public_key():
+    with open(key_path("public_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+class TestTokenCache:
+    """
+    Tests for TokenCache.
+    """
+
+    def test_token_cache_constructor(self):
+        cache = TokenCache()
+        assert cache.hits == 0
+        assert cache.misses == 0
+        assert len(cache) == 0
+
+    @pytest.mark.parametrize(
+        "ttl, max_entries, msg",
+        [
+            (0, 1024, "ttl should be positive int."),
+            ("3600", 1024, "ttl should be positive int."),
+            (3600, 0, "max_entries should be positive int."),
+            (3600, -1, "max_entries should be positive int."),
+        ],
+    )
+    def test_token_cache_constructor_with_invalid_args(self, ttl, max_entries, msg):
+        with pytest.raises(ValueError) as err:
+            TokenCache(ttl, max_entries)
+            pytest.fail("TokenCache() should fail.")
+        assert msg in str(err.value)
+
+    def test_token_cache_get_and_put(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        cache = TokenCache()
+        assert cache.get(b"token", [key]) is None
+        cache.put(b"token", [key], {1: "iss"}, b"", 0)
+        claims = cache.get(b"token", [key])
+        assert claims == {1: "iss"}
+        claims[1] = "modified"
+        assert cache.get(b"token", [key]) == {1: "iss"}
+        assert cache.get(b"token", [COSEKey.from_symmetric_key(alg="HS256")]) is None
+        assert cache.hits == 2
+        assert cache.misses == 2
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.hits == 0
+
+    def test_token_cache_copies_nested_claims(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        cache = TokenCache()
+        claims = {1: "iss", 8: {1: {1: 4, -1: b"xxx"}}, -70000: [1, [2]]}
+        cache.put(b"token", [key], claims, b"", 0)
+        claims[8][1][-1] = b"modified"
+        res = cache.get(b"token", [key])
+        assert res == {1: "iss", 8: {1: {1: 4, -1: b"xxx"}}, -70000: [1, [2]]}
+        res[8][1][-1] = b"modified"
+        res[-70000][1].append(3)
+        assert cache.get(b"token", [key]) == {1: "iss", 8: {1: {1: 4, -1: b"xxx"}}, -70000: [1, [2]]}
+
+    def test_token_cache_with_now(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        cache = TokenCache(ttl=10)
+        cache.put(b"token", [key], {1: "iss"}, b"", 0, now=1000)
+        assert cache.get(b"token", [key], now=1009) == {1: "iss"}
+        assert cache.get(b"token", [key], now=1010) is None
+        cache.put(b"token", [key], {1: "iss"}, b"", 0, 1005, now=1000)
+        assert cache.get(b"token", [key], now=1005) is None
+
+    def test_token_cache_put_expired(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        cache = TokenCache()
+        cache.put(b"token", [key], {1: "iss"}, b"", 0, time.time() - 1)
+        assert len(cache) == 0
+
+    def test_token_cache_lru_eviction(self):
+        key = COSEKey.from_symmetric_key(alg="HS256")
+        cache = TokenCache(max_entries=2)
+        cache.put(b"t1", [key], {}, b"", 0)
+        cache.put(b"t2", [key], {}, b"", 0)
+        cache.get(b"t1", [key])
+        cache.put(b"t3", [key], {}, b"", 0)
+        assert cache.get(b"t2", [key]) is None
+        assert cache.get(b"t1", [key]) == {}
+        assert cache.get(b"t3", [key]) == {}
+
+    def test_cwt_token_cache_disabled_by_default(self):
+        assert CWT.new().token_cache is None
+
+    def test_cwt_decode_with_token_cache(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16)
+        token = ctx.encode({"iss": "coaps://as.example", "cti": "123"}, private_key)
+        for _ in range(3):
+            assert ctx.decode(token, public_key)[1] == "coaps://as.example"
+        assert ctx.token_cache.hits == 2
+        assert ctx.token_cache.misses == 1
+
+    def test_cwt_decode_with_token_cache_and_no_verify(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16)
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        ctx.decode(token, public_key, no_verify=True)
+        ctx.decode(token, public_key, no_verify=True)
+        assert ctx.token_cache.hits == 0
+        assert ctx.token_cache.misses == 0
+
+    def test_cwt_decode_with_token_cache_and_invalid_token(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16)
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        token = token[:-1] + bytes([token[-1] ^ 1])
+        for _ in range(2):
+            with pytest.raises(VerifyError):
+                ctx.decode(token, public_key)
+                pytest.fail("decode() should fail.")
+        assert ctx.token_cache.misses == 2
+
+    def test_cwt_decode_with_token_cache_rechecks_exp(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16, leeway=10)
+        now = int(time.time())
+        token = ctx.encode({"iss": "coaps://as.example", "exp": now + 100}, private_key)
+        ctx.decode(token, public_key)
+        # The cached entry expires at exp - leeway, so the token is verified again.
+        ctx.decode(token, public_key, now=now + 95)
+        assert ctx.token_cache.hits == 0
+        assert ctx.token_cache.misses == 2
+
+    def test_cwt_decode_with_token_cache_uses_clock(self, private_key, public_key):
+        now = [int(time.time())]
+        ctx = CWT.new(token_cache_size=16, leeway=10, clock=lambda: now[0])
+        token = ctx.encode({"iss": "coaps://as.example", "exp": now[0] + 100}, private_key)
+        ctx.decode(token, public_key)
+        ctx.decode(token, public_key)
+        now[0] += 95
+        ctx.decode(token, public_key)
+        assert ctx.token_cache.hits == 1
+        assert ctx.token_cache.misses == 2
+
+    @pytest.mark.parametrize("invalid", [-1, "16", 1.5, True])
+    def test_cwt_with_invalid_token_cache_size(self, invalid):
+        with pytest.raises(ValueError) as err:
+            CWT.new(token_cache_size=invalid)
+            pytest.fail("CWT.new() should fail.")
+        assert "token_cache_size should be non-negative int." in str(err.value)
+
+    def test_cwt_decode_with_token_cache_keyed_by_keys(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16)
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        ctx.decode(token, public_key)
+        other = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        with pytest.raises(VerifyError):
+            ctx.decode(token, [other])
+            pytest.fail("decode() should fail.")
+        assert ctx.token_cache.hits == 0
+
+    def test_cwt_decode_with_token_cache_invalidated_by_key_removal(self, private_key, public_key):
+        ctx = CWT.new(token_cache_size=16)
+        other = COSEKey.from_symmetric_key(alg="HS256", kid="02")
+        ring = KeyRing([public_key, other])
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        ctx.decode(token, ring)
+        ring.remove(other)
+        ctx.decode(token, ring)
+        assert ctx.token_cache.hits == 1
+        ring.remove(public_key)
+        with pytest.raises(ValueError) as err:
+            ctx.decode(token, ring)
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+        assert ctx.token_cache.hits == 1
+        assert len(ctx.token_cache) == 0
+
+    def test_token_cache_invalidated_by_key_removal_without_kid(self):
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        ring = KeyRing([key, COSEKey.from_symmetric_key(alg="HS256", kid="02")])
+        cache = TokenCache()
+        cache.put(b"t1", ring, {}, b"", ring.generation)
+        cache.put(b"t2", ring, {}, b"01", ring.generation)
+        ring.remove(b"02")
+        assert cache.get(b"t1", ring) is None
+        assert cache.get(b"t2", ring) == {}
@@ -0,0 +1,254 @@
+"""
+Tests for Tracer and HistogramTracer.
+"""
+
+import threading
+
+import pytest
+
+from cwt import (
+    COSE,
+    CWT,
+    COSEKey,
+    Histogram,
+    HistogramTracer,
+    Recipient,
+    Span,
+    Tracer,
+    VerifyError,
+)
+from cwt.tracer import NoopTracer
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    with open(key_path("private_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+@pytest.fixture(scope="module")
+def public_key():
+    with open(key_path("public_key_es256.pem")) as key_file:
+        return COSEKey.from_pem(key_file.read(), kid="01")
+
+
+class Recorder(Tracer):
+    def __init__(self):
+        super().__init__()
+        self.spans = []
+
+    def on_span(self, span: Span):
+        self.spans.append(span)
+
+    def names(self) -> list:
+        return [s.name for s in self.spans]
+
+    def find(self, name: str) -> Span:
+        return [s for s in self.spans if s.name == name][-1]
+
+
+class TestTracer:
+    """
+    Tests for Tracer and HistogramTracer.
+    """
+
+    def test_tracer_span(self):
+        spans = []
+        tracer = Tracer(spans.append)
+        with tracer.span("phase", alg=-7) as span:
+            span.set("keys_tried", 2)
+        assert len(spans) == 1
+        assert spans[0].name == "phase"
+        assert spans[0].attrs == {"alg": -7, "keys_tried": 2}
+        assert spans[0].duration_ns >= 0
+
+    def test_tracer_span_with_error(self):
+        spans = []
+        tracer = Tracer(spans.append)
+        with pytest.raises(ValueError):
+            with tracer.span("phase"):
+                raise ValueError("failed")
+            pytest.fail("span should not suppress the exception.")
+        assert spans[0].attrs["error"] == "ValueError"
+
+    def test_tracer_noop(self):
+        tracer = NoopTracer()
+        with tracer.span("phase", alg=-7) as span:
+            span.set("keys_tried", 1)
+        assert tracer.span("a") is tracer.span("b")
+
+    def test_tracer_histogram(self):
+        h = Histogram()
+        assert h.percentile(50) == 0
+        assert h.mean_ns == 0.0
+        for v in [100, 200, 300, 5000]:
+            h.add(v)
+        assert h.count == 4
+        assert h.total_ns == 5600
+        assert h.min_ns == 100
+        assert h.max_ns == 5000
+        assert h.mean_ns == 1400.0
+        assert h.buckets == [(128, 1), (256, 1), (512, 1), (8192, 1)]
+        assert h.percentile(50) == 256
+        assert h.percentile(100) == 5000
+
+    def test_tracer_histogram_tracer(self):
+        called = []
+        tracer = HistogramTracer(callback=called.append)
+        for _ in range(3):
+            with tracer.span("a"):
+                pass
+        with tracer.span("b"):
+            pass
+        hs = tracer.histograms()
+        assert hs["a"].count == 3
+        assert hs["b"].count == 1
+        assert len(called) == 4
+        tracer.clear()
+        assert tracer.histograms() == {}
+
+    def test_tracer_histogram_tracer_with_group_by(self):
+        tracer = HistogramTracer(group_by="alg")
+        with tracer.span("cose.crypto", alg=-7):
+            pass
+        with tracer.span("cose.crypto", alg=-8):
+            pass
+        with tracer.span("cose.decode"):
+            pass
+        assert sorted(tracer.histograms().keys()) == ["cose.crypto[-7]", "cose.crypto[-8]", "cose.decode"]
+
+    def test_tracer_histogram_tracer_with_threads(self):
+        tracer = HistogramTracer()
+
+        def run():
+            for _ in range(1000):
+                with tracer.span("a"):
+                    pass
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert tracer.histograms()["a"].count == 4000
+
+    def test_tracer_cose_default(self):
+        ctx = COSE.new()
+        assert isinstance(ctx.tracer, NoopTracer)
+        tracer = Tracer()
+        ctx.tracer = tracer
+        assert ctx.tracer is tracer
+        ctx.tracer = None
+        assert isinstance(ctx.tracer, NoopTracer)
+
+    @pytest.mark.parametrize("invalid", ["xxx", {}, lambda s: s])
+    def test_tracer_cose_with_invalid_tracer(self, invalid):
+        with pytest.raises(ValueError) as err:
+            COSE.new(tracer=invalid)
+            pytest.fail("COSE.new() should fail.")
+        assert "tracer should be Tracer." in str(err.value)
+
+    def test_tracer_cose_sign1(self, private_key, public_key):
+        tracer = Recorder()
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, tracer=tracer)
+        encoded = ctx.encode_and_sign(b"Hello world!", private_key)
+        assert tracer.names() == ["cose.encode"]
+        assert tracer.find("cose.encode").attrs == {"alg": -7, "payload_size": 12}
+
+        tracer.spans.clear()
+        assert ctx.decode(encoded, public_key) == b"Hello world!"
+        assert tracer.names() == ["cose.parse", "cose.headers", "cose.key_lookup", "cose.crypto", "cose.decode"]
+        assert tracer.find("cose.decode").attrs == {"tag": 18, "alg": -7, "payload_size": 12}
+        assert tracer.find("cose.key_lookup").attrs == {"kid": b"01", "alg": -7, "keys": 1}
+        assert tracer.find("cose.crypto").attrs == {"alg": -7, "keys_tried": 1}
+
+    def test_tracer_cose_mac0_with_multiple_keys(self):
+        tracer = Recorder()
+        ctx = COSE.new(alg_auto_inclusion=True, tracer=tracer)
+        keys = [COSEKey.from_symmetric_key(alg="HS256") for _ in range(3)]
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[2])
+        assert ctx.decode(encoded, keys) == b"Hello world!"
+        assert tracer.find("cose.crypto").attrs == {"alg": 5, "keys_tried": 3}
+
+        with pytest.raises(VerifyError):
+            ctx.decode(encoded, keys[0:2])
+            pytest.fail("decode() should fail.")
+        assert tracer.find("cose.crypto").attrs == {"alg": 5, "keys_tried": 2, "error": "VerifyError"}
+        assert tracer.find("cose.decode").attrs["error"] == "VerifyError"
+
+    def test_tracer_cose_mac_with_recipients(self):
+        tracer = Recorder()
+        ctx = COSE.new(tracer=tracer)
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        r = Recipient.new(unprotected={"alg": "direct", "kid": "01"})
+        encoded = ctx.encode_and_mac(b"Hello world!", key, protected={"alg": "HS256"}, recipients=[r])
+        tracer.spans.clear()
+        assert ctx.decode(encoded, key) == b"Hello world!"
+        assert tracer.names() == ["cose.parse", "cose.headers", "cose.recipients", "cose.crypto", "cose.decode"]
+        assert tracer.find("cose.recipients").attrs == {"alg": 5, "recipients": 1}
+        assert tracer.find("cose.decode").attrs["tag"] == 97
+
+    def test_tracer_cose_encrypt0(self):
+        tracer = Recorder()
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, tracer=tracer)
+        key = COSEKey.from_symmetric_key(alg="A128GCM", kid="01")
+        encoded = ctx.encode_and_encrypt(b"Hello world!", key)
+        tracer.spans.clear()
+        assert ctx.decode(encoded, key) == b"Hello world!"
+        assert tracer.find("cose.decode").attrs == {"tag": 16, "alg": 1, "payload_size": 28}
+        assert tracer.find("cose.crypto").attrs == {"alg": 1, "keys_tried": 1}
+
+    def test_tracer_cose_with_cert_validation(self):
+        tracer = HistogramTracer()
+        with open(key_path("cert_es256.pem")) as key_file:
+            public_key = COSEKey.from_pem(key_file.read())
+        with open(key_path("private_key_cert_es256.pem")) as key_file:
+            private_key = COSEKey.from_pem(key_file.read())
+        ctx = COSE.new(alg_auto_inclusion=True, ca_certs=key_path("cacert.pem"), tracer=tracer)
+        encoded = ctx.encode_and_sign(b"Hello world!", private_key)
+        assert ctx.decode(encoded, [public_key]) == b"Hello world!"
+        assert tracer.histograms()["cose.cert_validation"].count == 1
+
+    def test_tracer_cwt(self, private_key, public_key):
+        tracer = Recorder()
+        ctx = CWT.new(tracer=tracer)
+        assert ctx.tracer is tracer
+        assert ctx.cose.tracer is tracer
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        tracer.spans.clear()
+        ctx.decode(token, public_key)
+        assert tracer.names() == [
+            "cwt.parse",
+            "cose.headers",
+            "cose.key_lookup",
+            "cose.crypto",
+            "cose.decode",
+            "cwt.parse",
+            "cwt.claims",
+            "cwt.decode",
+        ]
+
+    def test_tracer_cwt_with_token_cache(self, private_key, public_key):
+        tracer = Recorder()
+        ctx = CWT.new(token_cache_size=10, tracer=tracer)
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        ctx.decode(token, public_key)
+        assert tracer.find("cwt.decode").attrs == {"cache_hit": False}
+        tracer.spans.clear()
+        ctx.decode(token, public_key)
+        assert tracer.names() == ["cwt.claims", "cwt.decode"]
+        assert tracer.find("cwt.decode").attrs == {"cache_hit": True}
+
+    def test_tracer_cwt_set_tracer(self, private_key, public_key):
+        ctx = CWT.new()
+        assert isinstance(ctx.tracer, NoopTracer)
+        tracer = HistogramTracer()
+        ctx.tracer = tracer
+        token = ctx.encode({"iss": "coaps://as.example"}, private_key)
+        ctx.decode(token, public_key)
+        hs = tracer.histograms()
+        assert hs["cwt.decode"].count == 1
+        assert hs["cose.crypto"].count == 1
+        assert hs["cose.encode"].count == 1
@@ -0,0 +1,215 @@
+"""
+Tests for parallel trials of candidate keys.
+"""
+
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cwt import COSE, CWT, COSEKey, KeyRing, Recipient, VerifyError
+from cwt.batch import run_trials
+
+from .utils import key_path
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def _fail_unless(ok):
+    def trial(x):
+        if x != ok:
+            raise ValueError(f"invalid: {x}")
+        return x * 2
+
+    return trial
+
+
+class TestRunTrials:
+    """
+    Tests for run_trials.
+    """
+
+    def test_run_trials_sequentially(self):
+        assert run_trials(_fail_unless(3), list(range(10))) == (3, 6, 4)
+
+    def test_run_trials_in_parallel(self, executor):
+        i, res, tried = run_trials(_fail_unless(7), list(range(10)), 4, executor)
+        assert (i, res) == (7, 14)
+        assert 2 <= tried <= 10
+
+    def test_run_trials_on_thread_pool(self, executor):
+        thread_ids = []
+
+        def trial(x):
+            thread_ids.append(threading.get_ident())
+            raise ValueError("invalid")
+
+        run_trials(trial, [0] * 8, 4, executor)
+        assert len(thread_ids) == 8
+        assert threading.get_ident() not in thread_ids
+
+    def test_run_trials_with_single_candidate_on_calling_thread(self, executor):
+        assert run_trials(lambda _: threading.get_ident(), [0], 4, executor) == (0, threading.get_ident(), 1)
+
+    @pytest.mark.parametrize("workers", [1, 2, 4])
+    def test_run_trials_returns_last_error(self, executor, workers):
+        i, res, tried = run_trials(_fail_unless(-1), list(range(10)), workers, executor)
+        assert i == -1
+        assert isinstance(res, ValueError)
+        assert str(res) == "invalid: 9"
+        assert tried == 10
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_run_trials_without_candidates(self, executor, workers):
+        assert run_trials(_fail_unless(0), [], workers, executor) == (-1, None, 0)
+
+    def test_run_trials_stops_after_first_success(self, executor):
+        tried = []
+
+        def trial(x):
+            tried.append(x)
+            if x != 0:
+                time.sleep(0.05)
+                raise ValueError("invalid")
+            return x
+
+        assert run_trials(trial, list(range(40)), 4, executor)[:2] == (0, 0)
+        time.sleep(0.1)
+        assert len(tried) < 10
+
+    def test_run_trials_caps_fan_out(self, executor):
+        running = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def trial(x):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            raise ValueError("invalid")
+
+        run_trials(trial, list(range(12)), 2, executor)
+        assert peak[0] <= 2
+
+
+class TestParallelTrials:
+    """
+    Tests for decoding with parallel trials of candidate keys.
+    """
+
+    @pytest.mark.parametrize("invalid", [0, -1, "2", True, 1.5])
+    def test_cose_with_invalid_trial_workers(self, invalid):
+        with pytest.raises(ValueError) as err:
+            COSE.new(trial_workers=invalid)
+            pytest.fail("COSE.new() should fail.")
+        assert "trial_workers should be positive int." in str(err.value)
+
+    def test_cose_with_trial_workers_does_not_leak_threads(self):
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(4)]
+        encoded = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True).encode_and_mac(b"Hello world!", keys[3])
+        assert COSE.new(trial_workers=4).decode(encoded, keys) == b"Hello world!"
+        count = threading.active_count()
+        for _ in range(50):
+            assert COSE.new(trial_workers=4).decode(encoded, keys) == b"Hello world!"
+        assert threading.active_count() <= count + 4
+
+    def test_cose_decode_many_with_trial_workers(self):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(4)]
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[2])
+        assert ctx.decode_many([encoded] * 64, keys, workers=4, chunk_size=4) == [b"Hello world!"] * 64
+
+    def test_cose_decode_mac0_with_keys_sharing_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(10)]
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[6])
+        assert ctx.decode(encoded, keys) == b"Hello world!"
+        assert ctx.decode(encoded, KeyRing(keys)) == b"Hello world!"
+
+    def test_cose_decode_encrypt0_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True, trial_workers=3)
+        keys = [COSEKey.from_symmetric_key(alg="A128GCM") for _ in range(10)]
+        encoded = ctx.encode_and_encrypt(b"Hello world!", keys[9])
+        assert ctx.decode(encoded, keys) == b"Hello world!"
+
+    def test_cose_decode_signature1_with_keys_sharing_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=2)
+        with open(key_path("private_key_es256.pem")) as key_file:
+            priv = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_es256.pem")) as key_file:
+            pub = COSEKey.from_pem(key_file.read(), kid="01")
+        with open(key_path("public_key_ed25519.pem")) as key_file:
+            other = COSEKey.from_pem(key_file.read(), kid="01")
+        encoded = ctx.encode_and_sign(b"Hello world!", priv)
+        assert ctx.decode(encoded, [other, other, pub, other]) == b"Hello world!"
+
+    def test_cose_decode_encrypt_with_recipients_without_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="A128KW") for _ in range(6)]
+        r = Recipient.new(unprotected={"alg": "A128KW"}, sender_key=keys[4])
+        enc_key = COSEKey.from_symmetric_key(alg="A128GCM")
+        encoded = ctx.encode_and_encrypt(b"Hello world!", enc_key, recipients=[r])
+        assert ctx.decode(encoded, keys) == b"Hello world!"
+
+    def test_cose_decode_mac_with_recipients_sharing_kid(self):
+        ctx = COSE.new(alg_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="A128KW", kid="01") for _ in range(6)]
+        r = Recipient.new(unprotected={"alg": "A128KW", "kid": "01"}, sender_key=keys[2])
+        mac_key = COSEKey.from_symmetric_key(alg="HS256")
+        encoded = ctx.encode_and_mac(b"Hello world!", mac_key, recipients=[r])
+        assert ctx.decode(encoded, keys) == b"Hello world!"
+
+    @pytest.mark.parametrize("trial_workers", [1, 4])
+    def test_cose_decode_with_wrong_keys(self, trial_workers):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=trial_workers)
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(8)]
+        encoded = ctx.encode_and_mac(b"Hello world!", COSEKey.from_symmetric_key(alg="HS256", kid="01"))
+        with pytest.raises(VerifyError) as err:
+            ctx.decode(encoded, keys)
+            pytest.fail("decode() should fail.")
+        assert "Failed to compare digest." in str(err.value)
+
+    @pytest.mark.parametrize("trial_workers", [1, 4])
+    def test_cose_decode_without_keys(self, trial_workers):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=trial_workers)
+        key = COSEKey.from_symmetric_key(alg="HS256", kid="01")
+        encoded = ctx.encode_and_mac(b"Hello world!", key)
+        with pytest.raises(ValueError) as err:
+            ctx.decode(encoded, [COSEKey.from_symmetric_key(alg="HS256", kid="02")] * 3)
+            pytest.fail("decode() should fail.")
+        assert "key is not found." in str(err.value)
+
+    def test_cose_decode_with_adaptive_key_ring(self):
+        ctx = COSE.new(alg_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="HS256") for _ in range(8)]
+        ring = KeyRing(keys, adaptive=True)
+        encoded = ctx.encode_and_mac(b"Hello world!", keys[5])
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert ring.find(op=10, alg=5)[0] is keys[5]
+        assert ctx.decode(encoded, ring) == b"Hello world!"
+        assert ring.decodes == 2
+        assert ring.attempts >= 3
+
+    def test_cose_decode_detached_payload_stream(self):
+        ctx = COSE.new(alg_auto_inclusion=True, kid_auto_inclusion=True, trial_workers=4)
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(4)]
+        payload = b"Hello world!" * 10000
+        encoded = ctx.encode_and_mac(b"", keys[3], detached_payload=io.BytesIO(payload))
+        f = io.BytesIO(payload)
+        assert ctx.decode(encoded, keys, detached_payload=f) is f
+        assert ctx.decode(encoded, keys, detached_payload=iter([payload[:5], payload[5:]])) is not None
+
+    def test_cwt_decode_with_keys_sharing_kid(self):
+        ctx = CWT.new(trial_workers=2)
+        keys = [COSEKey.from_symmetric_key(alg="HS256", kid="01") for _ in range(4)]
+        token = ctx.encode({"iss": "coaps://as.example"}, keys[1])
+        assert ctx.decode(token, keys)[1] == "coaps://as.example"